@@ -0,0 +1,181 @@
+"""
+Fetch throughput benchmark: sync thread pool vs asyncio backend
+
+Scans many VPCs through a simulated EC2 endpoint with a fixed round-trip
+latency and a server-side token bucket that answers RequestLimitExceeded
+when it is exceeded, like EC2's per-account API limits. The sync path
+(sgmap.scan.scan_vpcs) retries throttled calls the way botocore's standard
+mode does; the asyncio path (sgmap.aio.scan_vpcs_async) paces calls with its
+adaptive rate limiter.
+
+Usage (from the repository root):
+    PYTHONPATH=src python -m benchmarks.bench_fetch
+    PYTHONPATH=src python -m benchmarks.bench_fetch --server-rate 40 --rate 100 --sync-workers 32
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+from sgmap.aio import scan_vpcs_async
+from sgmap.scan import scan_vpcs
+
+from benchmarks.synthetic import generate_security_groups
+
+
+class ThrottledError(Exception):
+    """Stand-in for botocore's ClientError with a RequestLimitExceeded code"""
+
+    def __init__(self) -> None:
+        super().__init__('RequestLimitExceeded')
+        self.response = {'Error': {'Code': 'RequestLimitExceeded'}}
+
+
+class SimulatedEc2Client:
+    """
+    Thread-safe EC2 client answering after `latency` seconds from synthetic VPCs,
+    throttled by a server-side token bucket.
+
+    With botocore_retries=True, throttled calls are retried in the calling
+    thread like botocore's standard retry mode (3 attempts, full-jitter
+    exponential backoff with a 1 second base).
+    """
+
+    def __init__(
+        self,
+        vpcs: Dict[str, List[Dict[str, Any]]],
+        latency: float,
+        server_rate: float,
+        server_burst: float,
+        page_size: int = 100,
+        botocore_retries: bool = False
+    ):
+        self.vpcs = vpcs
+        self.latency = latency
+        self.server_rate = server_rate
+        self.server_burst = server_burst
+        self.page_size = page_size
+        self.botocore_retries = botocore_retries
+        self.calls = 0
+        self.throttled = 0
+        self._tokens = server_burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.meta = type('Meta', (), {'region_name': 'us-east-1'})()
+
+    def _request(self) -> None:
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._tokens = min(self.server_burst, self._tokens + (now - self._updated) * self.server_rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                raise ThrottledError()
+            self._tokens -= 1
+
+    def _call(self) -> None:
+        attempts = 3 if self.botocore_retries else 1
+        for attempt in range(attempts):
+            try:
+                self._request()
+                return
+            except ThrottledError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(0, min(20, 2 ** attempt)))
+
+    def describe_vpcs(self, VpcIds: Optional[List[str]] = None, NextToken: Optional[str] = None) -> Dict[str, Any]:
+        self._call()
+        return {'Vpcs': [{'VpcId': vpc_id} for vpc_id in VpcIds or self.vpcs if vpc_id in self.vpcs]}
+
+    def describe_security_groups(
+        self,
+        Filters: List[Dict[str, Any]],
+        MaxResults: Optional[int] = None,
+        NextToken: Optional[str] = None
+    ) -> Dict[str, Any]:
+        self._call()
+        groups = self.vpcs[Filters[0]['Values'][0]]
+        start = int(NextToken or 0)
+        end = start + (MaxResults or self.page_size)
+        page: Dict[str, Any] = {'SecurityGroups': groups[start:end]}
+        if end < len(groups):
+            page['NextToken'] = str(end)
+        return page
+
+    def get_paginator(self, operation_name: str) -> Any:
+        client = self
+
+        class Paginator:
+            def paginate(self, Filters: List[Dict[str, Any]], PaginationConfig: Optional[Dict[str, Any]] = None) -> Any:
+                kwargs: Dict[str, Any] = {'Filters': Filters}
+                if PaginationConfig:
+                    kwargs['MaxResults'] = PaginationConfig['PageSize']
+                while True:
+                    page = client.describe_security_groups(**kwargs)
+                    yield page
+                    if 'NextToken' not in page:
+                        return
+                    kwargs['NextToken'] = page['NextToken']
+
+        return Paginator()
+
+
+def run(name: str, client: SimulatedEc2Client, scan: Any) -> None:
+    start = time.perf_counter()
+    try:
+        result = scan()
+        vpcs = sum(len(region) for region in result['regions'].values())
+        status = f"{vpcs} VPCs"
+    except ThrottledError:
+        status = 'FAILED (throttling retries exhausted)'
+    seconds = time.perf_counter() - start
+    print(
+        f"{name:<8} {seconds:>7.2f}s {client.calls / seconds:>9.1f} calls/s "
+        f"{client.throttled:>6} throttled  {status}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare sync and asyncio fetch throughput under throttling')
+    parser.add_argument('--vpcs', type=int, default=100, help='Number of VPCs to scan')
+    parser.add_argument('--groups', type=int, default=300, help='Security groups per VPC')
+    parser.add_argument('--latency', type=float, default=0.2, help='Round-trip latency per call in seconds')
+    parser.add_argument('--server-rate', type=float, default=100.0, help='Server-side sustained calls per second')
+    parser.add_argument('--server-burst', type=float, default=100.0, help='Server-side bucket capacity')
+    parser.add_argument('--sync-workers', type=int, default=8, help='Threads of the sync scan')
+    parser.add_argument('--concurrency', type=int, default=64, help='Calls in flight of the asyncio scan')
+    parser.add_argument('--rate', type=float, default=80.0, help='Asyncio rate per region (initial and maximum)')
+    args = parser.parse_args(argv)
+
+    groups = generate_security_groups(groups=args.groups, rules_per_group=4)
+    vpcs = {f"vpc-{index:08x}": groups for index in range(args.vpcs)}
+    vpc_ids = list(vpcs)
+    print(
+        f"{args.vpcs} VPCs x {args.groups} groups, latency {args.latency * 1000:.0f}ms, "
+        f"server limit {args.server_rate:.0f}/s (burst {args.server_burst:.0f})"
+    )
+
+    sync_client = SimulatedEc2Client(vpcs, args.latency, args.server_rate, args.server_burst, botocore_retries=True)
+    with patch('sgmap.scan.ec2_client', return_value=sync_client):
+        run('sync', sync_client, lambda: scan_vpcs(vpc_ids, max_workers=args.sync_workers))
+
+    async_client = SimulatedEc2Client(vpcs, args.latency, args.server_rate, args.server_burst)
+    run('asyncio', async_client, lambda: asyncio.run(scan_vpcs_async(
+        vpc_ids,
+        max_concurrency=args.concurrency,
+        rate=args.rate,
+        client_factory=lambda region: async_client
+    )))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Import-time benchmark for sgmap
+
+Measures the wall-clock time of fresh interpreters importing sgmap, the CLI
+module and running `sgmap --help`, next to importing boto3 alone, and reports
+whether boto3 was loaded.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_import.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+CASES = {
+    'import sgmap': 'import sgmap',
+    'import sgmap.cli': 'import sgmap.cli',
+    'sgmap --help': (
+        'import sys\n'
+        'from sgmap.cli import main\n'
+        'try:\n'
+        '    main(["--help"], prog_name="sgmap")\n'
+        'except SystemExit:\n'
+        '    pass\n'
+    ),
+    'import boto3 (reference)': 'import boto3',
+}
+
+_REPORT = '\nimport sys\nsys.stderr.write("boto3 loaded: %s\\n" % ("boto3" in sys.modules))\n'
+
+
+def run_case(code: str, runs: int) -> Dict[str, float]:
+    """
+    Time a snippet in fresh interpreters.
+
+    Args:
+        code: Python source to run
+        runs: Number of interpreters to start
+
+    Returns:
+        Dictionary with median and minimum milliseconds and whether boto3 was loaded
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    timings: List[float] = []
+    loaded = False
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', code + _REPORT],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        loaded = 'boto3 loaded: True' in result.stderr
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings), 'boto3': loaded}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10, help='Interpreters started per case')
+    args = parser.parse_args()
+
+    baseline = run_case('pass', args.runs)['median_ms']
+    print(f"{'case':<26} {'median':>9} {'min':>9} {'- python':>9}  boto3")
+    for name, code in CASES.items():
+        result = run_case(code, args.runs)
+        print(f"{name:<26} {result['median_ms']:>7.1f}ms {result['min_ms']:>7.1f}ms "
+              f"{result['median_ms'] - baseline:>7.1f}ms  {'loaded' if result['boto3'] else '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Pipeline benchmark for sgmap
+
+Times each stage separately on synthetic VPCs: fetch (against a stubbed EC2
+client), analyze_security_group_connections, the multiprocess analysis with
+one worker per CPU (parallel), generate_mermaid_diagram,
+generate_json_output, generate_columnar and reading the columnar file back
+(columnar_load). Reports the best wall time over several repeats,
+throughput and the tracemalloc peak of each stage, and compares them with
+the stored baselines.
+
+Usage (from the repository root):
+    PYTHONPATH=src python -m benchmarks.bench_pipeline                 # run and compare with baselines
+    PYTHONPATH=src python -m benchmarks.bench_pipeline --save-baseline # store the results as baselines
+    PYTHONPATH=src python -m benchmarks.bench_pipeline --scenario large --repeat 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from sgmap.core import (
+    analyze_security_group_connections,
+    generate_json_output,
+    generate_mermaid_diagram,
+    get_security_groups
+)
+from sgmap.columnar import ColumnarGraph, generate_columnar
+from sgmap.parallel import analyze_security_group_connections_parallel
+
+from benchmarks.synthetic import VPC_ID, StubEc2Client, generate_security_groups
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    'small': {'groups': 100, 'rules_per_group': 6, 'sg_reference_density': 0.5, 'cidr_count': 20},
+    'medium': {'groups': 1000, 'rules_per_group': 8, 'sg_reference_density': 0.5, 'cidr_count': 100},
+    'large': {'groups': 5000, 'rules_per_group': 10, 'sg_reference_density': 0.6, 'cidr_count': 500},
+}
+
+# Allowed slowdown / memory growth relative to the baseline before a stage counts as a regression
+DEFAULT_TIME_TOLERANCE = 0.5
+DEFAULT_MEMORY_TOLERANCE = 0.2
+
+
+def _fetch(state: Dict[str, Any]) -> Any:
+    return get_security_groups(VPC_ID, ec2=state['client'])
+
+
+def _analyze(state: Dict[str, Any]) -> Any:
+    return analyze_security_group_connections(state['vpc_and_sgs'])
+
+
+def _analyze_parallel(state: Dict[str, Any]) -> Any:
+    return analyze_security_group_connections_parallel(state['vpc_and_sgs'])
+
+
+def _mermaid(state: Dict[str, Any]) -> Any:
+    return generate_mermaid_diagram(state['connections'])
+
+
+def _json(state: Dict[str, Any]) -> Any:
+    return generate_json_output(state['connections'])
+
+
+def _columnar(state: Dict[str, Any]) -> Any:
+    return generate_columnar(state['connections'])
+
+
+def _columnar_load(state: Dict[str, Any]) -> Any:
+    return ColumnarGraph(state['columnar']).to_dict()
+
+
+# (stage name, function, state key to store the result under)
+STAGES: List[Any] = [
+    ('fetch', _fetch, 'vpc_and_sgs'),
+    ('analyze', _analyze, 'connections'),
+    ('parallel', _analyze_parallel, None),
+    ('mermaid', _mermaid, None),
+    ('json', _json, None),
+    ('columnar', _columnar, 'columnar'),
+    ('columnar_load', _columnar_load, None),
+]
+
+
+def measure(func: Callable[[Dict[str, Any]], Any], state: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    """
+    Measure a stage.
+
+    Timing runs and the memory run are separate, because tracemalloc slows
+    allocation-heavy code down considerably.
+
+    Args:
+        func: Stage function taking the pipeline state
+        state: Pipeline state (inputs of the stage)
+        repeat: Number of timed runs
+
+    Returns:
+        Dictionary with the best seconds, the tracemalloc peak in bytes and the stage result
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(state)
+        timings.append(time.perf_counter() - start)
+        del result
+
+    tracemalloc.start()
+    try:
+        result = func(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(timings), 'peak_bytes': peak, 'result': result}
+
+
+def run_scenario(params: Dict[str, Any], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Run every stage of the pipeline on a synthetic VPC.
+
+    Args:
+        params: Generator parameters (see benchmarks.synthetic.generate_security_groups)
+        repeat: Number of timed runs per stage
+
+    Returns:
+        Dictionary of stage name to measurements
+    """
+    security_groups = generate_security_groups(**params)
+    state: Dict[str, Any] = {'client': StubEc2Client(security_groups)}
+    results: Dict[str, Dict[str, Any]] = {}
+    groups = len(security_groups)
+    edges: Optional[int] = None
+
+    for name, func, key in STAGES:
+        measured = measure(func, state, repeat)
+        output = measured.pop('result')
+        if key is not None:
+            state[key] = output
+        if name == 'analyze':
+            edges = sum(
+                len(sg['inbound']) + len(sg['outbound'])
+                for sg in output['security_groups'].values()
+            )
+        measured['groups_per_second'] = groups / measured['seconds'] if measured['seconds'] else None
+        if edges is not None:
+            measured['edges_per_second'] = edges / measured['seconds'] if measured['seconds'] else None
+        if isinstance(output, str):
+            measured['output_bytes'] = len(output.encode('utf-8'))
+        elif isinstance(output, bytes):
+            measured['output_bytes'] = len(output)
+        results[name] = measured
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    baselines: Dict[str, Dict[str, Dict[str, Any]]],
+    time_tolerance: float,
+    memory_tolerance: float
+) -> List[str]:
+    """
+    Compare measurements with baselines.
+
+    Args:
+        results: Scenario -> stage -> measurements
+        baselines: Stored baselines in the same shape
+        time_tolerance: Allowed relative slowdown
+        memory_tolerance: Allowed relative growth of the memory peak
+
+    Returns:
+        Descriptions of the regressions found
+    """
+    regressions = []
+    for scenario, stages in results.items():
+        for stage, measured in stages.items():
+            baseline = baselines.get(scenario, {}).get(stage)
+            if baseline is None:
+                continue
+            if measured['seconds'] > baseline['seconds'] * (1 + time_tolerance):
+                regressions.append(
+                    f"{scenario}/{stage}: {measured['seconds'] * 1000:.1f}ms "
+                    f"vs baseline {baseline['seconds'] * 1000:.1f}ms"
+                )
+            if measured['peak_bytes'] > baseline['peak_bytes'] * (1 + memory_tolerance):
+                regressions.append(
+                    f"{scenario}/{stage}: peak {measured['peak_bytes'] / 2**20:.1f}MiB "
+                    f"vs baseline {baseline['peak_bytes'] / 2**20:.1f}MiB"
+                )
+    return regressions
+
+
+def _format_rate(value: Optional[float]) -> str:
+    return f"{value:,.0f}/s" if value else '-'
+
+
+def print_results(scenario: str, stages: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    """Print one scenario as a table"""
+    print(f"\n## {scenario} {SCENARIOS[scenario]}")
+    print(f"{'stage':<13} {'time':>10} {'vs base':>8} {'peak':>10} {'groups':>12} {'edges':>12} {'output':>10}")
+    for stage, measured in stages.items():
+        base = baseline.get(stage)
+        ratio = f"{measured['seconds'] / base['seconds']:.2f}x" if base else '-'
+        output = f"{measured['output_bytes'] / 2**20:.1f}MiB" if 'output_bytes' in measured else '-'
+        print(
+            f"{stage:<13} {measured['seconds'] * 1000:>8.1f}ms {ratio:>8} "
+            f"{measured['peak_bytes'] / 2**20:>7.1f}MiB "
+            f"{_format_rate(measured.get('groups_per_second')):>12} "
+            f"{_format_rate(measured.get('edges_per_second')):>12} {output:>10}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the sgmap pipeline stages on synthetic VPCs')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (can be repeated; default: small and medium)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best is kept)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baselines JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baselines')
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE,
+                        help='Allowed relative slowdown before failing')
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help='Allowed relative memory peak growth before failing')
+    args = parser.parse_args(argv)
+
+    baselines: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+    baseline_results = baselines.get('scenarios', {})
+
+    results = {}
+    for scenario in args.scenario or ['small', 'medium']:
+        results[scenario] = run_scenario(SCENARIOS[scenario], args.repeat)
+        print_results(scenario, results[scenario], baseline_results.get(scenario, {}))
+
+    if args.save_baseline:
+        baseline_results.update(results)
+        baselines = {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'scenarios': baseline_results
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaselines saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline_results, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
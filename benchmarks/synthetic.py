@@ -0,0 +1,159 @@
+"""
+Synthetic describe_security_groups payloads and a stubbed EC2 client
+
+The generator is deterministic for a given seed, so benchmark runs are
+comparable across commits.
+"""
+
+import json
+import random
+from typing import Any, Dict, Iterator, List, Optional
+
+VPC_ID = 'vpc-0bench000000000000'
+
+_COMMON_PORTS = [22, 80, 443, 3306, 5432, 6379, 8080, 8443, 9200, 27017]
+
+
+def _group_id(index: int) -> str:
+    return f"sg-{index:017x}"
+
+
+def _cidr_pool(cidr_count: int) -> List[str]:
+    """Build `cidr_count` distinct CIDRs, starting with 0.0.0.0/0"""
+    pool = ['0.0.0.0/0']
+    index = 0
+    while len(pool) < cidr_count:
+        pool.append(f"10.{index // 256 % 256}.{index % 256}.0/24")
+        index += 1
+    return pool[:max(cidr_count, 1)]
+
+
+def _rule(rng: random.Random, group_count: int, cidrs: List[str], sg_reference_density: float) -> Dict[str, Any]:
+    """Build one IpPermissions entry"""
+    kind = rng.random()
+    if kind < 0.05:
+        rule: Dict[str, Any] = {'IpProtocol': '-1'}
+    elif kind < 0.1:
+        rule = {'IpProtocol': 'icmp', 'FromPort': 8, 'ToPort': -1}
+    else:
+        port = rng.choice(_COMMON_PORTS)
+        to_port = port if rng.random() < 0.8 else port + rng.randrange(1, 100)
+        rule = {'IpProtocol': rng.choice(('tcp', 'tcp', 'tcp', 'udp')), 'FromPort': port, 'ToPort': to_port}
+
+    pairs = []
+    ranges = []
+    if rng.random() < sg_reference_density:
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            pairs.append({
+                'GroupId': _group_id(rng.randrange(group_count)),
+                'UserId': '123456789012',
+                **({'Description': f"from service {rng.randrange(50)}"} if rng.random() < 0.5 else {})
+            })
+    else:
+        for _ in range(rng.choice((1, 1, 2))):
+            # Skewed towards the first CIDRs, like 0.0.0.0/0 and office ranges in real VPCs
+            cidr = cidrs[min(int(rng.expovariate(1.0 / max(len(cidrs) / 8, 1))), len(cidrs) - 1)]
+            ranges.append({'CidrIp': cidr, **({'Description': f"range {cidr}"} if rng.random() < 0.5 else {})})
+    rule.update(UserIdGroupPairs=pairs, IpRanges=ranges, Ipv6Ranges=[], PrefixListIds=[])
+    return rule
+
+
+def generate_security_groups(
+    groups: int = 1000,
+    rules_per_group: int = 8,
+    sg_reference_density: float = 0.5,
+    cidr_count: int = 50,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Generate security groups shaped like describe_security_groups output.
+
+    Args:
+        groups: Number of security groups
+        rules_per_group: Number of ingress rules per group (egress gets a third, at least one)
+        sg_reference_density: Fraction of rules that reference other security groups
+        cidr_count: Number of distinct CIDRs used by the other rules
+        seed: Random seed
+
+    Returns:
+        List of security group dictionaries
+    """
+    rng = random.Random(seed)
+    cidrs = _cidr_pool(cidr_count)
+    security_groups = []
+    for index in range(groups):
+        security_groups.append({
+            'GroupId': _group_id(index),
+            'GroupName': f"bench-{index}",
+            'Description': f"Benchmark security group {index}",
+            'OwnerId': '123456789012',
+            'VpcId': VPC_ID,
+            'Tags': [{'Key': 'Name', 'Value': f"bench-{index}"}, {'Key': 'Team', 'Value': f"team-{index % 20}"}],
+            'IpPermissions': [
+                _rule(rng, groups, cidrs, sg_reference_density) for _ in range(rules_per_group)
+            ],
+            'IpPermissionsEgress': [
+                _rule(rng, groups, cidrs, sg_reference_density) for _ in range(max(rules_per_group // 3, 1))
+            ]
+        })
+    return security_groups
+
+
+def generate_vpc() -> Dict[str, Any]:
+    """
+    Generate the describe_vpcs entry of the synthetic VPC.
+
+    Returns:
+        VPC dictionary
+    """
+    return {
+        'VpcId': VPC_ID,
+        'CidrBlock': '10.0.0.0/8',
+        'Tags': [{'Key': 'Name', 'Value': 'bench'}]
+    }
+
+
+class StubPaginator:
+    """
+    describe_security_groups paginator serving a synthetic payload.
+
+    Pages are decoded from JSON on every request, so fetching allocates fresh
+    objects the way parsing a real API response does.
+    """
+
+    def __init__(self, security_groups: List[Dict[str, Any]], page_size: int):
+        self._group_ids = [sg['GroupId'] for sg in security_groups]
+        # Serialized once; only decoding is part of the measured fetch
+        self._encoded = [json.dumps(sg) for sg in security_groups]
+        self._page_size = page_size
+
+    def paginate(self, Filters: Optional[List[Dict[str, Any]]] = None, PaginationConfig: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        page_size = (PaginationConfig or {}).get('PageSize') or self._page_size
+        group_ids = None
+        for f in Filters or []:
+            if f['Name'] == 'group-id':
+                group_ids = set(f['Values'])
+        encoded = self._encoded
+        if group_ids is not None:
+            encoded = [data for sg_id, data in zip(self._group_ids, encoded) if sg_id in group_ids]
+        for start in range(0, len(encoded), page_size):
+            yield json.loads('{"SecurityGroups": [' + ','.join(encoded[start:start + page_size]) + ']}')
+
+
+class StubEc2Client:
+    """
+    Stand-in for a boto3 EC2 client answering from synthetic data, so fetch
+    can be timed without network access.
+    """
+
+    def __init__(self, security_groups: List[Dict[str, Any]], page_size: int = 1000):
+        self._vpc = generate_vpc()
+        self._paginator = StubPaginator(security_groups, page_size)
+
+    def describe_vpcs(self, VpcIds: List[str]) -> Dict[str, Any]:
+        return {'Vpcs': [self._vpc] if self._vpc['VpcId'] in VpcIds else []}
+
+    def get_paginator(self, operation_name: str) -> StubPaginator:
+        if operation_name != 'describe_security_groups':
+            raise NotImplementedError(operation_name)
+        return self._paginator
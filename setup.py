@@ -14,6 +14,9 @@ setup(
         "boto3>=1.20.0",
         "click>=8.0.0",
     ],
+    extras_require={
+        "numpy": ["numpy>=1.22"],
+    },
     python_requires=">=3.12.0",
     entry_points={
         "console_scripts": [
@@ -20,14 +20,74 @@ except ImportError:
 # Public API
 from .core import (
     get_security_groups,
+    iter_security_groups,
+    get_security_group_neighborhood,
+    build_connection_graph,
     analyze_security_group_connections,
     generate_mermaid_diagram,
-    generate_json_output
+    generate_json_output,
+    iter_mermaid_lines,
+    write_mermaid_diagram,
+    write_json_output,
+    iter_json_lines,
+    write_json_lines
 )
+from .graph import ConnectionGraph
+from .audit import AuditCheck, audit_connections, run_audit
+from .cache import SnapshotCache, get_security_groups_cached
+from .cidr_index import CidrIndex
+from .closure import ReachabilityClosure
+from .columnar import ColumnarGraph, open_columnar, write_columnar
+from .diff import diff_snapshots, generate_diff_mermaid
+from .memo import RenderCache, cached_json_output, cached_mermaid_diagram
+from .normalize import normalize_connections, normalize_entries
+from .offline import load_vpc_and_sgs_from_files
+from .parallel import analyze_security_group_connections_parallel
+from .prefix_lists import PrefixListResolver
+from .query import ReachabilityIndex
+from .scan import scan_vpcs
+from .split import split_connections, write_split_output
+from .stats import PipelineStats
+from .table import RuleTable
 
 __all__ = [
     'get_security_groups',
+    'iter_security_groups',
+    'get_security_group_neighborhood',
+    'build_connection_graph',
+    'ConnectionGraph',
     'analyze_security_group_connections',
+    'analyze_security_group_connections_parallel',
     'generate_mermaid_diagram',
-    'generate_json_output'
+    'generate_json_output',
+    'iter_mermaid_lines',
+    'write_mermaid_diagram',
+    'write_json_output',
+    'iter_json_lines',
+    'write_json_lines',
+    'write_columnar',
+    'open_columnar',
+    'ColumnarGraph',
+    'RenderCache',
+    'cached_mermaid_diagram',
+    'cached_json_output',
+    'scan_vpcs',
+    'split_connections',
+    'write_split_output',
+    'SnapshotCache',
+    'get_security_groups_cached',
+    'load_vpc_and_sgs_from_files',
+    'PrefixListResolver',
+    'ReachabilityIndex',
+    'ReachabilityClosure',
+    'CidrIndex',
+    'normalize_connections',
+    'normalize_entries',
+    'RuleTable',
+    'AuditCheck',
+    'run_audit',
+    'audit_connections',
+    'diff_snapshots',
+    'generate_diff_mermaid',
+    'PipelineStats'
 ]
\ No newline at end of file
@@ -0,0 +1,579 @@
+"""
+Asyncio fetch backend for sgmap
+
+boto3 calls block, so every describe call runs in a thread pool while the event
+loop keeps many of them in flight. Calls are paced per region by an
+AdaptiveRateLimiter, a token bucket whose refill rate grows additively while
+calls succeed and is cut multiplicatively when AWS throttles, and throttled
+calls are retried with full-jitter exponential backoff. botocore's own retries
+are disabled on the clients created here so that every throttling response
+reaches the limiter instead of being retried blindly inside a worker thread.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sgmap.aws import ec2_client, error_code
+from sgmap.cache import SnapshotCache, prefix_list_key, snapshot_key
+from sgmap.core import analyze_security_group_connections
+from sgmap.graph import prefix_list_ids
+
+# Error codes returned by EC2 (and other AWS APIs) when requests are throttled
+THROTTLING_ERROR_CODES = frozenset({
+    'RequestLimitExceeded',
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException'
+})
+
+DEFAULT_RATE = 20.0
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_DELAY = 0.25
+DEFAULT_MAX_DELAY = 20.0
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Check whether an exception is an AWS throttling error.
+
+    Args:
+        error: Exception raised by a boto3 call
+
+    Returns:
+        True for botocore ClientErrors with a throttling error code
+    """
+    return error_code(error) in THROTTLING_ERROR_CODES
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float = DEFAULT_BASE_DELAY,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    rng: Optional[random.Random] = None
+) -> float:
+    """
+    Compute a full-jitter exponential backoff delay.
+
+    Args:
+        attempt: Number of the failed attempt, starting at 0
+        base_delay: Delay cap of the first retry in seconds
+        max_delay: Upper bound of the delay cap in seconds
+        rng: Optional random number generator
+
+    Returns:
+        Delay in seconds, uniform in [0, min(max_delay, base_delay * 2 ** attempt)]
+    """
+    return (rng or random).uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to throttling (AIMD).
+
+    Each successful call raises the rate by `increase` requests per second up
+    to max_rate; each throttled call multiplies it by `decrease` down to
+    min_rate and empties the bucket, so a burst that tripped the server-side
+    limit is not immediately repeated. Meant to be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: Optional[float] = None,
+        min_rate: float = 1.0,
+        max_rate: Optional[float] = None,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            rate: Initial refill rate in requests per second
+            burst: Bucket capacity (default: one second worth of the initial rate)
+            min_rate: Lowest rate after throttling
+            max_rate: Highest rate reached by additive increase (default: the initial rate)
+            increase: Requests per second added after each successful call
+            decrease: Factor applied to the rate after a throttled call
+            clock: Monotonic clock in seconds
+        """
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self) -> None:
+        """Raise the rate after a successful call"""
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self) -> None:
+        """Lower the rate and empty the bucket after a throttled call"""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._tokens = min(self._tokens, 0.0)
+
+
+class AsyncFetcher:
+    """
+    Concurrent, rate-limited describe_* calls for asyncio code.
+
+    One EC2 client and one AdaptiveRateLimiter are kept per region (EC2 API
+    limits apply per account and region). Use it as an async context manager:
+
+    Example:
+        >>> async with AsyncFetcher(rate=20) as fetcher:
+        ...     vpc_and_sgs = await fetcher.get_security_groups('vpc-12345678', region='eu-west-1')
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate: float = DEFAULT_RATE,
+        max_rate: Optional[float] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        client_factory: Optional[Callable[[Optional[str]], Any]] = None
+    ):
+        """
+        Args:
+            max_concurrency: Maximum number of calls in flight
+            rate: Initial calls per second per region
+            max_rate: Highest calls per second per region (default: rate)
+            max_attempts: Attempts per call before a throttling error is raised
+            base_delay: Backoff cap of the first retry in seconds
+            max_delay: Upper bound of the backoff cap in seconds
+            client_factory: Function creating the EC2 client of a region
+                (default: sgmap.aws.ec2_client with botocore retries disabled)
+        """
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._client_factory = client_factory or _client_without_retries
+        self._clients: Dict[Optional[str], Any] = {}
+        self._limiters: Dict[Optional[str], AdaptiveRateLimiter] = {}
+        # Prefix list fetches by (region, prefix list ID), shared by every VPC of a scan
+        self._prefix_lists: Dict[Tuple[Optional[str], str], 'asyncio.Future[Optional[List[str]]]'] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AsyncFetcher':
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='sgmap-aio')
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def client(self, region: Optional[str] = None) -> Any:
+        """
+        Get the EC2 client of a region, creating it on first use.
+
+        Args:
+            region: Region name (None for the configured region)
+
+        Returns:
+            EC2 client
+        """
+        if region not in self._clients:
+            self._clients[region] = self._client_factory(region)
+        return self._clients[region]
+
+    def limiter(self, region: Optional[str] = None) -> AdaptiveRateLimiter:
+        """
+        Get the rate limiter of a region, creating it on first use.
+
+        Args:
+            region: Region name (None for the configured region)
+
+        Returns:
+            The region's AdaptiveRateLimiter
+        """
+        if region not in self._limiters:
+            self._limiters[region] = AdaptiveRateLimiter(self.rate, max_rate=self.max_rate)
+        return self._limiters[region]
+
+    async def call(self, region: Optional[str], operation: str, **kwargs: Any) -> Dict[str, Any]:
+        """
+        Make one rate-limited EC2 API call, retrying on throttling.
+
+        Args:
+            region: Region name (None for the configured region)
+            operation: boto3 method name, e.g. 'describe_security_groups'
+            **kwargs: Call parameters
+
+        Returns:
+            Parsed response
+        """
+        if self._executor is None or self._semaphore is None:
+            raise RuntimeError("AsyncFetcher must be used as an async context manager")
+        call = functools.partial(getattr(self.client(region), operation), **kwargs)
+        limiter = self.limiter(region)
+        loop = asyncio.get_running_loop()
+
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await limiter.acquire()
+                try:
+                    response = await loop.run_in_executor(self._executor, call)
+                except Exception as e:
+                    if not is_throttling_error(e):
+                        raise
+                    limiter.on_throttle()
+                    attempt += 1
+                    if attempt >= self.max_attempts:
+                        raise
+                else:
+                    limiter.on_success()
+                    return response
+            # Release the semaphore while waiting so other calls can proceed
+            await asyncio.sleep(backoff_delay(attempt - 1, self.base_delay, self.max_delay))
+
+    async def list_vpc_ids(self, region: Optional[str] = None) -> List[str]:
+        """
+        List the IDs of every VPC in a region.
+
+        Args:
+            region: Region name (None for the configured region)
+
+        Returns:
+            List of VPC IDs
+        """
+        vpc_ids: List[str] = []
+        kwargs: Dict[str, Any] = {}
+        while True:
+            page = await self.call(region, 'describe_vpcs', **kwargs)
+            vpc_ids.extend(vpc['VpcId'] for vpc in page.get('Vpcs', []))
+            if not page.get('NextToken'):
+                return vpc_ids
+            kwargs['NextToken'] = page['NextToken']
+
+    async def get_security_groups(
+        self,
+        vpc_id: str,
+        security_group_id: Optional[str] = None,
+        page_size: Optional[int] = None,
+        region: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Get security groups and VPC info, like sgmap.core.get_security_groups.
+
+        The VPC lookup and the first security group page are requested
+        concurrently; later pages follow their NextToken.
+
+        Args:
+            vpc_id: The VPC ID to filter security groups
+            security_group_id: Optional security group ID to filter
+            page_size: Optional MaxResults per describe_security_groups page
+            region: Region name (None for the configured region)
+
+        Returns:
+            Dictionary with VPC info (None if the VPC does not exist) and security groups
+        """
+        filters = [{'Name': 'vpc-id', 'Values': [vpc_id]}]
+        if security_group_id:
+            filters.append({'Name': 'group-id', 'Values': [security_group_id]})
+        kwargs: Dict[str, Any] = {'Filters': filters}
+        if page_size:
+            kwargs['MaxResults'] = page_size
+
+        vpc_info = asyncio.ensure_future(self._describe_vpc(vpc_id, region))
+        security_groups: List[Dict[str, Any]] = []
+        try:
+            while True:
+                page = await self.call(region, 'describe_security_groups', **kwargs)
+                security_groups.extend(page.get('SecurityGroups', []))
+                if not page.get('NextToken'):
+                    break
+                kwargs['NextToken'] = page['NextToken']
+        except BaseException:
+            vpc_info.cancel()
+            raise
+
+        return {
+            'vpc': await vpc_info,
+            'security_groups': security_groups
+        }
+
+    async def get_prefix_list_entries(
+        self,
+        prefix_list_id: str,
+        region: Optional[str] = None,
+        cache: Optional[SnapshotCache] = None
+    ) -> Optional[List[str]]:
+        """
+        Get the CIDRs of a managed prefix list, fetching it once per fetcher.
+
+        Concurrent callers asking for the same list share one fetch.
+
+        Args:
+            prefix_list_id: The prefix list ID
+            region: Region name (None for the configured region)
+            cache: Optional snapshot cache to persist the entries in
+
+        Returns:
+            CIDRs of the prefix list's entries, or None if it cannot be read
+        """
+        key = (region, prefix_list_id)
+        task = self._prefix_lists.get(key)
+        if task is None:
+            task = self._prefix_lists[key] = asyncio.ensure_future(
+                self._fetch_prefix_list(prefix_list_id, region, cache)
+            )
+        # A cancelled caller must not cancel the fetch shared with the others
+        return await asyncio.shield(task)
+
+    async def _fetch_prefix_list(
+        self,
+        prefix_list_id: str,
+        region: Optional[str],
+        cache: Optional[SnapshotCache]
+    ) -> Optional[List[str]]:
+        key = None
+        if cache is not None:
+            key = prefix_list_key(region or self.client(region).meta.region_name, prefix_list_id)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached['cidrs']
+
+        cidrs: List[str] = []
+        kwargs: Dict[str, Any] = {'PrefixListId': prefix_list_id}
+        try:
+            while True:
+                page = await self.call(region, 'get_managed_prefix_list_entries', **kwargs)
+                cidrs.extend(entry['Cidr'] for entry in page.get('Entries', []))
+                if not page.get('NextToken'):
+                    break
+                kwargs['NextToken'] = page['NextToken']
+        except Exception as e:
+            # Unknown or inaccessible prefix lists are shown by ID; other failures are retried by the next caller
+            if error_code(e) is None or is_throttling_error(e):
+                del self._prefix_lists[(region, prefix_list_id)]
+                raise
+            return None
+
+        if cache is not None:
+            cache.put(key, {'cidrs': cidrs})
+        return cidrs
+
+    async def resolve_prefix_lists(
+        self,
+        security_groups: Iterable[Dict[str, Any]],
+        region: Optional[str] = None,
+        cache: Optional[SnapshotCache] = None
+    ) -> Dict[str, Optional[List[str]]]:
+        """
+        Resolve every prefix list referenced by a set of security groups concurrently.
+
+        Args:
+            security_groups: Security group dictionaries as returned by the EC2 API
+            region: Region name (None for the configured region)
+            cache: Optional snapshot cache to persist the entries in
+
+        Returns:
+            Dictionary of prefix list ID to CIDRs (None when it cannot be read)
+        """
+        ids = prefix_list_ids(security_groups)
+        entries = await asyncio.gather(*(self.get_prefix_list_entries(pl_id, region, cache) for pl_id in ids))
+        return dict(zip(ids, entries))
+
+    async def _describe_vpc(self, vpc_id: str, region: Optional[str]) -> Optional[Dict[str, Any]]:
+        try:
+            response = await self.call(region, 'describe_vpcs', VpcIds=[vpc_id])
+        except Exception as e:
+            # VPC IDs are looked up in every scanned region, so a missing VPC is not an error
+            if error_code(e) == 'InvalidVpcID.NotFound':
+                return None
+            raise
+        return response['Vpcs'][0] if response['Vpcs'] else None
+
+    async def _scan_vpc(
+        self,
+        region: Optional[str],
+        vpc_id: str,
+        security_group_id: Optional[str],
+        page_size: Optional[int],
+        cache: Optional[SnapshotCache],
+        refresh: bool
+    ) -> Optional[Dict[str, Any]]:
+        key = None
+        vpc_and_sgs = None
+        if cache is not None:
+            key = snapshot_key(region or self.client(region).meta.region_name, vpc_id, security_group_id)
+            if not refresh:
+                vpc_and_sgs = cache.get(key)
+
+        if vpc_and_sgs is None:
+            vpc_and_sgs = await self.get_security_groups(vpc_id, security_group_id, page_size, region)
+            if cache is not None and vpc_and_sgs['vpc']:
+                cache.put(key, vpc_and_sgs)
+
+        if not vpc_and_sgs['vpc']:
+            return None
+        vpc_and_sgs['prefix_lists'] = await self.resolve_prefix_lists(vpc_and_sgs['security_groups'], region, cache)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, analyze_security_group_connections, vpc_and_sgs
+        )
+
+    async def scan_vpcs(
+        self,
+        vpc_ids: Optional[Sequence[str]] = None,
+        regions: Optional[Sequence[str]] = None,
+        all_vpcs: bool = False,
+        security_group_id: Optional[str] = None,
+        page_size: Optional[int] = None,
+        cache: Optional[SnapshotCache] = None,
+        refresh: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Fetch and analyze several VPCs across regions, like sgmap.scan.scan_vpcs.
+
+        Args:
+            vpc_ids: VPC IDs to analyze in every region
+            regions: Region names to scan (default: the configured default region)
+            all_vpcs: Analyze every VPC found in each region
+            security_group_id: Optional security group ID to filter
+            page_size: Optional MaxResults per describe_security_groups page
+            cache: Optional snapshot cache for each VPC's describe_* responses
+            refresh: Ignore cached snapshots and fetch again
+
+        Returns:
+            Dictionary of connection maps keyed by region and VPC ID
+        """
+        region_list: List[Optional[str]] = list(regions or [None])
+        if all_vpcs:
+            listings = await asyncio.gather(*(self.list_vpc_ids(region) for region in region_list))
+            targets = dict(zip(region_list, listings))
+        else:
+            targets = {region: list(vpc_ids or []) for region in region_list}
+
+        tasks = {
+            region: [
+                (vpc_id, asyncio.ensure_future(
+                    self._scan_vpc(region, vpc_id, security_group_id, page_size, cache, refresh)
+                ))
+                for vpc_id in region_vpc_ids
+            ]
+            for region, region_vpc_ids in targets.items()
+        }
+        try:
+            await asyncio.gather(*(task for region_tasks in tasks.values() for _, task in region_tasks))
+        except BaseException:
+            for region_tasks in tasks.values():
+                for _, task in region_tasks:
+                    task.cancel()
+            raise
+
+        # Collect in request order so the merged document is deterministic
+        result: Dict[str, Any] = {'regions': {}}
+        for region, region_tasks in tasks.items():
+            region_name = region or self.client(region).meta.region_name
+            region_connections: Dict[str, Any] = {}
+            for vpc_id, task in region_tasks:
+                if task.result() is not None:
+                    region_connections[vpc_id] = task.result()
+            if region_connections:
+                result['regions'][region_name] = region_connections
+        return result
+
+
+def _client_without_retries(region: Optional[str]) -> Any:
+    """Create an EC2 client whose throttling errors are left to the AsyncFetcher"""
+    from botocore.config import Config
+
+    return ec2_client(region, config=Config(retries={'total_max_attempts': 1}))
+
+
+async def get_security_groups_async(
+    vpc_id: str,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    region: Optional[str] = None,
+    **fetcher_options: Any
+) -> Dict[str, Any]:
+    """
+    Get security groups and VPC info without blocking the event loop.
+
+    Args:
+        vpc_id: The VPC ID to filter security groups
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        region: Region name (None for the configured region)
+        **fetcher_options: AsyncFetcher options (rate, max_attempts, ...)
+
+    Returns:
+        Dictionary with VPC info and security groups
+    """
+    async with AsyncFetcher(**fetcher_options) as fetcher:
+        return await fetcher.get_security_groups(vpc_id, security_group_id, page_size, region)
+
+
+async def scan_vpcs_async(
+    vpc_ids: Optional[Sequence[str]] = None,
+    regions: Optional[Sequence[str]] = None,
+    all_vpcs: bool = False,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    cache: Optional[SnapshotCache] = None,
+    refresh: bool = False,
+    **fetcher_options: Any
+) -> Dict[str, Any]:
+    """
+    Fetch and analyze several VPCs concurrently with rate limiting.
+
+    Args:
+        vpc_ids: VPC IDs to analyze in every region
+        regions: Region names to scan (default: the configured default region)
+        all_vpcs: Analyze every VPC found in each region
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        cache: Optional snapshot cache for each VPC's describe_* responses
+        refresh: Ignore cached snapshots and fetch again
+        **fetcher_options: AsyncFetcher options (max_concurrency, rate, ...)
+
+    Returns:
+        Dictionary of connection maps keyed by region and VPC ID, like scan_vpcs
+    """
+    async with AsyncFetcher(**fetcher_options) as fetcher:
+        return await fetcher.scan_vpcs(vpc_ids, regions, all_vpcs, security_group_id, page_size, cache, refresh)
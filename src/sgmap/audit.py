@@ -0,0 +1,301 @@
+"""
+Declarative policy checks over the rule table
+
+A check is a dictionary naming the rules it flags:
+
+    {
+        "id": "ssh-open-to-world",
+        "title": "SSH open to the Internet",
+        "severity": "high",
+        "match": {"direction": "inbound", "cidrs": ["0.0.0.0/0", "::/0"], "ports": ["22/tcp"]}
+    }
+
+Every condition of "match" must hold; a condition given a list holds when
+any of its values does. Conditions:
+
+    direction                  'inbound' or 'outbound'
+    peer_type                  'security_group' or 'cidr'
+    peer                       'internal' (a group of the VPC or a CIDR inside the VPC CIDR) or 'external'
+    protocols                  canonical protocols of the rule itself ('-1' for all-traffic rules)
+    ports                      PORT[/PROTOCOL] specs the rule allows (e.g. '22/tcp', '53/udp', 'icmp')
+    cidrs                      CIDR peers, as written in the rule
+    max_prefix_length          CIDR peers at least this broad (e.g. 8 flags /0 to /8)
+    security_groups            only rules of these groups
+    exclude_security_groups    never rules of these groups
+
+run_audit evaluates all checks in one batch over a RuleTable. Each distinct
+condition is turned into a row mask once and shared by every check using it,
+so hundreds of checks cost little more than the distinct conditions they use.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sgmap.intervals import ALL_PROTOCOLS, canonical_protocol, parse_port_spec
+from sgmap.table import RuleTable
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+WORLD = ['0.0.0.0/0', '::/0']
+
+# Checks run when no checks file is given
+DEFAULT_CHECKS: List[Dict[str, Any]] = [
+    {
+        'id': 'ssh-open-to-world',
+        'title': 'SSH open to the Internet',
+        'severity': 'high',
+        'match': {'direction': 'inbound', 'cidrs': WORLD, 'ports': ['22/tcp']}
+    },
+    {
+        'id': 'rdp-open-to-world',
+        'title': 'RDP open to the Internet',
+        'severity': 'high',
+        'match': {'direction': 'inbound', 'cidrs': WORLD, 'ports': ['3389/tcp']}
+    },
+    {
+        'id': 'database-open-to-world',
+        'title': 'Database port open to the Internet',
+        'severity': 'high',
+        'match': {
+            'direction': 'inbound',
+            'cidrs': WORLD,
+            'ports': ['1433/tcp', '1521/tcp', '3306/tcp', '5432/tcp', '6379/tcp', '27017/tcp']
+        }
+    },
+    {
+        'id': 'all-traffic-from-world',
+        'title': 'All traffic allowed from the Internet',
+        'severity': 'critical',
+        'match': {'direction': 'inbound', 'cidrs': WORLD, 'protocols': [ALL_PROTOCOLS]}
+    },
+    {
+        'id': 'all-traffic-to-external-group',
+        'title': 'All traffic allowed to a security group outside the VPC',
+        'severity': 'medium',
+        'match': {
+            'direction': 'outbound',
+            'peer_type': 'security_group',
+            'peer': 'external',
+            'protocols': [ALL_PROTOCOLS]
+        }
+    },
+]
+
+_CHOICES = {
+    'direction': ('inbound', 'outbound'),
+    'peer_type': ('security_group', 'cidr'),
+    'peer': ('internal', 'external'),
+}
+_LISTS = ('protocols', 'ports', 'cidrs', 'security_groups', 'exclude_security_groups')
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+class AuditCheck:
+    """
+    A validated check.
+
+    Attributes:
+        id: Check ID
+        title: Human-readable summary
+        severity: One of SEVERITIES
+        match: Conditions, with list conditions as lists and ports parsed
+            to (canonical protocol, port or None) tuples
+    """
+
+    def __init__(self, check_id: str, title: str = '', severity: str = 'medium',
+                 match: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            check_id: Check ID
+            title: Human-readable summary (default: the ID)
+            severity: One of SEVERITIES
+            match: Conditions (see the module docstring)
+
+        Raises:
+            ValueError: If the severity or a condition is invalid
+        """
+        if severity not in SEVERITIES:
+            raise ValueError(f"Check {check_id}: unknown severity {severity!r}")
+        self.id = check_id
+        self.title = title or check_id
+        self.severity = severity
+        self.match: Dict[str, Any] = {}
+        for key, value in (match or {}).items():
+            if key in _CHOICES:
+                if value not in _CHOICES[key]:
+                    raise ValueError(f"Check {check_id}: {key} must be one of {', '.join(_CHOICES[key])}")
+                self.match[key] = value
+            elif key == 'max_prefix_length':
+                if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 128:
+                    raise ValueError(f"Check {check_id}: max_prefix_length must be an integer from 0 to 128")
+                self.match[key] = value
+            elif key == 'ports':
+                try:
+                    self.match[key] = [parse_port_spec(str(spec)) for spec in _as_list(value)]
+                except ValueError as e:
+                    raise ValueError(f"Check {check_id}: {e}")
+            elif key == 'protocols':
+                self.match[key] = [canonical_protocol(protocol) for protocol in _as_list(value)]
+            elif key in _LISTS:
+                self.match[key] = [str(item) for item in _as_list(value)]
+            else:
+                raise ValueError(f"Check {check_id}: unknown condition {key!r}")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AuditCheck':
+        """
+        Build a check from its declarative form.
+
+        Args:
+            data: {'id', 'title', 'severity', 'match'} dictionary
+
+        Returns:
+            AuditCheck
+
+        Raises:
+            ValueError: If the check is invalid
+        """
+        if not isinstance(data, dict) or not data.get('id'):
+            raise ValueError(f"A check must be an object with an 'id': {data!r}")
+        unknown = set(data) - {'id', 'title', 'severity', 'match'}
+        if unknown:
+            raise ValueError(f"Check {data['id']}: unknown keys {', '.join(sorted(unknown))}")
+        return cls(str(data['id']), data.get('title', ''), data.get('severity', 'medium'), data.get('match'))
+
+
+def load_checks(path: str) -> List[AuditCheck]:
+    """
+    Load checks from a JSON file.
+
+    The file holds a list of checks or an object with a "checks" list.
+
+    Args:
+        path: Path of the JSON file
+
+    Returns:
+        List of AuditCheck
+
+    Raises:
+        ValueError: If the file does not hold valid checks
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('checks')
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of checks or an object with a 'checks' list")
+    return [AuditCheck.from_dict(item) for item in data]
+
+
+class _Conditions:
+    """
+    Row masks of condition values, computed once per table and shared by all checks.
+
+    Port coverage is the only condition that differs between most checks, so
+    it is evaluated last and only over the rows the other conditions left.
+    """
+
+    def __init__(self, table: RuleTable):
+        self.table = table
+        self._masks: Dict[Tuple[str, Any], Any] = {}
+
+    def _select(self, column: str, values: Any) -> Any:
+        """Memoized mask of the rows whose value in a column is one of values"""
+        key = (column, frozenset(values) if isinstance(values, list) else values)
+        mask = self._masks.get(key)
+        if mask is None:
+            members = key[1] if isinstance(key[1], frozenset) else frozenset((key[1],))
+            mask = self._masks[key] = self.table.select(column, members.__contains__)
+        return mask
+
+    def _ports(self, specs: List[Tuple[str, Optional[int]]], within: Any) -> Any:
+        """Rows of within allowing any of the (protocol, port) specs"""
+        table = self.table
+        # Rules for all protocols allow every port
+        mask = self._select('protocol', ALL_PROTOCOLS) & within
+        for protocol, port in specs:
+            if protocol == ALL_PROTOCOLS:
+                continue
+            candidates = self._select('protocol', protocol) & within
+            if port is not None:
+                candidates = table.select('ports', lambda ports: ports[0] <= port <= ports[1], within=candidates)
+            mask = mask | candidates
+        return mask
+
+    def mask(self, check: AuditCheck) -> Any:
+        """Mask of the rules a check flags"""
+        table = self.table
+        mask = table.all()
+        for key, value in check.match.items():
+            if key in ('direction', 'peer_type'):
+                mask = mask & self._select(key, value)
+            elif key == 'peer':
+                mask = mask & self._select('internal', value == 'internal')
+            elif key == 'protocols':
+                mask = mask & self._select('protocol', value)
+            elif key == 'cidrs':
+                mask = mask & self._select('peer', value) & self._select('peer_type', 'cidr')
+            elif key == 'max_prefix_length':
+                mask = mask & self._select('prefix_length', list(range(value + 1)))
+            elif key == 'security_groups':
+                mask = mask & self._select('owner', value)
+            elif key == 'exclude_security_groups':
+                mask = mask & table.invert(self._select('owner', value))
+        if 'ports' in check.match:
+            mask = self._ports(check.match['ports'], mask)
+        return mask
+
+
+def run_audit(table: RuleTable, checks: Iterable[AuditCheck], min_severity: str = 'low') -> List[Dict[str, Any]]:
+    """
+    Evaluate checks over a rule table.
+
+    Args:
+        table: RuleTable of the connection map to audit
+        checks: Checks to evaluate
+        min_severity: Skip checks below this severity
+
+    Returns:
+        Findings ({'check', 'title', 'severity', ...rule, see RuleTable.rule}),
+        grouped by check in the given order and by rule order within a check
+
+    Raises:
+        ValueError: If min_severity is unknown
+    """
+    if min_severity not in SEVERITIES:
+        raise ValueError(f"Unknown severity: {min_severity}")
+    threshold = SEVERITIES.index(min_severity)
+    conditions = _Conditions(table)
+    findings = []
+    for check in checks:
+        if SEVERITIES.index(check.severity) < threshold:
+            continue
+        for rule in table.rules(conditions.mask(check)):
+            findings.append({'check': check.id, 'title': check.title, 'severity': check.severity, **rule})
+    return findings
+
+
+def audit_connections(
+    connections: Dict[str, Any],
+    checks: Optional[Iterable[AuditCheck]] = None,
+    min_severity: str = 'low',
+    backend: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Audit a connection map.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        checks: Checks to evaluate (default: DEFAULT_CHECKS)
+        min_severity: Skip checks below this severity
+        backend: RuleTable backend ('numpy', 'array' or None for automatic)
+
+    Returns:
+        Findings, as returned by run_audit
+    """
+    if checks is None:
+        checks = [AuditCheck.from_dict(check) for check in DEFAULT_CHECKS]
+    return run_audit(RuleTable.from_connections(connections, backend), checks, min_severity)
@@ -0,0 +1,99 @@
+"""
+AWS client layer for sgmap
+
+boto3 is imported on first use rather than at module import time, so that
+importing sgmap, `sgmap --help` and offline commands (--from-file, diff,
+rendering saved data) do not pay for loading boto3 and botocore.
+"""
+
+import configparser
+import os
+from typing import Callable, Dict, List, Optional, Any
+
+# Functions called with every client created by ec2_client (e.g. PipelineStats.instrument_client)
+_client_hooks: List[Callable[[Any], None]] = []
+
+
+def register_client_hook(hook: Callable[[Any], None]) -> None:
+    """
+    Call a function with every EC2 client created from now on.
+
+    Args:
+        hook: Function taking the new client
+    """
+    _client_hooks.append(hook)
+
+
+def unregister_client_hook(hook: Callable[[Any], None]) -> None:
+    """
+    Stop calling a function registered with register_client_hook.
+
+    Args:
+        hook: Previously registered function
+    """
+    if hook in _client_hooks:
+        _client_hooks.remove(hook)
+
+
+def configured_region() -> Optional[str]:
+    """
+    Get the region a new EC2 client would use, without loading boto3 or botocore.
+
+    Like botocore, the AWS_REGION / AWS_DEFAULT_REGION environment variables
+    take precedence over the region of the active profile (AWS_PROFILE) in
+    the AWS config file (AWS_CONFIG_FILE, ~/.aws/config by default).
+
+    Returns:
+        Region name, or None if none is configured
+    """
+    region = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION')
+    if region:
+        return region
+    profile = os.environ.get('AWS_PROFILE') or os.environ.get('AWS_DEFAULT_PROFILE') or 'default'
+    config = configparser.RawConfigParser()
+    try:
+        config.read(os.path.expanduser(os.environ.get('AWS_CONFIG_FILE', '~/.aws/config')), encoding='utf-8')
+    except (configparser.Error, UnicodeDecodeError):
+        return None
+    for section in (f'profile {profile}', profile if profile == 'default' else None):
+        if section and config.has_option(section, 'region'):
+            return config.get(section, 'region').strip() or None
+    return None
+
+
+def error_code(error: BaseException) -> Optional[str]:
+    """
+    Get the AWS error code of an exception.
+
+    Args:
+        error: Exception raised by a boto3 call
+
+    Returns:
+        Error code of a botocore ClientError (e.g. 'InvalidVpcID.NotFound'), None otherwise
+    """
+    response = getattr(error, 'response', None)
+    return response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+
+
+def ec2_client(region_name: Optional[str] = None, config: Optional[Any] = None) -> Any:
+    """
+    Create an EC2 client, importing boto3 on first use.
+
+    Args:
+        region_name: Region of the client (default: the configured region)
+        config: Optional botocore.config.Config for the client
+
+    Returns:
+        boto3 EC2 client
+    """
+    import boto3
+
+    kwargs: Dict[str, Any] = {}
+    if region_name is not None:
+        kwargs['region_name'] = region_name
+    if config is not None:
+        kwargs['config'] = config
+    ec2 = boto3.client('ec2', **kwargs)
+    for hook in list(_client_hooks):
+        hook(ec2)
+    return ec2
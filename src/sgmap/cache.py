@@ -0,0 +1,249 @@
+"""
+On-disk snapshot cache of describe_* responses for sgmap
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Any
+
+from sgmap.aws import configured_region
+from sgmap.core import get_security_group_neighborhood, get_security_groups
+
+DEFAULT_MAX_AGE = 300
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_RETENTION = 7 * 24 * 60 * 60
+
+SNAPSHOT_SUFFIX = '.json'
+
+
+def credential_identity() -> str:
+    """
+    Identify the AWS account/credentials in use without calling AWS.
+
+    The profile name or access key ID is used instead of the account ID so that
+    a cached run does not need an STS round trip.
+
+    Returns:
+        Identity string for cache keys
+    """
+    return os.environ.get('AWS_PROFILE') or os.environ.get('AWS_ACCESS_KEY_ID') or 'default'
+
+
+class SnapshotCache:
+    """
+    Directory of JSON snapshots of describe_vpcs/describe_security_groups responses.
+
+    Snapshots are valid for max_age seconds. Writing a snapshot evicts files older
+    than the retention period and then the oldest files until the cache fits in
+    max_bytes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        retention: float = DEFAULT_RETENTION
+    ):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.retention = retention
+
+    @staticmethod
+    def make_key(account: str, region: str, vpc_id: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build a cache key.
+
+        Args:
+            account: Account or credential identity
+            region: Region name
+            vpc_id: VPC ID
+            filters: Extra filters that change the fetched data (e.g. security group ID)
+
+        Returns:
+            Hex digest identifying the snapshot
+        """
+        material = json.dumps([account, region, vpc_id, filters or {}], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + SNAPSHOT_SUFFIX)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a snapshot if it exists and is younger than max_age.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached VPC and security groups, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.max_age:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['vpc_and_sgs']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, vpc_and_sgs: Dict[str, Any]) -> None:
+        """
+        Write a snapshot atomically and evict old ones.
+
+        Args:
+            key: Cache key
+            vpc_and_sgs: VPC and security groups (security groups must be a list)
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.time(), 'vpc_and_sgs': vpc_and_sgs}, f, separators=(',', ':'))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def _snapshots(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                return [entry for entry in entries if entry.name.endswith(SNAPSHOT_SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def evict(self) -> int:
+        """
+        Remove snapshots older than the retention period, then the oldest ones
+        until the cache is within max_bytes.
+
+        Returns:
+            Number of snapshots removed
+        """
+        now = time.time()
+        snapshots = sorted(
+            ((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._snapshots()),
+            reverse=True
+        )
+
+        removed = 0
+        total_bytes = 0
+        for mtime, size, path in snapshots:
+            total_bytes += size
+            if now - mtime > self.retention or total_bytes > self.max_bytes:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+        return removed
+
+
+def snapshot_fingerprint(vpc_and_sgs: Dict[str, Any]) -> str:
+    """
+    Hash the content of a snapshot, to tell whether derived data is still current.
+
+    Args:
+        vpc_and_sgs: VPC and security groups (security groups must be a list)
+
+    Returns:
+        Hex digest of the snapshot content
+    """
+    data = json.dumps(vpc_and_sgs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def snapshot_key(
+    region: str,
+    vpc_id: str,
+    security_group_id: Optional[str] = None,
+    depth: Optional[int] = None
+) -> str:
+    """
+    Build the cache key of a VPC snapshot for the credentials in use.
+
+    Args:
+        region: Region name
+        vpc_id: The VPC ID
+        security_group_id: Optional security group ID filter
+        depth: Optional neighborhood depth around security_group_id
+
+    Returns:
+        Cache key
+    """
+    filters: Dict[str, Any] = {'group-id': security_group_id}
+    if depth is not None:
+        filters['depth'] = depth
+    return SnapshotCache.make_key(credential_identity(), region, vpc_id, filters)
+
+
+def prefix_list_key(region: str, prefix_list_id: str) -> str:
+    """
+    Build the cache key of a managed prefix list's entries for the credentials in use.
+
+    Args:
+        region: Region name
+        prefix_list_id: The prefix list ID
+
+    Returns:
+        Cache key
+    """
+    return SnapshotCache.make_key(credential_identity(), region, prefix_list_id, {'kind': 'prefix-list'})
+
+
+def get_security_groups_cached(
+    cache: SnapshotCache,
+    vpc_id: str,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    ec2: Optional[Any] = None,
+    region: Optional[str] = None,
+    refresh: bool = False,
+    depth: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Get security groups and VPC info through the snapshot cache.
+
+    A fresh snapshot is returned without any AWS call. Otherwise (or with
+    refresh=True) the data is fetched with get_security_groups and stored.
+
+    Args:
+        cache: Snapshot cache to use
+        vpc_id: The VPC ID to filter security groups
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        ec2: Optional EC2 client to reuse
+        region: Region name for the cache key (default: the client's region, or the
+            region configured in the environment or the AWS config file)
+        refresh: Ignore any cached snapshot and fetch again
+        depth: Fetch the neighborhood of security_group_id up to this many hops
+
+    Returns:
+        Dictionary with VPC info and security groups
+    """
+    if region is None:
+        # Resolved without creating a client, so that a cache hit does not load boto3
+        region = ec2.meta.region_name if ec2 is not None else configured_region() or 'default'
+    key = snapshot_key(region, vpc_id, security_group_id, depth)
+
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if depth is not None and security_group_id:
+        vpc_and_sgs = get_security_group_neighborhood(vpc_id, security_group_id, depth, page_size=page_size, ec2=ec2)
+    else:
+        vpc_and_sgs = get_security_groups(vpc_id, security_group_id, page_size=page_size, ec2=ec2)
+    # Only cache VPCs that exist so that a typo is not remembered
+    if vpc_and_sgs['vpc']:
+        cache.put(key, vpc_and_sgs)
+    return vpc_and_sgs
@@ -0,0 +1,319 @@
+"""
+CIDR prefix index over analyzed security group connections
+
+CidrIndex answers "which security group rules cover this address?" and
+"which rules overlap this network?" without scanning every rule. The CIDR
+peers of all rules are inserted once into a path-compressed binary trie
+(one per IP version), so a lookup walks at most one node per distinct
+prefix length on the path to the address (32 for IPv4, 128 for IPv6)
+however many rules are indexed, plus the matches themselves. Each distinct
+CIDR string is parsed once. Peers that are not CIDRs (e.g. unresolved
+prefix list IDs) are counted in `skipped` and not indexed.
+
+ipaddress is imported on first use, like boto3 in sgmap.aws, so that
+importing sgmap does not pay for it.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sgmap.graph import ConnectionGraph
+from sgmap.intervals import ALL_PROTOCOLS, canonical_protocol, port_range
+
+_WIDTHS = {4: 32, 6: 128}
+
+# (security group ID, direction, CIDR, name, protocol, from_port, to_port, description)
+CidrRule = Tuple[str, str, str, str, Any, Any, Any, str]
+
+
+class _Node:
+    """Trie node: a prefix (key left-aligned to the address width) and the rules ending at it"""
+
+    __slots__ = ('key', 'length', 'children', 'rules')
+
+    def __init__(self, key: int, length: int):
+        self.key = key
+        self.length = length
+        self.children: List[Optional['_Node']] = [None, None]
+        self.rules: List[int] = []
+
+
+def parse_network(value: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse an IP address or CIDR (host bits are ignored).
+
+    Args:
+        value: Address or CIDR, IPv4 or IPv6
+
+    Returns:
+        (version, network as an integer, prefix length), or None if value is not a CIDR
+    """
+    import ipaddress
+
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), network.prefixlen
+
+
+def _common_length(a: int, b: int, length: int, width: int) -> int:
+    """Length of the common prefix of two keys, up to `length` bits"""
+    diff = (a ^ b) >> (width - length)
+    return length - diff.bit_length()
+
+
+def _bit(key: int, position: int, width: int) -> int:
+    """Bit of a key at a position counted from the most significant bit"""
+    return (key >> (width - position - 1)) & 1
+
+
+class CidrIndex:
+    """
+    Index of security group rules by CIDR peer, for containment and overlap lookups.
+
+    Example:
+        >>> index = CidrIndex.from_connections(connections)
+        >>> [rule['security_group'] for rule in index.containing('10.20.30.40', direction='inbound')]
+        ['sg-11111111']
+    """
+
+    def __init__(self):
+        self._roots = {version: _Node(0, 0) for version in _WIDTHS}
+        self._rules: List[CidrRule] = []
+        # CIDR string -> trie node (None for values that are not CIDRs)
+        self._nodes: Dict[str, Optional[_Node]] = {}
+        self.group_names: Dict[str, str] = {}
+        # Number of rules whose peer could not be parsed as a CIDR
+        self.skipped = 0
+
+    def _insert(self, version: int, key: int, length: int) -> _Node:
+        """Get the node of a prefix, adding it (and splitting an edge) if needed"""
+        width = _WIDTHS[version]
+        node = self._roots[version]
+        while node.length != length:
+            bit = _bit(key, node.length, width)
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = _Node(key, length)
+                return child
+            common = _common_length(key, child.key, min(length, child.length), width)
+            if common == child.length:
+                node = child
+                continue
+            # The new prefix and the child diverge (or the new prefix is the child's ancestor)
+            branch = _Node(key >> (width - common) << (width - common), common)
+            node.children[bit] = branch
+            branch.children[_bit(child.key, common, width)] = child
+            if common == length:
+                return branch
+            leaf = branch.children[_bit(key, common, width)] = _Node(key, length)
+            return leaf
+        return node
+
+    def add_rule(
+        self,
+        owner: str,
+        direction: str,
+        cidr: str,
+        protocol: Any,
+        from_port: Any,
+        to_port: Any,
+        name: Optional[str] = None,
+        description: str = ''
+    ) -> bool:
+        """
+        Add a security group rule whose peer is a CIDR.
+
+        Args:
+            owner: ID of the group the rule belongs to
+            direction: 'inbound' or 'outbound'
+            cidr: CIDR (IPv4 or IPv6) of the peer
+            protocol: Rule protocol
+            from_port: Rule FromPort
+            to_port: Rule ToPort
+            name: Name of the peer (default: the CIDR)
+            description: Rule description
+
+        Returns:
+            True if the rule was indexed, False if cidr is not a CIDR
+        """
+        if cidr in self._nodes:
+            node = self._nodes[cidr]
+        else:
+            parsed = parse_network(cidr)
+            node = self._nodes[cidr] = self._insert(*parsed) if parsed is not None else None
+        if node is None:
+            self.skipped += 1
+            return False
+        node.rules.append(len(self._rules))
+        self._rules.append((owner, direction, cidr, cidr if name is None else name,
+                            protocol, from_port, to_port, description))
+        return True
+
+    @classmethod
+    def from_graph(cls, graph: ConnectionGraph) -> 'CidrIndex':
+        """
+        Build the index from a connection graph.
+
+        Args:
+            graph: ConnectionGraph of the security groups
+
+        Returns:
+            CidrIndex
+        """
+        index = cls()
+        for sg_id in graph.security_group_ids():
+            index.group_names[sg_id] = graph.node_name(sg_id)
+            for edge in graph.edges_of(sg_id):
+                conn = graph.edge(edge)
+                if conn['type'] == 'cidr':
+                    index.add_rule(sg_id, graph.edge_direction(edge), conn['id'], conn['protocol'],
+                                   conn['from_port'], conn['to_port'], conn['name'], conn['description'])
+        return index
+
+    @classmethod
+    def from_connections(cls, connections: Dict[str, Any]) -> 'CidrIndex':
+        """
+        Build the index from a connection map (e.g. saved --json output).
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+
+        Returns:
+            CidrIndex
+        """
+        index = cls()
+        for sg_id, sg_data in connections['security_groups'].items():
+            index.group_names[sg_id] = sg_data['name']
+            for direction in ('inbound', 'outbound'):
+                for conn in sg_data[direction]:
+                    if conn['type'] == 'cidr':
+                        index.add_rule(sg_id, direction, conn['id'], conn['protocol'], conn['from_port'],
+                                       conn['to_port'], conn['name'], conn['description'])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _walk(self, target: str, overlapping: bool) -> Iterator[_Node]:
+        """Yield the nodes of the prefixes containing target and, when overlapping, contained in it"""
+        parsed = parse_network(target)
+        if parsed is None:
+            raise ValueError(f"Invalid IP address or CIDR: {target}")
+        version, key, length = parsed
+        width = _WIDTHS[version]
+
+        node: Optional[_Node] = self._roots[version]
+        while node is not None:
+            if node.length > length:
+                # Below the target: the whole subtree is inside it if the target is a prefix of the node
+                if overlapping and _common_length(key, node.key, length, width) == length:
+                    yield from self._subtree(node)
+                return
+            if _common_length(key, node.key, node.length, width) != node.length:
+                return
+            if node.length == length:
+                if overlapping:
+                    yield from self._subtree(node)
+                else:
+                    yield node
+                return
+            yield node
+            node = node.children[_bit(key, node.length, width)]
+
+    @staticmethod
+    def _subtree(node: _Node) -> Iterator[_Node]:
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in node.children if child is not None)
+
+    def _matches(
+        self,
+        nodes: Iterator[_Node],
+        direction: Optional[str],
+        protocol: Optional[str],
+        port: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Materialize the rules of the given nodes that pass the filters, in insertion order"""
+        if protocol is not None:
+            protocol = canonical_protocol(protocol)
+        matches = []
+        for rule_id in sorted(rule_id for node in nodes for rule_id in node.rules):
+            owner, rule_direction, cidr, name, rule_protocol, from_port, to_port, description = self._rules[rule_id]
+            if direction is not None and rule_direction != direction:
+                continue
+            if protocol is not None:
+                canonical = canonical_protocol(rule_protocol)
+                if canonical != ALL_PROTOCOLS and canonical != protocol:
+                    continue
+                if port is not None:
+                    start, end = port_range(rule_protocol, from_port, to_port)
+                    if not start <= port <= end:
+                        continue
+            matches.append({
+                'security_group': owner,
+                'security_group_name': self.group_names.get(owner, owner),
+                'direction': rule_direction,
+                'cidr': cidr,
+                'name': name,
+                'protocol': rule_protocol,
+                'from_port': from_port,
+                'to_port': to_port,
+                'description': description
+            })
+        return matches
+
+    def containing(
+        self,
+        target: str,
+        direction: Optional[str] = None,
+        protocol: Optional[str] = None,
+        port: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the rules whose CIDR contains an address or a whole network.
+
+        Args:
+            target: IP address or CIDR
+            direction: Optional 'inbound' or 'outbound' filter
+            protocol: Optional protocol the rule must allow (rules for all protocols match)
+            port: Optional port the rule must allow (requires protocol)
+
+        Returns:
+            Matching rules ({'security_group', 'security_group_name', 'direction',
+            'cidr', 'name', 'protocol', 'from_port', 'to_port', 'description'})
+            in the order they were added
+
+        Raises:
+            ValueError: If target is not an IP address or CIDR
+        """
+        return self._matches(self._walk(target, overlapping=False), direction, protocol, port)
+
+    def overlapping(
+        self,
+        target: str,
+        direction: Optional[str] = None,
+        protocol: Optional[str] = None,
+        port: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the rules whose CIDR shares at least one address with a network.
+
+        These are the rules containing the network plus the rules for any
+        part of it.
+
+        Args:
+            target: IP address or CIDR
+            direction: Optional 'inbound' or 'outbound' filter
+            protocol: Optional protocol the rule must allow (rules for all protocols match)
+            port: Optional port the rule must allow (requires protocol)
+
+        Returns:
+            Matching rules, as returned by containing()
+
+        Raises:
+            ValueError: If target is not an IP address or CIDR
+        """
+        return self._matches(self._walk(target, overlapping=True), direction, protocol, port)
@@ -2,72 +2,909 @@
 Command line interface for sgmap
 """
 
+import contextlib
+import itertools
+import json as jsonlib
+import os
 import sys
 import click
-from typing import Optional
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
 
 from sgmap.core import (
     get_security_groups,
+    get_security_group_neighborhood,
+    select_neighborhood,
+    build_connection_graph,
     analyze_security_group_connections,
-    generate_mermaid_diagram,
-    generate_json_output
+    generate_json_output,
+    mermaid_ports,
+    write_json_lines,
+    write_json_output,
+    write_mermaid_diagram
 )
+from sgmap.audit import DEFAULT_CHECKS, SEVERITIES, AuditCheck, load_checks, run_audit
+from sgmap.aws import ec2_client
+from sgmap.cidr_index import CidrIndex, parse_network
+from sgmap.cache import DEFAULT_MAX_AGE, SnapshotCache, get_security_groups_cached, snapshot_fingerprint
+from sgmap.closure import CLOSURE_SUFFIX, ReachabilityClosure
+from sgmap.columnar import write_columnar
+from sgmap.diff import diff_snapshots, generate_diff_mermaid, has_changes, load_snapshot
+from sgmap.intervals import parse_port_spec
+from sgmap.normalize import normalize_connections
+from sgmap.offline import load_vpc_and_sgs_from_files
+from sgmap.parallel import analyze_security_group_connections_parallel
+from sgmap.prefix_lists import PrefixListResolver
+from sgmap.query import ReachabilityIndex
+from sgmap.scan import DEFAULT_MAX_WORKERS, flatten_scan, scan_vpcs
+from sgmap.split import write_split_output
+from sgmap.stats import PipelineStats
+from sgmap.table import RuleTable
 
 
-@click.command()
+def _split_regions(regions: Tuple[str, ...]) -> List[str]:
+    """
+    Split repeated and/or comma-separated --regions values.
+    
+    Args:
+        regions: Raw --regions option values
+        
+    Returns:
+        List of region names in the order given
+    """
+    return [region.strip() for value in regions for region in value.split(',') if region.strip()]
+
+
+def _write_scan(scan: Dict[str, Any], fp: IO[str], json: bool, with_vpc: bool, compact: bool = False) -> None:
+    """
+    Write a multi-VPC scan result.
+    
+    Args:
+        scan: Result of scan_vpcs
+        fp: Text file object to write to
+        json: Output the merged document as JSON
+        with_vpc: Include VPC in the mermaid diagrams
+        compact: Render compact mermaid diagrams
+    """
+    if json:
+        write_json_output(scan, fp)
+        return
+    
+    # One headed mermaid diagram per VPC, separated by blank lines
+    for index, (region, vpc_id, connections) in enumerate(flatten_scan(scan)):
+        if index:
+            fp.write("\n")
+        fp.write(f"## {region} / {vpc_id}\n\n")
+        write_mermaid_diagram(connections, fp, with_vpc, compact)
+
+
+def _report_normalized(stats: PipelineStats, collapsed: int) -> None:
+    """
+    Report the number of edges collapsed by --normalize on stderr and in the stats.
+    
+    Args:
+        stats: Stats collector of the run
+        collapsed: Number of edges removed by normalization
+    """
+    stats.incr('edges_collapsed', collapsed)
+    click.echo(f"Normalized: collapsed {collapsed} edges", err=True)
+
+
+def _load_vpc_and_sgs(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    cache: Optional[SnapshotCache] = None,
+    refresh: bool = False,
+    depth: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Get VPC and security groups from files, the snapshot cache, or AWS.
+    
+    Unless reading from files, managed prefix lists referenced by the rules
+    are resolved from AWS (through the snapshot cache when given) as the
+    groups are analyzed. Exits with an error message if the VPC or its
+    security groups are not found.
+    
+    Args:
+        vpc_id: VPC ID (optional with from_file)
+        from_file: Saved describe-* output files
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        cache: Optional snapshot cache
+        refresh: Ignore cached snapshots and fetch again
+        depth: Include the groups within this many references of security_group_id
+        
+    Returns:
+        Dictionary with VPC info and security groups (as a lazy iterator)
+    """
+    if from_file:
+        if depth is not None:
+            vpc_and_sgs = load_vpc_and_sgs_from_files(from_file, vpc_id)
+            vpc_and_sgs['security_groups'] = select_neighborhood(
+                vpc_and_sgs['security_groups'], security_group_id, depth
+            )
+        else:
+            vpc_and_sgs = load_vpc_and_sgs_from_files(from_file, vpc_id, security_group_id)
+        if vpc_and_sgs['vpc']:
+            vpc_id = vpc_and_sgs['vpc']['VpcId']
+    elif cache is not None:
+        vpc_and_sgs = get_security_groups_cached(
+            cache, vpc_id, security_group_id, page_size=page_size, refresh=refresh, depth=depth
+        )
+    elif depth is not None:
+        vpc_and_sgs = get_security_group_neighborhood(vpc_id, security_group_id, depth, page_size=page_size)
+    else:
+        vpc_and_sgs = get_security_groups(vpc_id, security_group_id, page_size=page_size, stream=True)
+    
+    if not vpc_and_sgs['vpc']:
+        click.echo(f"VPC not found: {vpc_id}")
+        sys.exit(1)
+    
+    # Peek at the first group so an empty result is detected without draining the stream
+    security_groups = iter(vpc_and_sgs['security_groups'])
+    first_sg = next(security_groups, None)
+    if first_sg is None:
+        click.echo(f"No security groups found for VPC ID: {vpc_id}" +
+                  (f" and security group ID: {security_group_id}" if security_group_id else ""))
+        sys.exit(1)
+    vpc_and_sgs['security_groups'] = itertools.chain([first_sg], security_groups)
+    if not from_file:
+        vpc_and_sgs['prefix_lists'] = PrefixListResolver(cache=cache)
+    return vpc_and_sgs
+
+
+def _source_options(func: Callable) -> Callable:
+    """
+    Add the single-VPC input options (--vpc-id, --from-file and fetch/cache options) to a subcommand.
+    """
+    options = [
+        click.option('--vpc-id', '-v', help='VPC ID to analyze security groups from'),
+        click.option(
+            '--from-file', '-f',
+            multiple=True,
+            type=click.Path(exists=True, dir_okay=False),
+            help='Read saved `aws ec2 describe-*` JSON output instead of calling AWS (can be repeated)'
+        ),
+        click.option(
+            '--page-size',
+            type=click.IntRange(5, 1000),
+            help='Number of security groups per describe_security_groups page (MaxResults)'
+        ),
+        click.option(
+            '--cache-dir',
+            envvar='SGMAP_CACHE_DIR',
+            type=click.Path(file_okay=False),
+            help='Directory for cached describe_* snapshots'
+        ),
+        click.option(
+            '--max-age',
+            type=click.FloatRange(0),
+            default=DEFAULT_MAX_AGE,
+            show_default=True,
+            help='Maximum age in seconds of a cached snapshot'
+        ),
+        click.option('--refresh', is_flag=True, help='Ignore cached snapshots and fetch from AWS again')
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _load_source(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool
+) -> Dict[str, Any]:
+    """
+    Load VPC and security groups for a subcommand declared with _source_options.
+    """
+    if not vpc_id and not from_file:
+        raise click.UsageError("Missing option '--vpc-id' (or use '--from-file').")
+    cache = SnapshotCache(cache_dir, max_age=max_age) if cache_dir else None
+    return _load_vpc_and_sgs(vpc_id, from_file, page_size=page_size, cache=cache, refresh=refresh)
+
+
+@click.group(invoke_without_command=True)
 @click.option(
     '--vpc-id', '-v',
-    required=True,
-    help='VPC ID to analyze security groups from'
+    multiple=True,
+    help='VPC ID to analyze security groups from (can be repeated)'
+)
+@click.option(
+    '--from-file', '-f',
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help='Read saved `aws ec2 describe-vpcs`/`describe-security-groups` JSON output instead of calling AWS (can be repeated)'
+)
+@click.option(
+    '--all-vpcs',
+    is_flag=True,
+    help='Analyze every VPC in the selected regions'
+)
+@click.option(
+    '--regions',
+    multiple=True,
+    help='Comma-separated region names to scan (can be repeated; default is the configured region)'
+)
+@click.option(
+    '--max-workers',
+    type=click.IntRange(1),
+    default=DEFAULT_MAX_WORKERS,
+    show_default=True,
+    help='Maximum number of VPCs fetched concurrently in multi-VPC mode (calls in flight with --max-rps)'
+)
+@click.option(
+    '--max-rps',
+    type=click.FloatRange(0, min_open=True),
+    help='In multi-VPC mode, fetch with the asyncio backend at up to this many describe calls per second '
+         'per region, slowing down when AWS throttles'
+)
+@click.option(
+    '--analysis-workers',
+    type=click.IntRange(1),
+    help='Analyze the security groups (and render --split-output) with this many processes (for very large VPCs)'
 )
 @click.option(
     '--security-group-id', '-s',
     help='Optional security group ID to filter'
 )
+@click.option(
+    '--depth',
+    type=click.IntRange(0),
+    help='With --security-group-id, also include the groups within this many references of it'
+)
 @click.option(
     '--json', '-j',
     is_flag=True,
     help='Output in JSON format instead of mermaid diagram'
 )
+@click.option(
+    '--json-lines',
+    type=click.Choice(['group', 'connection']),
+    is_flag=False,
+    flag_value='group',
+    help='Stream newline-delimited JSON, one record per security group (default) or per connection, '
+         'as each group is analyzed'
+)
+@click.option(
+    '--columnar',
+    is_flag=True,
+    help='Output the compact columnar binary format (see sgmap.columnar; requires --output)'
+)
 @click.option(
     '--with-vpc',
     is_flag=True,
     help='Include VPC in the mermaid diagram (default is to show only security groups and their connections)'
 )
-def main(vpc_id: str, security_group_id: Optional[str] = None, json: bool = False, with_vpc: bool = False) -> None:
+@click.option(
+    '--compact',
+    is_flag=True,
+    help='Declare each CIDR once and merge parallel edges into one edge with combined ports'
+)
+@click.option(
+    '--normalize',
+    is_flag=True,
+    help='Merge rules to the same peer with overlapping or adjacent port ranges before rendering '
+         'and report how many edges were collapsed'
+)
+@click.option(
+    '--output', '-o',
+    default='-',
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
+    help='Write the output to a file instead of stdout'
+)
+@click.option(
+    '--split-output',
+    type=click.Path(file_okay=False, writable=True),
+    help='Write one mermaid diagram (<sg-id>.md) and one JSON file (<sg-id>.json) per security group '
+         'to this directory'
+)
+@click.option(
+    '--page-size',
+    type=click.IntRange(5, 1000),
+    help='Number of security groups per describe_security_groups page (MaxResults)'
+)
+@click.option(
+    '--cache-dir',
+    envvar='SGMAP_CACHE_DIR',
+    type=click.Path(file_okay=False),
+    help='Directory for cached describe_* snapshots (caching is disabled when omitted)'
+)
+@click.option(
+    '--max-age',
+    type=click.FloatRange(0),
+    default=DEFAULT_MAX_AGE,
+    show_default=True,
+    help='Maximum age in seconds of a cached snapshot'
+)
+@click.option(
+    '--refresh',
+    is_flag=True,
+    help='Ignore cached snapshots and fetch from AWS again'
+)
+@click.option(
+    '--stats', 'show_stats',
+    is_flag=True,
+    help='Print stage timings, API call counts and graph size to stderr'
+)
+@click.option(
+    '--stats-file',
+    type=click.Path(dir_okay=False, writable=True),
+    help='Write stage timings, API call counts and graph size to a JSON file'
+)
+@click.pass_context
+def main(
+    ctx: click.Context,
+    vpc_id: Tuple[str, ...],
+    from_file: Tuple[str, ...] = (),
+    all_vpcs: bool = False,
+    regions: Tuple[str, ...] = (),
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_rps: Optional[float] = None,
+    analysis_workers: Optional[int] = None,
+    security_group_id: Optional[str] = None,
+    depth: Optional[int] = None,
+    json: bool = False,
+    json_lines: Optional[str] = None,
+    columnar: bool = False,
+    with_vpc: bool = False,
+    compact: bool = False,
+    normalize: bool = False,
+    output: str = '-',
+    split_output: Optional[str] = None,
+    page_size: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    max_age: float = DEFAULT_MAX_AGE,
+    refresh: bool = False,
+    show_stats: bool = False,
+    stats_file: Optional[str] = None
+) -> None:
     """
     AWS Security Group Mapping Tool.
     
     Analyzes security group connections within a VPC and outputs a visualization
     in mermaid diagram format or JSON.
     """
+    if ctx.invoked_subcommand is not None:
+        return
+    
+    if from_file and (all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--from-file' accepts at most one '--vpc-id' and no '--all-vpcs'/'--regions'.")
+    if not vpc_id and not all_vpcs and not from_file:
+        raise click.UsageError("Missing option '--vpc-id' (or use '--all-vpcs' or '--from-file').")
+    if depth is not None and not security_group_id:
+        raise click.UsageError("'--depth' requires '--security-group-id'.")
+    if depth is not None and (all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--depth' cannot be used with several VPCs.")
+    if max_rps is not None and not (all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--max-rps' requires several VPCs ('--all-vpcs', '--regions' or repeated '--vpc-id').")
+    if analysis_workers is not None and (all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--analysis-workers' cannot be used with several VPCs.")
+    if split_output and (all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--split-output' cannot be used with several VPCs.")
+    if split_output and (json or output != '-'):
+        raise click.UsageError("'--split-output' writes both formats and cannot be used with '--json' or '--output'.")
+    if json_lines and (json or columnar or split_output):
+        raise click.UsageError("'--json-lines' cannot be used with '--json', '--columnar' or '--split-output'.")
+    if json_lines and (all_vpcs or regions or len(vpc_id) > 1 or analysis_workers is not None):
+        raise click.UsageError("'--json-lines' requires a single VPC and cannot be used with '--analysis-workers'.")
+    if columnar and (json or split_output):
+        raise click.UsageError("'--columnar' cannot be used with '--json' or '--split-output'.")
+    if columnar and (output == '-' or all_vpcs or regions or len(vpc_id) > 1):
+        raise click.UsageError("'--columnar' requires '--output' and a single VPC.")
+    
+    stats = PipelineStats()
     try:
-        # Get VPC and security groups
-        vpc_and_sgs = get_security_groups(vpc_id, security_group_id)
-        
-        if not vpc_and_sgs['vpc']:
-            click.echo(f"VPC not found: {vpc_id}")
-            sys.exit(1)
-            
-        if not vpc_and_sgs['security_groups']:
-            click.echo(f"No security groups found for VPC ID: {vpc_id}" +
-                      (f" and security group ID: {security_group_id}" if security_group_id else ""))
+        with contextlib.ExitStack() as stack:
+            if show_stats or stats_file:
+                stack.enter_context(stats)
+            _run_main(
+                stats, vpc_id, from_file, all_vpcs, _split_regions(regions), max_workers, max_rps, analysis_workers,
+                security_group_id, depth, json, json_lines, columnar, with_vpc, compact, normalize, output,
+                split_output, page_size, cache_dir, max_age, refresh
+            )
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+    finally:
+        if show_stats:
+            click.echo(stats.format_report(), err=True)
+        if stats_file:
+            with open(stats_file, 'w', encoding='utf-8') as f:
+                jsonlib.dump(stats.to_dict(), f, indent=2)
+                f.write("\n")
+
+
+def _run_main(
+    stats: PipelineStats,
+    vpc_id: Tuple[str, ...],
+    from_file: Tuple[str, ...],
+    all_vpcs: bool,
+    region_names: List[str],
+    max_workers: int,
+    max_rps: Optional[float],
+    analysis_workers: Optional[int],
+    security_group_id: Optional[str],
+    depth: Optional[int],
+    json: bool,
+    json_lines: Optional[str],
+    columnar: bool,
+    with_vpc: bool,
+    compact: bool,
+    normalize: bool,
+    output: str,
+    split_output: Optional[str],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool
+) -> None:
+    """
+    Fetch, analyze and render for the main command, timing each stage.
+    """
+    cache = SnapshotCache(cache_dir, max_age=max_age) if cache_dir else None
+    
+    # Several VPCs and/or regions: scan concurrently and merge the results
+    if all_vpcs or region_names or len(vpc_id) > 1:
+        with stats.stage('scan'):
+            if max_rps is not None:
+                # asyncio is only loaded when the asyncio backend is used
+                import asyncio
+                from sgmap.aio import scan_vpcs_async
+                
+                scan = asyncio.run(scan_vpcs_async(
+                    vpc_ids=vpc_id,
+                    regions=region_names,
+                    all_vpcs=all_vpcs,
+                    security_group_id=security_group_id,
+                    page_size=page_size,
+                    cache=cache,
+                    refresh=refresh,
+                    max_concurrency=max_workers,
+                    rate=max_rps
+                ))
+            else:
+                scan = scan_vpcs(
+                    vpc_ids=vpc_id,
+                    regions=region_names,
+                    all_vpcs=all_vpcs,
+                    security_group_id=security_group_id,
+                    page_size=page_size,
+                    max_workers=max_workers,
+                    cache=cache,
+                    refresh=refresh
+                )
+        if not scan['regions']:
+            click.echo("No VPCs found")
             sys.exit(1)
-        
-        # Analyze connections
-        connections = analyze_security_group_connections(vpc_and_sgs)
-        
-        # Generate output
+        for _, _, connections in flatten_scan(scan):
+            stats.record_connections(connections)
+        if normalize:
+            with stats.stage('normalize'):
+                collapsed = 0
+                for region, scanned_vpc_id, connections in flatten_scan(scan):
+                    scan['regions'][region][scanned_vpc_id], vpc_collapsed = normalize_connections(connections)
+                    collapsed += vpc_collapsed
+            _report_normalized(stats, collapsed)
+        with stats.stage('render'), click.open_file(output, 'w', encoding='utf-8') as fp:
+            _write_scan(scan, fp, json, with_vpc, compact)
+        return
+    
+    # Get VPC and security groups (from files, the snapshot cache, or streamed page by page)
+    with stats.stage('fetch'):
+        vpc_and_sgs = _load_vpc_and_sgs(
+            vpc_id[0] if vpc_id else None, from_file, security_group_id,
+            page_size=page_size, cache=cache, refresh=refresh, depth=depth
+        )
+    # Pages after the first are fetched lazily by the next stage; count them as fetch time
+    vpc_and_sgs['security_groups'] = stats.iter_stage('fetch', vpc_and_sgs['security_groups'])
+    
+    # Analyze and write one group at a time, while the remaining pages are being fetched
+    if json_lines:
+        with stats.stage('stream'), click.open_file(output, 'w', encoding='utf-8') as fp:
+            write_json_lines(vpc_and_sgs, fp, per_connection=json_lines == 'connection', normalize=normalize)
+        return
+    
+    # Analyze connections while the remaining pages are being fetched
+    with stats.stage('analyze'):
+        if analysis_workers is not None:
+            connections = analyze_security_group_connections_parallel(vpc_and_sgs, workers=analysis_workers)
+        else:
+            connections = analyze_security_group_connections(vpc_and_sgs)
+    stats.record_connections(connections)
+    
+    # Collapse redundant rules so that every renderer gets fewer edges
+    if normalize:
+        with stats.stage('normalize'):
+            connections, collapsed = normalize_connections(connections)
+        _report_normalized(stats, collapsed)
+    
+    # One diagram and JSON file per security group, rendered from the shared analysis
+    if split_output:
+        with stats.stage('render'):
+            sg_ids = write_split_output(connections, split_output, with_vpc, compact, workers=analysis_workers)
+        click.echo(f"Wrote {len(sg_ids)} security groups to {split_output}", err=True)
+        return
+    
+    if columnar:
+        with stats.stage('render'), open(output, 'wb') as bfp:
+            write_columnar(connections, bfp)
+        return
+    
+    # Write output line by line to stdout or the --output file
+    with stats.stage('render'), click.open_file(output, 'w', encoding='utf-8') as fp:
         if json:
-            output = generate_json_output(connections)
+            write_json_output(connections, fp)
         else:
-            output = generate_mermaid_diagram(connections, with_vpc)
-        
-        click.echo(output)
-        
+            write_mermaid_diagram(connections, fp, with_vpc, compact)
+
+
+@main.command()
+@_source_options
+@click.option('--from', 'source', required=True, help='Source security group ID')
+@click.option('--to', 'target', required=True, help='Destination security group ID')
+@click.option(
+    '--port', '-p',
+    help='Destination PORT[/PROTOCOL], e.g. 5432/tcp, 53/udp, icmp or all (default: any protocol and port)'
+)
+@click.option('--max-hops', type=click.IntRange(1), help='Maximum number of chained hops (default: unlimited)')
+@click.option('--direct', is_flag=True, help='Only consider direct connections (same as --max-hops 1)')
+@click.option('--json', '-j', is_flag=True, help='Output the result as JSON')
+def query(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool,
+    source: str,
+    target: str,
+    port: Optional[str],
+    max_hops: Optional[int],
+    direct: bool,
+    json: bool
+) -> None:
+    """
+    Check whether one security group can reach another.
+    
+    Both the egress rules of the source and the ingress rules of the destination
+    must allow the port, directly or through a chain of security group references.
+    Without --port, any protocol and port allowed on each hop will do.
+    Exits with status 1 when the traffic is not allowed.
+    """
+    protocol, port_number = None, None
+    if port is not None:
+        try:
+            protocol, port_number = parse_port_spec(port)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--port'")
+    
+    try:
+        vpc_and_sgs = _load_source(vpc_id, from_file, page_size, cache_dir, max_age, refresh)
+        index = ReachabilityIndex.from_graph(build_connection_graph(vpc_and_sgs))
+        result = index.query(source, target, protocol, port_number, max_hops=1 if direct else max_hops)
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
         sys.exit(1)
+    
+    if json:
+        click.echo(jsonlib.dumps(result, indent=2))
+    else:
+        if protocol is None:
+            ports = 'any port'
+        else:
+            ports = f"{result['protocol']}/{port_number if port_number is not None else 'all'}"
+        if result['allowed']:
+            click.echo(f"ALLOWED: {source} -> {target} ({ports}) via {' -> '.join(result['path'])}")
+        else:
+            click.echo(f"DENIED: {source} -> {target} ({ports})")
+    if not result['allowed']:
+        sys.exit(1)
+
+
+@main.command()
+@_source_options
+@click.option('--ip', 'target', required=True, help='IP address or CIDR to look up (IPv4 or IPv6)')
+@click.option(
+    '--overlaps',
+    is_flag=True,
+    help='Also match rules for any part of the CIDR (default: only rules containing all of it)'
+)
+@click.option('--direction', type=click.Choice(['inbound', 'outbound']), help='Only match rules of this direction')
+@click.option('--port', '-p', help='Only match rules allowing PORT[/PROTOCOL], e.g. 443/tcp, 53/udp or icmp')
+@click.option('--json', '-j', is_flag=True, help='Output the matching rules as JSON')
+def lookup(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool,
+    target: str,
+    overlaps: bool,
+    direction: Optional[str],
+    port: Optional[str],
+    json: bool
+) -> None:
+    """
+    Find the security group rules that expose an IP address or CIDR.
+    
+    Matches rules whose CIDR contains the address (e.g. 10.0.0.0/8 or
+    0.0.0.0/0 for 10.20.30.40). Exits with status 1 when no rule matches.
+    """
+    if parse_network(target) is None:
+        raise click.BadParameter(f"Invalid IP address or CIDR: {target}", param_hint="'--ip'")
+    protocol, port_number = None, None
+    if port is not None:
+        try:
+            protocol, port_number = parse_port_spec(port)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--port'")
+    
+    try:
+        vpc_and_sgs = _load_source(vpc_id, from_file, page_size, cache_dir, max_age, refresh)
+        index = CidrIndex.from_graph(build_connection_graph(vpc_and_sgs))
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+    
+    find = index.overlapping if overlaps else index.containing
+    matches = find(target, direction=direction, protocol=protocol, port=port_number)
+    
+    if json:
+        click.echo(jsonlib.dumps(matches, indent=2))
+    elif not matches:
+        click.echo(f"No security group rule matches {target}")
+    else:
+        for match in matches:
+            peer = match['cidr'] if match['name'] == match['cidr'] else f"{match['cidr']} ({match['name']})"
+            click.echo(f"{match['security_group']} ({match['security_group_name']}) "
+                       f"{match['direction']} {mermaid_ports(match)} {peer}")
+    if not matches:
+        sys.exit(1)
+
+
+@main.command()
+@_source_options
+@click.option(
+    '--checks', '-c', 'checks_files',
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help='JSON file of checks to run instead of the built-in checks (can be repeated)'
+)
+@click.option(
+    '--severity',
+    type=click.Choice(SEVERITIES),
+    default='low',
+    show_default=True,
+    help='Only run checks of at least this severity'
+)
+@click.option('--json', '-j', is_flag=True, help='Output the findings as JSON')
+def audit(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool,
+    checks_files: Tuple[str, ...],
+    severity: str,
+    json: bool
+) -> None:
+    """
+    Check security group rules against policy checks.
+    
+    Runs the built-in checks (SSH, RDP and database ports open to the
+    Internet, all traffic from the Internet or to security groups outside
+    the VPC) or the checks of --checks files in one batch over the analyzed
+    rules. Exits with status 1 when a rule is flagged.
+    """
+    try:
+        if checks_files:
+            checks = [check for path in checks_files for check in load_checks(path)]
+        else:
+            checks = [AuditCheck.from_dict(check) for check in DEFAULT_CHECKS]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--checks'")
+    checks = [check for check in checks if SEVERITIES.index(check.severity) >= SEVERITIES.index(severity)]
+    
+    try:
+        vpc_and_sgs = _load_source(vpc_id, from_file, page_size, cache_dir, max_age, refresh)
+        table = RuleTable.from_connections(analyze_security_group_connections(vpc_and_sgs))
+        findings = run_audit(table, checks)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+    
+    if json:
+        click.echo(jsonlib.dumps(findings, indent=2))
+    else:
+        for finding in findings:
+            peer = finding['id'] if finding['name'] == finding['id'] else f"{finding['id']} ({finding['name']})"
+            click.echo(f"[{finding['severity'].upper()}] {finding['check']}: "
+                       f"{finding['security_group']} ({finding['security_group_name']}) "
+                       f"{finding['direction']} {mermaid_ports(finding)} {peer}")
+    click.echo(f"{len(findings)} findings from {len(checks)} checks over {len(table)} rules", err=True)
+    if findings:
+        sys.exit(1)
+
+
+@main.command('blast-radius')
+@_source_options
+@click.option('--security-group-id', '-s', required=True, help='Security group assumed to be compromised')
+@click.option('--reverse', is_flag=True, help='List the security groups that can reach the group instead')
+@click.option(
+    '--closure', 'closure_path',
+    type=click.Path(dir_okay=False),
+    help='Closure file to reuse, or to write when missing or built from another snapshot '
+         '(default: stored in --cache-dir when set)'
+)
+@click.option('--json', '-j', is_flag=True, help='Output the result as JSON')
+def blast_radius(
+    vpc_id: Optional[str],
+    from_file: Tuple[str, ...],
+    page_size: Optional[int],
+    cache_dir: Optional[str],
+    max_age: float,
+    refresh: bool,
+    security_group_id: str,
+    reverse: bool,
+    closure_path: Optional[str],
+    json: bool
+) -> None:
+    """
+    List every security group transitively reachable from a group.
+    
+    A group reaches another when its egress rules and the other group's
+    ingress rules allow a common protocol and port, directly or through a
+    chain of groups. The transitive closure is computed once per snapshot and
+    saved with it, so later queries on the same snapshot only read it.
+    """
+    try:
+        loaded = _load_source(vpc_id, from_file, page_size, cache_dir, max_age, refresh)
+        vpc_and_sgs = {'vpc': loaded['vpc'], 'security_groups': list(loaded['security_groups'])}
+        fingerprint = snapshot_fingerprint(vpc_and_sgs)
+        if closure_path is None and cache_dir:
+            closure_path = os.path.join(cache_dir, fingerprint + CLOSURE_SUFFIX)
+        closure = ReachabilityClosure.load(closure_path, fingerprint) if closure_path else None
+        if closure is None:
+            closure = ReachabilityClosure.from_graph(build_connection_graph(vpc_and_sgs), fingerprint)
+            if closure_path:
+                closure.save(closure_path)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+    
+    if security_group_id not in closure:
+        click.echo(f"Error: Unknown security group: {security_group_id}", err=True)
+        sys.exit(1)
+    result = closure.query(security_group_id, reverse)
+    
+    if json:
+        click.echo(jsonlib.dumps(result, indent=2))
+    else:
+        verb = 'can be reached from' if reverse else 'can reach'
+        click.echo(f"{security_group_id} ({result['name']}) {verb} {result['count']} security groups")
+        for group in result['security_groups']:
+            click.echo(f"  {group['id']} ({group['name']})")
+
+
+@main.command()
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+@click.option('--vpc-id', help='VPC ID to select from describe-security-groups output')
+@click.option('--json', '-j', is_flag=True, help='Output the diff as JSON')
+@click.option('--exit-code', is_flag=True, help='Exit with status 1 when the snapshots differ')
+def diff(old: str, new: str, vpc_id: Optional[str], json: bool, exit_code: bool) -> None:
+    """
+    Show security groups and connections changed between two snapshots.
+    
+    OLD and NEW are saved describe-security-groups output or --cache-dir
+    snapshot files. Only the changed subgraph is drawn.
+    """
+    try:
+        result = diff_snapshots(load_snapshot(old, vpc_id), load_snapshot(new, vpc_id))
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        sys.exit(1)
+    
+    if json:
+        click.echo(generate_json_output(result))
+    else:
+        click.echo(generate_diff_mermaid(result))
+    if exit_code and has_changes(result):
+        sys.exit(1)
+
+
+@main.command()
+@click.option('--vpc-id', '-v', multiple=True, help='VPC ID to serve (can be repeated)')
+@click.option(
+    '--from-file', '-f',
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help='Serve saved `aws ec2 describe-*` JSON output, re-read on every refresh (can be repeated)'
+)
+@click.option('--region', help='Region of the VPCs (default is the configured region)')
+@click.option(
+    '--page-size',
+    type=click.IntRange(5, 1000),
+    help='Number of security groups per describe_security_groups page (MaxResults)'
+)
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('--port', type=click.IntRange(0, 65535), default=8080, show_default=True, help='Port to listen on')
+@click.option(
+    '--interval',
+    type=click.FloatRange(1),
+    default=300,
+    show_default=True,
+    help='Seconds between background refreshes'
+)
+@click.option('--quiet', '-q', is_flag=True, help='Do not log requests')
+def serve(
+    vpc_id: Tuple[str, ...],
+    from_file: Tuple[str, ...],
+    region: Optional[str],
+    page_size: Optional[int],
+    host: str,
+    port: int,
+    interval: float,
+    quiet: bool
+) -> None:
+    """
+    Serve mermaid, JSON and reachability queries for VPCs over HTTP.
+    
+    The connection graphs are kept in memory and refreshed in the background;
+    rendered documents are cached until a refresh finds changes.
+    """
+    # http.server is only loaded by this command
+    from sgmap.server import GraphStore, SgmapServer
+    
+    if not vpc_id and not from_file:
+        raise click.UsageError("Missing option '--vpc-id' (or use '--from-file').")
+    
+    if from_file:
+        def loader(target: str) -> Dict[str, Any]:
+            return load_vpc_and_sgs_from_files(from_file, target)
+        
+        if not vpc_id:
+            try:
+                vpc = load_vpc_and_sgs_from_files(from_file)['vpc']
+            except ValueError as e:
+                raise click.UsageError(str(e))
+            if not vpc:
+                click.echo("No security groups found in the input files", err=True)
+                sys.exit(1)
+            vpc_id = (vpc['VpcId'],)
+    else:
+        ec2 = ec2_client(region)
+        # Prefix lists are shared by every VPC and fetched again once per refresh interval
+        prefix_lists = PrefixListResolver(ec2, region=region, ttl=interval)
+        
+        def loader(target: str) -> Dict[str, Any]:
+            vpc_and_sgs = get_security_groups(target, page_size=page_size, ec2=ec2)
+            vpc_and_sgs['prefix_lists'] = prefix_lists
+            return vpc_and_sgs
+    
+    store = GraphStore(loader, vpc_id, interval=interval)
+    store.refresh_all()
+    for status in store.status():
+        if status['error']:
+            click.echo(f"Error loading {status['id']}: {status['error']}", err=True)
+    
+    server = SgmapServer((host, port), store, quiet=quiet)
+    click.echo(f"Serving {', '.join(vpc_id)} on http://{host}:{server.server_address[1]}", err=True)
+    store.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.stop()
+        server.server_close()
 
 
 if __name__ == '__main__':
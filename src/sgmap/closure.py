@@ -0,0 +1,425 @@
+"""
+Precomputed transitive reachability ("blast radius") between security groups
+
+ReachabilityClosure answers "which groups can a compromised group reach,
+directly or through other groups?" and the reverse ("which groups can reach
+this one?") without a graph search per query. A group reaches another
+directly when its egress rules and the other group's ingress rules allow at
+least one common protocol and port (see ReachabilityIndex.successors); egress
+to a CIDR covering the VPC, such as the default allow-all egress to
+0.0.0.0/0, reaches every group whose ingress admits the source.
+
+The closure is built once per snapshot:
+
+1. Tarjan's algorithm collapses the graph into strongly connected
+   components (every group of a component reaches every other one). It emits
+   the components in reverse topological order.
+2. Groups are numbered so that each component is a contiguous block, and
+   each component gets one integer bitset of the groups it reaches (its own
+   members and those of every component downstream), built by OR-ing the
+   bitsets of its successor components in emission order. The reverse
+   bitsets are built the same way in topological order.
+
+A query is then a bit test (reaches), a popcount (blast_radius_size) or a
+walk over the set bits of one bitset (blast_radius). save/load persist the
+closure as JSON with the fingerprint of the snapshot it was built from, so
+that it can be stored next to the snapshot and reused until the snapshot
+changes.
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from sgmap.graph import ConnectionGraph
+from sgmap.query import ReachabilityIndex
+
+# Version 2: egress to CIDRs covering the VPC reaches groups (closures saved before are stale)
+FORMAT_VERSION = 2
+
+# Suffix of closure files stored in a snapshot cache directory
+CLOSURE_SUFFIX = '.closure.json'
+
+
+def _strongly_connected_components(successors: List[List[int]]) -> List[List[int]]:
+    """
+    Tarjan's algorithm without recursion.
+
+    Args:
+        successors: Successor node numbers of each node
+
+    Returns:
+        Components as lists of node numbers, in reverse topological order
+        (a component comes after every component it reaches)
+    """
+    count = len(successors)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for root in range(count):
+        if index[root] != -1:
+            continue
+        # (node, position of the next successor to visit)
+        work = [(root, 0)]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            node, position = work[-1]
+            if position < len(successors[node]):
+                work[-1] = (node, position + 1)
+                successor = successors[node][position]
+                if index[successor] == -1:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    work.append((successor, 0))
+                elif on_stack[successor] and index[successor] < low[node]:
+                    low[node] = index[successor]
+                continue
+
+            work.pop()
+            if work and low[node] < low[work[-1][0]]:
+                low[work[-1][0]] = low[node]
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component[::-1])
+    return components
+
+
+class ReachabilityClosure:
+    """
+    Transitive closure of the security group reachability graph.
+
+    Example:
+        >>> closure = ReachabilityClosure.from_connections(connections)
+        >>> closure.blast_radius('sg-22222222')
+        ['sg-11111111', 'sg-33333333']
+        >>> closure.reaches('sg-33333333', 'sg-22222222')
+        False
+    """
+
+    def __init__(
+        self,
+        groups: List[str],
+        names: List[str],
+        component_start: List[int],
+        reach: List[int],
+        reverse: List[int],
+        fingerprint: Optional[str] = None
+    ):
+        """
+        Use from_index, from_graph, from_connections or load to build a closure.
+
+        Args:
+            groups: Group IDs, numbered so that each component is a contiguous block
+            names: Group names, in the same order
+            component_start: First group number of each component, plus len(groups)
+            reach: Bitset of the groups each component reaches (itself included)
+            reverse: Bitset of the groups reaching each component (itself included)
+            fingerprint: Fingerprint of the snapshot the closure was built from
+        """
+        self.groups = groups
+        self.names = names
+        self.fingerprint = fingerprint
+        self._component_start = component_start
+        self._reach = reach
+        self._reverse = reverse
+        self._position = {sg_id: position for position, sg_id in enumerate(groups)}
+        self._component = [0] * len(groups)
+        for component in range(len(component_start) - 1):
+            for position in range(component_start[component], component_start[component + 1]):
+                self._component[position] = component
+
+    @classmethod
+    def from_index(
+        cls,
+        index: ReachabilityIndex,
+        groups: Optional[Iterable[str]] = None,
+        names: Optional[Dict[str, str]] = None,
+        fingerprint: Optional[str] = None
+    ) -> 'ReachabilityClosure':
+        """
+        Compute the closure of a reachability index.
+
+        Args:
+            index: ReachabilityIndex of the security groups
+            groups: Groups to include in this order (default: every group of the
+                index); groups only referenced by rules are appended
+            names: Group names by ID (default: the IDs)
+            fingerprint: Fingerprint of the snapshot, stored with the closure
+
+        Returns:
+            ReachabilityClosure
+        """
+        order = list(dict.fromkeys(groups or ()))
+        order.extend(sorted(index.security_groups() - set(order)))
+        numbers = {sg_id: number for number, sg_id in enumerate(order)}
+        successors = [[numbers[target] for target in index.successors(sg_id)] for sg_id in order]
+
+        components = _strongly_connected_components(successors)
+        # Number the groups component by component, in emission order
+        positions = [0] * len(order)
+        component_of = [0] * len(order)
+        component_start = []
+        position = 0
+        for component, members in enumerate(components):
+            component_start.append(position)
+            for node in members:
+                positions[node] = position
+                component_of[node] = component
+                position += 1
+        component_start.append(position)
+
+        # Successor components are emitted before their predecessors
+        successor_components: List[List[int]] = []
+        reach = []
+        for component, members in enumerate(components):
+            downstream = {component_of[successor] for node in members for successor in successors[node]}
+            downstream.discard(component)
+            successor_components.append(sorted(downstream))
+            bits = ((1 << len(members)) - 1) << component_start[component]
+            for other in downstream:
+                bits |= reach[other]
+            reach.append(bits)
+
+        reverse = [((1 << len(members)) - 1) << component_start[component]
+                   for component, members in enumerate(components)]
+        for component in range(len(components) - 1, -1, -1):
+            for other in successor_components[component]:
+                reverse[other] |= reverse[component]
+
+        ordered = [''] * len(order)
+        for node, sg_id in enumerate(order):
+            ordered[positions[node]] = sg_id
+        names = names or {}
+        return cls(ordered, [names.get(sg_id, sg_id) for sg_id in ordered], component_start, reach, reverse,
+                   fingerprint)
+
+    @classmethod
+    def from_graph(cls, graph: ConnectionGraph, fingerprint: Optional[str] = None) -> 'ReachabilityClosure':
+        """
+        Compute the closure of a connection graph.
+
+        Args:
+            graph: ConnectionGraph of the security groups
+            fingerprint: Fingerprint of the snapshot, stored with the closure
+
+        Returns:
+            ReachabilityClosure
+        """
+        groups = graph.security_group_ids()
+        names = {sg_id: graph.node_name(sg_id) for sg_id in groups}
+        return cls.from_index(ReachabilityIndex.from_graph(graph), groups, names, fingerprint)
+
+    @classmethod
+    def from_connections(cls, connections: Dict[str, Any], fingerprint: Optional[str] = None) -> 'ReachabilityClosure':
+        """
+        Compute the closure of a connection map (e.g. saved --json output).
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+            fingerprint: Fingerprint of the snapshot, stored with the closure
+
+        Returns:
+            ReachabilityClosure
+        """
+        names = {sg_id: sg_data['name'] for sg_id, sg_data in connections['security_groups'].items()}
+        return cls.from_index(ReachabilityIndex.from_connections(connections), list(names), names, fingerprint)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def __contains__(self, sg_id: str) -> bool:
+        return sg_id in self._position
+
+    @property
+    def component_count(self) -> int:
+        """Number of strongly connected components"""
+        return len(self._component_start) - 1
+
+    def _bits(self, sg_id: str, reverse: bool) -> int:
+        """Bitset of a group's component, without the group itself"""
+        position = self._position.get(sg_id)
+        if position is None:
+            raise KeyError(f"Unknown security group: {sg_id}")
+        bitsets = self._reverse if reverse else self._reach
+        return bitsets[self._component[position]] & ~(1 << position)
+
+    def reaches(self, source: str, target: str) -> bool:
+        """
+        Check whether a group reaches another, directly or through other groups.
+
+        Args:
+            source: Source security group ID
+            target: Destination security group ID
+
+        Returns:
+            True if traffic from source can reach target (always True when they are the same group)
+
+        Raises:
+            KeyError: If either group is unknown
+        """
+        position = self._position.get(target)
+        if position is None:
+            raise KeyError(f"Unknown security group: {target}")
+        return source == target or bool(self._bits(source, False) >> position & 1)
+
+    def blast_radius_size(self, sg_id: str, reverse: bool = False) -> int:
+        """
+        Count the groups a group reaches (or, with reverse, that reach it).
+
+        Args:
+            sg_id: Security group ID
+            reverse: Count the groups reaching sg_id instead
+
+        Returns:
+            Number of groups, the group itself excluded
+
+        Raises:
+            KeyError: If the group is unknown
+        """
+        return self._bits(sg_id, reverse).bit_count()
+
+    def blast_radius(self, sg_id: str, reverse: bool = False) -> List[str]:
+        """
+        List the groups a group reaches (or, with reverse, that reach it).
+
+        Args:
+            sg_id: Security group ID
+            reverse: List the groups reaching sg_id instead
+
+        Returns:
+            Sorted security group IDs, the group itself excluded
+
+        Raises:
+            KeyError: If the group is unknown
+        """
+        # Binary digits from the least significant bit, i.e. in group number order
+        digits = bin(self._bits(sg_id, reverse))[:1:-1]
+        groups = []
+        position = digits.find('1')
+        while position != -1:
+            groups.append(self.groups[position])
+            position = digits.find('1', position + 1)
+        return sorted(groups)
+
+    def query(self, sg_id: str, reverse: bool = False) -> Dict[str, Any]:
+        """
+        Answer a blast radius query.
+
+        Args:
+            sg_id: Security group ID
+            reverse: Report the groups reaching sg_id instead
+
+        Returns:
+            Dictionary with the query, the number of groups and the groups
+            ({'id', 'name'})
+
+        Raises:
+            KeyError: If the group is unknown
+        """
+        groups = self.blast_radius(sg_id, reverse)
+        return {
+            'security_group': sg_id,
+            'name': self.names[self._position[sg_id]],
+            'reverse': reverse,
+            'count': len(groups),
+            'security_groups': [{'id': group, 'name': self.names[self._position[group]]} for group in groups]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize the closure.
+
+        Returns:
+            JSON-serializable dictionary (bitsets as hex strings)
+        """
+        return {
+            'version': FORMAT_VERSION,
+            'fingerprint': self.fingerprint,
+            'groups': self.groups,
+            'names': self.names,
+            'component_start': self._component_start,
+            'reach': [format(bits, 'x') for bits in self._reach],
+            'reverse': [format(bits, 'x') for bits in self._reverse]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ReachabilityClosure':
+        """
+        Deserialize a closure written by to_dict.
+
+        Args:
+            data: Serialized closure
+
+        Returns:
+            ReachabilityClosure
+
+        Raises:
+            ValueError: If the data is not a closure of a supported version
+        """
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported closure format version: {data.get('version')}")
+        return cls(
+            data['groups'],
+            data['names'],
+            data['component_start'],
+            [int(bits, 16) for bits in data['reach']],
+            [int(bits, 16) for bits in data['reverse']],
+            data.get('fingerprint')
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write the closure to a JSON file atomically.
+
+        Args:
+            path: Destination file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Optional[str] = None) -> Optional['ReachabilityClosure']:
+        """
+        Read a closure file.
+
+        Args:
+            path: File written by save
+            fingerprint: Expected snapshot fingerprint, if any
+
+        Returns:
+            ReachabilityClosure, or None if the file is missing, unreadable
+            or was built from another snapshot
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                closure = cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if fingerprint is not None and closure.fingerprint != fingerprint:
+            return None
+        return closure
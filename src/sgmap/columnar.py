@@ -0,0 +1,391 @@
+"""
+Columnar binary export of connection maps
+
+A compact, stdlib-only alternative to the JSON output for large graphs. Every
+string (IDs, names, CIDRs, protocols, descriptions, tags) is stored once in a
+string table; groups and edges are stored as fixed-width little-endian
+columns. open_columnar memory-maps a file and exposes the columns as
+memoryviews, so loading costs nothing until the data is read and the edge
+columns can be scanned without building a dict per edge.
+
+File layout:
+    8 bytes   magic b'SGMAPCOL'
+    4 bytes   header length (uint32, little-endian)
+    header    UTF-8 JSON: format version, VPC summary, counts and
+              {column name: [offset, typecode, length]}
+    columns   from the first 8-byte boundary after the header, each aligned
+              to 8 bytes (offsets are relative to the first column)
+
+Columns (G groups, E edges, S strings; string columns hold string table indices):
+    string_offsets   I  S + 1 byte offsets into string_data
+    string_data      B  UTF-8 strings, back to back
+    group_id         I  G
+    group_name       I  G
+    group_description I G
+    group_tags       I  G  tags as a JSON string
+    group_edge_start I  G + 1  edges of group g are group_edge_start[g]:group_edge_start[g + 1]
+    edge_owner       I  E  index of the group whose rule defines the edge
+    edge_kind        B  E  direction | peer type << 1 (see sgmap.graph)
+    edge_peer        I  E  security group ID or CIDR
+    edge_name        I  E
+    edge_protocol    I  E
+    edge_from_port   i  E  PORT_ALL when the rule has no port ('all')
+    edge_to_port     i  E
+    edge_description I  E
+"""
+
+import json
+import mmap
+import sys
+from array import array
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from sgmap.graph import CIDR, DIRECTIONS, PEER_TYPES, SECURITY_GROUP
+
+MAGIC = b'SGMAPCOL'
+FORMAT_VERSION = 1
+
+# Stored in the port columns for rules without ports (from_port / to_port 'all')
+PORT_ALL = -2 ** 31
+
+_ALIGNMENT = 8
+
+# Column name -> array typecode, in file order
+COLUMNS: Dict[str, str] = {
+    'string_offsets': 'I',
+    'string_data': 'B',
+    'group_id': 'I',
+    'group_name': 'I',
+    'group_description': 'I',
+    'group_tags': 'I',
+    'group_edge_start': 'I',
+    'edge_owner': 'I',
+    'edge_kind': 'B',
+    'edge_peer': 'I',
+    'edge_name': 'I',
+    'edge_protocol': 'I',
+    'edge_from_port': 'i',
+    'edge_to_port': 'i',
+    'edge_description': 'I',
+}
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _encode_port(port: Any) -> int:
+    return PORT_ALL if port == 'all' else port
+
+
+def _decode_port(port: int) -> Any:
+    return 'all' if port == PORT_ALL else port
+
+
+def _data_start(header_size: int) -> int:
+    end = len(MAGIC) + 4 + header_size
+    return end + -end % _ALIGNMENT
+
+
+def generate_columnar(connections: Dict[str, Any]) -> bytes:
+    """
+    Encode a connection map in the columnar binary format.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+
+    Returns:
+        File contents
+    """
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+    group_id = columns['group_id']
+    group_name = columns['group_name']
+    group_description = columns['group_description']
+    group_tags = columns['group_tags']
+    group_edge_start = columns['group_edge_start']
+    edge_owner = columns['edge_owner']
+    edge_kind = columns['edge_kind']
+    edge_peer = columns['edge_peer']
+    edge_name = columns['edge_name']
+    edge_protocol = columns['edge_protocol']
+    edge_from_port = columns['edge_from_port']
+    edge_to_port = columns['edge_to_port']
+    edge_description = columns['edge_description']
+
+    for group, (sg_id, sg_data) in enumerate(connections['security_groups'].items()):
+        group_id.append(intern(sg_id))
+        group_name.append(intern(sg_data['name']))
+        group_description.append(intern(sg_data['description']))
+        group_tags.append(intern(json.dumps(sg_data['tags'], separators=(',', ':'))))
+        group_edge_start.append(len(edge_owner))
+        for direction, key in enumerate(DIRECTIONS):
+            for conn in sg_data[key]:
+                edge_owner.append(group)
+                edge_kind.append(direction | (SECURITY_GROUP if conn['type'] == 'security_group' else CIDR) << 1)
+                edge_peer.append(intern(conn['id']))
+                edge_name.append(intern(conn['name']))
+                edge_protocol.append(intern(str(conn['protocol'])))
+                edge_from_port.append(_encode_port(conn['from_port']))
+                edge_to_port.append(_encode_port(conn['to_port']))
+                edge_description.append(intern(conn['description']))
+    group_edge_start.append(len(edge_owner))
+
+    string_offsets = columns['string_offsets']
+    string_data = bytearray()
+    string_offsets.append(0)
+    for value in strings:
+        string_data += value.encode('utf-8')
+        string_offsets.append(len(string_data))
+    columns['string_data'] = array('B', string_data)
+
+    # Columns follow the header at the next aligned offset; their offsets are relative to it
+    payloads = []
+    layout: Dict[str, List[Any]] = {}
+    offset = 0
+    for name, column in columns.items():
+        if _BIG_ENDIAN and column.itemsize > 1:
+            column.byteswap()
+        offset += -offset % _ALIGNMENT
+        layout[name] = [offset, column.typecode, len(column)]
+        payloads.append((offset, column.tobytes()))
+        offset += len(payloads[-1][1])
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'vpc': connections['vpc'],
+        'groups': len(group_id),
+        'edges': len(edge_owner),
+        'strings': len(strings),
+        'columns': layout
+    }, separators=(',', ':')).encode('utf-8')
+
+    out = bytearray(MAGIC)
+    out += len(header).to_bytes(4, 'little')
+    out += header
+    data_start = _data_start(len(header))
+    for offset, payload in payloads:
+        out += bytes(data_start + offset - len(out))
+        out += payload
+    return bytes(out)
+
+
+def write_columnar(connections: Dict[str, Any], fp: IO[bytes]) -> None:
+    """
+    Write a connection map in the columnar binary format.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        fp: Binary file object to write to
+    """
+    fp.write(generate_columnar(connections))
+
+
+class ColumnarGraph:
+    """
+    Read-only view of a columnar file.
+
+    Columns are memoryviews over the underlying buffer (cast to the column's
+    typecode) and strings are decoded on first access, so opening a file only
+    parses its header. Use open_columnar to memory-map a file.
+
+    Example:
+        >>> with open_columnar('sgmap.bin') as graph:
+        ...     inbound = sum(1 for kind in graph.column('edge_kind') if kind & 1 == 0)
+        ...     connections = graph.to_dict()
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        """
+        Args:
+            buffer: File contents
+
+        Raises:
+            ValueError: If the buffer is not a columnar file of a supported version
+        """
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError('Not an sgmap columnar file')
+        start = len(MAGIC) + 4
+        header_size = int.from_bytes(buffer[len(MAGIC):start], 'little')
+        header = json.loads(bytes(buffer[start:start + header_size]))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version: {header['version']}")
+
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._data_start = _data_start(header_size)
+        self.vpc: Dict[str, Any] = header['vpc']
+        self.group_count: int = header['groups']
+        self.edge_count: int = header['edges']
+        self._layout: Dict[str, List[Any]] = header['columns']
+        self._columns: Dict[str, Any] = {}
+        self._strings: List[Optional[str]] = [None] * header['strings']
+
+    def column(self, name: str) -> Any:
+        """
+        Get a column without copying it (copied once on big-endian hosts).
+
+        Args:
+            name: Column name (see COLUMNS)
+
+        Returns:
+            memoryview (or array) of the column's values
+        """
+        column = self._columns.get(name)
+        if column is None:
+            offset, typecode, length = self._layout[name]
+            offset += self._data_start
+            raw = self._view[offset:offset + length * array(typecode).itemsize]
+            if _BIG_ENDIAN and typecode != 'B':
+                column = array(typecode, raw.tobytes())
+                column.byteswap()
+            else:
+                column = raw.cast(typecode)
+            self._columns[name] = column
+        return column
+
+    def string(self, index: int) -> str:
+        """
+        Get an entry of the string table.
+
+        Args:
+            index: String table index, as stored in the string columns
+
+        Returns:
+            Decoded string
+        """
+        value = self._strings[index]
+        if value is None:
+            offsets = self.column('string_offsets')
+            value = str(self.column('string_data')[offsets[index]:offsets[index + 1]], 'utf-8')
+            self._strings[index] = value
+        return value
+
+    def strings(self) -> List[str]:
+        """
+        Decode the whole string table.
+
+        Returns:
+            Strings in table order
+        """
+        offsets = self.column('string_offsets')
+        data = bytes(self.column('string_data'))
+        self._strings = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(self._strings))]
+        return self._strings  # type: ignore[return-value]
+
+    def security_group_ids(self) -> List[str]:
+        """
+        Get the IDs of the security groups in file order.
+
+        Returns:
+            List of security group IDs
+        """
+        return [self.string(index) for index in self.column('group_id')]
+
+    def iter_edges(self) -> Iterator[Tuple[str, str, str, str, Any, Any, Any]]:
+        """
+        Iterate over the edges with their strings resolved.
+
+        Yields:
+            (owner group ID, direction, peer type, peer ID, protocol, from_port, to_port) tuples
+        """
+        strings = self.strings()
+        group_ids = [strings[index] for index in self.column('group_id')]
+        for owner, kind, peer, protocol, from_port, to_port in zip(
+            self.column('edge_owner'),
+            self.column('edge_kind'),
+            self.column('edge_peer'),
+            self.column('edge_protocol'),
+            self.column('edge_from_port'),
+            self.column('edge_to_port')
+        ):
+            yield (group_ids[owner], DIRECTIONS[kind & 1], PEER_TYPES[kind >> 1], strings[peer],
+                   strings[protocol], _decode_port(from_port), _decode_port(to_port))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Rebuild the connection map that was written.
+
+        Returns:
+            Dictionary with VPC info and security group connections
+        """
+        strings = self.strings()
+        tags: Dict[int, Any] = {}
+        security_groups: Dict[str, Any] = {}
+        edge_start = self.column('group_edge_start')
+        kinds = self.column('edge_kind')
+        peers = self.column('edge_peer')
+        names = self.column('edge_name')
+        protocols = self.column('edge_protocol')
+        from_ports = self.column('edge_from_port')
+        to_ports = self.column('edge_to_port')
+        descriptions = self.column('edge_description')
+
+        for group, (sg_id, name, description, tag_index) in enumerate(zip(
+            self.column('group_id'),
+            self.column('group_name'),
+            self.column('group_description'),
+            self.column('group_tags')
+        )):
+            if tag_index not in tags:
+                tags[tag_index] = json.loads(strings[tag_index])
+            directions: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]] = ([], [])
+            for edge in range(edge_start[group], edge_start[group + 1]):
+                kind = kinds[edge]
+                directions[kind & 1].append({
+                    'type': PEER_TYPES[kind >> 1],
+                    'id': strings[peers[edge]],
+                    'name': strings[names[edge]],
+                    'protocol': strings[protocols[edge]],
+                    'from_port': _decode_port(from_ports[edge]),
+                    'to_port': _decode_port(to_ports[edge]),
+                    'description': strings[descriptions[edge]]
+                })
+            security_groups[strings[sg_id]] = {
+                'name': strings[name],
+                'description': strings[description],
+                'tags': tags[tag_index],
+                'inbound': directions[0],
+                'outbound': directions[1]
+            }
+        return {'vpc': self.vpc, 'security_groups': security_groups}
+
+    def close(self) -> None:
+        """Release the columns and close the memory map, if any"""
+        for column in self._columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self._columns.clear()
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self) -> 'ColumnarGraph':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def open_columnar(path: str) -> ColumnarGraph:
+    """
+    Memory-map a columnar file.
+
+    Args:
+        path: File written by write_columnar
+
+    Returns:
+        ColumnarGraph backed by the memory map (close it, or use it as a context manager)
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return ColumnarGraph(buffer)
+    except Exception:
+        buffer.close()
+        raise
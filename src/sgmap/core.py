@@ -3,8 +3,17 @@ Core functionality for sgmap
 """
 
 import json
-import boto3
-from typing import Dict, List, Optional, Any
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple, Any
+
+from sgmap.aws import ec2_client
+from sgmap.graph import (
+    DIRECTIONS, PEER_TYPES, SECURITY_GROUP, ConnectionGraph, iter_rule_edges, resolve_prefix_lists
+)
+from sgmap.intervals import MAX_PORT, canonical_protocol, merge_ranges, port_range
+from sgmap.normalize import normalize_entries
+
+# Maximum number of values in a single describe_security_groups filter
+MAX_FILTER_VALUES = 200
 
 
 def get_name_from_tags(tags: List[Dict[str, str]]) -> str:
@@ -23,37 +32,311 @@ def get_name_from_tags(tags: List[Dict[str, str]]) -> str:
     return ''
 
 
-def get_security_groups(vpc_id: str, security_group_id: Optional[str] = None) -> Dict[str, Any]:
+def iter_security_groups(
+    vpc_id: str,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    ec2: Optional[Any] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over security groups in a VPC, one describe_security_groups page at a time.
+    
+    Args:
+        vpc_id: The VPC ID to filter security groups
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per page (5-1000, API default when omitted)
+        ec2: Optional EC2 client to reuse
+        
+    Yields:
+        Security group dictionaries as returned by the EC2 API
+    """
+    if ec2 is None:
+        ec2 = ec2_client()
+    
+    filters = [{'Name': 'vpc-id', 'Values': [vpc_id]}]
+    
+    if security_group_id:
+        filters.append({'Name': 'group-id', 'Values': [security_group_id]})
+    
+    yield from _paginate_security_groups(ec2, filters, page_size)
+
+
+def _paginate_security_groups(
+    ec2: Any,
+    filters: List[Dict[str, Any]],
+    page_size: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over every page of a filtered describe_security_groups call.
+    
+    Args:
+        ec2: EC2 client
+        filters: describe_security_groups Filters
+        page_size: Optional MaxResults per page
+        
+    Yields:
+        Security group dictionaries as returned by the EC2 API
+    """
+    paginate_kwargs: Dict[str, Any] = {'Filters': filters}
+    if page_size:
+        paginate_kwargs['PaginationConfig'] = {'PageSize': page_size}
+    
+    paginator = ec2.get_paginator('describe_security_groups')
+    for page in paginator.paginate(**paginate_kwargs):
+        yield from page.get('SecurityGroups', [])
+
+
+def get_security_groups(
+    vpc_id: str,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    stream: bool = False,
+    ec2: Optional[Any] = None
+) -> Dict[str, Any]:
     """
     Get security groups and VPC info for a given VPC ID and optionally filter by security group ID.
     
     Args:
         vpc_id: The VPC ID to filter security groups
         security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        stream: Return security groups as a lazy generator instead of a list
+        ec2: Optional EC2 client to reuse
         
     Returns:
         Dictionary with VPC info and security groups
     """
-    ec2 = boto3.client('ec2')
+    if ec2 is None:
+        ec2 = ec2_client()
     
     # Get VPC info
     vpc_response = ec2.describe_vpcs(VpcIds=[vpc_id])
     vpc_info = vpc_response['Vpcs'][0] if vpc_response['Vpcs'] else None
     
-    # Get security groups
-    filters = [{'Name': 'vpc-id', 'Values': [vpc_id]}]
+    # Get security groups (all pages)
+    security_groups: Iterable[Dict[str, Any]] = iter_security_groups(
+        vpc_id, security_group_id, page_size=page_size, ec2=ec2
+    )
+    if not stream:
+        security_groups = list(security_groups)
     
-    if security_group_id:
-        filters.append({'Name': 'group-id', 'Values': [security_group_id]})
+    return {
+        'vpc': vpc_info,
+        'security_groups': security_groups
+    }
+
+
+def referenced_group_ids(sg: Dict[str, Any]) -> Set[str]:
+    """
+    Get the IDs of the security groups referenced by a group's rules.
     
-    sg_response = ec2.describe_security_groups(Filters=filters)
+    Args:
+        sg: Security group dictionary as returned by the EC2 API
+        
+    Returns:
+        Set of referenced security group IDs
+    """
+    return {peer_id for _, peer_type, peer_id, *_ in iter_rule_edges(sg) if peer_type == SECURITY_GROUP}
+
+
+def _fetch_new_groups(
+    ec2: Any,
+    vpc_id: str,
+    filter_name: str,
+    values: List[str],
+    groups: Dict[str, Dict[str, Any]],
+    page_size: Optional[int] = None
+) -> List[str]:
+    """
+    Fetch the security groups matching a filter, in batches of filter values.
+    
+    Args:
+        ec2: EC2 client
+        vpc_id: The VPC ID to filter security groups
+        filter_name: describe_security_groups filter name (e.g. 'group-id')
+        values: Filter values
+        groups: Groups fetched so far, updated in place
+        page_size: Optional MaxResults per page
+        
+    Returns:
+        IDs of the groups that were not fetched before
+    """
+    new_ids = []
+    for start in range(0, len(values), MAX_FILTER_VALUES):
+        filters = [
+            {'Name': 'vpc-id', 'Values': [vpc_id]},
+            {'Name': filter_name, 'Values': values[start:start + MAX_FILTER_VALUES]}
+        ]
+        for sg in _paginate_security_groups(ec2, filters, page_size):
+            if sg['GroupId'] not in groups:
+                groups[sg['GroupId']] = sg
+                new_ids.append(sg['GroupId'])
+    return new_ids
+
+
+def get_security_group_neighborhood(
+    vpc_id: str,
+    security_group_id: str,
+    depth: int,
+    page_size: Optional[int] = None,
+    ec2: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Get a security group and the groups within `depth` references of it.
+    
+    Neighbors are found breadth-first without listing the whole VPC: each hop
+    fetches the groups the frontier references (group-id filter) and the
+    groups whose ingress or egress rules reference the frontier
+    (ip-permission.group-id / egress.ip-permission.group-id filters).
+    Filter values are sent in batches, so the number of API calls grows with
+    the size of the neighborhood rather than with the size of the VPC.
+    
+    Args:
+        vpc_id: The VPC ID to filter security groups
+        security_group_id: Security group ID at the center of the neighborhood
+        depth: Number of hops to follow (0 for the group alone)
+        page_size: Optional MaxResults per describe_security_groups page
+        ec2: Optional EC2 client to reuse
+        
+    Returns:
+        Dictionary with VPC info and security groups in breadth-first order
+    """
+    if ec2 is None:
+        ec2 = ec2_client()
+    
+    vpc_response = ec2.describe_vpcs(VpcIds=[vpc_id])
+    vpc_info = vpc_response['Vpcs'][0] if vpc_response['Vpcs'] else None
+    
+    groups: Dict[str, Dict[str, Any]] = {}
+    frontier = _fetch_new_groups(ec2, vpc_id, 'group-id', [security_group_id], groups, page_size)
+    for _ in range(depth):
+        if not frontier:
+            break
+        next_frontier = []
+        for filter_name in ('ip-permission.group-id', 'egress.ip-permission.group-id'):
+            next_frontier += _fetch_new_groups(ec2, vpc_id, filter_name, frontier, groups, page_size)
+        referenced = set()
+        for sg_id in frontier:
+            referenced.update(peer for peer in referenced_group_ids(groups[sg_id]) if peer not in groups)
+        next_frontier += _fetch_new_groups(ec2, vpc_id, 'group-id', sorted(referenced), groups, page_size)
+        frontier = next_frontier
     
     return {
         'vpc': vpc_info,
-        'security_groups': sg_response['SecurityGroups']
+        'security_groups': list(groups.values())
     }
 
 
+def select_neighborhood(
+    security_groups: Iterable[Dict[str, Any]],
+    security_group_id: str,
+    depth: int
+) -> List[Dict[str, Any]]:
+    """
+    Select a security group and the groups within `depth` references of it.
+    
+    In-memory counterpart of get_security_group_neighborhood for groups that
+    are already loaded (e.g. from files).
+    
+    Args:
+        security_groups: Security group dictionaries
+        security_group_id: Security group ID at the center of the neighborhood
+        depth: Number of hops to follow (0 for the group alone)
+        
+    Returns:
+        Security groups in breadth-first order
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    neighbors: Dict[str, Set[str]] = {}
+    for sg in security_groups:
+        sg_id = sg['GroupId']
+        groups[sg_id] = sg
+        for peer in referenced_group_ids(sg):
+            # References count in both directions
+            neighbors.setdefault(sg_id, set()).add(peer)
+            neighbors.setdefault(peer, set()).add(sg_id)
+    
+    if security_group_id not in groups:
+        return []
+    
+    selected = [security_group_id]
+    seen = {security_group_id}
+    frontier = [security_group_id]
+    for _ in range(depth):
+        next_frontier = []
+        for sg_id in frontier:
+            for peer in sorted(neighbors.get(sg_id, ())):
+                if peer not in seen and peer in groups:
+                    seen.add(peer)
+                    next_frontier.append(peer)
+        selected += next_frontier
+        frontier = next_frontier
+    return [groups[sg_id] for sg_id in selected]
+
+
+def list_vpc_ids(ec2: Optional[Any] = None) -> List[str]:
+    """
+    List the IDs of every VPC visible to an EC2 client.
+    
+    Args:
+        ec2: Optional EC2 client to reuse
+        
+    Returns:
+        List of VPC IDs
+    """
+    if ec2 is None:
+        ec2 = ec2_client()
+    
+    paginator = ec2.get_paginator('describe_vpcs')
+    return [vpc['VpcId'] for page in paginator.paginate() for vpc in page.get('Vpcs', [])]
+
+
+def summarize_vpc(vpc_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarize describe_vpcs output for the connection map.
+    
+    Args:
+        vpc_info: VPC dictionary as returned by the EC2 API
+        
+    Returns:
+        Dictionary with VPC ID, CIDR, name and tags
+    """
+    return {
+        'id': vpc_info['VpcId'],
+        'cidr': vpc_info.get('CidrBlock', ''),
+        'name': get_name_from_tags(vpc_info.get('Tags', [])),
+        'tags': vpc_info.get('Tags', [])
+    }
+
+
+def build_connection_graph(vpc_and_sgs: Dict[str, Any]) -> ConnectionGraph:
+    """
+    Build the compact connection graph of a VPC's security groups.
+    
+    Security groups may be given as a list or any iterable (e.g. the generator
+    returned by get_security_groups(..., stream=True)); they are consumed in a
+    single pass, so analysis proceeds page by page as the API responds.
+    
+    Managed prefix lists referenced by rules are expanded with
+    vpc_and_sgs['prefix_lists'] when present (a PrefixListResolver or a
+    mapping of prefix list ID to CIDRs). When the security groups are a list,
+    every referenced prefix list is resolved in one batch before analysis.
+    
+    Args:
+        vpc_and_sgs: Dictionary with VPC info, security groups and optional prefix lists
+        
+    Returns:
+        ConnectionGraph of the security groups
+    """
+    prefix_lists = vpc_and_sgs.get('prefix_lists')
+    if prefix_lists is not None and isinstance(vpc_and_sgs['security_groups'], list):
+        prefix_lists = resolve_prefix_lists(prefix_lists, vpc_and_sgs['security_groups'])
+    graph = ConnectionGraph(summarize_vpc(vpc_and_sgs['vpc']), prefix_lists)
+    for sg in vpc_and_sgs['security_groups']:
+        graph.add_security_group(sg)
+    return graph
+
+
 def analyze_security_group_connections(vpc_and_sgs: Dict[str, Any]) -> Dict[str, Any]:
     """
     Analyze security group connections and build a connection map.
@@ -64,108 +347,66 @@ def analyze_security_group_connections(vpc_and_sgs: Dict[str, Any]) -> Dict[str,
     Returns:
         Dictionary with VPC info and security group connections
     """
-    vpc_info = vpc_and_sgs['vpc']
-    security_groups = vpc_and_sgs['security_groups']
-    
-    # Create a mapping of security group ID to name for easier reference
-    sg_id_to_name = {sg['GroupId']: sg['GroupName'] for sg in security_groups}
-    
-    # Initialize connection map
-    connections = {
-        'vpc': {
-            'id': vpc_info['VpcId'],
-            'cidr': vpc_info.get('CidrBlock', ''),
-            'name': get_name_from_tags(vpc_info.get('Tags', [])),
-            'tags': vpc_info.get('Tags', [])
-        },
-        'security_groups': {}
-    }
+    return build_connection_graph(vpc_and_sgs).to_dict()
+
+
+def mermaid_node_id(peer_type: str, peer_id: str) -> str:
+    """
+    Get the mermaid node ID of a security group or CIDR.
     
-    for sg in security_groups:
-        sg_id = sg['GroupId']
-        connections['security_groups'][sg_id] = {
-            'name': sg['GroupName'],
-            'description': sg.get('Description', ''),
-            'tags': sg.get('Tags', []),
-            'inbound': [],
-            'outbound': []
-        }
+    Args:
+        peer_type: 'security_group' or 'cidr'
+        peer_id: Security group ID, CIDR (IPv4 or IPv6) or unresolved prefix list ID
         
-        # Process inbound rules (ingress)
-        for rule in sg.get('IpPermissions', []):
-            for group in rule.get('UserIdGroupPairs', []):
-                if 'GroupId' in group:
-                    target_sg_id = group['GroupId']
-                    connections['security_groups'][sg_id]['inbound'].append({
-                        'type': 'security_group',
-                        'id': target_sg_id,
-                        'name': sg_id_to_name.get(target_sg_id, target_sg_id),
-                        'protocol': rule.get('IpProtocol', 'all'),
-                        'from_port': rule.get('FromPort', 'all'),
-                        'to_port': rule.get('ToPort', 'all'),
-                        'description': group.get('Description', '')
-                    })
-            
-            # Add CIDR connections
-            for cidr in rule.get('IpRanges', []):
-                connections['security_groups'][sg_id]['inbound'].append({
-                    'type': 'cidr',
-                    'id': cidr.get('CidrIp', 'unknown'),
-                    'name': cidr.get('Description', cidr.get('CidrIp', 'unknown')),
-                    'protocol': rule.get('IpProtocol', 'all'),
-                    'from_port': rule.get('FromPort', 'all'),
-                    'to_port': rule.get('ToPort', 'all'),
-                    'description': cidr.get('Description', '')
-                })
+    Returns:
+        Mermaid node ID
+    """
+    if peer_type == 'security_group':
+        return f"SG_{peer_id.replace('-', '_')}"
+    return f"CIDR_{peer_id.replace('.', '_').replace('/', '_').replace(':', '_').replace('-', '_')}"
+
+
+def mermaid_ports(conn: Dict[str, Any]) -> str:
+    """
+    Format the protocol and ports of a connection for an edge label.
+    
+    Args:
+        conn: Connection entry
         
-        # Process outbound rules (egress)
-        for rule in sg.get('IpPermissionsEgress', []):
-            for group in rule.get('UserIdGroupPairs', []):
-                if 'GroupId' in group:
-                    target_sg_id = group['GroupId']
-                    connections['security_groups'][sg_id]['outbound'].append({
-                        'type': 'security_group',
-                        'id': target_sg_id,
-                        'name': sg_id_to_name.get(target_sg_id, target_sg_id),
-                        'protocol': rule.get('IpProtocol', 'all'),
-                        'from_port': rule.get('FromPort', 'all'),
-                        'to_port': rule.get('ToPort', 'all'),
-                        'description': group.get('Description', '')
-                    })
-            
-            # Add CIDR connections
-            for cidr in rule.get('IpRanges', []):
-                connections['security_groups'][sg_id]['outbound'].append({
-                    'type': 'cidr',
-                    'id': cidr.get('CidrIp', 'unknown'),
-                    'name': cidr.get('Description', cidr.get('CidrIp', 'unknown')),
-                    'protocol': rule.get('IpProtocol', 'all'),
-                    'from_port': rule.get('FromPort', 'all'),
-                    'to_port': rule.get('ToPort', 'all'),
-                    'description': cidr.get('Description', '')
-                })
-    
-    return connections
-
-def generate_mermaid_diagram(connections: Dict[str, Any], include_vpc: bool = False) -> str:
+    Returns:
+        Label such as 'tcp/80-80' or '-1/all'
     """
-    Generate a mermaid diagram from security group connections.
+    ports = f"{conn['from_port']}-{conn['to_port']}" if conn['from_port'] != 'all' else 'all'
+    return f"{conn['protocol']}/{ports}"
+
+
+def _format_link_runs(runs: List[range]) -> str:
+    """
+    Format runs of link indices for a linkStyle line.
     
     Args:
-        connections: Dictionary with VPC info and security group connections
-        include_vpc: Whether to include VPC in the diagram (default: True)
+        runs: Consecutive link index ranges
         
     Returns:
-        Mermaid diagram as a string
+        Comma-separated link indices
     """
-    mermaid = ["```mermaid", "flowchart LR"]
+    return ','.join(str(index) for run in runs for index in run)
+
+
+def _iter_group_node_lines(connections: Dict[str, Any], include_vpc: bool) -> Iterator[str]:
+    """
+    Generate the VPC and security group node lines of a mermaid diagram.
     
-    # Track link indices
-    link_index = 0
-    vpc_links = []
-    inbound_links = []
-    outbound_links = []
+    With include_vpc, each security group node is followed by its
+    "belongs to" link from the VPC node (one link per security group).
     
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        include_vpc: Whether to include VPC in the diagram
+        
+    Yields:
+        Lines of the mermaid diagram
+    """
     vpc = connections['vpc']
     vpc_id = vpc['id']
     vpc_node_id = f"VPC_{vpc_id.replace('-', '_')}"
@@ -174,11 +415,11 @@ def generate_mermaid_diagram(connections: Dict[str, Any], include_vpc: bool = Fa
     if include_vpc:
         vpc_name = vpc['name'] if vpc['name'] else vpc_id
         vpc_label = f"{vpc_name}<br>({vpc_id})<br>{vpc['cidr']}"
-        mermaid.append(f"    {vpc_node_id}[\"🌐 {vpc_label}\"]")
+        yield f"    {vpc_node_id}[\"🌐 {vpc_label}\"]"
     
     # Add security group nodes
     for sg_id, sg_data in connections['security_groups'].items():
-        node_id = f"SG_{sg_id.replace('-', '_')}"
+        node_id = mermaid_node_id('security_group', sg_id)
         
         # Add tag information if available
         tag_info = ""
@@ -187,87 +428,242 @@ def generate_mermaid_diagram(connections: Dict[str, Any], include_vpc: bool = Fa
                 tag_info += f"<br>{tag.get('Key')}: {tag.get('Value')}"
         
         node_label = f"{sg_data['name']}<br>({sg_id}){tag_info}"
-        mermaid.append(f"    {node_id}[\"{node_label}\"]")
+        yield f"    {node_id}[\"{node_label}\"]"
         
         # Add VPC to security group connection if include_vpc is True
         if include_vpc:
-            mermaid.append(f"    {vpc_node_id} -->|belongs to| {node_id}")
-            vpc_links.append(link_index)
-            link_index += 1
+            yield f"    {vpc_node_id} -->|belongs to| {node_id}"
+
+
+def _format_port_ranges(ranges: List[Tuple[int, int]]) -> str:
+    """
+    Format merged port ranges, e.g. '22,80-81' or 'all'.
+    
+    Args:
+        ranges: Sorted, non-overlapping (start, end) tuples
+        
+    Returns:
+        Comma-separated ports and port ranges
+    """
+    if ranges == [(0, MAX_PORT)]:
+        return 'all'
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def compact_ports(conns: List[Dict[str, Any]]) -> str:
+    """
+    Combine the protocols and ports of parallel connections into one edge label.
+    
+    TCP and UDP port ranges are merged per protocol (overlapping and adjacent
+    ranges are collapsed); other protocols (e.g. ICMP types) are listed as is.
+    
+    Args:
+        conns: Connection entries between the same pair of nodes
+        
+    Returns:
+        Label such as 'tcp/22,80-81<br>udp/53'
+    """
+    ranges: Dict[str, List[Tuple[int, int]]] = {}
+    others: Dict[str, None] = {}
+    for conn in conns:
+        protocol = canonical_protocol(conn['protocol'])
+        if protocol in ('tcp', 'udp'):
+            ranges.setdefault(protocol, []).append(port_range(protocol, conn['from_port'], conn['to_port']))
+        else:
+            others[mermaid_ports(conn)] = None
+    
+    labels = [f"{protocol}/{_format_port_ranges(merge_ranges(protocol_ranges))}"
+              for protocol, protocol_ranges in ranges.items()]
+    labels.extend(others)
+    return '<br>'.join(labels)
+
+
+def _iter_compact_mermaid_lines(connections: Dict[str, Any], include_vpc: bool) -> Iterator[str]:
+    """
+    Generate the body of a compact mermaid diagram.
+    
+    Every CIDR node is declared once, and connections between the same pair
+    of nodes in the same direction are drawn as a single edge whose label
+    combines their ports.
+    
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        include_vpc: Whether to include VPC in the diagram
+        
+    Yields:
+        Lines of the mermaid diagram after the header
+    """
+    yield from _iter_group_node_lines(connections, include_vpc)
+    
+    # (source node, target node, direction) -> parallel connections, in first-seen order
+    edges: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    cidr_nodes: Dict[str, str] = {}
+    for sg_id, sg_data in connections['security_groups'].items():
+        group_node = mermaid_node_id('security_group', sg_id)
+        for direction in ('inbound', 'outbound'):
+            for conn in sg_data[direction]:
+                peer_node = mermaid_node_id(conn['type'], conn['id'])
+                if conn['type'] == 'cidr' and peer_node not in cidr_nodes:
+                    cidr_nodes[peer_node] = conn['id']
+                key = (peer_node, group_node, direction) if direction == 'inbound' else (group_node, peer_node, direction)
+                edges.setdefault(key, []).append(conn)
+    
+    for cidr_node, cidr in cidr_nodes.items():
+        yield f"    {cidr_node}[\"🔌 {cidr}\"]"
+    
+    link_index = len(connections['security_groups']) if include_vpc else 0
+    links: Dict[str, List[int]] = {'inbound': [], 'outbound': []}
+    for (source_node, target_node, direction), conns in edges.items():
+        yield f"    {source_node} -->|{direction}: {compact_ports(conns)}| {target_node}"
+        links[direction].append(link_index)
+        link_index += 1
+    
+    if links['inbound']:
+        yield f"    linkStyle {','.join(map(str, links['inbound']))} stroke:#cccccc,stroke-width:2"
+    if links['outbound']:
+        yield f"    linkStyle {','.join(map(str, links['outbound']))} stroke:#555555,stroke-width:2"
+    
+    yield "```"
+
+
+def iter_mermaid_lines(
+    connections: Dict[str, Any],
+    include_vpc: bool = False,
+    compact: bool = False
+) -> Iterator[str]:
+    """
+    Generate a mermaid diagram from security group connections, one line at a time.
+    
+    Link indices for the trailing linkStyle lines are tracked as runs of
+    consecutive edges (one inbound and one outbound run per security group),
+    so no line has to be kept after it is yielded.
+    
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        include_vpc: Whether to include VPC in the diagram (default: True)
+        compact: Declare each CIDR once and merge parallel edges (see compact_ports)
+        
+    Yields:
+        Lines of the mermaid diagram (without newlines)
+    """
+    yield "```mermaid"
+    yield "flowchart LR"
+    
+    if compact:
+        yield from _iter_compact_mermaid_lines(connections, include_vpc)
+        return
+    
+    # Add VPC and security group nodes
+    yield from _iter_group_node_lines(connections, include_vpc)
+    
+    # Track link indices (the VPC links come first)
+    link_index = len(connections['security_groups']) if include_vpc else 0
+    inbound_links: List[range] = []
+    outbound_links: List[range] = []
     
     # Add security group connections
     for sg_id, sg_data in connections['security_groups'].items():
-        source_node = f"SG_{sg_id.replace('-', '_')}"
+        source_node = mermaid_node_id('security_group', sg_id)
         
         # Add inbound connections (security group <- 許可している接続元)
+        run_start = link_index
         for conn in sg_data['inbound']:
             if conn['type'] == 'security_group':
-                target_node = f"SG_{conn['id'].replace('-', '_')}"
-                protocol = conn['protocol']
-                ports = f"{conn['from_port']}-{conn['to_port']}" if conn['from_port'] != 'all' else 'all'
-                label = f"inbound: {protocol}/{ports}"
-                mermaid.append(f"    {target_node} -->|{label}| {source_node}")
-                inbound_links.append(link_index)
+                target_node = mermaid_node_id('security_group', conn['id'])
+                label = f"inbound: {mermaid_ports(conn)}"
+                yield f"    {target_node} -->|{label}| {source_node}"
                 link_index += 1
             elif conn['type'] == 'cidr':
                 # Create a CIDR node for external connections
-                cidr_id = conn['id'].replace('.', '_').replace('/', '_')
-                cidr_node = f"CIDR_{cidr_id}"
+                cidr_node = mermaid_node_id('cidr', conn['id'])
                 cidr_label = conn['id']
                 if conn['description']:
                     cidr_label += f"<br>({conn['description']})"
                 
                 # Add CIDR node
-                mermaid.append(f"    {cidr_node}[\"🔌 {cidr_label}\"]")
+                yield f"    {cidr_node}[\"🔌 {cidr_label}\"]"
                 
-                protocol = conn['protocol']
-                ports = f"{conn['from_port']}-{conn['to_port']}" if conn['from_port'] != 'all' else 'all'
-                label = f"inbound: {protocol}/{ports}"
-                mermaid.append(f"    {cidr_node} -->|{label}| {source_node}")
-                inbound_links.append(link_index)
+                label = f"inbound: {mermaid_ports(conn)}"
+                yield f"    {cidr_node} -->|{label}| {source_node}"
                 link_index += 1
         
+        if link_index > run_start:
+            inbound_links.append(range(run_start, link_index))
+        
         # Add outbound connections (security group -> 許可している接続先)
+        run_start = link_index
         for conn in sg_data['outbound']:
             if conn['type'] == 'security_group':
-                target_node = f"SG_{conn['id'].replace('-', '_')}"
-                protocol = conn['protocol']
-                ports = f"{conn['from_port']}-{conn['to_port']}" if conn['from_port'] != 'all' else 'all'
-                label = f"outbound: {protocol}/{ports}"
-                mermaid.append(f"    {source_node} -->|{label}| {target_node}")
-                outbound_links.append(link_index)
+                target_node = mermaid_node_id('security_group', conn['id'])
+                label = f"outbound: {mermaid_ports(conn)}"
+                yield f"    {source_node} -->|{label}| {target_node}"
                 link_index += 1
             elif conn['type'] == 'cidr':
                 # Create a CIDR node for external connections
-                cidr_id = conn['id'].replace('.', '_').replace('/', '_')
-                cidr_node = f"CIDR_{cidr_id}"
+                cidr_node = mermaid_node_id('cidr', conn['id'])
                 cidr_label = conn['id']
                 if conn['description']:
                     cidr_label += f"<br>({conn['description']})"
                 
                 # Add CIDR node
-                mermaid.append(f"    {cidr_node}[\"🔌 {cidr_label}\"]")
+                yield f"    {cidr_node}[\"🔌 {cidr_label}\"]"
                 
-                protocol = conn['protocol']
-                ports = f"{conn['from_port']}-{conn['to_port']}" if conn['from_port'] != 'all' else 'all'
-                label = f"outbound: {protocol}/{ports}"
-                mermaid.append(f"    {source_node} -->|{label}| {cidr_node}")
-                outbound_links.append(link_index)
+                label = f"outbound: {mermaid_ports(conn)}"
+                yield f"    {source_node} -->|{label}| {cidr_node}"
                 link_index += 1
+        if link_index > run_start:
+            outbound_links.append(range(run_start, link_index))
     
-    # Add link styles
-    if vpc_links:
-        # VPC links can remain default color
-        pass
-    
+    # Add link styles (VPC links keep the default color)
     if inbound_links:
-        mermaid.append(f"    linkStyle {','.join(map(str, inbound_links))} stroke:#cccccc,stroke-width:2")
+        yield f"    linkStyle {_format_link_runs(inbound_links)} stroke:#cccccc,stroke-width:2"
     
     if outbound_links:
-        mermaid.append(f"    linkStyle {','.join(map(str, outbound_links))} stroke:#555555,stroke-width:2")
+        yield f"    linkStyle {_format_link_runs(outbound_links)} stroke:#555555,stroke-width:2"
     
-    mermaid.append("```")
-    return "\n".join(mermaid)
+    yield "```"
+
+
+def generate_mermaid_diagram(
+    connections: Dict[str, Any],
+    include_vpc: bool = False,
+    compact: bool = False
+) -> str:
+    """
+    Generate a mermaid diagram from security group connections.
+    
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        include_vpc: Whether to include VPC in the diagram (default: True)
+        compact: Declare each CIDR once and merge parallel edges
+        
+    Returns:
+        Mermaid diagram as a string
+    """
+    return "\n".join(iter_mermaid_lines(connections, include_vpc, compact))
+
+
+def write_mermaid_diagram(
+    connections: Dict[str, Any],
+    fp: IO[str],
+    include_vpc: bool = False,
+    compact: bool = False
+) -> None:
+    """
+    Write a mermaid diagram to a file-like object incrementally.
+    
+    The output is identical to generate_mermaid_diagram followed by a newline,
+    without building the whole diagram in memory.
+    
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        fp: Text file object to write to
+        include_vpc: Whether to include VPC in the diagram (default: True)
+        compact: Declare each CIDR once and merge parallel edges
+    """
+    for line in iter_mermaid_lines(connections, include_vpc, compact):
+        fp.write(line)
+        fp.write("\n")
 
 
 def generate_json_output(connections: Dict[str, Any]) -> str:
@@ -280,4 +676,120 @@ def generate_json_output(connections: Dict[str, Any]) -> str:
     Returns:
         JSON string
     """
-    return json.dumps(connections, indent=2)
\ No newline at end of file
+    return json.dumps(connections, indent=2)
+
+
+def write_json_output(connections: Dict[str, Any], fp: IO[str]) -> None:
+    """
+    Write JSON output to a file-like object incrementally.
+    
+    The output is identical to generate_json_output followed by a newline.
+    
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        fp: Text file object to write to
+    """
+    json.dump(connections, fp, indent=2)
+    fp.write("\n")
+
+
+def iter_json_lines(
+    vpc_and_sgs: Dict[str, Any],
+    per_connection: bool = False,
+    known_names: Optional[Dict[str, str]] = None,
+    normalize: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """
+    Analyze security groups one at a time and yield NDJSON records as soon as each is analyzed.
+    
+    The first record describes the VPC ({'record': 'vpc', ...}). It is followed
+    by one record per security group, shaped like an entry of the connection
+    map with 'record', 'vpc_id' and 'id' added, or with per_connection by one
+    record per connection ({'record': 'connection', 'vpc_id', 'security_group',
+    'direction', ...connection entry}). Security groups may be a stream (see
+    build_connection_graph); nothing but the names of the groups seen so far is
+    kept. Security group peers are named from known_names when given,
+    otherwise from the groups seen so far, and by their ID when not known yet.
+    
+    Args:
+        vpc_and_sgs: Dictionary with VPC info and security groups
+        per_connection: Yield one record per connection instead of per security group
+        known_names: Names of every security group of the VPC, if already known
+        normalize: Normalize the connections of each group (see sgmap.normalize)
+        
+    Yields:
+        JSON-serializable records
+    """
+    vpc = summarize_vpc(vpc_and_sgs['vpc'])
+    vpc_id = vpc['id']
+    prefix_lists = vpc_and_sgs.get('prefix_lists')
+    yield {'record': 'vpc', **vpc}
+    
+    names: Dict[str, str] = {} if known_names is None else known_names
+    for sg in vpc_and_sgs['security_groups']:
+        sg_id = sg['GroupId']
+        if known_names is None:
+            names[sg_id] = sg['GroupName']
+        connections: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]] = ([], [])
+        for direction, peer_type, peer_id, name, protocol, from_port, to_port, description in iter_rule_edges(sg, prefix_lists):
+            connections[direction].append({
+                'type': PEER_TYPES[peer_type],
+                'id': peer_id,
+                'name': names.get(peer_id, peer_id) if name is None else name,
+                'protocol': protocol,
+                'from_port': from_port,
+                'to_port': to_port,
+                'description': description
+            })
+        if normalize:
+            connections = (normalize_entries(connections[0]), normalize_entries(connections[1]))
+        
+        if per_connection:
+            for direction, entries in zip(DIRECTIONS, connections):
+                for entry in entries:
+                    yield {'record': 'connection', 'vpc_id': vpc_id, 'security_group': sg_id,
+                           'direction': direction, **entry}
+        else:
+            yield {
+                'record': 'security_group',
+                'vpc_id': vpc_id,
+                'id': sg_id,
+                'name': sg['GroupName'],
+                'description': sg.get('Description', ''),
+                'tags': sg.get('Tags', []),
+                'inbound': connections[0],
+                'outbound': connections[1]
+            }
+
+
+def write_json_lines(
+    vpc_and_sgs: Dict[str, Any],
+    fp: IO[str],
+    per_connection: bool = False,
+    known_names: Optional[Dict[str, str]] = None,
+    normalize: bool = False
+) -> None:
+    """
+    Write NDJSON records (see iter_json_lines), one per line.
+    
+    The file object is flushed after each security group, so that a reader
+    on the other end of a pipe receives records while the remaining pages
+    are still being fetched.
+    
+    Args:
+        vpc_and_sgs: Dictionary with VPC info and security groups
+        fp: Text file object to write to
+        per_connection: Write one record per connection instead of per security group
+        known_names: Names of every security group of the VPC, if already known
+        normalize: Normalize the connections of each group (see sgmap.normalize)
+    """
+    current = None
+    for record in iter_json_lines(vpc_and_sgs, per_connection, known_names, normalize):
+        # The VPC and group records carry 'id', connection records their group's ID
+        owner = record.get('security_group', record.get('id'))
+        if owner != current and current is not None:
+            fp.flush()
+        current = owner
+        fp.write(json.dumps(record, separators=(',', ':')))
+        fp.write("\n")
+    fp.flush()
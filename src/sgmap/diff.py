@@ -0,0 +1,276 @@
+"""
+Incremental diff between two security group snapshots
+
+Every security group is fingerprinted by a hash of its API representation, so
+only groups whose fingerprint differs are analyzed and compared edge by edge.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+from sgmap.core import mermaid_node_id, mermaid_ports, summarize_vpc
+from sgmap.graph import DIRECTIONS, PEER_TYPES, iter_rule_edges
+from sgmap.offline import _first_key, load_vpc_and_sgs_from_files
+
+# (direction, peer_type, peer_id, protocol, from_port, to_port)
+EdgeKey = Tuple[str, str, str, Any, Any, Any]
+
+_LINK_STYLES = {
+    'added': 'stroke:#2da44e,stroke-width:2',
+    'removed': 'stroke:#cf222e,stroke-width:2,stroke-dasharray:5 5',
+    'changed': 'stroke:#bf8700,stroke-width:2'
+}
+
+_CLASS_STYLES = {
+    'added': 'fill:#dafbe1,stroke:#2da44e',
+    'removed': 'fill:#ffebe9,stroke:#cf222e,stroke-dasharray:5 5',
+    'changed': 'fill:#fff8c5,stroke:#bf8700'
+}
+
+_MARKERS = {'added': '+', 'removed': '-', 'changed': '~'}
+
+
+def group_fingerprint(sg: Dict[str, Any]) -> str:
+    """
+    Hash a security group's API representation.
+
+    Args:
+        sg: Security group dictionary as returned by the EC2 API
+
+    Returns:
+        Hex digest that changes whenever any field of the group changes
+    """
+    data = json.dumps(sg, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_snapshot(path: str, vpc_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a snapshot file.
+
+    Accepts saved `aws ec2 describe-security-groups` output or a snapshot
+    written by the --cache-dir cache.
+
+    Args:
+        path: Path to the snapshot file
+        vpc_id: VPC ID to select from describe-security-groups output
+
+    Returns:
+        Dictionary with VPC info and security groups, like get_security_groups
+    """
+    if _first_key(path) == 'SecurityGroups':
+        vpc_and_sgs = load_vpc_and_sgs_from_files([path], vpc_id)
+        return {'vpc': vpc_and_sgs['vpc'], 'security_groups': list(vpc_and_sgs['security_groups'])}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'vpc_and_sgs' not in data:
+        raise ValueError(f"Unrecognized snapshot file: {path}")
+    return data['vpc_and_sgs']
+
+
+def _index_groups(security_groups: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, Tuple[str, Dict[str, Any]]], Dict[str, str]]:
+    """
+    Fingerprint security groups and collect their names.
+
+    Args:
+        security_groups: Security group dictionaries
+
+    Returns:
+        ({group ID: (fingerprint, group)}, {group ID: group name})
+    """
+    groups: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    names: Dict[str, str] = {}
+    for sg in security_groups:
+        groups[sg['GroupId']] = (group_fingerprint(sg), sg)
+        names[sg['GroupId']] = sg['GroupName']
+    return groups, names
+
+
+def _group_edges(sg: Optional[Dict[str, Any]], names: Dict[str, str]) -> Dict[EdgeKey, Dict[str, Any]]:
+    """
+    Analyze the edges of a single security group.
+
+    Args:
+        sg: Security group dictionary (None for a group missing from the snapshot)
+        names: Names of the snapshot's security groups, for security group peers
+
+    Returns:
+        Dictionary of edge key to connection entry
+    """
+    edges: Dict[EdgeKey, Dict[str, Any]] = {}
+    if sg is None:
+        return edges
+    for direction, peer_type, peer_id, name, protocol, from_port, to_port, description in iter_rule_edges(sg):
+        key = (DIRECTIONS[direction], PEER_TYPES[peer_type], peer_id, protocol, from_port, to_port)
+        edges[key] = {
+            'direction': key[0],
+            'type': key[1],
+            'id': peer_id,
+            'name': names.get(peer_id, peer_id) if name is None else name,
+            'protocol': protocol,
+            'from_port': from_port,
+            'to_port': to_port,
+            'description': description
+        }
+    return edges
+
+
+def _diff_group(
+    old_sg: Optional[Dict[str, Any]],
+    new_sg: Optional[Dict[str, Any]],
+    old_names: Dict[str, str],
+    new_names: Dict[str, str]
+) -> Dict[str, Any]:
+    """
+    Compare the two versions of a security group edge by edge.
+
+    An edge is identified by its direction, peer and rule; an edge whose
+    description differs is reported as changed.
+
+    Args:
+        old_sg: Old security group (None if added)
+        new_sg: New security group (None if removed)
+        old_names: Security group names in the old snapshot
+        new_names: Security group names in the new snapshot
+
+    Returns:
+        Dictionary with status, name and added/removed/changed edges
+    """
+    old_edges = _group_edges(old_sg, old_names)
+    new_edges = _group_edges(new_sg, new_names)
+
+    added = [edge for key, edge in new_edges.items() if key not in old_edges]
+    removed = [edge for key, edge in old_edges.items() if key not in new_edges]
+    changed = []
+    for key, edge in new_edges.items():
+        old_edge = old_edges.get(key)
+        if old_edge is not None and old_edge['description'] != edge['description']:
+            changed.append(dict(edge, old_description=old_edge['description']))
+
+    if old_sg is None:
+        status = 'added'
+    elif new_sg is None:
+        status = 'removed'
+    else:
+        status = 'changed'
+    sg = new_sg if new_sg is not None else old_sg
+
+    return {
+        'status': status,
+        'name': sg['GroupName'],
+        'old_name': old_sg['GroupName'] if old_sg is not None else None,
+        'edges': {'added': added, 'removed': removed, 'changed': changed}
+    }
+
+
+def diff_snapshots(old_vpc_and_sgs: Dict[str, Any], new_vpc_and_sgs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compute the security groups and edges added, removed or changed between two snapshots.
+
+    Groups are matched by ID and compared by fingerprint first, so only groups
+    that actually changed are analyzed; the cost of the comparison grows with
+    the amount of change rather than with the size of the VPC.
+
+    Args:
+        old_vpc_and_sgs: Old dictionary with VPC info and security groups
+        new_vpc_and_sgs: New dictionary with VPC info and security groups
+
+    Returns:
+        Dictionary with VPC info, a summary of counts and the per-group differences
+    """
+    old_groups, old_names = _index_groups(old_vpc_and_sgs['security_groups'])
+    new_groups, new_names = _index_groups(new_vpc_and_sgs['security_groups'])
+
+    security_groups: Dict[str, Any] = {}
+    unchanged = 0
+    for sg_id in list(old_groups) + [sg_id for sg_id in new_groups if sg_id not in old_groups]:
+        old_fingerprint, old_sg = old_groups.get(sg_id, (None, None))
+        new_fingerprint, new_sg = new_groups.get(sg_id, (None, None))
+        if old_fingerprint == new_fingerprint:
+            unchanged += 1
+            continue
+        security_groups[sg_id] = _diff_group(old_sg, new_sg, old_names, new_names)
+
+    summary = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': unchanged}
+    edge_summary = {'added': 0, 'removed': 0, 'changed': 0}
+    for group in security_groups.values():
+        summary[group['status']] += 1
+        for status, edges in group['edges'].items():
+            edge_summary[status] += len(edges)
+    summary['edges'] = edge_summary
+
+    vpc = new_vpc_and_sgs['vpc'] or old_vpc_and_sgs['vpc']
+    return {
+        'vpc': summarize_vpc(vpc) if vpc else None,
+        'summary': summary,
+        'security_groups': security_groups
+    }
+
+
+def has_changes(diff: Dict[str, Any]) -> bool:
+    """
+    Check whether a diff contains any difference.
+
+    Args:
+        diff: Result of diff_snapshots
+
+    Returns:
+        True if any security group was added, removed or changed
+    """
+    return bool(diff['security_groups'])
+
+
+def generate_diff_mermaid(diff: Dict[str, Any]) -> str:
+    """
+    Generate a mermaid diagram of the changed subgraph.
+
+    Only changed security groups, the peers of their changed edges and those
+    edges are drawn. Added, removed and changed elements are styled green, red
+    (dashed) and amber respectively.
+
+    Args:
+        diff: Result of diff_snapshots
+
+    Returns:
+        Mermaid diagram as a string
+    """
+    mermaid = ["```mermaid", "flowchart LR"]
+    nodes: Dict[str, str] = {}
+    edge_lines: List[str] = []
+    links: Dict[str, List[int]] = {'added': [], 'removed': [], 'changed': []}
+
+    for sg_id, group in diff['security_groups'].items():
+        node_id = mermaid_node_id('security_group', sg_id)
+        nodes[node_id] = f"    {node_id}[\"{group['name']}<br>({sg_id})\"]:::{group['status']}"
+
+    for sg_id, group in diff['security_groups'].items():
+        group_node = mermaid_node_id('security_group', sg_id)
+        for status, edges in group['edges'].items():
+            for conn in edges:
+                peer_node = mermaid_node_id(conn['type'], conn['id'])
+                if peer_node not in nodes:
+                    if conn['type'] == 'security_group':
+                        nodes[peer_node] = f"    {peer_node}[\"{conn['name']}<br>({conn['id']})\"]"
+                    else:
+                        nodes[peer_node] = f"    {peer_node}[\"🔌 {conn['id']}\"]"
+
+                label = f"{_MARKERS[status]} {conn['direction']}: {mermaid_ports(conn)}"
+                if conn['direction'] == 'inbound':
+                    edge_lines.append(f"    {peer_node} -->|{label}| {group_node}")
+                else:
+                    edge_lines.append(f"    {group_node} -->|{label}| {peer_node}")
+                links[status].append(len(edge_lines) - 1)
+
+    mermaid.extend(nodes.values())
+    mermaid.extend(edge_lines)
+
+    for status, indices in links.items():
+        if indices:
+            mermaid.append(f"    linkStyle {','.join(map(str, indices))} {_LINK_STYLES[status]}")
+    for status, style in _CLASS_STYLES.items():
+        mermaid.append(f"    classDef {status} {style}")
+
+    mermaid.append("```")
+    return "\n".join(mermaid)
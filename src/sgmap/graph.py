@@ -0,0 +1,453 @@
+"""
+Compact indexed graph model of security group connections
+
+Edges are stored column-wise in typed arrays. Security group IDs are interned
+as integer nodes, and repeated values (CIDRs, (protocol, from_port, to_port)
+triples and (name, description) labels) are interned once instead of being
+copied into one dict per edge. ConnectionGraph.to_dict() reproduces the nested
+dict returned by analyze_security_group_connections.
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+INBOUND = 0
+OUTBOUND = 1
+DIRECTIONS = ('inbound', 'outbound')
+
+SECURITY_GROUP = 0
+CIDR = 1
+PEER_TYPES = ('security_group', 'cidr')
+
+# (direction, peer_type, peer_id, name, protocol, from_port, to_port, description)
+# name is None for security group peers; it is resolved once every group is known.
+RuleEdge = Tuple[int, int, str, Optional[str], Any, Any, Any, str]
+
+# Prefix list ID -> CIDRs of its entries, or None if it could not be resolved.
+# Anything with a compatible get() works, e.g. sgmap.prefix_lists.PrefixListResolver.
+PrefixLists = Any
+
+
+def prefix_list_ids(security_groups: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Get the IDs of the managed prefix lists referenced by security group rules.
+
+    Args:
+        security_groups: Security group dictionaries as returned by the EC2 API
+
+    Returns:
+        Prefix list IDs in first-seen order, without duplicates
+    """
+    ids: Dict[str, None] = {}
+    for sg in security_groups:
+        for key in ('IpPermissions', 'IpPermissionsEgress'):
+            for rule in sg.get(key, []):
+                for prefix_list in rule.get('PrefixListIds', []):
+                    if 'PrefixListId' in prefix_list:
+                        ids[prefix_list['PrefixListId']] = None
+    return list(ids)
+
+
+def resolve_prefix_lists(
+    prefix_lists: PrefixLists,
+    security_groups: Iterable[Dict[str, Any]]
+) -> Dict[str, Optional[List[str]]]:
+    """
+    Resolve every prefix list referenced by a set of security groups at once.
+
+    Resolvers with a resolve() method (see sgmap.prefix_lists) fetch the
+    missing lists in one concurrent batch; plain mappings are looked up.
+
+    Args:
+        prefix_lists: Prefix list resolver or mapping
+        security_groups: Security group dictionaries as returned by the EC2 API
+
+    Returns:
+        Dictionary of prefix list ID to CIDRs (None when unresolved)
+    """
+    ids = prefix_list_ids(security_groups)
+    if hasattr(prefix_lists, 'resolve'):
+        return prefix_lists.resolve(ids)
+    return {pl_id: prefix_lists.get(pl_id) for pl_id in ids}
+
+
+def iter_rule_edges(sg: Dict[str, Any], prefix_lists: Optional[PrefixLists] = None) -> Iterator[RuleEdge]:
+    """
+    Iterate over the connection edges described by a security group's rules.
+
+    Inbound (IpPermissions) edges come first, then outbound (IpPermissionsEgress);
+    within a rule, security group peers precede IPv4 CIDRs, IPv6 CIDRs and
+    prefix lists. A resolved prefix list yields one CIDR peer per entry, named
+    by the prefix list ID; an unresolved one yields a single peer whose ID is
+    the prefix list ID.
+
+    Args:
+        sg: Security group dictionary as returned by the EC2 API
+        prefix_lists: Optional prefix list resolver or mapping (see resolve_prefix_lists)
+
+    Yields:
+        (direction, peer_type, peer_id, name, protocol, from_port, to_port, description) tuples
+    """
+    for direction, key in ((INBOUND, 'IpPermissions'), (OUTBOUND, 'IpPermissionsEgress')):
+        for rule in sg.get(key, []):
+            protocol = rule.get('IpProtocol', 'all')
+            from_port = rule.get('FromPort', 'all')
+            to_port = rule.get('ToPort', 'all')
+
+            for group in rule.get('UserIdGroupPairs', []):
+                if 'GroupId' in group:
+                    yield (direction, SECURITY_GROUP, group['GroupId'], None,
+                           protocol, from_port, to_port, group.get('Description', ''))
+
+            for key, cidr_key in (('IpRanges', 'CidrIp'), ('Ipv6Ranges', 'CidrIpv6')):
+                for cidr in rule.get(key, []):
+                    cidr_ip = cidr.get(cidr_key, 'unknown')
+                    yield (direction, CIDR, cidr_ip, cidr.get('Description', cidr_ip),
+                           protocol, from_port, to_port, cidr.get('Description', ''))
+
+            for prefix_list in rule.get('PrefixListIds', []):
+                pl_id = prefix_list.get('PrefixListId', 'unknown')
+                cidrs = prefix_lists.get(pl_id) if prefix_lists is not None else None
+                for cidr_ip in (cidrs if cidrs is not None else [pl_id]):
+                    yield (direction, CIDR, cidr_ip, pl_id,
+                           protocol, from_port, to_port, prefix_list.get('Description', ''))
+
+
+class ConnectionGraph:
+    """
+    Security group connection graph with interned nodes and array-backed edges.
+
+    Nodes are security group IDs (analyzed groups and groups referenced by
+    rules). Each edge belongs to the group whose rule defines it and points to
+    a peer, which is either a security group node or an interned CIDR (IPv4,
+    IPv6, or an entry of a managed prefix list). Edges are indexed by owning
+    group (inbound and outbound) and, for security group peers, by peer.
+    """
+
+    def __init__(self, vpc: Dict[str, Any], prefix_lists: Optional[PrefixLists] = None):
+        """
+        Args:
+            vpc: VPC summary ({'id', 'cidr', 'name', 'tags'})
+            prefix_lists: Optional prefix list resolver or mapping used to expand
+                PrefixListIds (see iter_rule_edges)
+        """
+        self.vpc = vpc
+        self.prefix_lists = prefix_lists
+
+        # Interned values: strings, (protocol, from_port, to_port) and (name, description)
+        self._values: List[Any] = []
+        self._value_index: Dict[Any, int] = {}
+
+        # Interned security group node IDs
+        self._nodes: List[str] = []
+        self._node_index: Dict[str, int] = {}
+
+        # Analyzed groups in input order. A group's edges are contiguous, from its
+        # first edge ID up to the next group's first edge ID.
+        self._group_nodes = array('I')
+        self._group_names = array('I')
+        self._group_descriptions = array('I')
+        self._group_tags: List[List[Dict[str, str]]] = []
+        self._group_edge_start = array('I')
+        self._group_of_node: Dict[int, int] = {}
+
+        # Edge columns. kind = direction | peer_type << 1; peer is a node for
+        # security group peers and an interned CIDR otherwise.
+        self._edge_owner = array('I')
+        self._edge_kind = array('B')
+        self._edge_peer = array('I')
+        self._edge_rule = array('I')
+        self._edge_label = array('I')
+
+        # Edges naming each security group node as their peer
+        self._edges_by_peer: Dict[int, array] = {}
+
+    def _intern(self, value: Any) -> int:
+        index = self._value_index.get(value)
+        if index is None:
+            index = len(self._values)
+            self._values.append(value)
+            self._value_index[value] = index
+        return index
+
+    def _node(self, sg_id: str) -> int:
+        index = self._node_index.get(sg_id)
+        if index is None:
+            index = len(self._nodes)
+            self._nodes.append(sg_id)
+            self._node_index[sg_id] = index
+        return index
+
+    def add_security_group(self, sg: Dict[str, Any]) -> None:
+        """
+        Add a security group and the edges described by its rules.
+
+        Edges are those of iter_rule_edges, in its order; the (protocol,
+        from_port, to_port) triple is interned once per run of edges sharing it
+        rather than once per edge.
+
+        Args:
+            sg: Security group dictionary as returned by the EC2 API
+        """
+        intern = self._intern
+        node_of = self._node
+        edges_by_peer = self._edges_by_peer
+        owner_column = self._edge_owner
+        kind_column = self._edge_kind
+        peer_column = self._edge_peer
+        rule_column = self._edge_rule
+        label_column = self._edge_label
+
+        node = node_of(sg['GroupId'])
+        self._group_of_node[node] = len(self._group_nodes)
+        self._group_nodes.append(node)
+        self._group_names.append(intern(sg['GroupName']))
+        self._group_descriptions.append(intern(sg.get('Description', '')))
+        self._group_tags.append(sg.get('Tags', []))
+        self._group_edge_start.append(len(owner_column))
+
+        last_rule = None
+        rule_value = 0
+        for direction, peer_type, peer_id, name, protocol, from_port, to_port, description in iter_rule_edges(
+            sg, self.prefix_lists
+        ):
+            rule = (protocol, from_port, to_port)
+            if rule != last_rule:
+                last_rule = rule
+                rule_value = intern(rule)
+            if peer_type == SECURITY_GROUP:
+                peer = node_of(peer_id)
+                peer_edges = edges_by_peer.get(peer)
+                if peer_edges is None:
+                    peer_edges = edges_by_peer[peer] = array('I')
+                peer_edges.append(len(owner_column))
+            else:
+                peer = intern(peer_id)
+            owner_column.append(node)
+            kind_column.append(direction | peer_type << 1)
+            peer_column.append(peer)
+            rule_column.append(rule_value)
+            label_column.append(intern((name, description)))
+
+    @property
+    def node_count(self) -> int:
+        """Number of security group nodes (analyzed and referenced)"""
+        return len(self._nodes)
+
+    @property
+    def edge_count(self) -> int:
+        """Number of edges"""
+        return len(self._edge_owner)
+
+    def _group_edge_range(self, group: int) -> range:
+        start = self._group_edge_start[group]
+        if group + 1 < len(self._group_edge_start):
+            return range(start, self._group_edge_start[group + 1])
+        return range(start, len(self._edge_owner))
+
+    def security_group_ids(self) -> List[str]:
+        """
+        Get the IDs of the analyzed security groups in input order.
+
+        Returns:
+            List of security group IDs
+        """
+        return [self._nodes[node] for node in self._group_nodes]
+
+    def has_security_group(self, sg_id: str) -> bool:
+        """
+        Check whether a security group was analyzed (not only referenced).
+
+        Args:
+            sg_id: Security group ID
+
+        Returns:
+            True if the group's rules are part of the graph
+        """
+        return self._node_index.get(sg_id, -1) in self._group_of_node
+
+    def node_name(self, sg_id: str) -> str:
+        """
+        Get the name of a security group node.
+
+        Args:
+            sg_id: Security group ID
+
+        Returns:
+            Group name, or the ID for groups referenced but not analyzed
+        """
+        group = self._group_of_node.get(self._node_index.get(sg_id, -1))
+        return sg_id if group is None else self._values[self._group_names[group]]
+
+    def edge_owner(self, edge: int) -> str:
+        """
+        Get the ID of the security group whose rule defines an edge.
+
+        Args:
+            edge: Edge ID
+
+        Returns:
+            Security group ID
+        """
+        return self._nodes[self._edge_owner[edge]]
+
+    def edge_direction(self, edge: int) -> str:
+        """
+        Get the direction of an edge relative to its owning group.
+
+        Args:
+            edge: Edge ID
+
+        Returns:
+            'inbound' or 'outbound'
+        """
+        return DIRECTIONS[self._edge_kind[edge] & 1]
+
+    def edge_peer(self, edge: int) -> Tuple[str, str]:
+        """
+        Get the peer of an edge.
+
+        Args:
+            edge: Edge ID
+
+        Returns:
+            (peer type, peer ID) - a security group ID or a CIDR
+        """
+        peer_type = self._edge_kind[edge] >> 1
+        if peer_type == SECURITY_GROUP:
+            return PEER_TYPES[peer_type], self._nodes[self._edge_peer[edge]]
+        return PEER_TYPES[peer_type], self._values[self._edge_peer[edge]]
+
+    def edge_rule(self, edge: int) -> Tuple[Any, Any, Any]:
+        """
+        Get the protocol and port range of an edge.
+
+        Args:
+            edge: Edge ID
+
+        Returns:
+            (protocol, from_port, to_port) as given by the EC2 API ('all' when absent)
+        """
+        return self._values[self._edge_rule[edge]]
+
+    def edge(self, edge: int) -> Dict[str, Any]:
+        """
+        Materialize an edge as a connection entry dict.
+
+        Args:
+            edge: Edge ID
+
+        Returns:
+            Connection entry ({'type', 'id', 'name', 'protocol', 'from_port', 'to_port', 'description'})
+        """
+        peer_type, peer_id = self.edge_peer(edge)
+        name, description = self._values[self._edge_label[edge]]
+        protocol, from_port, to_port = self.edge_rule(edge)
+        return {
+            'type': peer_type,
+            'id': peer_id,
+            'name': self.node_name(peer_id) if name is None else name,
+            'protocol': protocol,
+            'from_port': from_port,
+            'to_port': to_port,
+            'description': description
+        }
+
+    def edges_of(self, sg_id: str, direction: Optional[str] = None) -> List[int]:
+        """
+        Get the edges defined by a security group's rules.
+
+        Args:
+            sg_id: Security group ID
+            direction: Optional 'inbound' or 'outbound' filter
+
+        Returns:
+            Edge IDs in rule order
+        """
+        group = self._group_of_node.get(self._node_index.get(sg_id, -1))
+        if group is None:
+            return []
+        edges = self._group_edge_range(group)
+        if direction is None:
+            return list(edges)
+        wanted = DIRECTIONS.index(direction)
+        return [edge for edge in edges if self._edge_kind[edge] & 1 == wanted]
+
+    def edges_referencing(self, sg_id: str, direction: Optional[str] = None) -> List[int]:
+        """
+        Get the edges of security group rules that name a security group as peer.
+
+        Args:
+            sg_id: Security group ID
+            direction: Optional 'inbound' or 'outbound' filter (relative to the owning group)
+
+        Returns:
+            Edge IDs in input order
+        """
+        edges = self._edges_by_peer.get(self._node_index.get(sg_id, -1), ())
+        if direction is None:
+            return list(edges)
+        wanted = DIRECTIONS.index(direction)
+        return [edge for edge in edges if self._edge_kind[edge] & 1 == wanted]
+
+    def _node_names(self, known_names: Optional[Dict[str, str]] = None) -> List[str]:
+        """Resolve every node's display name once (group name, or ID if not analyzed)"""
+        if known_names is not None:
+            return [known_names.get(sg_id, sg_id) for sg_id in self._nodes]
+        names = list(self._nodes)
+        for node, group in self._group_of_node.items():
+            names[node] = self._values[self._group_names[group]]
+        return names
+
+    def _group_dict(self, group: int, names: List[str]) -> Dict[str, Any]:
+        values = self._values
+        nodes = self._nodes
+        inbound: List[Dict[str, Any]] = []
+        outbound: List[Dict[str, Any]] = []
+        edges = self._group_edge_range(group)
+        start, stop = edges.start, edges.stop
+        for kind, peer, rule, label in zip(
+            self._edge_kind[start:stop],
+            self._edge_peer[start:stop],
+            self._edge_rule[start:stop],
+            self._edge_label[start:stop]
+        ):
+            protocol, from_port, to_port = values[rule]
+            name, description = values[label]
+            if kind >> 1 == SECURITY_GROUP:
+                entry = {'type': 'security_group', 'id': nodes[peer], 'name': names[peer]}
+            else:
+                entry = {'type': 'cidr', 'id': values[peer], 'name': name}
+            entry['protocol'] = protocol
+            entry['from_port'] = from_port
+            entry['to_port'] = to_port
+            entry['description'] = description
+            (outbound if kind & 1 else inbound).append(entry)
+        return {
+            'name': values[self._group_names[group]],
+            'description': values[self._group_descriptions[group]],
+            'tags': self._group_tags[group],
+            'inbound': inbound,
+            'outbound': outbound
+        }
+
+    def to_dict(self, known_names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Convert the graph to the connection map returned by analyze_security_group_connections.
+
+        Args:
+            known_names: Names of every security group of the VPC, used instead of
+                the names of the groups in this graph when it holds only part of
+                the VPC (groups missing from it are named by their ID)
+
+        Returns:
+            Dictionary with VPC info and security group connections
+        """
+        names = self._node_names(known_names)
+        security_groups: Dict[str, Any] = {}
+        for group, node in enumerate(self._group_nodes):
+            security_groups[self._nodes[node]] = self._group_dict(group, names)
+        return {
+            'vpc': self.vpc,
+            'security_groups': security_groups
+        }
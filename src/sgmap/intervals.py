@@ -0,0 +1,211 @@
+"""
+Protocol and port range helpers for sgmap
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ALL_PROTOCOLS = '-1'
+MAX_PORT = 65535
+
+# Protocols whose FromPort/ToPort are an ICMP type and code rather than a port range
+ICMP_PROTOCOLS = ('icmp', 'icmpv6')
+
+_PROTOCOL_NAMES = {
+    '6': 'tcp',
+    '17': 'udp',
+    '1': 'icmp',
+    '58': 'icmpv6',
+    'all': ALL_PROTOCOLS
+}
+
+
+def canonical_protocol(protocol: Any) -> str:
+    """
+    Canonicalize an IpProtocol value.
+
+    Args:
+        protocol: Protocol name or number ('tcp', '6', 6, '-1', 'all', ...)
+
+    Returns:
+        Lower-case protocol name, or '-1' for all protocols
+    """
+    name = str(protocol).lower()
+    return _PROTOCOL_NAMES.get(name, name)
+
+
+def port_range(protocol: Any, from_port: Any, to_port: Any) -> Tuple[int, int]:
+    """
+    Get the inclusive port range covered by a rule.
+
+    Rules for all protocols, rules without ports and -1 ports (e.g. all ICMP
+    types) cover the full range. For ICMP, FromPort is the type and ToPort the
+    code: a rule covers its type only (whatever its code), as a single "port".
+
+    Args:
+        protocol: Rule protocol
+        from_port: Rule FromPort ('all' when absent)
+        to_port: Rule ToPort ('all' when absent)
+
+    Returns:
+        (start, end) tuple
+    """
+    protocol = canonical_protocol(protocol)
+    if protocol == ALL_PROTOCOLS or from_port == 'all' or from_port == -1:
+        return 0, MAX_PORT
+    if protocol in ICMP_PROTOCOLS:
+        return int(from_port), int(from_port)
+    if to_port == 'all' or to_port == -1:
+        return int(from_port), MAX_PORT
+    return int(from_port), int(to_port)
+
+
+def parse_port_spec(spec: str) -> Tuple[str, Optional[int]]:
+    """
+    Parse a PORT[/PROTOCOL] specification such as '5432/tcp', '53/udp', '443' or 'all'.
+
+    Args:
+        spec: Port specification (protocol defaults to tcp)
+
+    Returns:
+        (canonical protocol, port) - port is None for 'all' or a bare protocol like 'icmp'
+    """
+    port_part, _, protocol_part = spec.strip().partition('/')
+    if not protocol_part and not port_part.isdigit():
+        # A bare protocol ('icmp', '-1') or 'all'
+        return canonical_protocol(port_part), None
+    protocol = canonical_protocol(protocol_part or 'tcp')
+    if port_part in ('', 'all', '*'):
+        return protocol, None
+    if not port_part.isdigit() or int(port_part) > MAX_PORT:
+        raise ValueError(f"Invalid port specification: {spec}")
+    return protocol, int(port_part)
+
+
+def merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge overlapping or adjacent inclusive ranges.
+
+    Args:
+        ranges: (start, end) tuples
+
+    Returns:
+        Sorted, non-overlapping (start, end) tuples
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class PortIntervalIndex:
+    """
+    Per-protocol sorted, merged port intervals with O(log n) membership tests.
+    """
+
+    __slots__ = ('_pending', '_starts', '_ends')
+
+    def __init__(self):
+        self._pending: Dict[str, List[Tuple[int, int]]] = {}
+        self._starts: Dict[str, List[int]] = {}
+        self._ends: Dict[str, List[int]] = {}
+
+    def add(self, protocol: Any, from_port: Any, to_port: Any) -> None:
+        """
+        Add a rule's protocol and port range.
+
+        Args:
+            protocol: Rule protocol
+            from_port: Rule FromPort
+            to_port: Rule ToPort
+        """
+        protocol = canonical_protocol(protocol)
+        self._pending.setdefault(protocol, []).append(port_range(protocol, from_port, to_port))
+
+    def _build(self) -> None:
+        for protocol, ranges in self._pending.items():
+            ranges.extend(zip(self._starts.get(protocol, []), self._ends.get(protocol, [])))
+            merged = merge_ranges(ranges)
+            self._starts[protocol] = [start for start, _ in merged]
+            self._ends[protocol] = [end for _, end in merged]
+        self._pending = {}
+
+    def allows(self, protocol: str, port: Optional[int] = None) -> bool:
+        """
+        Check whether a protocol/port is covered.
+
+        Args:
+            protocol: Canonical protocol to check
+            port: Port to check (None means any port of the protocol)
+
+        Returns:
+            True if a rule for the protocol (or for all protocols) covers the port
+        """
+        if self._pending:
+            self._build()
+        if ALL_PROTOCOLS in self._starts:
+            return True
+        starts = self._starts.get(protocol)
+        if starts is None:
+            return False
+        if port is None:
+            return True
+        index = bisect_right(starts, port) - 1
+        return index >= 0 and port <= self._ends[protocol][index]
+
+    def ranges(self) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Get the merged ranges per protocol.
+
+        Returns:
+            Dictionary of protocol to sorted (start, end) tuples
+        """
+        if self._pending:
+            self._build()
+        return {protocol: list(zip(starts, self._ends[protocol])) for protocol, starts in self._starts.items()}
+
+    def intersects(self, other: 'PortIntervalIndex', protocol: Optional[str] = None) -> bool:
+        """
+        Check whether two indexes cover at least one common protocol and port.
+
+        Args:
+            other: Index to compare with
+            protocol: Only compare this canonical protocol (None for any protocol)
+
+        Returns:
+            True if some protocol/port is allowed by both
+        """
+        for index in (self, other):
+            if index._pending:
+                index._build()
+        mine, theirs = self._starts, other._starts
+        if protocol is not None:
+            protocols: Iterable[str] = (protocol,)
+        elif ALL_PROTOCOLS in mine:
+            return bool(theirs)
+        elif ALL_PROTOCOLS in theirs:
+            return bool(mine)
+        else:
+            protocols = mine.keys() & theirs.keys()
+        for name in protocols:
+            a_starts, a_ends = self._covered(name)
+            b_starts, b_ends = other._covered(name)
+            i = j = 0
+            while i < len(a_starts) and j < len(b_starts):
+                if a_starts[i] <= b_ends[j] and b_starts[j] <= a_ends[i]:
+                    return True
+                if a_ends[i] < b_ends[j]:
+                    i += 1
+                else:
+                    j += 1
+        return False
+
+    def _covered(self, protocol: str) -> Tuple[List[int], List[int]]:
+        """Starts and ends of a protocol's ranges, counting rules for all protocols as every port"""
+        if ALL_PROTOCOLS in self._starts:
+            return [0], [MAX_PORT]
+        return self._starts.get(protocol, []), self._ends.get(protocol, [])
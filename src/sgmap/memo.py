@@ -0,0 +1,174 @@
+"""
+Memoized rendering of connection maps
+
+RenderCache keeps the most recently rendered mermaid and JSON documents in a
+bounded LRU keyed by a hash of the connection map, the output format and the
+rendering options, so a consumer that renders the same map repeatedly only
+pays for hashing it. Callers that already version their data (a snapshot ID,
+an ETag) can pass that as the key and skip hashing altogether.
+"""
+
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sgmap.core import generate_json_output, generate_mermaid_diagram
+
+DEFAULT_MAXSIZE = 32
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def content_key(connections: Dict[str, Any]) -> str:
+    """
+    Hash a connection map.
+
+    The map is pickled rather than serialized as JSON because pickling is
+    several times faster. Any change to the data, including the order of
+    groups and edges, changes the key. Equal maps whose objects are shared
+    differently (e.g. one analyzed and one loaded from JSON) may hash
+    differently, which only costs a cache miss.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+
+    Returns:
+        Hex digest of the map
+    """
+    data = pickle.dumps(connections, protocol=pickle.HIGHEST_PROTOCOL)
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class RenderCache:
+    """
+    Bounded LRU of rendered documents. Safe to share between threads.
+
+    Example:
+        >>> cache = RenderCache(maxsize=16)
+        >>> mermaid = cache.mermaid(connections, include_vpc=True)
+        >>> cache.cache_info()
+        CacheInfo(hits=0, misses=1, maxsize=16, currsize=1)
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        """
+        Args:
+            maxsize: Maximum number of documents kept
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[Any, ...], str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _render(self, cache_key: Tuple[Any, ...], render: Callable[[], str]) -> str:
+        with self._lock:
+            document = self._entries.get(cache_key)
+            if document is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        # Rendered outside the lock so that other keys are not blocked
+        document = render()
+        with self._lock:
+            self._entries[cache_key] = document
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return document
+
+    def mermaid(
+        self,
+        connections: Dict[str, Any],
+        include_vpc: bool = False,
+        compact: bool = False,
+        key: Optional[Hashable] = None
+    ) -> str:
+        """
+        Get the mermaid diagram of a connection map, rendering it on a miss.
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+            include_vpc: Whether to include VPC in the diagram
+            compact: Merge parallel edges and declare each CIDR once
+            key: Version of the map chosen by the caller (default: content_key(connections))
+
+        Returns:
+            Mermaid diagram as a string, as generate_mermaid_diagram returns it
+        """
+        cache_key = ('mermaid', include_vpc, compact, content_key(connections) if key is None else key)
+        return self._render(cache_key, lambda: generate_mermaid_diagram(connections, include_vpc, compact))
+
+    def json(self, connections: Dict[str, Any], key: Optional[Hashable] = None) -> str:
+        """
+        Get the JSON output of a connection map, rendering it on a miss.
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+            key: Version of the map chosen by the caller (default: content_key(connections))
+
+        Returns:
+            JSON string, as generate_json_output returns it
+        """
+        cache_key = ('json', content_key(connections) if key is None else key)
+        return self._render(cache_key, lambda: generate_json_output(connections))
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Get the hit and miss counts, like functools.lru_cache.
+
+        Returns:
+            CacheInfo(hits, misses, maxsize, currsize)
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self) -> None:
+        """Remove every document and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Cache used by the module-level functions
+default_render_cache = RenderCache()
+
+
+def cached_mermaid_diagram(
+    connections: Dict[str, Any],
+    include_vpc: bool = False,
+    compact: bool = False,
+    key: Optional[Hashable] = None
+) -> str:
+    """
+    Memoized generate_mermaid_diagram using the default RenderCache.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        include_vpc: Whether to include VPC in the diagram
+        compact: Merge parallel edges and declare each CIDR once
+        key: Version of the map chosen by the caller (default: content_key(connections))
+
+    Returns:
+        Mermaid diagram as a string
+    """
+    return default_render_cache.mermaid(connections, include_vpc, compact, key=key)
+
+
+def cached_json_output(connections: Dict[str, Any], key: Optional[Hashable] = None) -> str:
+    """
+    Memoized generate_json_output using the default RenderCache.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        key: Version of the map chosen by the caller (default: content_key(connections))
+
+    Returns:
+        JSON string
+    """
+    return default_render_cache.json(connections, key=key)
@@ -0,0 +1,109 @@
+"""
+Rule normalization for sgmap connection maps
+
+AWS lets the same peer appear in several IpPermissions entries of a group,
+with protocols spelled differently ('tcp' and '6') and port ranges that
+overlap or touch. normalize_connections collapses the connections of each
+(group, direction, peer, protocol) into the fewest equivalent entries
+before rendering:
+
+- protocols are canonicalized ('6' -> 'tcp', 'all' -> '-1');
+- a rule for all protocols makes every other rule to the same peer redundant;
+- TCP and UDP port ranges are merged when they overlap or are adjacent;
+- other protocols (ICMP types, ESP, ...) are deduplicated, and a rule for
+  all ICMP types makes the other types redundant.
+
+A merged entry keeps the name and description of the first rule it covers.
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, List, Tuple
+
+from sgmap.intervals import ALL_PROTOCOLS, canonical_protocol, merge_ranges, port_range
+
+# Protocols whose from_port/to_port are port ranges; for the others they are types and codes
+_PORT_PROTOCOLS = ('tcp', 'udp')
+
+
+def _merge_port_ranges(protocol: str, conns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge the TCP or UDP connections to one peer into one entry per disjoint port range"""
+    ranges = [port_range(protocol, conn['from_port'], conn['to_port']) for conn in conns]
+    merged = merge_ranges(ranges)
+    starts = [start for start, _ in merged]
+
+    # The first connection (in rule order) falling in each merged range names it
+    firsts: Dict[int, Dict[str, Any]] = {}
+    for conn, (start, _) in zip(conns, ranges):
+        firsts.setdefault(bisect_right(starts, start) - 1, conn)
+
+    entries = []
+    for index, (start, end) in enumerate(merged):
+        first = firsts[index]
+        entry = dict(first, protocol=protocol)
+        if port_range(protocol, first['from_port'], first['to_port']) != (start, end):
+            entry['from_port'], entry['to_port'] = start, end
+        entries.append(entry)
+    return entries
+
+
+def _dedupe_types(protocol: str, conns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deduplicate connections of a protocol without port ranges (ICMP types, ESP, ...)"""
+    for conn in conns:
+        if conn['from_port'] in ('all', -1):
+            return [dict(conn, protocol=protocol)]
+    seen: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for conn in conns:
+        seen.setdefault((conn['from_port'], conn['to_port']), dict(conn, protocol=protocol))
+    return list(seen.values())
+
+
+def normalize_entries(conns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normalize the connections of one group in one direction.
+
+    Args:
+        conns: Connection entries ({'type', 'id', 'name', 'protocol', 'from_port', 'to_port', 'description'})
+
+    Returns:
+        Equivalent connection entries with canonical protocols, in the order
+        each peer and protocol first appears
+    """
+    # (peer type, peer ID) -> canonical protocol -> connections, in first-seen order
+    peers: Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]] = {}
+    for conn in conns:
+        protocols = peers.setdefault((conn['type'], conn['id']), {})
+        protocols.setdefault(canonical_protocol(conn['protocol']), []).append(conn)
+
+    entries: List[Dict[str, Any]] = []
+    for protocols in peers.values():
+        if ALL_PROTOCOLS in protocols:
+            entries.append(dict(protocols[ALL_PROTOCOLS][0], protocol=ALL_PROTOCOLS))
+            continue
+        for protocol, same in protocols.items():
+            if protocol in _PORT_PROTOCOLS:
+                entries.extend(_merge_port_ranges(protocol, same))
+            else:
+                entries.extend(_dedupe_types(protocol, same))
+    return entries
+
+
+def normalize_connections(connections: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Normalize every group of a connection map.
+
+    The input is not modified; group metadata is shared with the result.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+
+    Returns:
+        (normalized connection map, number of edges collapsed)
+    """
+    collapsed = 0
+    security_groups: Dict[str, Any] = {}
+    for sg_id, sg_data in connections['security_groups'].items():
+        inbound = normalize_entries(sg_data['inbound'])
+        outbound = normalize_entries(sg_data['outbound'])
+        collapsed += len(sg_data['inbound']) + len(sg_data['outbound']) - len(inbound) - len(outbound)
+        security_groups[sg_id] = dict(sg_data, inbound=inbound, outbound=outbound)
+    return {**connections, 'security_groups': security_groups}, collapsed
@@ -0,0 +1,219 @@
+"""
+Offline input for sgmap: raw `aws ec2 describe-*` JSON files
+
+Large dumps are parsed incrementally so that only one security group at a time
+has to be held in memory while it is analyzed.
+"""
+
+import itertools
+import json
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple, Any
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonStream:
+    """
+    Incremental reader over a JSON text file, decoding one value at a time.
+    """
+
+    def __init__(self, fp: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Read more text into the buffer; return False at end of file"""
+        if self._eof:
+            return False
+        chunk = self._fp.read(max(self._chunk_size, min_size))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ('' at end of file)"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        """Consume the given structural character"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON: expected '{char}' but found '{found or 'end of file'}'")
+        self._pos += 1
+
+    def decode(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number (or literal) ending exactly at the buffer edge may be truncated
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Grow geometrically so a value spanning many chunks is re-scanned O(log n) times
+            if not self._fill(min_size=len(self._buf) - self._pos):
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                self._pos = end
+                return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """Decode the elements of the next JSON array one at a time"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == ',':
+                self._pos += 1
+            else:
+                self.expect(']')
+                return
+
+
+def iter_json_array_items(fp: IO[str], keys: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the elements of arrays stored under top-level keys of a JSON object.
+
+    Other top-level arrays are skipped element by element, so memory use is bounded
+    by the largest single element rather than by the file size.
+
+    Args:
+        fp: Text file object containing a JSON object
+        keys: Top-level keys whose array elements should be yielded
+        chunk_size: Number of characters read at a time
+
+    Yields:
+        (key, element) tuples in file order
+    """
+    keys = set(keys)
+    stream = _JsonStream(fp, chunk_size)
+
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+        if stream.peek() == '[':
+            for item in stream.iter_array():
+                if key in keys:
+                    yield key, item
+        else:
+            stream.decode()
+        if stream.peek() == ',':
+            stream.expect(',')
+        else:
+            stream.expect('}')
+            return
+
+
+def _first_key(path: str) -> Optional[str]:
+    """
+    Get the first top-level key of a JSON object file without reading the rest.
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        First key, or None for an empty object
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size=4096)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return None
+        return stream.decode()
+
+
+def _iter_file_security_groups(paths: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the SecurityGroups of describe-security-groups output files.
+
+    Args:
+        paths: Paths to describe-security-groups JSON files
+
+    Yields:
+        Security group dictionaries
+    """
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for _, sg in iter_json_array_items(f, ('SecurityGroups',)):
+                yield sg
+
+
+def load_vpc_and_sgs_from_files(
+    paths: Sequence[str],
+    vpc_id: Optional[str] = None,
+    security_group_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Load VPC info and security groups from saved `aws ec2 describe-vpcs` and
+    `aws ec2 describe-security-groups` output files.
+
+    Security groups are returned as a generator that parses the files lazily.
+    Without a describe-vpcs file, the VPC info is reduced to its ID.
+
+    Args:
+        paths: Paths to describe-vpcs and/or describe-security-groups JSON files
+        vpc_id: VPC ID to select (default: the only VPC, or the VPC of the first group)
+        security_group_id: Optional security group ID to filter
+
+    Returns:
+        Dictionary with VPC info and security groups, like get_security_groups
+    """
+    vpcs: List[Dict[str, Any]] = []
+    sg_paths: List[str] = []
+    for path in paths:
+        if _first_key(path) == 'Vpcs':
+            with open(path, 'r', encoding='utf-8') as f:
+                vpcs.extend(vpc for _, vpc in iter_json_array_items(f, ('Vpcs',)))
+        else:
+            sg_paths.append(path)
+
+    security_groups: Iterator[Dict[str, Any]] = _iter_file_security_groups(sg_paths)
+
+    if vpc_id is None:
+        if len(vpcs) > 1:
+            raise ValueError("Multiple VPCs found in input files; specify a VPC ID")
+        if vpcs:
+            vpc_id = vpcs[0]['VpcId']
+        else:
+            first_sg = next(security_groups, None)
+            if first_sg is None:
+                return {'vpc': None, 'security_groups': []}
+            vpc_id = first_sg.get('VpcId')
+            security_groups = itertools.chain([first_sg], security_groups)
+
+    if vpcs:
+        vpc_info = next((vpc for vpc in vpcs if vpc['VpcId'] == vpc_id), None)
+    else:
+        vpc_info = {'VpcId': vpc_id}
+
+    return {
+        'vpc': vpc_info,
+        'security_groups': (
+            sg for sg in security_groups
+            if sg.get('VpcId', vpc_id) == vpc_id
+            and (not security_group_id or sg['GroupId'] == security_group_id)
+        )
+    }
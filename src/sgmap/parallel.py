@@ -0,0 +1,134 @@
+"""
+Multiprocess analysis of very large security group sets
+
+The security groups are split into contiguous shards that are analyzed by a
+process pool. Every worker receives the map of security group ID to name (and
+the resolved managed prefix lists) once, when it starts, so peers defined in
+another shard are named exactly as in the serial analysis; the shard results
+are merged in input order, which makes the connection map identical to
+analyze_security_group_connections.
+
+multiprocessing is imported on first use, like boto3 in sgmap.aws, so that
+importing sgmap does not pay for it.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Sequence, Tuple, Union, Any
+
+from sgmap.core import analyze_security_group_connections, summarize_vpc
+from sgmap.graph import ConnectionGraph, resolve_prefix_lists
+
+# Shards smaller than this cost more to ship between processes than to analyze
+MIN_SHARD_SIZE = 500
+
+# Number of shards per worker, so that uneven shards do not leave workers idle
+SHARDS_PER_WORKER = 4
+
+# Worker state set by _init_worker: the name map, the resolved prefix lists and,
+# with the fork start method, the security groups themselves (inherited instead of pickled)
+_worker_state: Dict[str, Any] = {}
+
+Shard = Union[range, List[Dict[str, Any]]]
+
+
+def _init_worker(
+    names: Dict[str, str],
+    prefix_lists: Optional[Dict[str, Optional[List[str]]]],
+    security_groups: Optional[Sequence[Dict[str, Any]]]
+) -> None:
+    _worker_state['names'] = names
+    _worker_state['prefix_lists'] = prefix_lists
+    _worker_state['security_groups'] = security_groups
+
+
+def _analyze_shard(shard: Shard) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Analyze one shard of security groups in a worker process.
+
+    Args:
+        shard: Index range into the inherited security groups, or the groups themselves
+
+    Returns:
+        (security group ID, connection entry) pairs in input order
+    """
+    if isinstance(shard, range):
+        shard = _worker_state['security_groups'][shard.start:shard.stop]
+    graph = ConnectionGraph({}, _worker_state['prefix_lists'])
+    for sg in shard:
+        graph.add_security_group(sg)
+    return list(graph.to_dict(_worker_state['names'])['security_groups'].items())
+
+
+def analyze_security_group_connections_parallel(
+    vpc_and_sgs: Dict[str, Any],
+    workers: Optional[int] = None,
+    shard_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Analyze security group connections with a pool of worker processes.
+
+    Falls back to the serial analysis when a single worker or a single shard
+    would do the work. Where the fork start method is available the workers
+    inherit the security groups and only index ranges are sent to them;
+    otherwise each shard is pickled to its worker. Managed prefix lists are
+    resolved once in the parent process, so workers never call AWS.
+
+    Args:
+        vpc_and_sgs: Dictionary with VPC info, security groups and optional prefix lists
+        workers: Number of worker processes (default: CPU count)
+        shard_size: Security groups per shard (default: spread over the
+            workers, at least MIN_SHARD_SIZE)
+
+    Returns:
+        Dictionary with VPC info and security group connections, identical to
+        analyze_security_group_connections
+    """
+    security_groups = list(vpc_and_sgs['security_groups'])
+    workers = workers or os.cpu_count() or 1
+    if shard_size is None:
+        shard_size = max(MIN_SHARD_SIZE, math.ceil(len(security_groups) / (workers * SHARDS_PER_WORKER)))
+
+    prefix_lists = vpc_and_sgs.get('prefix_lists')
+    if prefix_lists is not None:
+        prefix_lists = resolve_prefix_lists(prefix_lists, security_groups)
+
+    if workers <= 1 or len(security_groups) <= shard_size:
+        return analyze_security_group_connections({
+            'vpc': vpc_and_sgs['vpc'],
+            'security_groups': security_groups,
+            'prefix_lists': prefix_lists
+        })
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # If an ID appears more than once, use the last group's name, as in serial analysis
+    names = {sg['GroupId']: sg['GroupName'] for sg in security_groups}
+    bounds = [range(start, min(start + shard_size, len(security_groups)))
+              for start in range(0, len(security_groups), shard_size)]
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        initargs: Tuple[Any, ...] = (names, prefix_lists, security_groups)
+        shards: List[Shard] = list(bounds)
+    else:
+        context = multiprocessing.get_context()
+        initargs = (names, prefix_lists, None)
+        shards = [security_groups[bound.start:bound.stop] for bound in bounds]
+
+    connections: Dict[str, Any] = {}
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(shards)),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=initargs
+    ) as pool:
+        for entries in pool.map(_analyze_shard, shards):
+            for sg_id, entry in entries:
+                connections[sg_id] = entry
+
+    return {
+        'vpc': summarize_vpc(vpc_and_sgs['vpc']),
+        'security_groups': connections
+    }
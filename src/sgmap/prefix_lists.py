@@ -0,0 +1,172 @@
+"""
+Memoized resolution of managed prefix lists for sgmap
+
+Security group rules may reference managed prefix lists (PrefixListIds)
+instead of CIDRs, and the same few lists (S3, CloudFront, corporate ranges)
+tend to be referenced by many groups. PrefixListResolver fetches the entries
+of each list with get_managed_prefix_list_entries once, shares the result
+between every group and thread that asks for it, and can persist it in a
+SnapshotCache so that later runs skip the call until the cache's max_age.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+from sgmap.aws import configured_region, ec2_client, error_code
+from sgmap.cache import SnapshotCache, prefix_list_key
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class PrefixListResolver:
+    """
+    Resolve prefix list IDs to the CIDRs of their entries.
+
+    Each prefix list is fetched at most once per ttl seconds (once for the
+    lifetime of the resolver by default), however many security groups
+    reference it and however many threads ask for it concurrently. Lists
+    that cannot be fetched (unknown ID, access denied) resolve to None.
+
+    Example:
+        >>> resolver = PrefixListResolver(region='ap-northeast-1')
+        >>> resolver.resolve(['pl-61a54008', 'pl-78a54011'])
+        {'pl-61a54008': ['52.95.150.0/24', ...], 'pl-78a54011': [...]}
+    """
+
+    def __init__(
+        self,
+        ec2: Optional[Any] = None,
+        region: Optional[str] = None,
+        cache: Optional[SnapshotCache] = None,
+        ttl: Optional[float] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS
+    ):
+        """
+        Args:
+            ec2: Optional EC2 client to reuse (default: created on first fetch)
+            region: Region name (default: the client's or configured region)
+            cache: Optional snapshot cache to persist prefix list entries in
+            ttl: Seconds an in-memory result stays valid (default: forever)
+            max_workers: Maximum number of concurrent fetches in resolve()
+        """
+        self.region = region
+        self.cache = cache
+        self.ttl = ttl
+        self.max_workers = max_workers
+        # Number of get_managed_prefix_list_entries fetches (not pages)
+        self.calls = 0
+        self._ec2 = ec2
+        self._entries: Dict[str, Tuple[float, Future]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ec2(self) -> Any:
+        """EC2 client, created on first use"""
+        with self._lock:
+            if self._ec2 is None:
+                self._ec2 = ec2_client(self.region)
+            return self._ec2
+
+    def _claim(self, prefix_list_id: str) -> Tuple[Future, bool]:
+        """Get the future of a prefix list, and whether the caller must fill it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(prefix_list_id)
+            if entry is not None and (self.ttl is None or now - entry[0] <= self.ttl):
+                return entry[1], False
+            future: Future = Future()
+            self._entries[prefix_list_id] = (now, future)
+            return future, True
+
+    def _fill(self, prefix_list_id: str, future: Future) -> None:
+        try:
+            future.set_result(self._load(prefix_list_id))
+        except BaseException as e:
+            # Do not remember failures such as network errors; the next caller retries
+            with self._lock:
+                if self._entries.get(prefix_list_id, (0, None))[1] is future:
+                    del self._entries[prefix_list_id]
+            future.set_exception(e)
+
+    def _load(self, prefix_list_id: str) -> Optional[List[str]]:
+        """Read a prefix list from the persistent cache, or fetch and store it"""
+        if self.cache is None:
+            return self._fetch(prefix_list_id)
+
+        region = self.region or (self._ec2.meta.region_name if self._ec2 is not None else configured_region() or 'default')
+        key = prefix_list_key(region, prefix_list_id)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached['cidrs']
+        cidrs = self._fetch(prefix_list_id)
+        # Only cache resolved lists so that a missing permission is not remembered
+        if cidrs is not None:
+            self.cache.put(key, {'cidrs': cidrs})
+        return cidrs
+
+    def _fetch(self, prefix_list_id: str) -> Optional[List[str]]:
+        """Fetch every entry of a prefix list, or None if it cannot be read"""
+        ec2 = self.ec2
+        with self._lock:
+            self.calls += 1
+        try:
+            paginator = ec2.get_paginator('get_managed_prefix_list_entries')
+            return [
+                entry['Cidr']
+                for page in paginator.paginate(PrefixListId=prefix_list_id)
+                for entry in page.get('Entries', [])
+            ]
+        except Exception as e:
+            # botocore ClientError (InvalidPrefixListID.NotFound, UnauthorizedOperation, ...)
+            if error_code(e) is None:
+                raise
+            return None
+
+    def get(self, prefix_list_id: str, default: Any = None) -> Optional[List[str]]:
+        """
+        Resolve one prefix list, fetching it unless already known.
+
+        Args:
+            prefix_list_id: The prefix list ID
+            default: Ignored; present so the resolver can stand in for a mapping
+
+        Returns:
+            CIDRs of the prefix list's entries, or None if it cannot be read
+        """
+        future, owner = self._claim(prefix_list_id)
+        if owner:
+            self._fill(prefix_list_id, future)
+        return future.result()
+
+    def resolve(self, prefix_list_ids: Iterable[str]) -> Dict[str, Optional[List[str]]]:
+        """
+        Resolve several prefix lists, fetching the unknown ones concurrently.
+
+        Args:
+            prefix_list_ids: Prefix list IDs (duplicates are fetched once)
+
+        Returns:
+            Dictionary of prefix list ID to CIDRs (None when it cannot be read)
+        """
+        futures: Dict[str, Future] = {}
+        claimed: List[Tuple[str, Future]] = []
+        for prefix_list_id in prefix_list_ids:
+            if prefix_list_id in futures:
+                continue
+            future, owner = self._claim(prefix_list_id)
+            futures[prefix_list_id] = future
+            if owner:
+                claimed.append((prefix_list_id, future))
+
+        workers = min(self.max_workers, len(claimed))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in executor.map(lambda item: self._fill(*item), claimed):
+                    pass
+        else:
+            for prefix_list_id, future in claimed:
+                self._fill(prefix_list_id, future)
+
+        return {prefix_list_id: future.result() for prefix_list_id, future in futures.items()}
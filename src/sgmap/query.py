@@ -0,0 +1,288 @@
+"""
+Reachability queries over analyzed security group connections
+"""
+
+from collections import deque
+from typing import Any, Dict, List, Optional, Set
+
+from sgmap.cidr_index import parse_network
+from sgmap.graph import ConnectionGraph
+from sgmap.intervals import PortIntervalIndex, canonical_protocol
+
+_WIDTHS = {4: 32, 6: 128}
+
+
+class ReachabilityIndex:
+    """
+    Index answering "can security group A talk to B on port P?".
+
+    Traffic from A to B is allowed when an egress rule of A references B and
+    an ingress rule of B references A, both covering the protocol and port.
+    Egress to a CIDR covering the VPC (0.0.0.0/0 and ::/0 included, as in the
+    default egress rule of every group) counts as egress to every group. CIDR
+    ingress is not modeled, as it does not tell which groups it admits.
+    Port ranges are kept in per-pair interval indexes, so a direct check is a
+    couple of dict lookups and a binary search.
+    """
+
+    def __init__(self, vpc_cidr: Optional[str] = None):
+        """
+        Args:
+            vpc_cidr: CIDR of the VPC, so that egress to a CIDR containing it
+                counts as egress to every group (default: only /0 CIDRs do)
+        """
+        self._vpc_network = parse_network(vpc_cidr) if vpc_cidr else None
+        # source -> target -> ports allowed by the source's egress rules
+        self._egress: Dict[str, Dict[str, PortIntervalIndex]] = {}
+        # target -> source -> ports allowed by the target's ingress rules
+        self._ingress: Dict[str, Dict[str, PortIntervalIndex]] = {}
+        # source -> targets whose ingress rules reference it, in rule order
+        self._ingress_targets: Dict[str, Dict[str, None]] = {}
+        # source -> ports allowed by its egress rules to CIDRs covering the VPC
+        self._open_egress: Dict[str, PortIntervalIndex] = {}
+        self._covers_vpc: Dict[str, bool] = {}
+
+    def add_rule(self, owner: str, direction: str, peer: str, protocol: Any, from_port: Any, to_port: Any) -> None:
+        """
+        Add a security group rule that references another security group.
+
+        Args:
+            owner: ID of the group the rule belongs to
+            direction: 'inbound' or 'outbound'
+            peer: ID of the referenced group
+            protocol: Rule protocol
+            from_port: Rule FromPort
+            to_port: Rule ToPort
+        """
+        table = self._ingress if direction == 'inbound' else self._egress
+        peers = table.setdefault(owner, {})
+        index = peers.get(peer)
+        if index is None:
+            index = peers[peer] = PortIntervalIndex()
+            if direction == 'inbound':
+                self._ingress_targets.setdefault(peer, {})[owner] = None
+        index.add(protocol, from_port, to_port)
+
+    def add_cidr_rule(self, owner: str, direction: str, cidr: str, protocol: Any, from_port: Any, to_port: Any) -> None:
+        """
+        Add a security group rule whose peer is a CIDR.
+
+        Only egress to a CIDR covering the VPC is kept; other CIDR rules do not
+        reach any security group.
+
+        Args:
+            owner: ID of the group the rule belongs to
+            direction: 'inbound' or 'outbound'
+            cidr: Peer CIDR (IPv4, IPv6 or a prefix list entry)
+            protocol: Rule protocol
+            from_port: Rule FromPort
+            to_port: Rule ToPort
+        """
+        if direction != 'outbound' or not self._covers(cidr):
+            return
+        index = self._open_egress.get(owner)
+        if index is None:
+            index = self._open_egress[owner] = PortIntervalIndex()
+        index.add(protocol, from_port, to_port)
+
+    def _covers(self, cidr: str) -> bool:
+        """Whether a CIDR contains every address of the VPC"""
+        covers = self._covers_vpc.get(cidr)
+        if covers is None:
+            network = parse_network(cidr)
+            vpc = self._vpc_network
+            if network is None:
+                covers = False
+            elif network[2] == 0:
+                covers = True
+            elif vpc is None or vpc[0] != network[0] or vpc[2] < network[2]:
+                covers = False
+            else:
+                shift = _WIDTHS[vpc[0]] - network[2]
+                covers = vpc[1] >> shift == network[1] >> shift
+            self._covers_vpc[cidr] = covers
+        return covers
+
+    @classmethod
+    def from_graph(cls, graph: ConnectionGraph) -> 'ReachabilityIndex':
+        """
+        Build the index from a connection graph.
+
+        Args:
+            graph: ConnectionGraph of the security groups
+
+        Returns:
+            ReachabilityIndex
+        """
+        index = cls((graph.vpc or {}).get('cidr'))
+        for sg_id in graph.security_group_ids():
+            for edge in graph.edges_of(sg_id):
+                peer_type, peer = graph.edge_peer(edge)
+                if peer_type == 'security_group':
+                    index.add_rule(sg_id, graph.edge_direction(edge), peer, *graph.edge_rule(edge))
+                else:
+                    index.add_cidr_rule(sg_id, graph.edge_direction(edge), peer, *graph.edge_rule(edge))
+        return index
+
+    @classmethod
+    def from_connections(cls, connections: Dict[str, Any]) -> 'ReachabilityIndex':
+        """
+        Build the index from a connection map (e.g. saved --json output).
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+
+        Returns:
+            ReachabilityIndex
+        """
+        index = cls((connections.get('vpc') or {}).get('cidr'))
+        for sg_id, sg_data in connections['security_groups'].items():
+            for direction in ('inbound', 'outbound'):
+                for conn in sg_data[direction]:
+                    add = index.add_rule if conn['type'] == 'security_group' else index.add_cidr_rule
+                    add(sg_id, direction, conn['id'], conn['protocol'], conn['from_port'], conn['to_port'])
+        return index
+
+    def allows(
+        self,
+        source: str,
+        target: str,
+        protocol: Optional[str] = 'tcp',
+        port: Optional[int] = None
+    ) -> bool:
+        """
+        Check whether a group can directly reach another one.
+
+        Args:
+            source: Source security group ID
+            target: Destination security group ID
+            protocol: Protocol name or number (None for any protocol and port)
+            port: Destination port (None for any port)
+
+        Returns:
+            True if the source's egress and the target's ingress both allow it
+        """
+        ingress = self._ingress.get(target, {}).get(source)
+        if ingress is None:
+            return False
+        egress = [index for index in (self._egress.get(source, {}).get(target), self._open_egress.get(source))
+                  if index is not None]
+        if protocol is None:
+            return any(index.intersects(ingress) for index in egress)
+        protocol = canonical_protocol(protocol)
+        if port is None:
+            # Some port of the protocol must be open on both sides
+            return any(index.intersects(ingress, protocol) for index in egress)
+        return ingress.allows(protocol, port) and any(index.allows(protocol, port) for index in egress)
+
+    def _candidates(self, source: str) -> List[str]:
+        """Groups the source may reach: those its egress references, then those admitting it"""
+        targets = dict.fromkeys(self._egress.get(source, {}))
+        if source in self._open_egress:
+            targets.update(self._ingress_targets.get(source, {}))
+        return list(targets)
+
+    def successors(self, source: str) -> List[str]:
+        """
+        Get the groups a group can directly reach on at least one protocol and port.
+
+        Args:
+            source: Source security group ID
+
+        Returns:
+            Destination security group IDs, in rule order
+        """
+        return [target for target in self._candidates(source) if self.allows(source, target, None)]
+
+    def find_path(
+        self,
+        source: str,
+        target: str,
+        protocol: Optional[str] = 'tcp',
+        port: Optional[int] = None,
+        max_hops: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """
+        Find the shortest chain of security groups through which source reaches target.
+
+        Every hop must be allowed on the same protocol and port. With
+        protocol=None, each hop only needs some protocol and port allowed by
+        both of its groups.
+
+        Args:
+            source: Source security group ID
+            target: Destination security group ID
+            protocol: Protocol name or number (None for any protocol and port)
+            port: Destination port (None for any port)
+            max_hops: Maximum number of hops (None for unlimited)
+
+        Returns:
+            List of group IDs from source to target, or None if unreachable
+        """
+        if protocol is not None:
+            protocol = canonical_protocol(protocol)
+        if self.allows(source, target, protocol, port):
+            return [source, target]
+
+        parents: Dict[str, Optional[str]] = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            node, hops = queue.popleft()
+            if max_hops is not None and hops >= max_hops:
+                continue
+            for peer in self._candidates(node):
+                if peer in parents or not self.allows(node, peer, protocol, port):
+                    continue
+                parents[peer] = node
+                if peer == target:
+                    path = [peer]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append((peer, hops + 1))
+        return None
+
+    def query(
+        self,
+        source: str,
+        target: str,
+        protocol: Optional[str] = 'tcp',
+        port: Optional[int] = None,
+        max_hops: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Answer a reachability query.
+
+        Args:
+            source: Source security group ID
+            target: Destination security group ID
+            protocol: Protocol name or number (None for any protocol and port)
+            port: Destination port (None for any port)
+            max_hops: Maximum number of hops (1 for direct only, None for unlimited)
+
+        Returns:
+            Dictionary with the query, whether it is allowed, and the path found
+        """
+        path = self.find_path(source, target, protocol, port, max_hops)
+        return {
+            'source': source,
+            'target': target,
+            'protocol': canonical_protocol(protocol) if protocol is not None else None,
+            'port': port,
+            'allowed': path is not None,
+            'direct': path is not None and len(path) == 2,
+            'path': path or []
+        }
+
+    def security_groups(self) -> Set[str]:
+        """
+        Get every security group that appears in a security group rule or has egress open to the VPC.
+
+        Returns:
+            Set of security group IDs
+        """
+        groups = set(self._egress) | set(self._ingress) | set(self._open_egress)
+        for table in (self._egress, self._ingress):
+            for peers in table.values():
+                groups.update(peers)
+        return groups
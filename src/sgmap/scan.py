@@ -0,0 +1,148 @@
+"""
+Concurrent multi-VPC / multi-region scanning for sgmap
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+from sgmap.aws import ec2_client, error_code
+from sgmap.cache import SnapshotCache, get_security_groups_cached
+from sgmap.core import (
+    get_security_groups,
+    list_vpc_ids,
+    analyze_security_group_connections
+)
+from sgmap.prefix_lists import PrefixListResolver
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def _scan_vpc(
+    ec2: Any,
+    vpc_id: str,
+    security_group_id: Optional[str],
+    page_size: Optional[int],
+    cache: Optional[SnapshotCache] = None,
+    refresh: bool = False,
+    prefix_lists: Optional[PrefixListResolver] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Fetch and analyze a single VPC.
+
+    Args:
+        ec2: EC2 client for the VPC's region
+        vpc_id: The VPC ID to analyze
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        cache: Optional snapshot cache
+        refresh: Ignore cached snapshots and fetch again
+        prefix_lists: Optional prefix list resolver shared by the region's VPCs
+
+    Returns:
+        Connection map for the VPC, or None if the VPC does not exist in the region
+    """
+    try:
+        if cache is not None:
+            vpc_and_sgs = get_security_groups_cached(
+                cache, vpc_id, security_group_id, page_size=page_size, ec2=ec2, refresh=refresh
+            )
+        else:
+            vpc_and_sgs = get_security_groups(vpc_id, security_group_id, page_size=page_size, stream=True, ec2=ec2)
+    except Exception as e:
+        # VPC IDs are looked up in every scanned region, so a missing VPC is not an error
+        if error_code(e) == 'InvalidVpcID.NotFound':
+            return None
+        raise
+    if not vpc_and_sgs['vpc']:
+        return None
+    if prefix_lists is not None:
+        vpc_and_sgs['prefix_lists'] = prefix_lists
+    return analyze_security_group_connections(vpc_and_sgs)
+
+
+def scan_vpcs(
+    vpc_ids: Optional[Sequence[str]] = None,
+    regions: Optional[Sequence[str]] = None,
+    all_vpcs: bool = False,
+    security_group_id: Optional[str] = None,
+    page_size: Optional[int] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    cache: Optional[SnapshotCache] = None,
+    refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Fetch and analyze several VPCs, possibly across several regions, concurrently.
+
+    One EC2 client is created per region and shared by every worker scanning that
+    region (boto3 clients are thread-safe), as is one PrefixListResolver, so
+    each managed prefix list is fetched once per region. VPCs that do not exist
+    in a region (InvalidVpcID.NotFound) are skipped, so the same VPC IDs can be
+    looked up across many regions.
+
+    Args:
+        vpc_ids: VPC IDs to analyze in every region
+        regions: Region names to scan (default: the configured default region)
+        all_vpcs: Analyze every VPC found in each region
+        security_group_id: Optional security group ID to filter
+        page_size: Optional MaxResults per describe_security_groups page
+        max_workers: Maximum number of concurrent fetches
+        cache: Optional snapshot cache for each VPC's describe_* responses
+        refresh: Ignore cached snapshots and fetch again
+
+    Returns:
+        Dictionary of connection maps keyed by region and VPC ID
+    """
+    clients = {region: ec2_client(region) for region in (regions or [None])}
+    resolvers = {
+        region: PrefixListResolver(ec2, region=region, cache=cache, max_workers=max_workers)
+        for region, ec2 in clients.items()
+    }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if all_vpcs:
+            listings = {region: executor.submit(list_vpc_ids, ec2) for region, ec2 in clients.items()}
+            targets = {region: future.result() for region, future in listings.items()}
+        else:
+            targets = {region: list(vpc_ids or []) for region in clients}
+
+        futures = {
+            region: [
+                (vpc_id, executor.submit(
+                    _scan_vpc, clients[region], vpc_id, security_group_id, page_size, cache, refresh,
+                    resolvers[region]
+                ))
+                for vpc_id in region_vpc_ids
+            ]
+            for region, region_vpc_ids in targets.items()
+        }
+
+        # Collect in submission order so the merged document is deterministic
+        result: Dict[str, Any] = {'regions': {}}
+        for region, region_futures in futures.items():
+            region_name = region or clients[region].meta.region_name
+            region_connections: Dict[str, Any] = {}
+            for vpc_id, future in region_futures:
+                connections = future.result()
+                if connections is not None:
+                    region_connections[vpc_id] = connections
+            if region_connections:
+                result['regions'][region_name] = region_connections
+
+    return result
+
+
+def flatten_scan(scan: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Flatten a scan result into (region, vpc_id, connections) tuples.
+
+    Args:
+        scan: Result of scan_vpcs
+
+    Returns:
+        List of (region, vpc_id, connections) tuples in document order
+    """
+    return [
+        (region, vpc_id, connections)
+        for region, vpcs in scan['regions'].items()
+        for vpc_id, connections in vpcs.items()
+    ]
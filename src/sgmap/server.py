@@ -0,0 +1,347 @@
+"""
+Long-running HTTP server for sgmap
+
+`sgmap serve` keeps the analyzed connection graphs of a fixed set of VPCs in
+memory and refreshes them in the background, so requests pay neither
+interpreter startup nor a fetch. Rendered documents are cached per VPC and
+option combination, and a refresh that finds the same security groups keeps
+the existing snapshot and its cached renders.
+
+Endpoints:
+    GET  /healthz
+    GET  /vpcs                                  loaded VPCs and their refresh status
+    GET  /vpcs/<vpc-id>/mermaid?with_vpc=1&compact=1
+    GET  /vpcs/<vpc-id>/json
+    GET  /vpcs/<vpc-id>/query?from=<sg>&to=<sg>&port=5432/tcp&max_hops=<n>
+    GET  /vpcs/<vpc-id>/blast-radius?sg=<sg>&reverse=1
+    POST /vpcs/<vpc-id>/refresh                 refresh now
+"""
+
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from sgmap.cache import snapshot_fingerprint
+from sgmap.closure import ReachabilityClosure
+from sgmap.core import build_connection_graph, write_json_output, write_mermaid_diagram
+from sgmap.graph import resolve_prefix_lists
+from sgmap.intervals import parse_port_spec
+from sgmap.query import ReachabilityIndex
+
+DEFAULT_INTERVAL = 300
+
+# Function returning the VPC info and security groups of a VPC ID
+Loader = Callable[[str], Dict[str, Any]]
+
+
+class VpcSnapshot:
+    """
+    Immutable analyzed state of one VPC, with lazily built renders, reachability index and closure.
+    """
+
+    def __init__(self, vpc_and_sgs: Dict[str, Any], fingerprint: str):
+        """
+        Args:
+            vpc_and_sgs: Dictionary with VPC info and a list of security groups
+            fingerprint: Hash of vpc_and_sgs identifying this version of the VPC
+        """
+        self.fingerprint = fingerprint
+        self.graph = build_connection_graph(vpc_and_sgs)
+        self.connections = self.graph.to_dict()
+        self._renders: Dict[Tuple[str, bool, bool], bytes] = {}
+        self._index: Optional[ReachabilityIndex] = None
+        self._closure: Optional[ReachabilityClosure] = None
+
+    def render(self, kind: str, with_vpc: bool = False, compact: bool = False) -> bytes:
+        """
+        Render the connection map, once per option combination.
+
+        Args:
+            kind: 'mermaid' or 'json'
+            with_vpc: Include the VPC in the mermaid diagram
+            compact: Render a compact mermaid diagram
+
+        Returns:
+            UTF-8 encoded document
+        """
+        key = (kind, with_vpc, compact)
+        body = self._renders.get(key)
+        if body is None:
+            fp = io.StringIO()
+            if kind == 'json':
+                write_json_output(self.connections, fp)
+            else:
+                write_mermaid_diagram(self.connections, fp, with_vpc, compact)
+            # Concurrent first requests may both render; either result is kept
+            body = self._renders.setdefault(key, fp.getvalue().encode('utf-8'))
+        return body
+
+    def index(self) -> ReachabilityIndex:
+        """
+        Get the reachability index of the VPC, building it on first use.
+
+        Returns:
+            ReachabilityIndex of the snapshot's graph
+        """
+        if self._index is None:
+            self._index = ReachabilityIndex.from_graph(self.graph)
+        return self._index
+
+    def closure(self) -> ReachabilityClosure:
+        """
+        Get the transitive reachability closure of the VPC, building it on first use.
+
+        Returns:
+            ReachabilityClosure of the snapshot's graph
+        """
+        if self._closure is None:
+            groups = self.graph.security_group_ids()
+            names = {sg_id: self.graph.node_name(sg_id) for sg_id in groups}
+            self._closure = ReachabilityClosure.from_index(self.index(), groups, names, self.fingerprint)
+        return self._closure
+
+
+class GraphStore:
+    """
+    In-memory snapshots of a set of VPCs, refreshed in a background thread.
+
+    A failed refresh keeps serving the previous snapshot and records the error.
+    """
+
+    def __init__(self, loader: Loader, vpc_ids: Sequence[str], interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            loader: Function returning the VPC info and security groups of a VPC ID
+            vpc_ids: VPC IDs to serve
+            interval: Seconds between background refreshes
+        """
+        self.loader = loader
+        self.vpc_ids = list(vpc_ids)
+        self.interval = interval
+        self._snapshots: Dict[str, VpcSnapshot] = {}
+        self._status: Dict[str, Dict[str, Any]] = {vpc_id: {'refreshed_at': None, 'error': None} for vpc_id in self.vpc_ids}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, vpc_id: str) -> Optional[VpcSnapshot]:
+        """
+        Get the current snapshot of a VPC.
+
+        Args:
+            vpc_id: VPC ID
+
+        Returns:
+            VpcSnapshot, or None if the VPC has not been loaded successfully
+        """
+        return self._snapshots.get(vpc_id)
+
+    def refresh(self, vpc_id: str) -> bool:
+        """
+        Load a VPC again and replace its snapshot if it changed.
+
+        Args:
+            vpc_id: VPC ID
+
+        Returns:
+            True if a new snapshot was stored
+        """
+        try:
+            vpc_and_sgs = self.loader(vpc_id)
+            if not vpc_and_sgs['vpc']:
+                raise ValueError(f"VPC not found: {vpc_id}")
+            security_groups = list(vpc_and_sgs['security_groups'])
+            refreshed: Dict[str, Any] = {'vpc': vpc_and_sgs['vpc'], 'security_groups': security_groups}
+            # Resolved prefix lists are part of the fingerprint, so a changed list is picked up
+            if vpc_and_sgs.get('prefix_lists') is not None:
+                refreshed['prefix_lists'] = resolve_prefix_lists(vpc_and_sgs['prefix_lists'], security_groups)
+            vpc_and_sgs = refreshed
+            fingerprint = snapshot_fingerprint(vpc_and_sgs)
+            current = self._snapshots.get(vpc_id)
+            changed = current is None or current.fingerprint != fingerprint
+            if changed:
+                snapshot = VpcSnapshot(vpc_and_sgs, fingerprint)
+        except Exception as e:
+            with self._lock:
+                self._status[vpc_id]['error'] = str(e)
+            return False
+
+        with self._lock:
+            if changed:
+                self._snapshots[vpc_id] = snapshot
+            self._status[vpc_id] = {'refreshed_at': time.time(), 'error': None}
+        return changed
+
+    def refresh_all(self) -> None:
+        """Refresh every VPC in turn"""
+        for vpc_id in self.vpc_ids:
+            self.refresh(vpc_id)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Describe the served VPCs.
+
+        Returns:
+            One dictionary per VPC with its name, size, last refresh time and last error
+        """
+        result = []
+        for vpc_id in self.vpc_ids:
+            snapshot = self._snapshots.get(vpc_id)
+            with self._lock:
+                entry: Dict[str, Any] = {'id': vpc_id, **self._status[vpc_id]}
+            entry['loaded'] = snapshot is not None
+            if snapshot is not None:
+                entry['name'] = snapshot.connections['vpc']['name']
+                entry['security_groups'] = len(snapshot.connections['security_groups'])
+                entry['edges'] = snapshot.graph.edge_count
+            result.append(entry)
+        return result
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.refresh_all()
+
+    def start(self) -> None:
+        """Start refreshing in the background every `interval` seconds"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sgmap-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def _flag(params: Dict[str, List[str]], name: str) -> bool:
+    return params.get(name, ['0'])[-1].lower() in ('1', 'true', 'yes', 'on')
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SgmapRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler answering from the server's GraphStore"""
+
+    server: 'SgmapServer'
+
+    def do_GET(self) -> None:
+        self._dispatch('GET')
+
+    def do_POST(self) -> None:
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        params = parse_qs(url.query)
+        try:
+            if method == 'GET' and parts == ['healthz']:
+                self._send(200, b'ok\n', 'text/plain; charset=utf-8')
+            elif method == 'GET' and parts == ['vpcs']:
+                self._send_json(200, self.server.store.status())
+            elif len(parts) == 3 and parts[0] == 'vpcs':
+                self._vpc_request(method, parts[1], parts[2], params)
+            else:
+                raise _HttpError(404, f"Not found: {url.path}")
+        except _HttpError as e:
+            self._send_json(e.status, {'error': str(e)})
+
+    def _vpc_request(self, method: str, vpc_id: str, action: str, params: Dict[str, List[str]]) -> None:
+        store = self.server.store
+        if vpc_id not in store.vpc_ids:
+            raise _HttpError(404, f"Unknown VPC: {vpc_id}")
+
+        if action == 'refresh' and method == 'POST':
+            changed = store.refresh(vpc_id)
+            status = next(entry for entry in store.status() if entry['id'] == vpc_id)
+            self._send_json(200 if status['error'] is None else 502, dict(status, changed=changed))
+            return
+        if method != 'GET' or action not in ('mermaid', 'json', 'query', 'blast-radius'):
+            raise _HttpError(404, f"Not found: {self.path}")
+
+        snapshot = store.get(vpc_id)
+        if snapshot is None:
+            raise _HttpError(503, f"VPC not loaded yet: {vpc_id}")
+
+        if action == 'query':
+            self._send_json(200, self._query(snapshot, params))
+            return
+        if action == 'blast-radius':
+            self._send_json(200, self._blast_radius(snapshot, params))
+            return
+
+        with_vpc = _flag(params, 'with_vpc')
+        compact = _flag(params, 'compact')
+        etag = f'"{snapshot.fingerprint[:32]}-{action}-{int(with_vpc)}{int(compact)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, b'', None, etag)
+            return
+        body = snapshot.render(action, with_vpc, compact)
+        content_type = 'application/json' if action == 'json' else 'text/markdown; charset=utf-8'
+        self._send(200, body, content_type, etag)
+
+    def _query(self, snapshot: VpcSnapshot, params: Dict[str, List[str]]) -> Dict[str, Any]:
+        source = params.get('from', [None])[-1]
+        target = params.get('to', [None])[-1]
+        if not source or not target:
+            raise _HttpError(400, "Missing 'from' or 'to' parameter")
+        try:
+            # Without a port, any protocol and port allowed on each hop will do
+            protocol, port = parse_port_spec(params['port'][-1]) if 'port' in params else (None, None)
+            max_hops = int(params['max_hops'][-1]) if 'max_hops' in params else None
+        except ValueError as e:
+            raise _HttpError(400, str(e))
+        return snapshot.index().query(source, target, protocol, port, max_hops=max_hops)
+
+    def _blast_radius(self, snapshot: VpcSnapshot, params: Dict[str, List[str]]) -> Dict[str, Any]:
+        sg_id = params.get('sg', [None])[-1]
+        if not sg_id:
+            raise _HttpError(400, "Missing 'sg' parameter")
+        closure = snapshot.closure()
+        if sg_id not in closure:
+            raise _HttpError(404, f"Unknown security group: {sg_id}")
+        return closure.query(sg_id, reverse=_flag(params, 'reverse'))
+
+    def _send_json(self, status: int, data: Any) -> None:
+        self._send(status, (json.dumps(data, indent=2) + "\n").encode('utf-8'), 'application/json')
+
+    def _send(self, status: int, body: bytes, content_type: Optional[str], etag: Optional[str] = None) -> None:
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class SgmapServer(ThreadingHTTPServer):
+    """Threaded HTTP server serving a GraphStore"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], store: GraphStore, quiet: bool = False):
+        """
+        Args:
+            address: (host, port) to listen on (port 0 picks a free port)
+            store: Snapshots to serve
+            quiet: Do not log requests to stderr
+        """
+        super().__init__(address, SgmapRequestHandler)
+        self.store = store
+        self.quiet = quiet
@@ -0,0 +1,148 @@
+"""
+Per-security-group output from a single analysis
+
+split_connections slices one connection map into one map per security group,
+each equal to what `--security-group-id` would produce except that peers are
+named from the whole VPC. The slices share the analyzed entries instead of
+copying them. write_split_output renders every slice to a mermaid and a JSON
+file, spreading the groups over a process pool for large VPCs; like
+sgmap.parallel, the workers inherit the connection map when the fork start
+method is available and only index ranges are sent to them.
+"""
+
+import math
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union, Any
+
+from sgmap.core import write_json_output, write_mermaid_diagram
+
+# Below this many groups per worker, rendering in-process is faster than starting a pool
+MIN_GROUPS_PER_WORKER = 250
+
+# Number of chunks per worker, so that uneven chunks do not leave workers idle
+CHUNKS_PER_WORKER = 4
+
+# Worker state set by _init_worker: the output options and, with the fork
+# start method, the connection map itself (inherited instead of pickled)
+_worker_state: Dict[str, Any] = {}
+
+Chunk = Union[range, List[Tuple[str, Dict[str, Any]]]]
+
+
+def split_connections(connections: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Split a connection map into one connection map per security group.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+
+    Yields:
+        (security group ID, connection map holding only that group) tuples in input order
+    """
+    vpc = connections['vpc']
+    for sg_id, entry in connections['security_groups'].items():
+        yield sg_id, {'vpc': vpc, 'security_groups': {sg_id: entry}}
+
+
+def _write_group(
+    directory: str,
+    sg_id: str,
+    connections: Dict[str, Any],
+    include_vpc: bool,
+    compact: bool
+) -> None:
+    """Write the mermaid and JSON files of one security group"""
+    path = os.path.join(directory, sg_id)
+    with open(f"{path}.md", 'w', encoding='utf-8') as fp:
+        write_mermaid_diagram(connections, fp, include_vpc, compact)
+    with open(f"{path}.json", 'w', encoding='utf-8') as fp:
+        write_json_output(connections, fp)
+
+
+def _init_worker(options: Tuple[str, bool, bool], vpc: Dict[str, Any], connections: Optional[Dict[str, Any]]) -> None:
+    _worker_state['options'] = options
+    _worker_state['vpc'] = vpc
+    _worker_state['connections'] = connections
+    _worker_state['sg_ids'] = list(connections['security_groups']) if connections is not None else None
+
+
+def _write_chunk(chunk: Chunk) -> int:
+    """
+    Write the files of a chunk of security groups in a worker process.
+
+    Args:
+        chunk: Index range into the inherited connection map, or (ID, entry) pairs
+
+    Returns:
+        Number of groups written
+    """
+    directory, include_vpc, compact = _worker_state['options']
+    vpc = _worker_state['vpc']
+    if isinstance(chunk, range):
+        entries = _worker_state['connections']['security_groups']
+        chunk = [(sg_id, entries[sg_id]) for sg_id in _worker_state['sg_ids'][chunk.start:chunk.stop]]
+    for sg_id, entry in chunk:
+        _write_group(directory, sg_id, {'vpc': vpc, 'security_groups': {sg_id: entry}}, include_vpc, compact)
+    return len(chunk)
+
+
+def write_split_output(
+    connections: Dict[str, Any],
+    directory: str,
+    include_vpc: bool = False,
+    compact: bool = False,
+    workers: Optional[int] = None
+) -> List[str]:
+    """
+    Write a mermaid diagram (<sg-id>.md) and a JSON document (<sg-id>.json) per security group.
+
+    The files are identical to the output of the main command with
+    `--security-group-id`, except that peers are named from the whole VPC.
+    Groups are rendered in-process unless each worker would get at least
+    MIN_GROUPS_PER_WORKER of them.
+
+    Args:
+        connections: Dictionary with VPC info and security group connections
+        directory: Output directory (created if missing)
+        include_vpc: Whether to include the VPC in the diagrams
+        compact: Declare each CIDR once and merge parallel edges
+        workers: Number of worker processes (default: CPU count)
+
+    Returns:
+        IDs of the security groups written, in input order
+    """
+    os.makedirs(directory, exist_ok=True)
+    sg_ids = list(connections['security_groups'])
+    workers = min(workers or os.cpu_count() or 1, len(sg_ids) // MIN_GROUPS_PER_WORKER)
+
+    if workers <= 1:
+        for sg_id, group_connections in split_connections(connections):
+            _write_group(directory, sg_id, group_connections, include_vpc, compact)
+        return sg_ids
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    options = (directory, include_vpc, compact)
+    chunk_size = math.ceil(len(sg_ids) / (workers * CHUNKS_PER_WORKER))
+    bounds = [range(start, min(start + chunk_size, len(sg_ids))) for start in range(0, len(sg_ids), chunk_size)]
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        initargs: Tuple[Any, ...] = (options, connections['vpc'], connections)
+        chunks: Sequence[Chunk] = bounds
+    else:
+        context = multiprocessing.get_context()
+        initargs = (options, connections['vpc'], None)
+        entries = list(connections['security_groups'].items())
+        chunks = [entries[bound.start:bound.stop] for bound in bounds]
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=initargs
+    ) as pool:
+        for _ in pool.map(_write_chunk, chunks):
+            pass
+    return sg_ids
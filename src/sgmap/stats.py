@@ -0,0 +1,256 @@
+"""
+Pipeline instrumentation for sgmap
+
+PipelineStats records the wall time of pipeline stages, the AWS API calls
+made by EC2 clients (calls, pages, botocore retry attempts and time spent in
+calls) and the size of the analyzed graph. Every measurement is also passed
+to registered callbacks so it can be forwarded to other monitoring systems.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from sgmap.aws import register_client_hook, unregister_client_hook
+
+# callback(kind, name, value): kind is 'timing' (seconds) or 'counter' (increment)
+StatsCallback = Callable[[str, str, float], None]
+
+_START_KEY = 'sgmap_stats_start'
+
+T = TypeVar('T')
+
+
+class PipelineStats:
+    """
+    Collector of stage timings and counters for one sgmap run.
+
+    Used as a context manager, it instruments every EC2 client created by
+    sgmap.aws.ec2_client while it is active; clients passed in explicitly can
+    be instrumented with instrument_client. It is safe to use from the worker
+    threads of a multi-VPC scan.
+
+    Example:
+        >>> with PipelineStats(callbacks=[print]) as stats:
+        ...     with stats.stage('analyze'):
+        ...         connections = analyze_security_group_connections(vpc_and_sgs)
+        ...     stats.record_connections(connections)
+    """
+
+    def __init__(self, callbacks: Optional[List[StatsCallback]] = None):
+        """
+        Args:
+            callbacks: Functions called with (kind, name, value) for every measurement
+        """
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self._callbacks: List[StatsCallback] = list(callbacks or [])
+        self._lock = threading.Lock()
+        # Per-thread stack of the time spent in stages nested in each open stage
+        self._nested = threading.local()
+        self._started: Optional[float] = None
+        self._total: Optional[float] = None
+
+    def __enter__(self) -> 'PipelineStats':
+        self._started = time.perf_counter()
+        register_client_hook(self.instrument_client)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        unregister_client_hook(self.instrument_client)
+        self._total = time.perf_counter() - self._started
+        self._emit('timing', 'total', self._total)
+
+    def add_callback(self, callback: StatsCallback) -> None:
+        """
+        Register a callback for subsequent measurements.
+
+        Args:
+            callback: Function called with (kind, name, value)
+        """
+        self._callbacks.append(callback)
+
+    def _emit(self, kind: str, name: str, value: float) -> None:
+        for callback in self._callbacks:
+            callback(kind, name, value)
+
+    def record_time(self, name: str, seconds: float) -> None:
+        """
+        Add wall time to a stage.
+
+        Args:
+            name: Stage name
+            seconds: Elapsed seconds
+        """
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self._emit('timing', name, seconds)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """
+        Increment a counter.
+
+        Args:
+            name: Counter name
+            value: Increment
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._emit('counter', name, value)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block of code as a pipeline stage.
+
+        Time spent in stages opened inside the block (by the same thread) is
+        credited to those stages only, so stage times do not overlap.
+
+        Args:
+            name: Stage name (repeated stages accumulate)
+        """
+        stack = getattr(self._nested, 'stack', None)
+        if stack is None:
+            stack = self._nested.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.record_time(name, elapsed - nested)
+
+    def iter_stage(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Time the production of every item of a lazy iterable as a pipeline stage.
+
+        Used for streamed describe_security_groups pages, which are fetched
+        while a later stage consumes them.
+
+        Args:
+            name: Stage name
+            iterable: Iterable to time
+
+        Yields:
+            The items of the iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def instrument_client(self, ec2: Any) -> None:
+        """
+        Count the API calls, pages, retries and call time of an EC2 client.
+
+        Args:
+            ec2: boto3 EC2 client
+        """
+        events = ec2.meta.events
+        events.register('before-call.ec2', self._before_call, unique_id=f'sgmap-stats-before-{id(self)}')
+        events.register('after-call.ec2', self._after_call, unique_id=f'sgmap-stats-after-{id(self)}')
+        events.register('after-call-error.ec2', self._after_call_error, unique_id=f'sgmap-stats-error-{id(self)}')
+
+    def _before_call(self, context: Dict[str, Any], **kwargs: Any) -> None:
+        context[_START_KEY] = time.perf_counter()
+
+    def _finish_call(self, operation_name: str, context: Dict[str, Any]) -> None:
+        self.incr('api_calls')
+        self.incr(f'api_calls.{operation_name}')
+        if operation_name == 'DescribeSecurityGroups':
+            self.incr('pages')
+        start = context.pop(_START_KEY, None)
+        if start is not None:
+            self.incr('api_seconds', time.perf_counter() - start)
+
+    def _after_call(
+        self,
+        http_response: Any,
+        parsed: Dict[str, Any],
+        model: Any,
+        context: Dict[str, Any],
+        **kwargs: Any
+    ) -> None:
+        self._finish_call(model.name, context)
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        if retries:
+            self.incr('retries', retries)
+        if http_response.status_code >= 300:
+            self.incr('api_errors')
+
+    def _after_call_error(self, event_name: str, context: Dict[str, Any], **kwargs: Any) -> None:
+        # Raised by the endpoint (e.g. connection errors) after botocore gave up retrying
+        self._finish_call(event_name.rsplit('.', 1)[-1], context)
+        self.incr('api_errors')
+
+    def record_connections(self, connections: Dict[str, Any]) -> None:
+        """
+        Count the security groups, nodes and edges of a connection map.
+
+        Nodes are the analyzed security groups plus the security groups and
+        CIDRs their rules reference.
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+        """
+        nodes = set(connections['security_groups'])
+        edges = 0
+        for sg_data in connections['security_groups'].values():
+            for direction in ('inbound', 'outbound'):
+                edges += len(sg_data[direction])
+                nodes.update((conn['type'], conn['id']) if conn['type'] == 'cidr' else conn['id']
+                             for conn in sg_data[direction])
+        self.incr('security_groups', len(connections['security_groups']))
+        self.incr('nodes', len(nodes))
+        self.incr('edges', edges)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the recorded measurements.
+
+        Returns:
+            Dictionary with stage seconds, counters and the total wall time
+        """
+        with self._lock:
+            return {
+                'stages': dict(self.stages),
+                'counters': dict(self.counters),
+                'total_seconds': self._total
+            }
+
+    def format_report(self) -> str:
+        """
+        Format the measurements as a human-readable report.
+
+        Returns:
+            Multi-line report
+        """
+        data = self.to_dict()
+        counters = data['counters']
+        lines = ["sgmap stats:"]
+        for name, seconds in data['stages'].items():
+            lines.append(f"  {name + ':':<18}{seconds:.3f}s")
+        if data['total_seconds'] is not None:
+            lines.append(f"  {'total:':<18}{data['total_seconds']:.3f}s")
+        lines.append(
+            f"  {'api calls:':<18}{int(counters.get('api_calls', 0))} "
+            f"(pages {int(counters.get('pages', 0))}, retries {int(counters.get('retries', 0))}, "
+            f"errors {int(counters.get('api_errors', 0))}, {counters.get('api_seconds', 0.0):.3f}s in calls)"
+        )
+        for name in sorted(counters):
+            if name.startswith('api_calls.'):
+                lines.append(f"    {name[len('api_calls.'):] + ':':<16}{int(counters[name])}")
+        lines.append(
+            f"  {'graph:':<18}{int(counters.get('security_groups', 0))} security groups, "
+            f"{int(counters.get('nodes', 0))} nodes, {int(counters.get('edges', 0))} edges"
+            + (f" ({int(counters['edges_collapsed'])} collapsed)" if 'edges_collapsed' in counters else "")
+        )
+        return "\n".join(lines)
@@ -0,0 +1,430 @@
+"""
+Flat rule table over analyzed security group connections
+
+RuleTable holds one row per rule (edge) of a connection map in parallel
+columns, so that a check over every rule is a handful of array operations
+instead of a walk over the nested connection dicts. Every column holds small
+integer codes into a list of distinct values (see RuleTable.values), so a
+predicate is evaluated once per distinct value and then applied to the whole
+column with a lookup table.
+
+Columns are NumPy arrays when NumPy is installed and stdlib arrays
+otherwise. Row masks are NumPy boolean arrays, or integers holding one
+0/1 byte per row with the array backend, so that masks are combined with
+single bitwise operations on both backends. NumPy is imported when a table
+is built, like boto3 in sgmap.aws, so that importing sgmap does not pay for it.
+
+Columns (N rules):
+    owner          I  index into group_ids of the group whose rule it is
+    direction      B  index into DIRECTIONS
+    peer_type      B  index into PEER_TYPES
+    peer           I  index into peers (security group IDs and CIDRs)
+    protocol       H  index into protocols (canonical, see sgmap.intervals)
+    ports          I  index into port_ranges, the inclusive range the rule covers
+    prefix_length  B  prefix length of CIDR peers, NOT_A_CIDR otherwise
+    internal       B  1 when the peer is a group of the table or a CIDR inside the VPC CIDR
+    from_port      i  start of the covered port range
+    to_port        i  end of the covered port range
+"""
+
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sgmap.cidr_index import parse_network
+from sgmap.graph import CIDR, DIRECTIONS, PEER_TYPES, SECURITY_GROUP
+from sgmap.intervals import canonical_protocol, port_range
+
+# prefix_length of peers that are not CIDRs (security groups, unresolved prefix lists)
+NOT_A_CIDR = 255
+
+_WIDTHS = {4: 32, 6: 128}
+
+# Column name -> array typecode, in row order of RuleTable.columns
+COLUMNS: Dict[str, str] = {
+    'owner': 'I',
+    'direction': 'B',
+    'peer_type': 'B',
+    'peer': 'I',
+    'protocol': 'H',
+    'ports': 'I',
+    'prefix_length': 'B',
+    'internal': 'B',
+    'from_port': 'i',
+    'to_port': 'i',
+}
+
+Mask = Any
+
+
+def _import_numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class _ArrayBackend:
+    """Masks as integers with one 0/1 byte per row, built with bytes.translate or map"""
+
+    name = 'array'
+
+    def __init__(self, size: int):
+        self.size = size
+        self._all = int.from_bytes(b'\x01' * size, 'little')
+
+    def column(self, values: array) -> array:
+        return values
+
+    def take(self, lookup: bytearray, column: array) -> Mask:
+        if column.typecode == 'B':
+            table = bytes(lookup) + bytes(256 - len(lookup))
+            return int.from_bytes(column.tobytes().translate(table), 'little')
+        return int.from_bytes(bytes(map(lookup.__getitem__, column)), 'little')
+
+    def from_rows(self, rows: List[int]) -> Mask:
+        selected = bytearray(self.size)
+        for row in rows:
+            selected[row] = 1
+        return int.from_bytes(selected, 'little')
+
+    def full(self) -> Mask:
+        return self._all
+
+    def empty(self) -> Mask:
+        return 0
+
+    def invert(self, mask: Mask) -> Mask:
+        return mask ^ self._all
+
+    def count(self, mask: Mask) -> int:
+        return mask.bit_count()
+
+    def rows(self, mask: Mask) -> List[int]:
+        data = mask.to_bytes(self.size, 'little')
+        rows = []
+        row = data.find(1)
+        while row != -1:
+            rows.append(row)
+            row = data.find(1, row + 1)
+        return rows
+
+
+class _NumpyBackend:
+    """Masks as NumPy boolean arrays; columns are zero-copy views of the built arrays"""
+
+    name = 'numpy'
+
+    def __init__(self, size: int, numpy: Any):
+        self.size = size
+        self._np = numpy
+
+    def column(self, values: array) -> Any:
+        return self._np.frombuffer(values, dtype=values.typecode) if len(values) else \
+            self._np.zeros(0, dtype=values.typecode)
+
+    def take(self, lookup: bytearray, column: Any) -> Mask:
+        return self._np.frombuffer(bytes(lookup), dtype=self._np.bool_)[column] if lookup else \
+            self._np.zeros(self.size, dtype=self._np.bool_)
+
+    def from_rows(self, rows: List[int]) -> Mask:
+        mask = self._np.zeros(self.size, dtype=self._np.bool_)
+        mask[rows] = True
+        return mask
+
+    def full(self) -> Mask:
+        return self._np.ones(self.size, dtype=self._np.bool_)
+
+    def empty(self) -> Mask:
+        return self._np.zeros(self.size, dtype=self._np.bool_)
+
+    def invert(self, mask: Mask) -> Mask:
+        return ~mask
+
+    def count(self, mask: Mask) -> int:
+        return int(self._np.count_nonzero(mask))
+
+    def rows(self, mask: Mask) -> List[int]:
+        return self._np.flatnonzero(mask).tolist()
+
+
+def _network_contains(outer: Optional[Tuple[int, int, int]], inner: Tuple[int, int, int]) -> bool:
+    """Whether a parsed network contains another (both as returned by parse_network)"""
+    if outer is None or outer[0] != inner[0] or inner[2] < outer[2]:
+        return False
+    shift = _WIDTHS[outer[0]] - outer[2]
+    return inner[1] >> shift == outer[1] >> shift
+
+
+class RuleTable:
+    """
+    Columnar table of the rules of a connection map.
+
+    Rows are in connection map order (groups, then inbound and outbound
+    rules). Build masks with select(), combine them with &, | and invert(),
+    and materialize the matching rules with rules().
+
+    Example:
+        >>> table = RuleTable.from_connections(connections)
+        >>> world = table.select('peer', lambda cidr: cidr in ('0.0.0.0/0', '::/0'))
+        >>> ssh = table.select('ports', lambda ports: ports[0] <= 22 <= ports[1])
+        >>> [rule['security_group'] for rule in table.rules(world & ssh)]
+        ['sg-11111111']
+    """
+
+    def __init__(self, connections: Dict[str, Any], backend: Optional[str] = None):
+        """
+        Args:
+            connections: Dictionary with VPC info and security group connections
+            backend: 'numpy', 'array' or None to use NumPy when it is installed
+
+        Raises:
+            ValueError: If backend is unknown
+            ImportError: If backend is 'numpy' and NumPy is not installed
+        """
+        if backend not in (None, 'numpy', 'array'):
+            raise ValueError(f"Unknown backend: {backend}")
+        numpy = _import_numpy() if backend != 'array' else None
+        if backend == 'numpy' and numpy is None:
+            raise ImportError("The numpy backend requires NumPy (pip install numpy)")
+
+        self.vpc: Dict[str, Any] = connections['vpc']
+        self.group_ids: List[str] = list(connections['security_groups'])
+        self.group_names: List[str] = [sg_data['name'] for sg_data in connections['security_groups'].values()]
+        self.peers: List[str] = []
+        self.protocols: List[str] = []
+        self.port_ranges: List[Tuple[int, int]] = []
+        self._rules: List[Tuple[int, int, Dict[str, Any]]] = []
+
+        built = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self._fill(connections, built)
+
+        size = len(self._rules)
+        self._backend: Any = _NumpyBackend(size, numpy) if numpy is not None else _ArrayBackend(size)
+        self.backend: str = self._backend.name
+        self.columns: Dict[str, Any] = {name: self._backend.column(values) for name, values in built.items()}
+        self._values: Dict[str, Sequence[Any]] = {
+            'owner': self.group_ids,
+            'direction': DIRECTIONS,
+            'peer_type': PEER_TYPES,
+            'peer': self.peers,
+            'protocol': self.protocols,
+            'ports': self.port_ranges,
+            'prefix_length': [length if length <= 128 else None for length in range(256)],
+            'internal': (False, True),
+        }
+
+    @classmethod
+    def from_connections(cls, connections: Dict[str, Any], backend: Optional[str] = None) -> 'RuleTable':
+        """
+        Build the table of a connection map (e.g. saved --json output).
+
+        Args:
+            connections: Dictionary with VPC info and security group connections
+            backend: 'numpy', 'array' or None to use NumPy when it is installed
+
+        Returns:
+            RuleTable
+        """
+        return cls(connections, backend)
+
+    def _fill(self, connections: Dict[str, Any], columns: Dict[str, array]) -> None:
+        """Append one row per rule to the columns, interning peers, protocols and port ranges"""
+        groups = {sg_id: index for index, sg_id in enumerate(self.group_ids)}
+        peers: Dict[str, int] = {}
+        protocols: Dict[str, int] = {}
+        ranges: Dict[Tuple[int, int], int] = {}
+        # CIDR -> (prefix length, inside the VPC CIDR)
+        networks: Dict[str, Tuple[int, int]] = {}
+        vpc_network = parse_network(self.vpc.get('cidr') or '')
+
+        owner_col, direction_col, peer_type_col = columns['owner'], columns['direction'], columns['peer_type']
+        peer_col, protocol_col, ports_col = columns['peer'], columns['protocol'], columns['ports']
+        prefix_col, internal_col = columns['prefix_length'], columns['internal']
+        from_col, to_col = columns['from_port'], columns['to_port']
+
+        for owner, sg_data in enumerate(connections['security_groups'].values()):
+            for direction, key in enumerate(DIRECTIONS):
+                for conn in sg_data[key]:
+                    peer_id = conn['id']
+                    peer = peers.get(peer_id)
+                    if peer is None:
+                        peer = peers[peer_id] = len(self.peers)
+                        self.peers.append(peer_id)
+                    protocol = canonical_protocol(conn['protocol'])
+                    code = protocols.get(protocol)
+                    if code is None:
+                        code = protocols[protocol] = len(self.protocols)
+                        self.protocols.append(protocol)
+                    covered = port_range(protocol, conn['from_port'], conn['to_port'])
+                    ports = ranges.get(covered)
+                    if ports is None:
+                        ports = ranges[covered] = len(self.port_ranges)
+                        self.port_ranges.append(covered)
+
+                    if conn['type'] == 'security_group':
+                        peer_type, prefix_length, internal = SECURITY_GROUP, NOT_A_CIDR, int(peer_id in groups)
+                    else:
+                        peer_type = CIDR
+                        network = networks.get(peer_id)
+                        if network is None:
+                            parsed = parse_network(peer_id)
+                            network = networks[peer_id] = (NOT_A_CIDR, 0) if parsed is None else \
+                                (parsed[2], int(_network_contains(vpc_network, parsed)))
+                        prefix_length, internal = network
+
+                    owner_col.append(owner)
+                    direction_col.append(direction)
+                    peer_type_col.append(peer_type)
+                    peer_col.append(peer)
+                    protocol_col.append(code)
+                    ports_col.append(ports)
+                    prefix_col.append(prefix_length)
+                    internal_col.append(internal)
+                    from_col.append(covered[0])
+                    to_col.append(covered[1])
+                    self._rules.append((owner, direction, conn))
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def values(self, column: str) -> Sequence[Any]:
+        """
+        Get the distinct values a code column refers to.
+
+        Args:
+            column: Column name (any column but from_port and to_port)
+
+        Returns:
+            Sequence indexed by the codes stored in the column
+        """
+        return self._values[column]
+
+    def select(self, column: str, predicate: Callable[[Any], bool], within: Optional[Mask] = None) -> Mask:
+        """
+        Select the rows whose value in a code column satisfies a predicate.
+
+        The predicate is called once per distinct value, not once per row.
+
+        Args:
+            column: Column name (see values())
+            predicate: Function of a value returning True for the rows to select
+            within: Only select among the rows of this mask; cheaper than
+                combining masks afterwards when it selects few rows
+
+        Returns:
+            Row mask
+        """
+        values = self._values[column]
+        codes = self.columns[column]
+        if within is not None and self._backend.count(within) * 16 < len(self._rules):
+            # Few candidate rows (e.g. rules open to the world): test only their values
+            hits: Dict[int, bool] = {}
+            selected = []
+            for row in self._backend.rows(within):
+                code = int(codes[row])
+                hit = hits.get(code)
+                if hit is None:
+                    hit = hits[code] = values[code] is not None and bool(predicate(values[code]))
+                if hit:
+                    selected.append(row)
+            return self._backend.from_rows(selected)
+
+        lookup = bytearray(len(values))
+        for code, value in enumerate(values):
+            if value is not None and predicate(value):
+                lookup[code] = 1
+        mask = self._backend.take(lookup, codes)
+        return mask if within is None else mask & within
+
+    def select_codes(self, column: str, codes: Iterable[int]) -> Mask:
+        """
+        Select the rows whose code in a column is one of the given codes.
+
+        Args:
+            column: Column name (see values())
+            codes: Codes to select
+
+        Returns:
+            Row mask
+        """
+        lookup = bytearray(len(self._values[column]))
+        for code in codes:
+            lookup[code] = 1
+        return self._backend.take(lookup, self.columns[column])
+
+    def all(self) -> Mask:
+        """Mask selecting every row"""
+        return self._backend.full()
+
+    def none(self) -> Mask:
+        """Mask selecting no row"""
+        return self._backend.empty()
+
+    def invert(self, mask: Mask) -> Mask:
+        """
+        Complement a mask.
+
+        Args:
+            mask: Row mask
+
+        Returns:
+            Mask selecting the rows mask does not select
+        """
+        return self._backend.invert(mask)
+
+    def count(self, mask: Mask) -> int:
+        """
+        Count the rows selected by a mask.
+
+        Args:
+            mask: Row mask
+
+        Returns:
+            Number of selected rows
+        """
+        return self._backend.count(mask)
+
+    def rows(self, mask: Mask) -> List[int]:
+        """
+        Get the row numbers selected by a mask.
+
+        Args:
+            mask: Row mask
+
+        Returns:
+            Row numbers in ascending order
+        """
+        return self._backend.rows(mask)
+
+    def rule(self, row: int) -> Dict[str, Any]:
+        """
+        Materialize one rule.
+
+        Args:
+            row: Row number
+
+        Returns:
+            {'security_group', 'security_group_name', 'direction', 'type', 'id',
+            'name', 'protocol', 'from_port', 'to_port', 'description'} with the
+            values of the connection map
+        """
+        owner, direction, conn = self._rules[row]
+        return {
+            'security_group': self.group_ids[owner],
+            'security_group_name': self.group_names[owner],
+            'direction': DIRECTIONS[direction],
+            **conn
+        }
+
+    def rules(self, mask: Mask) -> List[Dict[str, Any]]:
+        """
+        Materialize the rules selected by a mask.
+
+        Args:
+            mask: Row mask
+
+        Returns:
+            Rules (see rule()) in row order
+        """
+        return [self.rule(row) for row in self.rows(mask)]
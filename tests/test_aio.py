@@ -0,0 +1,328 @@
+"""
+Tests for sgmap.aio module
+"""
+
+import asyncio
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+from click.testing import CliRunner
+
+from sgmap.aio import (
+    AdaptiveRateLimiter,
+    AsyncFetcher,
+    backoff_delay,
+    get_security_groups_async,
+    is_throttling_error,
+    scan_vpcs_async
+)
+from sgmap.cache import SnapshotCache
+from sgmap.cli import main
+
+_GROUP_XML = """<item>
+  <ownerId>123456789012</ownerId>
+  <groupId>{group_id}</groupId>
+  <groupName>{name}</groupName>
+  <groupDescription>{name} group</groupDescription>
+  <vpcId>{vpc_id}</vpcId>
+  <ipPermissions>
+    <item>
+      <ipProtocol>tcp</ipProtocol><fromPort>443</fromPort><toPort>443</toPort>
+      <groups><item><groupId>{peer_id}</groupId><userId>123456789012</userId></item></groups>
+      <ipRanges><item><cidrIp>10.0.0.0/8</cidrIp></item></ipRanges>
+    </item>
+  </ipPermissions>
+  <ipPermissionsEgress/>
+</item>"""
+
+_THROTTLED_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Response><Errors><Error><Code>RequestLimitExceeded</Code><Message>Request limit exceeded.</Message></Error></Errors>
+<RequestID>stub</RequestID></Response>"""
+
+_NOT_FOUND_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Response><Errors><Error><Code>InvalidVpcID.NotFound</Code><Message>The vpc ID '{vpc_id}' does not exist</Message></Error></Errors>
+<RequestID>stub</RequestID></Response>"""
+
+
+class StubEc2Endpoint:
+    """
+    Local EC2 query API serving DescribeVpcs and paginated DescribeSecurityGroups
+    from in-memory VPCs, throttling the first `throttle_first` requests
+    """
+
+    def __init__(self, vpcs, page_size=2, throttle_first=0):
+        self.vpcs = vpcs
+        self.page_size = page_size
+        self.throttle_first = throttle_first
+        self.requests = []
+        self._lock = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+                status, payload = endpoint.handle({k: v[0] for k, v in parse_qs(body).items()})
+                data = payload.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def handle(self, params):
+        with self._lock:
+            self.requests.append(params['Action'])
+            if len(self.requests) <= self.throttle_first:
+                return 503, _THROTTLED_XML
+
+        if params['Action'] == 'DescribeVpcs':
+            vpc_ids = [params['VpcId.1']] if 'VpcId.1' in params else list(self.vpcs)
+            missing = [vpc_id for vpc_id in vpc_ids if vpc_id not in self.vpcs]
+            if missing:
+                return 400, _NOT_FOUND_XML.format(vpc_id=missing[0])
+            items = ''.join(
+                f"<item><vpcId>{vpc_id}</vpcId><cidrBlock>10.0.0.0/16</cidrBlock></item>" for vpc_id in vpc_ids
+            )
+            return 200, f"<DescribeVpcsResponse><vpcSet>{items}</vpcSet></DescribeVpcsResponse>"
+
+        vpc_id = params['Filter.1.Value.1']
+        groups = self.vpcs.get(vpc_id, [])
+        start = int(params.get('NextToken', 0))
+        end = start + self.page_size
+        items = ''.join(_GROUP_XML.format(vpc_id=vpc_id, **group) for group in groups[start:end])
+        next_token = f"<nextToken>{end}</nextToken>" if end < len(groups) else ''
+        return 200, (
+            f"<DescribeSecurityGroupsResponse><securityGroupInfo>{items}</securityGroupInfo>"
+            f"{next_token}</DescribeSecurityGroupsResponse>"
+        )
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _groups(prefix, count):
+    """Build `count` groups, each referencing the previous one"""
+    return [
+        {'group_id': f"sg-{prefix}{i}", 'name': f"{prefix}{i}", 'peer_id': f"sg-{prefix}{max(i - 1, 0)}"}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def stub_endpoint(monkeypatch):
+    """
+    Fixture factory for a local EC2 endpoint used by every boto3 client
+    """
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    endpoints = []
+
+    def start(vpcs, **kwargs):
+        endpoint = StubEc2Endpoint(vpcs, **kwargs).__enter__()
+        endpoints.append(endpoint)
+        monkeypatch.setenv('AWS_ENDPOINT_URL_EC2', endpoint.url)
+        return endpoint
+
+    yield start
+    for endpoint in endpoints:
+        endpoint.__exit__(None, None, None)
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveRateLimiter:
+    """Tests for AdaptiveRateLimiter class"""
+
+    def test_token_bucket(self):
+        """Test the burst is served immediately and then tokens refill at the rate"""
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=2, burst=2, clock=clock)
+
+        assert limiter.try_acquire() == 0
+        assert limiter.try_acquire() == 0
+        assert limiter.try_acquire() == pytest.approx(0.5)
+        clock.now = 0.5
+        assert limiter.try_acquire() == 0
+
+    def test_aimd(self):
+        """Test throttling halves the rate and empties the bucket; successes restore it"""
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=8, min_rate=1, increase=1, clock=clock)
+
+        limiter.on_throttle()
+        limiter.on_throttle()
+        assert limiter.rate == 2
+        assert limiter.try_acquire() == pytest.approx(0.5)
+
+        for _ in range(10):
+            limiter.on_success()
+        assert limiter.rate == 8
+
+        for _ in range(10):
+            limiter.on_throttle()
+        assert limiter.rate == 1
+
+
+class TestBackoff:
+    """Tests for backoff_delay and is_throttling_error functions"""
+
+    def test_full_jitter(self):
+        """Test delays are bounded by the exponential cap"""
+        rng = random.Random(1)
+        delays = [backoff_delay(attempt, 0.1, 1.0, rng) for attempt in range(10)]
+
+        assert all(0 <= delay <= min(1.0, 0.1 * 2 ** attempt) for attempt, delay in enumerate(delays))
+
+    def test_is_throttling_error(self):
+        """Test throttling is recognized from the error code"""
+        error = Exception()
+        error.response = {'Error': {'Code': 'RequestLimitExceeded'}}
+
+        assert is_throttling_error(error)
+        assert not is_throttling_error(ValueError())
+
+
+class TestAsyncFetcher:
+    """Tests for AsyncFetcher against a local EC2 endpoint"""
+
+    def test_get_security_groups(self, stub_endpoint):
+        """Test every page is fetched and the result matches the sync API's shape"""
+        endpoint = stub_endpoint({'vpc-1': _groups('a', 5)})
+
+        vpc_and_sgs = asyncio.run(get_security_groups_async('vpc-1'))
+
+        assert vpc_and_sgs['vpc']['VpcId'] == 'vpc-1'
+        assert [sg['GroupId'] for sg in vpc_and_sgs['security_groups']] == [f"sg-a{i}" for i in range(5)]
+        assert vpc_and_sgs['security_groups'][1]['IpPermissions'][0]['UserIdGroupPairs'][0]['GroupId'] == 'sg-a0'
+        assert endpoint.requests.count('DescribeSecurityGroups') == 3
+
+    def test_throttling_is_retried_and_slows_down(self, stub_endpoint):
+        """Test throttled calls are retried with backoff and lower the region's rate"""
+        endpoint = stub_endpoint({'vpc-1': _groups('a', 3)}, throttle_first=3)
+
+        async def fetch():
+            async with AsyncFetcher(rate=50, base_delay=0.01) as fetcher:
+                result = await fetcher.get_security_groups('vpc-1')
+                return result, fetcher.limiter().rate
+
+        vpc_and_sgs, rate = asyncio.run(fetch())
+
+        assert len(vpc_and_sgs['security_groups']) == 3
+        assert len(endpoint.requests) == 3 + 3
+        assert rate < 50
+
+    def test_gives_up_after_max_attempts(self, stub_endpoint):
+        """Test the throttling error is raised once the attempts are exhausted"""
+        stub_endpoint({'vpc-1': []}, throttle_first=100)
+
+        with pytest.raises(Exception) as excinfo:
+            asyncio.run(get_security_groups_async(
+                'vpc-1', max_attempts=2, base_delay=0.01
+            ))
+
+        assert is_throttling_error(excinfo.value)
+
+    def test_scan_vpcs(self, stub_endpoint, tmp_path):
+        """Test VPCs are scanned concurrently, missing ones skipped and snapshots cached"""
+        endpoint = stub_endpoint({'vpc-1': _groups('a', 3), 'vpc-2': _groups('b', 4)})
+        cache = SnapshotCache(str(tmp_path))
+
+        scan = asyncio.run(scan_vpcs_async(
+            ['vpc-1', 'vpc-missing', 'vpc-2'], cache=cache
+        ))
+
+        vpcs = scan['regions']['us-east-1']
+        assert list(vpcs) == ['vpc-1', 'vpc-2']
+        assert vpcs['vpc-2']['security_groups']['sg-b3']['inbound'][0]['name'] == 'b2'
+
+        requests = len(endpoint.requests)
+        cached = asyncio.run(scan_vpcs_async(['vpc-1', 'vpc-2'], cache=cache))
+        assert cached == scan
+        assert len(endpoint.requests) == requests
+
+    def test_scan_all_vpcs(self, stub_endpoint):
+        """Test every VPC of the region is listed and scanned"""
+        stub_endpoint({'vpc-1': _groups('a', 1), 'vpc-2': _groups('b', 1)})
+
+        scan = asyncio.run(scan_vpcs_async(all_vpcs=True))
+
+        assert list(scan['regions']['us-east-1']) == ['vpc-1', 'vpc-2']
+
+    def test_prefix_lists_are_fetched_once(self):
+        """Test prefix list entries are paginated, shared between callers and unreadable lists resolve to None"""
+        class Ec2:
+            def __init__(self):
+                self.requests = []
+
+            def get_managed_prefix_list_entries(self, PrefixListId, NextToken=None):
+                self.requests.append((PrefixListId, NextToken))
+                if PrefixListId == 'pl-missing':
+                    error = Exception('not found')
+                    error.response = {'Error': {'Code': 'InvalidPrefixListID.NotFound'}}
+                    raise error
+                if NextToken is None:
+                    return {'Entries': [{'Cidr': '52.216.0.0/15'}], 'NextToken': 'next'}
+                return {'Entries': [{'Cidr': '3.5.0.0/19'}]}
+
+        ec2 = Ec2()
+        groups = [{'IpPermissions': [{'PrefixListIds': [{'PrefixListId': 'pl-s3'}, {'PrefixListId': 'pl-missing'}]}]}]
+
+        async def resolve():
+            async with AsyncFetcher(client_factory=lambda region: ec2) as fetcher:
+                return await asyncio.gather(
+                    fetcher.resolve_prefix_lists(groups), fetcher.resolve_prefix_lists(groups)
+                )
+
+        first, second = asyncio.run(resolve())
+
+        assert first == second == {'pl-s3': ['52.216.0.0/15', '3.5.0.0/19'], 'pl-missing': None}
+        assert sorted(ec2.requests, key=str) == [('pl-missing', None), ('pl-s3', 'next'), ('pl-s3', None)]
+
+    def test_requires_context(self):
+        """Test calls outside `async with` are rejected"""
+        with pytest.raises(RuntimeError):
+            asyncio.run(AsyncFetcher(client_factory=lambda region: None).call(None, 'describe_vpcs'))
+
+
+class TestMaxRpsOption:
+    """Tests for the --max-rps option"""
+
+    def test_scan(self, stub_endpoint):
+        """Test several VPCs are scanned with the asyncio backend"""
+        stub_endpoint({'vpc-1': _groups('a', 3), 'vpc-2': _groups('b', 2)}, throttle_first=1)
+
+        result = CliRunner().invoke(main, ['-v', 'vpc-1', '-v', 'vpc-2', '--max-rps', '50', '--json'])
+
+        assert result.exit_code == 0
+        assert list(json.loads(result.output)['regions']['us-east-1']) == ['vpc-1', 'vpc-2']
+
+    def test_requires_several_vpcs(self):
+        """Test the option is rejected for a single VPC"""
+        result = CliRunner().invoke(main, ['-v', 'vpc-1', '--max-rps', '10'])
+
+        assert result.exit_code == 2
+        assert "'--max-rps' requires several VPCs" in result.output
@@ -0,0 +1,205 @@
+"""
+Tests for sgmap.audit module
+"""
+
+import ipaddress
+import json
+import random
+
+import pytest
+
+from sgmap.audit import DEFAULT_CHECKS, AuditCheck, audit_connections, load_checks, run_audit
+from sgmap.core import analyze_security_group_connections
+from sgmap.intervals import canonical_protocol, port_range
+from sgmap.table import RuleTable
+
+
+def _conn(peer_type, peer, protocol='tcp', from_port=443, to_port=443):
+    return {'type': peer_type, 'id': peer, 'name': peer, 'protocol': protocol,
+            'from_port': from_port, 'to_port': to_port, 'description': ''}
+
+
+@pytest.fixture(params=['array', 'numpy'])
+def backend(request):
+    """
+    Fixture for each table backend (numpy is skipped when NumPy is not installed)
+    """
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    return request.param
+
+
+@pytest.fixture
+def connections():
+    """
+    Fixture for a connection map violating each built-in check once
+    """
+    return {
+        'vpc': {'id': 'vpc-1', 'cidr': '10.0.0.0/16', 'name': '', 'tags': []},
+        'security_groups': {
+            'sg-bastion': {'name': 'bastion', 'description': '', 'tags': [], 'inbound': [
+                _conn('cidr', '0.0.0.0/0', 'tcp', 22, 22),
+                _conn('cidr', '::/0', '6', 3380, 3400),
+                _conn('cidr', '10.0.0.0/16', 'tcp', 5432, 5432)
+            ], 'outbound': [
+                _conn('security_group', 'sg-db', '-1', 'all', 'all'),
+                _conn('security_group', 'sg-peer-vpc', '-1', 'all', 'all')
+            ]},
+            'sg-db': {'name': 'db', 'description': '', 'tags': [], 'inbound': [
+                _conn('cidr', '0.0.0.0/0', 'all', 'all', 'all')
+            ], 'outbound': []}
+        }
+    }
+
+
+def _reference(connections, check):
+    """Evaluate a check by walking the connection map, for comparison with the table"""
+    vpc = ipaddress.ip_network(connections['vpc']['cidr'])
+    flagged = []
+    for sg_id, sg_data in connections['security_groups'].items():
+        for direction in ('inbound', 'outbound'):
+            for conn in sg_data[direction]:
+                match = check.match
+                protocol = canonical_protocol(conn['protocol'])
+                start, end = port_range(conn['protocol'], conn['from_port'], conn['to_port'])
+                network = ipaddress.ip_network(conn['id']) if conn['type'] == 'cidr' else None
+                internal = conn['id'] in connections['security_groups'] if network is None else \
+                    network.version == vpc.version and network.subnet_of(vpc)
+                if 'direction' in match and direction != match['direction']:
+                    continue
+                if 'peer_type' in match and conn['type'] != match['peer_type']:
+                    continue
+                if 'peer' in match and internal != (match['peer'] == 'internal'):
+                    continue
+                if 'protocols' in match and protocol not in match['protocols']:
+                    continue
+                if 'cidrs' in match and (network is None or conn['id'] not in match['cidrs']):
+                    continue
+                if 'max_prefix_length' in match and (network is None or network.prefixlen > match['max_prefix_length']):
+                    continue
+                if 'security_groups' in match and sg_id not in match['security_groups']:
+                    continue
+                if sg_id in match.get('exclude_security_groups', []):
+                    continue
+                if 'ports' in match and not any(
+                    protocol == '-1' or (protocol == spec_protocol and (port is None or start <= port <= end))
+                    for spec_protocol, port in match['ports'] if spec_protocol != '-1'
+                ) and protocol != '-1':
+                    continue
+                flagged.append((sg_id, direction, conn['id'], conn['protocol']))
+    return flagged
+
+
+class TestAuditCheck:
+    """Tests for AuditCheck class"""
+
+    def test_from_dict(self):
+        """Test conditions are validated and normalized"""
+        check = AuditCheck.from_dict({
+            'id': 'dns', 'match': {'ports': '53/udp', 'protocols': ['6', 'all'], 'cidrs': '0.0.0.0/0'}
+        })
+
+        assert (check.id, check.title, check.severity) == ('dns', 'dns', 'medium')
+        assert check.match == {'ports': [('udp', 53)], 'protocols': ['tcp', '-1'], 'cidrs': ['0.0.0.0/0']}
+
+    @pytest.mark.parametrize('data', [
+        {'match': {}},
+        {'id': 'x', 'severity': 'urgent'},
+        {'id': 'x', 'match': {'direction': 'ingress'}},
+        {'id': 'x', 'match': {'ports': ['ssh/tcp']}},
+        {'id': 'x', 'match': {'max_prefix_length': 200}},
+        {'id': 'x', 'match': {'color': 'red'}},
+        {'id': 'x', 'matches': {}}
+    ])
+    def test_invalid(self, data):
+        """Test invalid checks are rejected"""
+        with pytest.raises(ValueError):
+            AuditCheck.from_dict(data)
+
+    def test_load_checks(self, tmp_path):
+        """Test a file may hold a list of checks or an object with a checks list"""
+        path = tmp_path / 'checks.json'
+        path.write_text(json.dumps({'checks': [{'id': 'a'}, {'id': 'b', 'severity': 'low'}]}))
+        assert [check.id for check in load_checks(str(path))] == ['a', 'b']
+
+        path.write_text(json.dumps({'id': 'a'}))
+        with pytest.raises(ValueError):
+            load_checks(str(path))
+
+
+class TestRunAudit:
+    """Tests for run_audit and audit_connections functions"""
+
+    def test_default_checks(self, connections, backend):
+        """Test each built-in check flags its rule, including through all-traffic rules"""
+        findings = audit_connections(connections, backend=backend)
+
+        assert [(f['check'], f['security_group'], f['id']) for f in findings] == [
+            ('ssh-open-to-world', 'sg-bastion', '0.0.0.0/0'),
+            ('ssh-open-to-world', 'sg-db', '0.0.0.0/0'),
+            ('rdp-open-to-world', 'sg-bastion', '::/0'),
+            ('rdp-open-to-world', 'sg-db', '0.0.0.0/0'),
+            ('database-open-to-world', 'sg-db', '0.0.0.0/0'),
+            ('all-traffic-from-world', 'sg-db', '0.0.0.0/0'),
+            ('all-traffic-to-external-group', 'sg-bastion', 'sg-peer-vpc')
+        ]
+        assert findings[0]['severity'] == 'high'
+        assert findings[0]['title'] == 'SSH open to the Internet'
+
+    def test_min_severity_and_exclusions(self, connections, backend):
+        """Test checks below the severity are skipped and excluded groups are never flagged"""
+        checks = [AuditCheck.from_dict(check) for check in DEFAULT_CHECKS]
+        checks.append(AuditCheck.from_dict({
+            'id': 'ssh-except-bastion', 'severity': 'critical',
+            'match': {'ports': ['22'], 'cidrs': ['0.0.0.0/0'], 'exclude_security_groups': ['sg-bastion']}
+        }))
+        table = RuleTable.from_connections(connections, backend)
+
+        findings = run_audit(table, checks, min_severity='critical')
+
+        assert [(f['check'], f['security_group']) for f in findings] == [
+            ('all-traffic-from-world', 'sg-db'), ('ssh-except-bastion', 'sg-db')
+        ]
+        with pytest.raises(ValueError):
+            run_audit(table, checks, min_severity='severe')
+
+    def test_matches_reference(self, backend):
+        """Test random checks over random rules against a walk over the connection map"""
+        rng = random.Random(3)
+        cidrs = ['0.0.0.0/0', '::/0', '10.0.0.0/8', '10.0.1.0/24', '192.168.0.0/16', '2001:db8::/32']
+        groups = [f"sg-{i}" for i in range(30)]
+        connections = {'vpc': {'id': 'vpc-1', 'cidr': '10.0.0.0/16'}, 'security_groups': {}}
+        for sg_id in groups:
+            rules = {'inbound': [], 'outbound': []}
+            for _ in range(rng.randint(0, 12)):
+                protocol = rng.choice(['tcp', 'udp', '6', '-1', 'icmp'])
+                start = rng.randint(0, 65535)
+                ports = ('all', 'all') if protocol == '-1' else (start, min(65535, start + rng.choice([0, 10, 1000])))
+                peer = rng.choice([('cidr', rng.choice(cidrs)), ('security_group', rng.choice(groups + ['sg-x']))])
+                rules[rng.choice(['inbound', 'outbound'])].append(_conn(*peer, protocol, *ports))
+            connections['security_groups'][sg_id] = {'name': sg_id, **rules}
+
+        table = RuleTable.from_connections(connections, backend)
+        for i in range(200):
+            match = {}
+            for key, values in [
+                ('direction', ['inbound', 'outbound']), ('peer_type', ['security_group', 'cidr']),
+                ('peer', ['internal', 'external']), ('protocols', [['tcp'], ['-1'], ['udp', 'icmp']]),
+                ('cidrs', [cidrs[:2], cidrs[2:4]]), ('max_prefix_length', [0, 8, 16]),
+                ('security_groups', [groups[:10]]), ('exclude_security_groups', [groups[5:20]]),
+                ('ports', [[f"{rng.randint(0, 65535)}/tcp"], ['53/udp', '22'], ['icmp'], ['all']])
+            ]:
+                if rng.random() < 0.3:
+                    match[key] = rng.choice(values)
+            check = AuditCheck.from_dict({'id': f"check-{i}", 'match': match})
+
+            findings = run_audit(table, [check])
+
+            assert [(f['security_group'], f['direction'], f['id'], f['protocol']) for f in findings] == \
+                _reference(connections, check), match
+
+    def test_analyzed_connections(self, sample_vpc_and_sgs, backend):
+        """Test the sample VPC passes the built-in checks"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        assert audit_connections(connections, backend=backend) == []
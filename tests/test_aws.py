@@ -0,0 +1,123 @@
+"""
+Tests for sgmap.aws module
+"""
+
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from sgmap.aws import configured_region, ec2_client
+
+
+def _run_isolated(code):
+    """Run code in a fresh interpreter with the same import path"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+
+
+class TestEc2Client:
+    """Tests for ec2_client function"""
+
+    def test_default_region(self):
+        """Test the client uses the configured region by default"""
+        with patch('boto3.client') as mock_client:
+            ec2_client()
+
+        mock_client.assert_called_once_with('ec2')
+
+    def test_region_name(self):
+        """Test the client can be created for a given region"""
+        with patch('boto3.client') as mock_client:
+            ec2_client('eu-west-1')
+
+        mock_client.assert_called_once_with('ec2', region_name='eu-west-1')
+
+
+class TestConfiguredRegion:
+    """Tests for configured_region function"""
+
+    @pytest.fixture
+    def config(self, tmp_path, monkeypatch):
+        """Fixture for an AWS config file and an environment without region variables"""
+        path = tmp_path / 'config'
+        path.write_text('[default]\nregion = us-west-2\n\n[profile dev]\nregion = eu-west-1\n')
+        for name in ('AWS_REGION', 'AWS_DEFAULT_REGION', 'AWS_PROFILE', 'AWS_DEFAULT_PROFILE'):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv('AWS_CONFIG_FILE', str(path))
+        return path
+
+    def test_profile_region(self, config, monkeypatch):
+        """Test the region of the default or active profile is read from the config file"""
+        assert configured_region() == 'us-west-2'
+        monkeypatch.setenv('AWS_PROFILE', 'dev')
+        assert configured_region() == 'eu-west-1'
+        monkeypatch.setenv('AWS_PROFILE', 'missing')
+        assert configured_region() is None
+
+    def test_environment_takes_precedence(self, config, monkeypatch):
+        """Test the region environment variables override the config file"""
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'ap-northeast-1')
+        assert configured_region() == 'ap-northeast-1'
+        monkeypatch.setenv('AWS_REGION', 'sa-east-1')
+        assert configured_region() == 'sa-east-1'
+
+
+class TestLazyImport:
+    """Tests that boto3 is only loaded for live fetches"""
+
+    @pytest.mark.parametrize('code', [
+        'import sgmap',
+        'import sgmap.cli',
+        'from sgmap.cli import main\ntry:\n    main(["--help"])\nexcept SystemExit:\n    pass',
+    ])
+    def test_boto3_not_imported(self, code):
+        """Test importing sgmap and running --help do not import boto3"""
+        result = _run_isolated(code + '\nimport sys\nassert "boto3" not in sys.modules\nassert "botocore" not in sys.modules')
+
+        assert result.returncode == 0, result.stderr
+
+    def test_offline_render_does_not_import_boto3(self, tmp_path, sample_security_groups_response):
+        """Test rendering saved describe-security-groups output does not import boto3"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+
+        result = _run_isolated(
+            'from sgmap.cli import main\n'
+            'try:\n'
+            f'    main(["--from-file", {str(path)!r}, "--compact"])\n'
+            'except SystemExit as e:\n'
+            '    assert not e.code, e.code\n'
+            'import sys\n'
+            'assert "boto3" not in sys.modules'
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert 'SG_sg_11111111' in result.stdout
+
+    def test_cached_run_does_not_import_boto3(self, tmp_path, sample_vpc_and_sgs):
+        """Test rendering a fresh cached snapshot does not import boto3"""
+        snapshot = tmp_path / 'snapshot.json'
+        snapshot.write_text(json.dumps(sample_vpc_and_sgs))
+
+        result = _run_isolated(
+            'import json, os\n'
+            'os.environ["AWS_DEFAULT_REGION"] = "us-east-1"\n'
+            'from sgmap.cache import SnapshotCache, snapshot_key\n'
+            f'cache = SnapshotCache({str(tmp_path)!r})\n'
+            f'cache.put(snapshot_key("us-east-1", "vpc-12345678", None), json.load(open({str(snapshot)!r})))\n'
+            'from sgmap.cli import main\n'
+            'try:\n'
+            f'    main(["--vpc-id", "vpc-12345678", "--cache-dir", {str(tmp_path)!r}])\n'
+            'except SystemExit as e:\n'
+            '    assert not e.code, e.code\n'
+            'import sys\n'
+            'assert "boto3" not in sys.modules\n'
+            'assert "botocore" not in sys.modules'
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert 'SG_sg_11111111' in result.stdout
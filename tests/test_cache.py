@@ -0,0 +1,140 @@
+"""
+Tests for sgmap.cache module
+"""
+
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from sgmap.cache import SnapshotCache, get_security_groups_cached, snapshot_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """
+    Fixture for a snapshot cache in a temporary directory
+    """
+    return SnapshotCache(str(tmp_path), max_age=60)
+
+
+def _age(path, seconds):
+    """Make a file look `seconds` old"""
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+class TestSnapshotCache:
+    """Tests for SnapshotCache class"""
+
+    def test_make_key_depends_on_every_part(self):
+        """Test keys differ by account, region, VPC and filter"""
+        base = SnapshotCache.make_key('acct', 'us-east-1', 'vpc-1', {'group-id': None})
+        assert base == SnapshotCache.make_key('acct', 'us-east-1', 'vpc-1', {'group-id': None})
+        assert base != SnapshotCache.make_key('other', 'us-east-1', 'vpc-1', {'group-id': None})
+        assert base != SnapshotCache.make_key('acct', 'eu-west-1', 'vpc-1', {'group-id': None})
+        assert base != SnapshotCache.make_key('acct', 'us-east-1', 'vpc-2', {'group-id': None})
+        assert base != SnapshotCache.make_key('acct', 'us-east-1', 'vpc-1', {'group-id': 'sg-1'})
+
+    def test_put_and_get(self, cache, sample_vpc_and_sgs):
+        """Test a stored snapshot is returned while fresh"""
+        cache.put('key', sample_vpc_and_sgs)
+
+        assert cache.get('key') == sample_vpc_and_sgs
+        assert cache.get('missing') is None
+
+    def test_get_expired(self, cache, sample_vpc_and_sgs, tmp_path):
+        """Test a snapshot older than max_age is a miss"""
+        cache.put('key', sample_vpc_and_sgs)
+        _age(tmp_path / 'key.json', 120)
+
+        assert cache.get('key') is None
+
+    def test_evict_by_age(self, tmp_path, sample_vpc_and_sgs):
+        """Test snapshots past the retention period are removed"""
+        cache = SnapshotCache(str(tmp_path), retention=3600)
+        cache.put('old', sample_vpc_and_sgs)
+        _age(tmp_path / 'old.json', 7200)
+        cache.put('new', sample_vpc_and_sgs)
+
+        assert not (tmp_path / 'old.json').exists()
+        assert (tmp_path / 'new.json').exists()
+
+    def test_evict_by_size(self, tmp_path, sample_vpc_and_sgs):
+        """Test the oldest snapshots are removed to stay within max_bytes"""
+        cache = SnapshotCache(str(tmp_path))
+        cache.put('first', sample_vpc_and_sgs)
+        size = (tmp_path / 'first.json').stat().st_size
+        _age(tmp_path / 'first.json', 20)
+        cache.put('second', sample_vpc_and_sgs)
+        _age(tmp_path / 'second.json', 10)
+
+        # Room for two snapshots but not three (sizes vary by a few bytes with the timestamp)
+        cache.max_bytes = size * 2 + size // 2
+        cache.put('third', sample_vpc_and_sgs)
+
+        assert sorted(os.listdir(tmp_path)) == ['second.json', 'third.json']
+
+
+class TestGetSecurityGroupsCached:
+    """Tests for get_security_groups_cached function"""
+
+    @patch('sgmap.cache.get_security_groups')
+    def test_cached_run_skips_fetch(self, mock_get_sg, cache, sample_vpc_and_sgs):
+        """Test the second call is served from the cache"""
+        mock_get_sg.return_value = sample_vpc_and_sgs
+
+        first = get_security_groups_cached(cache, 'vpc-12345678', region='us-east-1')
+        second = get_security_groups_cached(cache, 'vpc-12345678', region='us-east-1')
+
+        assert first == second == sample_vpc_and_sgs
+        mock_get_sg.assert_called_once_with('vpc-12345678', None, page_size=None, ec2=None)
+
+    @patch('sgmap.cache.get_security_groups')
+    def test_refresh_fetches_again(self, mock_get_sg, cache, sample_vpc_and_sgs):
+        """Test refresh=True bypasses a fresh snapshot"""
+        mock_get_sg.return_value = sample_vpc_and_sgs
+
+        get_security_groups_cached(cache, 'vpc-12345678', region='us-east-1')
+        get_security_groups_cached(cache, 'vpc-12345678', region='us-east-1', refresh=True)
+
+        assert mock_get_sg.call_count == 2
+
+    @patch('sgmap.cache.get_security_groups')
+    def test_missing_vpc_not_cached(self, mock_get_sg, cache):
+        """Test a missing VPC is not stored"""
+        mock_get_sg.return_value = {'vpc': None, 'security_groups': []}
+
+        get_security_groups_cached(cache, 'vpc-nonexistent', region='us-east-1')
+        get_security_groups_cached(cache, 'vpc-nonexistent', region='us-east-1')
+
+        assert mock_get_sg.call_count == 2
+
+    @patch('sgmap.cache.get_security_groups')
+    def test_region_from_config_file(self, mock_get_sg, cache, sample_vpc_and_sgs, tmp_path, monkeypatch):
+        """Test the cache is keyed by the region of the profile in the AWS config file"""
+        mock_get_sg.return_value = sample_vpc_and_sgs
+        config = tmp_path / 'config'
+        monkeypatch.delenv('AWS_REGION', raising=False)
+        monkeypatch.delenv('AWS_DEFAULT_REGION', raising=False)
+        monkeypatch.setenv('AWS_CONFIG_FILE', str(config))
+        monkeypatch.setenv('AWS_PROFILE', 'dev')
+
+        config.write_text('[profile dev]\nregion = eu-west-1\n')
+        get_security_groups_cached(cache, 'vpc-12345678')
+        config.write_text('[profile dev]\nregion = ap-northeast-1\n')
+        get_security_groups_cached(cache, 'vpc-12345678')
+
+        assert mock_get_sg.call_count == 2
+        assert get_security_groups_cached(cache, 'vpc-12345678', region='eu-west-1') == sample_vpc_and_sgs
+        assert mock_get_sg.call_count == 2
+
+    def test_cache_hit_creates_no_client(self, cache, sample_vpc_and_sgs, monkeypatch):
+        """Test a fresh snapshot is returned without creating an EC2 client"""
+        monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        cache.put(snapshot_key('us-east-1', 'vpc-12345678', None), sample_vpc_and_sgs)
+
+        with patch('sgmap.aws.ec2_client', side_effect=AssertionError('client created')), \
+                patch('sgmap.core.ec2_client', side_effect=AssertionError('client created')):
+            assert get_security_groups_cached(cache, 'vpc-12345678') == sample_vpc_and_sgs
@@ -0,0 +1,146 @@
+"""
+Tests for sgmap.cidr_index module
+"""
+
+import ipaddress
+import random
+
+import pytest
+
+from sgmap.cidr_index import CidrIndex, parse_network
+from sgmap.core import analyze_security_group_connections, build_connection_graph
+
+
+def _conn(cidr, protocol='tcp', from_port=443, to_port=443, name=None):
+    return {'type': 'cidr', 'id': cidr, 'name': name or cidr, 'protocol': protocol,
+            'from_port': from_port, 'to_port': to_port, 'description': ''}
+
+
+@pytest.fixture
+def connections():
+    """
+    Fixture for a connection map with nested IPv4 and IPv6 CIDR peers
+    """
+    return {
+        'vpc': {'id': 'vpc-1', 'cidr': '10.0.0.0/16', 'name': '', 'tags': []},
+        'security_groups': {
+            'sg-public': {'name': 'public', 'description': '', 'tags': [], 'inbound': [
+                _conn('0.0.0.0/0', name='Internet'), _conn('::/0')
+            ], 'outbound': [_conn('0.0.0.0/0', '-1', 'all', 'all')]},
+            'sg-office': {'name': 'office', 'description': '', 'tags': [], 'inbound': [
+                _conn('203.0.113.0/24', 'tcp', 22, 22), _conn('2001:db8::/32', 'tcp', 22, 22)
+            ], 'outbound': []},
+            'sg-host': {'name': 'host', 'description': '', 'tags': [], 'inbound': [
+                _conn('203.0.113.10/32', 'udp', 53, 53), _conn('pl-12345678'),
+                {'type': 'security_group', 'id': 'sg-office', 'name': 'office', 'protocol': 'tcp',
+                 'from_port': 22, 'to_port': 22, 'description': ''}
+            ], 'outbound': []}
+        }
+    }
+
+
+class TestParseNetwork:
+    """Tests for parse_network function"""
+
+    def test_parse_network(self):
+        """Test addresses, CIDRs with host bits and non-CIDR peers"""
+        assert parse_network('10.1.2.3') == (4, 0x0A010203, 32)
+        assert parse_network('10.1.2.3/8') == (4, 0x0A000000, 8)
+        assert parse_network('2001:db8::/32') == (6, 0x20010DB8 << 96, 32)
+        assert parse_network('pl-12345678') is None
+        assert parse_network('unknown') is None
+
+
+class TestCidrIndex:
+    """Tests for CidrIndex class"""
+
+    def test_containing(self, connections):
+        """Test every rule whose CIDR contains the address is found, in rule order"""
+        index = CidrIndex.from_connections(connections)
+
+        matches = index.containing('203.0.113.10')
+
+        assert [(m['security_group'], m['direction'], m['cidr']) for m in matches] == [
+            ('sg-public', 'inbound', '0.0.0.0/0'),
+            ('sg-public', 'outbound', '0.0.0.0/0'),
+            ('sg-office', 'inbound', '203.0.113.0/24'),
+            ('sg-host', 'inbound', '203.0.113.10/32')
+        ]
+        assert matches[0] == {
+            'security_group': 'sg-public',
+            'security_group_name': 'public',
+            'direction': 'inbound',
+            'cidr': '0.0.0.0/0',
+            'name': 'Internet',
+            'protocol': 'tcp',
+            'from_port': 443,
+            'to_port': 443,
+            'description': ''
+        }
+        assert [m['cidr'] for m in index.containing('203.0.113.0/24')] == [
+            '0.0.0.0/0', '0.0.0.0/0', '203.0.113.0/24'
+        ]
+        assert [m['cidr'] for m in index.containing('2001:db8:1::1')] == ['::/0', '2001:db8::/32']
+
+    def test_overlapping(self, connections):
+        """Test overlap lookups also find rules for parts of the network"""
+        index = CidrIndex.from_connections(connections)
+
+        assert [m['cidr'] for m in index.overlapping('203.0.0.0/16')] == [
+            '0.0.0.0/0', '0.0.0.0/0', '203.0.113.0/24', '203.0.113.10/32'
+        ]
+        assert [m['cidr'] for m in index.overlapping('::/0')] == ['::/0', '2001:db8::/32']
+        assert [m['cidr'] for m in index.overlapping('198.51.100.0/24')] == ['0.0.0.0/0', '0.0.0.0/0']
+
+    def test_filters(self, connections):
+        """Test direction, protocol and port filters"""
+        index = CidrIndex.from_connections(connections)
+
+        def cidrs(**filters):
+            return [(m['direction'], m['cidr']) for m in index.containing('203.0.113.10', **filters)]
+
+        assert cidrs(direction='outbound') == [('outbound', '0.0.0.0/0')]
+        assert cidrs(direction='inbound', protocol='tcp', port=22) == [('inbound', '203.0.113.0/24')]
+        # Rules for all protocols match any protocol and port
+        assert cidrs(protocol='17', port=53) == [('outbound', '0.0.0.0/0'), ('inbound', '203.0.113.10/32')]
+
+    def test_non_cidr_peers_are_skipped(self, connections):
+        """Test prefix list IDs and security group peers are not indexed"""
+        index = CidrIndex.from_connections(connections)
+
+        assert len(index) == 6
+        assert index.skipped == 1
+        with pytest.raises(ValueError):
+            index.containing('pl-12345678')
+
+    def test_from_graph(self, sample_vpc_and_sgs):
+        """Test the index built from a graph matches the one built from the connection map"""
+        from_graph = CidrIndex.from_graph(build_connection_graph(sample_vpc_and_sgs))
+        from_connections = CidrIndex.from_connections(analyze_security_group_connections(sample_vpc_and_sgs))
+
+        assert from_graph.containing('192.0.2.1') == from_connections.containing('192.0.2.1')
+        assert len(from_graph.containing('192.0.2.1')) == 3
+
+    def test_matches_linear_scan(self):
+        """Test random containment and overlap lookups against ipaddress"""
+        rng = random.Random(7)
+        index = CidrIndex()
+        networks = []
+        for i in range(2000):
+            width = 32 if rng.random() < 0.7 else 128
+            length = rng.randint(0, width)
+            network = ipaddress.ip_network((rng.getrandbits(length) << (width - length), length)) \
+                if width == 32 else ipaddress.IPv6Network((rng.getrandbits(length) << (width - length), length))
+            networks.append(network)
+            index.add_rule(f"sg-{i}", 'inbound', str(network), '-1', 'all', 'all')
+
+        for _ in range(200):
+            width = 32 if rng.random() < 0.7 else 128
+            length = rng.choice([width, rng.randint(0, width)])
+            bits = rng.getrandbits(length) << (width - length) if length else 0
+            target = ipaddress.ip_network((bits, length)) if width == 32 else ipaddress.IPv6Network((bits, length))
+
+            containing = [f"sg-{i}" for i, n in enumerate(networks) if n.version == target.version and target.subnet_of(n)]
+            overlapping = [f"sg-{i}" for i, n in enumerate(networks) if n.version == target.version and n.overlaps(target)]
+            assert [m['security_group'] for m in index.containing(str(target))] == containing
+            assert [m['security_group'] for m in index.overlapping(str(target))] == overlapping
@@ -2,11 +2,13 @@
 Tests for sgmap.cli module
 """
 
-from unittest.mock import patch, MagicMock
+import json
+from unittest.mock import ANY, patch, MagicMock
 import pytest
 from click.testing import CliRunner
 
 from sgmap.cli import main
+from sgmap.core import analyze_security_group_connections, generate_mermaid_diagram
 
 
 class TestCli:
@@ -19,15 +21,15 @@ class TestCli:
 
     @patch('sgmap.cli.get_security_groups')
     @patch('sgmap.cli.analyze_security_group_connections')
-    @patch('sgmap.cli.generate_mermaid_diagram')
+    @patch('sgmap.cli.write_mermaid_diagram')
     def test_main_with_mermaid_output(
-        self, mock_generate_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
+        self, mock_write_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
     ):
         """Test main function with mermaid output"""
         # Setup mocks
         mock_get_sg.return_value = sample_vpc_and_sgs
         mock_analyze.return_value = {'vpc': {}, 'security_groups': {}}
-        mock_generate_mermaid.return_value = "```mermaid\nflowchart LR\n```"
+        mock_write_mermaid.side_effect = lambda connections, fp, include_vpc, compact: fp.write("```mermaid\nflowchart LR\n```\n")
 
         # Run the CLI command
         result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678'])
@@ -38,21 +40,21 @@ class TestCli:
         assert "flowchart LR" in result.output
 
         # Verify the function calls
-        mock_get_sg.assert_called_once_with('vpc-12345678', None)
+        mock_get_sg.assert_called_once_with('vpc-12345678', None, page_size=None, stream=True)
         mock_analyze.assert_called_once_with(sample_vpc_and_sgs)
-        mock_generate_mermaid.assert_called_once_with({'vpc': {}, 'security_groups': {}}, False)
+        mock_write_mermaid.assert_called_once_with({'vpc': {}, 'security_groups': {}}, ANY, False, False)
 
     @patch('sgmap.cli.get_security_groups')
     @patch('sgmap.cli.analyze_security_group_connections')
-    @patch('sgmap.cli.generate_json_output')
+    @patch('sgmap.cli.write_json_output')
     def test_main_with_json_output(
-        self, mock_generate_json, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
+        self, mock_write_json, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
     ):
         """Test main function with JSON output"""
         # Setup mocks
         mock_get_sg.return_value = sample_vpc_and_sgs
         mock_analyze.return_value = {'vpc': {}, 'security_groups': {}}
-        mock_generate_json.return_value = '{"vpc": {}, "security_groups": {}}'
+        mock_write_json.side_effect = lambda connections, fp: fp.write('{"vpc": {}, "security_groups": {}}\n')
 
         # Run the CLI command
         result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--json'])
@@ -62,21 +64,21 @@ class TestCli:
         assert '{"vpc": {}, "security_groups": {}}' in result.output
 
         # Verify the function calls
-        mock_get_sg.assert_called_once_with('vpc-12345678', None)
+        mock_get_sg.assert_called_once_with('vpc-12345678', None, page_size=None, stream=True)
         mock_analyze.assert_called_once_with(sample_vpc_and_sgs)
-        mock_generate_json.assert_called_once_with({'vpc': {}, 'security_groups': {}})
+        mock_write_json.assert_called_once_with({'vpc': {}, 'security_groups': {}}, ANY)
 
     @patch('sgmap.cli.get_security_groups')
     @patch('sgmap.cli.analyze_security_group_connections')
-    @patch('sgmap.cli.generate_mermaid_diagram')
+    @patch('sgmap.cli.write_mermaid_diagram')
     def test_main_with_security_group_filter(
-        self, mock_generate_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
+        self, mock_write_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
     ):
         """Test main function with security group filter"""
         # Setup mocks
         mock_get_sg.return_value = sample_vpc_and_sgs
         mock_analyze.return_value = {'vpc': {}, 'security_groups': {}}
-        mock_generate_mermaid.return_value = "```mermaid\nflowchart LR\n```"
+        mock_write_mermaid.side_effect = lambda connections, fp, include_vpc, compact: fp.write("```mermaid\nflowchart LR\n```\n")
 
         # Run the CLI command
         result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--security-group-id', 'sg-11111111'])
@@ -85,19 +87,19 @@ class TestCli:
         assert result.exit_code == 0
 
         # Verify the function calls
-        mock_get_sg.assert_called_once_with('vpc-12345678', 'sg-11111111')
+        mock_get_sg.assert_called_once_with('vpc-12345678', 'sg-11111111', page_size=None, stream=True)
 
     @patch('sgmap.cli.get_security_groups')
     @patch('sgmap.cli.analyze_security_group_connections')
-    @patch('sgmap.cli.generate_mermaid_diagram')
+    @patch('sgmap.cli.write_mermaid_diagram')
     def test_main_with_with_vpc_option(
-        self, mock_generate_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
+        self, mock_write_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
     ):
         """Test main function with with-vpc option"""
         # Setup mocks
         mock_get_sg.return_value = sample_vpc_and_sgs
         mock_analyze.return_value = {'vpc': {}, 'security_groups': {}}
-        mock_generate_mermaid.return_value = "```mermaid\nflowchart LR\n```"
+        mock_write_mermaid.side_effect = lambda connections, fp, include_vpc, compact: fp.write("```mermaid\nflowchart LR\n```\n")
 
         # Run the CLI command
         result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--with-vpc'])
@@ -106,7 +108,211 @@ class TestCli:
         assert result.exit_code == 0
 
         # Verify the function calls
-        mock_generate_mermaid.assert_called_once_with({'vpc': {}, 'security_groups': {}}, True)
+        mock_write_mermaid.assert_called_once_with({'vpc': {}, 'security_groups': {}}, ANY, True, False)
+
+    @patch('sgmap.cli.get_security_groups')
+    @patch('sgmap.cli.analyze_security_group_connections')
+    @patch('sgmap.cli.write_mermaid_diagram')
+    def test_main_with_page_size(
+        self, mock_write_mermaid, mock_analyze, mock_get_sg, cli_runner, sample_vpc_and_sgs
+    ):
+        """Test main function passes the page size through to the fetch"""
+        mock_get_sg.return_value = sample_vpc_and_sgs
+        mock_analyze.return_value = {'vpc': {}, 'security_groups': {}}
+        mock_write_mermaid.side_effect = lambda connections, fp, include_vpc, compact: fp.write("```mermaid\nflowchart LR\n```\n")
+
+        result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--page-size', '100'])
+
+        assert result.exit_code == 0
+        mock_get_sg.assert_called_once_with('vpc-12345678', None, page_size=100, stream=True)
+
+    @patch('sgmap.cli.scan_vpcs')
+    def test_main_with_multiple_vpcs_and_regions(self, mock_scan, cli_runner):
+        """Test main function scans several VPCs and regions concurrently"""
+        mock_scan.return_value = {'regions': {'us-east-1': {'vpc-1': {'vpc': {}, 'security_groups': {}}}}}
+
+        result = cli_runner.invoke(main, [
+            '--vpc-id', 'vpc-1', '--vpc-id', 'vpc-2',
+            '--regions', 'us-east-1,eu-west-1', '--regions', 'ap-northeast-1',
+            '--max-workers', '4', '--json'
+        ])
+
+        assert result.exit_code == 0
+        assert '"us-east-1"' in result.output
+        mock_scan.assert_called_once_with(
+            vpc_ids=('vpc-1', 'vpc-2'),
+            regions=['us-east-1', 'eu-west-1', 'ap-northeast-1'],
+            all_vpcs=False,
+            security_group_id=None,
+            page_size=None,
+            max_workers=4,
+            cache=None,
+            refresh=False
+        )
+
+    @patch('sgmap.cli.scan_vpcs')
+    def test_main_with_all_vpcs_mermaid(self, mock_scan, cli_runner, sample_vpc_and_sgs):
+        """Test main function renders one mermaid diagram per scanned VPC"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+        mock_scan.return_value = {'regions': {'us-east-1': {'vpc-12345678': connections}}}
+
+        result = cli_runner.invoke(main, ['--all-vpcs'])
+
+        assert result.exit_code == 0
+        assert '## us-east-1 / vpc-12345678' in result.output
+        assert '```mermaid' in result.output
+
+    @patch('sgmap.cli.scan_vpcs')
+    def test_main_with_output_file(self, mock_scan, cli_runner, sample_vpc_and_sgs, tmp_path):
+        """Test --output writes the scanned diagrams to a file"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+        mock_scan.return_value = {'regions': {'us-east-1': {'vpc-1': connections, 'vpc-2': connections}}}
+        output = tmp_path / 'map.md'
+
+        result = cli_runner.invoke(main, ['--all-vpcs', '--output', str(output)])
+
+        assert result.exit_code == 0
+        assert result.output == ''
+        diagram = generate_mermaid_diagram(connections)
+        assert output.read_text(encoding='utf-8') == (
+            f"## us-east-1 / vpc-1\n\n{diagram}\n\n## us-east-1 / vpc-2\n\n{diagram}\n"
+        )
+
+    def test_main_with_compact(self, cli_runner, tmp_path, sample_security_groups_response):
+        """Test --compact renders each CIDR node once"""
+        sgs_path = tmp_path / 'sgs.json'
+        sgs_path.write_text(json.dumps(sample_security_groups_response))
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--compact'])
+
+        assert result.exit_code == 0
+        assert result.output.count('CIDR_0_0_0_0_0["') == 1
+
+    def test_main_with_normalize(self, cli_runner, tmp_path, sample_vpc_and_sgs):
+        """Test --normalize merges overlapping rules to the same peer and reports the count"""
+        sample_vpc_and_sgs['security_groups'][0]['IpPermissions'] = [
+            {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]},
+            {'IpProtocol': '6', 'FromPort': 81, 'ToPort': 90, 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]}
+        ]
+        sgs_path = tmp_path / 'sgs.json'
+        sgs_path.write_text(json.dumps({'SecurityGroups': sample_vpc_and_sgs['security_groups']}))
+        out_path = tmp_path / 'out.json'
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--normalize', '--json', '-o', str(out_path)])
+
+        assert result.exit_code == 0
+        assert "Normalized: collapsed 1 edges" in result.output
+        inbound = json.loads(out_path.read_text())['security_groups']['sg-11111111']['inbound']
+        assert [(conn['protocol'], conn['from_port'], conn['to_port']) for conn in inbound] == [('tcp', 80, 90)]
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--normalize', '--json-lines', 'connection',
+                                          '-o', str(out_path)])
+        assert result.exit_code == 0
+        records = [json.loads(line) for line in out_path.read_text().splitlines()]
+        assert [(r['from_port'], r['to_port']) for r in records if r.get('security_group') == 'sg-11111111'
+                and r['direction'] == 'inbound'] == [(80, 90)]
+
+    def test_main_with_json_lines(self, cli_runner, tmp_path, sample_security_groups_response):
+        """Test --json-lines writes a VPC record and one record per group or connection"""
+        sgs_path = tmp_path / 'sgs.json'
+        sgs_path.write_text(json.dumps(sample_security_groups_response))
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--json-lines'])
+        assert result.exit_code == 0
+        records = [json.loads(line) for line in result.output.splitlines()]
+        assert [record['record'] for record in records] == ['vpc'] + ['security_group'] * 3
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--json-lines', 'connection'])
+        assert result.exit_code == 0
+        assert len(result.output.splitlines()) == 1 + 7
+
+    def test_main_json_lines_rejects_json(self, cli_runner):
+        """Test --json-lines cannot be combined with --json"""
+        result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--json-lines', '--json'])
+
+        assert result.exit_code == 2
+        assert "'--json-lines' cannot be used with '--json'" in result.output
+
+    def test_main_requires_vpc_id_or_all_vpcs(self, cli_runner):
+        """Test main function rejects a call without --vpc-id or --all-vpcs"""
+        result = cli_runner.invoke(main, [])
+
+        assert result.exit_code == 2
+        assert '--vpc-id' in result.output
+
+    @patch('sgmap.cli.get_security_groups_cached')
+    @patch('sgmap.cli.get_security_groups')
+    def test_main_with_cache_dir(self, mock_get_sg, mock_get_cached, cli_runner, sample_vpc_and_sgs, tmp_path):
+        """Test main function reads through the snapshot cache when --cache-dir is given"""
+        mock_get_cached.return_value = sample_vpc_and_sgs
+
+        result = cli_runner.invoke(main, [
+            '--vpc-id', 'vpc-12345678', '--cache-dir', str(tmp_path), '--max-age', '60', '--refresh', '--json'
+        ])
+
+        assert result.exit_code == 0
+        mock_get_sg.assert_not_called()
+        cache = mock_get_cached.call_args.args[0]
+        assert cache.cache_dir == str(tmp_path)
+        assert cache.max_age == 60
+        assert mock_get_cached.call_args.args[1:] == ('vpc-12345678', None)
+        assert mock_get_cached.call_args.kwargs == {'page_size': None, 'refresh': True, 'depth': None}
+
+    @patch('sgmap.cli.get_security_groups')
+    def test_main_with_from_file(
+        self, mock_get_sg, cli_runner, tmp_path, sample_vpc_response, sample_security_groups_response
+    ):
+        """Test main function renders saved describe-* output without calling AWS"""
+        vpcs_path = tmp_path / 'vpcs.json'
+        sgs_path = tmp_path / 'sgs.json'
+        vpcs_path.write_text(json.dumps(sample_vpc_response))
+        sgs_path.write_text(json.dumps(sample_security_groups_response))
+
+        result = cli_runner.invoke(main, ['--from-file', str(vpcs_path), '--from-file', str(sgs_path), '--json'])
+
+        assert result.exit_code == 0
+        assert json.loads(result.output)['vpc']['id'] == 'vpc-12345678'
+        mock_get_sg.assert_not_called()
+
+    def test_main_with_depth_from_file(self, cli_runner, tmp_path, sample_security_groups_response):
+        """Test --depth selects the neighborhood of the security group from saved output"""
+        sgs_path = tmp_path / 'sgs.json'
+        sgs_path.write_text(json.dumps(sample_security_groups_response))
+
+        result = cli_runner.invoke(main, [
+            '--from-file', str(sgs_path), '-s', 'sg-33333333', '--depth', '1', '--json'
+        ])
+
+        assert result.exit_code == 0
+        assert list(json.loads(result.output)['security_groups']) == ['sg-33333333', 'sg-11111111']
+
+    @patch('sgmap.cli.get_security_group_neighborhood')
+    @patch('sgmap.cli.get_security_groups')
+    def test_main_with_depth(self, mock_get_sg, mock_neighborhood, cli_runner, sample_vpc_and_sgs):
+        """Test --depth fetches the neighborhood instead of the whole VPC"""
+        mock_neighborhood.return_value = sample_vpc_and_sgs
+
+        result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '-s', 'sg-11111111', '--depth', '2'])
+
+        assert result.exit_code == 0
+        mock_get_sg.assert_not_called()
+        mock_neighborhood.assert_called_once_with('vpc-12345678', 'sg-11111111', 2, page_size=None)
+
+    def test_main_depth_requires_security_group_id(self, cli_runner):
+        """Test --depth without --security-group-id is a usage error"""
+        result = cli_runner.invoke(main, ['--vpc-id', 'vpc-12345678', '--depth', '1'])
+
+        assert result.exit_code == 2
+        assert '--security-group-id' in result.output
+
+    def test_main_from_file_rejects_scan_options(self, cli_runner, tmp_path):
+        """Test --from-file cannot be combined with multi-VPC options"""
+        sgs_path = tmp_path / 'sgs.json'
+        sgs_path.write_text('{"SecurityGroups": []}')
+
+        result = cli_runner.invoke(main, ['--from-file', str(sgs_path), '--all-vpcs'])
+
+        assert result.exit_code == 2
 
     @patch('sgmap.cli.get_security_groups')
     def test_main_vpc_not_found(self, mock_get_sg, cli_runner):
@@ -145,4 +351,252 @@ class TestCli:
 
         # Verify the result
         assert result.exit_code == 1
-        assert "Error: Test error" in result.output
\ No newline at end of file
+        assert "Error: Test error" in result.output
+
+class TestQueryCommand:
+    """Tests for the query subcommand"""
+
+    @pytest.fixture
+    def cli_runner(self):
+        """Fixture for CLI runner"""
+        return CliRunner()
+
+    @pytest.fixture
+    def sgs_file(self, tmp_path, sample_security_groups_response):
+        """Fixture writing a describe-security-groups output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        return str(path)
+
+    def test_query_allowed(self, cli_runner, sgs_file):
+        """Test an allowed connection exits successfully"""
+        result = cli_runner.invoke(main, [
+            'query', '--from-file', sgs_file, '--from', 'sg-11111111', '--to', 'sg-33333333', '--port', '3306/tcp'
+        ])
+
+        assert result.exit_code == 0
+        assert 'ALLOWED: sg-11111111 -> sg-33333333 (tcp/3306)' in result.output
+
+    def test_query_any_port_by_default(self, cli_runner, sgs_file):
+        """Test a query without --port is allowed when some protocol and port is open"""
+        result = cli_runner.invoke(main, [
+            'query', '--from-file', sgs_file, '--from', 'sg-11111111', '--to', 'sg-33333333'
+        ])
+
+        assert result.exit_code == 0
+        assert 'ALLOWED: sg-11111111 -> sg-33333333 (any port) via sg-11111111 -> sg-33333333' in result.output
+
+    def test_query_denied_json(self, cli_runner, sgs_file):
+        """Test a denied connection exits with status 1"""
+        result = cli_runner.invoke(main, [
+            'query', '--from-file', sgs_file, '--from', 'sg-11111111', '--to', 'sg-33333333', '--port', '22', '--json'
+        ])
+
+        assert result.exit_code == 1
+        assert json.loads(result.output)['allowed'] is False
+
+    def test_query_invalid_port(self, cli_runner, sgs_file):
+        """Test an invalid port specification is a usage error"""
+        result = cli_runner.invoke(main, [
+            'query', '--from-file', sgs_file, '--from', 'sg-1', '--to', 'sg-2', '--port', 'ssh/tcp'
+        ])
+
+        assert result.exit_code == 2
+
+    @patch('sgmap.cli.get_security_groups')
+    def test_query_live(self, mock_get_sg, cli_runner, sample_vpc_and_sgs):
+        """Test query fetches the whole VPC from AWS"""
+        mock_get_sg.return_value = sample_vpc_and_sgs
+
+        result = cli_runner.invoke(main, [
+            'query', '--vpc-id', 'vpc-12345678', '--from', 'sg-22222222', '--to', 'sg-11111111', '--port', '80'
+        ])
+
+        assert result.exit_code == 0
+        mock_get_sg.assert_called_once_with('vpc-12345678', None, page_size=None, stream=True)
+
+
+class TestLookupCommand:
+    """Tests for the lookup subcommand"""
+
+    @pytest.fixture
+    def cli_runner(self):
+        """Fixture for CLI runner"""
+        return CliRunner()
+
+    @pytest.fixture
+    def sgs_file(self, tmp_path, sample_security_groups_response):
+        """Fixture writing a describe-security-groups output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        return str(path)
+
+    def test_lookup(self, cli_runner, sgs_file):
+        """Test the rules containing an address are listed"""
+        result = cli_runner.invoke(main, [
+            'lookup', '--from-file', sgs_file, '--ip', '198.51.100.7', '--direction', 'inbound', '--port', '443'
+        ])
+
+        assert result.exit_code == 0
+        assert result.output == "sg-22222222 (LoadBalancer) inbound tcp/443-443 0.0.0.0/0 (Allow HTTPS from anywhere)\n"
+
+    def test_lookup_json_no_match(self, cli_runner, sgs_file):
+        """Test no match exits with status 1"""
+        result = cli_runner.invoke(main, [
+            'lookup', '--from-file', sgs_file, '--ip', '2001:db8::1', '--json'
+        ])
+
+        assert result.exit_code == 1
+        assert json.loads(result.output) == []
+
+    def test_lookup_invalid_ip(self, cli_runner, sgs_file):
+        """Test an invalid address is a usage error"""
+        result = cli_runner.invoke(main, ['lookup', '--from-file', sgs_file, '--ip', '10.0.0.300'])
+
+        assert result.exit_code == 2
+        assert 'Invalid IP address or CIDR' in result.output
+
+
+class TestAuditCommand:
+    """Tests for the audit subcommand"""
+
+    @pytest.fixture
+    def cli_runner(self):
+        """Fixture for CLI runner"""
+        return CliRunner()
+
+    @pytest.fixture
+    def sgs_file(self, tmp_path, sample_security_groups_response):
+        """Fixture writing a describe-security-groups output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        return str(path)
+
+    def test_audit_default_checks_pass(self, cli_runner, sgs_file):
+        """Test the sample VPC passes the built-in checks"""
+        result = cli_runner.invoke(main, ['audit', '--from-file', sgs_file])
+
+        assert result.exit_code == 0
+        assert "0 findings from 5 checks over 7 rules" in result.output
+
+    def test_audit_checks_file(self, cli_runner, sgs_file, tmp_path):
+        """Test checks from a file flag rules and exit with status 1"""
+        checks_path = tmp_path / 'checks.json'
+        checks_path.write_text(json.dumps([
+            {'id': 'http-open', 'severity': 'low', 'match': {'direction': 'inbound', 'cidrs': ['0.0.0.0/0'], 'ports': ['80']}},
+            {'id': 'egress-all', 'severity': 'high', 'match': {'direction': 'outbound', 'protocols': ['-1']}}
+        ]))
+
+        result = cli_runner.invoke(main, ['audit', '--from-file', sgs_file, '--checks', str(checks_path)])
+        assert result.exit_code == 1
+        assert "[LOW] http-open: sg-11111111 (WebServer) inbound tcp/80-80 0.0.0.0/0" in result.output
+        assert "[HIGH] egress-all: sg-33333333 (Database) outbound -1/-1--1 0.0.0.0/0" in result.output
+
+        result = cli_runner.invoke(main, [
+            'audit', '--from-file', sgs_file, '--checks', str(checks_path), '--severity', 'high', '--json'
+        ])
+        assert result.exit_code == 1
+        findings = json.loads(result.output[:result.output.rindex(']') + 1])
+        assert [(f['check'], f['security_group']) for f in findings] == [('egress-all', 'sg-33333333')]
+
+    def test_audit_invalid_checks_file(self, cli_runner, sgs_file, tmp_path):
+        """Test an invalid checks file is a usage error"""
+        checks_path = tmp_path / 'checks.json'
+        checks_path.write_text(json.dumps([{'id': 'bad', 'match': {'direction': 'ingress'}}]))
+
+        result = cli_runner.invoke(main, ['audit', '--from-file', sgs_file, '--checks', str(checks_path)])
+
+        assert result.exit_code == 2
+        assert "direction must be one of inbound, outbound" in result.output
+
+
+class TestBlastRadiusCommand:
+    """Tests for the blast-radius subcommand"""
+
+    @pytest.fixture
+    def cli_runner(self):
+        """Fixture for CLI runner"""
+        return CliRunner()
+
+    @pytest.fixture
+    def sgs_file(self, tmp_path, sample_security_groups_response):
+        """Fixture writing a describe-security-groups output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        return str(path)
+
+    def test_blast_radius(self, cli_runner, sgs_file):
+        """Test the groups reachable from a group, and the reverse, are listed"""
+        result = cli_runner.invoke(main, ['blast-radius', '--from-file', sgs_file, '-s', 'sg-22222222'])
+        assert result.exit_code == 0
+        assert result.output == (
+            "sg-22222222 (LoadBalancer) can reach 2 security groups\n"
+            "  sg-11111111 (WebServer)\n"
+            "  sg-33333333 (Database)\n"
+        )
+
+        result = cli_runner.invoke(main, ['blast-radius', '--from-file', sgs_file, '-s', 'sg-11111111', '--reverse', '--json'])
+        assert result.exit_code == 0
+        assert json.loads(result.output)['security_groups'] == [{'id': 'sg-22222222', 'name': 'LoadBalancer'}]
+
+    def test_closure_file_is_reused(self, cli_runner, sgs_file, tmp_path):
+        """Test the closure is written once and read back while the snapshot is unchanged"""
+        closure_path = tmp_path / 'closure.json'
+        args = ['blast-radius', '--from-file', sgs_file, '-s', 'sg-22222222', '--closure', str(closure_path)]
+
+        assert cli_runner.invoke(main, args).exit_code == 0
+        assert closure_path.exists()
+        with patch('sgmap.cli.build_connection_graph') as mock_build:
+            result = cli_runner.invoke(main, args)
+        assert result.exit_code == 0
+        assert "can reach 2 security groups" in result.output
+        mock_build.assert_not_called()
+
+    def test_unknown_group(self, cli_runner, sgs_file):
+        """Test an unknown security group exits with status 1"""
+        result = cli_runner.invoke(main, ['blast-radius', '--from-file', sgs_file, '-s', 'sg-unknown'])
+
+        assert result.exit_code == 1
+        assert "Unknown security group: sg-unknown" in result.output
+
+
+class TestDiffCommand:
+    """Tests for the diff subcommand"""
+
+    @pytest.fixture
+    def cli_runner(self):
+        """Fixture for CLI runner"""
+        return CliRunner()
+
+    @pytest.fixture
+    def snapshots(self, tmp_path, sample_security_groups_response):
+        """Fixture writing old and new describe-security-groups output files"""
+        old = tmp_path / 'old.json'
+        old.write_text(json.dumps(sample_security_groups_response))
+        new_response = json.loads(json.dumps(sample_security_groups_response))
+        new_response['SecurityGroups'][1]['IpPermissions'][0].update(FromPort=8443, ToPort=8443)
+        new = tmp_path / 'new.json'
+        new.write_text(json.dumps(new_response))
+        return str(old), str(new)
+
+    def test_diff_mermaid(self, cli_runner, snapshots):
+        """Test the changed subgraph is printed as mermaid"""
+        result = cli_runner.invoke(main, ['diff', *snapshots])
+
+        assert result.exit_code == 0
+        assert ':::changed' in result.output
+        assert '+ inbound: tcp/8443-8443' in result.output
+        assert '- inbound: tcp/443-443' in result.output
+
+    def test_diff_json_exit_code(self, cli_runner, snapshots):
+        """Test --exit-code exits with status 1 when the snapshots differ"""
+        result = cli_runner.invoke(main, ['diff', *snapshots, '--json', '--exit-code'])
+
+        assert result.exit_code == 1
+        assert json.loads(result.output)['summary']['changed'] == 1
+
+    def test_diff_identical_exit_code(self, cli_runner, snapshots):
+        """Test --exit-code exits successfully without differences"""
+        result = cli_runner.invoke(main, ['diff', snapshots[0], snapshots[0], '--exit-code'])
+
+        assert result.exit_code == 0
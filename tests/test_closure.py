@@ -0,0 +1,171 @@
+"""
+Tests for sgmap.closure module
+"""
+
+import json
+import random
+
+import pytest
+
+from sgmap.closure import ReachabilityClosure, _strongly_connected_components
+from sgmap.core import analyze_security_group_connections, build_connection_graph
+from sgmap.query import ReachabilityIndex
+
+
+def _index(edges, port=443):
+    """Build an index where each (source, target) pair allows tcp/port on both sides"""
+    index = ReachabilityIndex()
+    for source, target in edges:
+        index.add_rule(source, 'outbound', target, 'tcp', port, port)
+        index.add_rule(target, 'inbound', source, 'tcp', port, port)
+    return index
+
+
+class TestStronglyConnectedComponents:
+    """Tests for _strongly_connected_components function"""
+
+    def test_components_in_reverse_topological_order(self):
+        """Test cycles are collapsed and every component follows the components it reaches"""
+        # 0 -> 1 -> 2 -> 0 (cycle), 2 -> 3, 4 -> 3, 5 alone
+        successors = [[1], [2], [0, 3], [], [3], []]
+
+        components = _strongly_connected_components(successors)
+
+        assert sorted(sorted(component) for component in components) == [[0, 1, 2], [3], [4], [5]]
+        order = {node: i for i, component in enumerate(components) for node in component}
+        assert order[3] < order[0] and order[3] < order[4]
+
+    def test_deep_chain(self):
+        """Test a chain far deeper than the recursion limit"""
+        count = 20000
+        components = _strongly_connected_components([[i + 1] for i in range(count - 1)] + [[]])
+
+        assert components == [[i] for i in range(count - 1, -1, -1)]
+
+
+class TestReachabilityClosure:
+    """Tests for ReachabilityClosure class"""
+
+    def test_blast_radius(self):
+        """Test transitive reachability in both directions, through a cycle"""
+        closure = ReachabilityClosure.from_index(
+            _index([('sg-a', 'sg-b'), ('sg-b', 'sg-c'), ('sg-c', 'sg-b'), ('sg-c', 'sg-d')]),
+            groups=['sg-a', 'sg-b', 'sg-c', 'sg-d', 'sg-e']
+        )
+
+        assert closure.blast_radius('sg-a') == ['sg-b', 'sg-c', 'sg-d']
+        assert closure.blast_radius('sg-b') == ['sg-c', 'sg-d']
+        assert closure.blast_radius('sg-d') == []
+        assert closure.blast_radius('sg-d', reverse=True) == ['sg-a', 'sg-b', 'sg-c']
+        assert closure.blast_radius_size('sg-c', reverse=True) == 2
+        assert closure.blast_radius('sg-e') == []
+        assert closure.reaches('sg-a', 'sg-d')
+        assert not closure.reaches('sg-d', 'sg-a')
+        assert closure.component_count == 4
+        with pytest.raises(KeyError):
+            closure.blast_radius('sg-unknown')
+
+    def test_one_sided_and_disjoint_rules_do_not_connect(self):
+        """Test an edge needs both the egress and the ingress rule on a common port"""
+        index = _index([('sg-a', 'sg-b')])
+        index.add_rule('sg-b', 'outbound', 'sg-c', 'tcp', 22, 22)
+        index.add_rule('sg-c', 'inbound', 'sg-b', 'tcp', 80, 80)
+        index.add_rule('sg-c', 'outbound', 'sg-d', '-1', 'all', 'all')
+
+        closure = ReachabilityClosure.from_index(index)
+
+        assert closure.blast_radius('sg-a') == ['sg-b']
+        assert closure.blast_radius('sg-c') == []
+
+    def test_from_graph_and_connections(self, sample_vpc_and_sgs):
+        """Test the sample VPC: the load balancer reaches the web and database groups"""
+        from_graph = ReachabilityClosure.from_graph(build_connection_graph(sample_vpc_and_sgs))
+        from_connections = ReachabilityClosure.from_connections(analyze_security_group_connections(sample_vpc_and_sgs))
+
+        for closure in (from_graph, from_connections):
+            assert closure.query('sg-22222222') == {
+                'security_group': 'sg-22222222',
+                'name': 'LoadBalancer',
+                'reverse': False,
+                'count': 2,
+                'security_groups': [
+                    {'id': 'sg-11111111', 'name': 'WebServer'},
+                    {'id': 'sg-33333333', 'name': 'Database'}
+                ]
+            }
+            assert closure.blast_radius('sg-33333333', reverse=True) == ['sg-11111111', 'sg-22222222']
+
+    def test_allow_all_cidr_egress(self):
+        """Test groups with the default allow-all egress reach the groups admitting them"""
+        def sg(group_id, sources, egress_cidr=None):
+            return {
+                'GroupId': group_id, 'GroupName': group_id, 'VpcId': 'vpc-12345678',
+                'IpPermissions': [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                                   'UserIdGroupPairs': [{'GroupId': source} for source in sources]}],
+                'IpPermissionsEgress': [{'IpProtocol': '-1', 'IpRanges': [{'CidrIp': egress_cidr}]}]
+                if egress_cidr else []
+            }
+
+        vpc_and_sgs = {
+            'vpc': {'VpcId': 'vpc-12345678', 'CidrBlock': '10.0.0.0/16', 'Tags': []},
+            'security_groups': [
+                sg('sg-a', [], '0.0.0.0/0'),
+                sg('sg-b', ['sg-a'], '0.0.0.0/0'),
+                sg('sg-c', ['sg-b']),
+                sg('sg-d', ['sg-c'], '192.168.0.0/16')
+            ]
+        }
+
+        for closure in (
+            ReachabilityClosure.from_graph(build_connection_graph(vpc_and_sgs)),
+            ReachabilityClosure.from_connections(analyze_security_group_connections(vpc_and_sgs))
+        ):
+            assert closure.blast_radius('sg-a') == ['sg-b', 'sg-c']
+            assert closure.blast_radius('sg-c') == []
+            assert closure.blast_radius('sg-c', reverse=True) == ['sg-a', 'sg-b']
+
+    def test_matches_graph_search(self):
+        """Test random graphs against a search per group"""
+        rng = random.Random(11)
+        groups = [f"sg-{i}" for i in range(200)]
+        edges = [tuple(rng.sample(groups, 2)) for _ in range(300)]
+        closure = ReachabilityClosure.from_index(_index(edges), groups)
+
+        adjacency = {group: set() for group in groups}
+        for source, target in edges:
+            adjacency[source].add(target)
+
+        def search(group, graph):
+            seen, stack = {group}, [group]
+            while stack:
+                for peer in graph[stack.pop()]:
+                    if peer not in seen:
+                        seen.add(peer)
+                        stack.append(peer)
+            return sorted(seen - {group})
+
+        reverse = {group: set() for group in groups}
+        for source, target in edges:
+            reverse[target].add(source)
+        for group in groups:
+            assert closure.blast_radius(group) == search(group, adjacency)
+            assert closure.blast_radius(group, reverse=True) == search(group, reverse)
+
+    def test_save_and_load(self, tmp_path):
+        """Test a saved closure is loaded back only for the same snapshot fingerprint"""
+        closure = ReachabilityClosure.from_index(_index([('sg-a', 'sg-b'), ('sg-b', 'sg-a')]), fingerprint='abc')
+        path = str(tmp_path / 'closure.json')
+        closure.save(path)
+
+        loaded = ReachabilityClosure.load(path, 'abc')
+        assert loaded is not None
+        assert loaded.blast_radius('sg-a') == ['sg-b']
+        assert loaded.to_dict() == closure.to_dict()
+        assert ReachabilityClosure.load(path, 'other') is None
+        assert ReachabilityClosure.load(str(tmp_path / 'missing.json')) is None
+
+        # Closures saved in an older format are rebuilt
+        data = closure.to_dict()
+        data['version'] = 1
+        (tmp_path / 'old.json').write_text(json.dumps(data))
+        assert ReachabilityClosure.load(str(tmp_path / 'old.json'), 'abc') is None
@@ -0,0 +1,87 @@
+"""
+Tests for sgmap.columnar module
+"""
+
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from sgmap.cli import main
+from sgmap.columnar import ColumnarGraph, generate_columnar, open_columnar, write_columnar
+from sgmap.core import analyze_security_group_connections
+
+
+@pytest.fixture
+def connections(sample_vpc_and_sgs):
+    """
+    Fixture for the analyzed sample VPC
+    """
+    return analyze_security_group_connections(sample_vpc_and_sgs)
+
+
+class TestColumnar:
+    """Tests for the columnar writer and ColumnarGraph"""
+
+    def test_round_trip(self, connections):
+        """Test the connection map is rebuilt exactly, including 'all' ports"""
+        outbound = connections['security_groups']['sg-33333333']['outbound'][0]
+        outbound['from_port'] = outbound['to_port'] = 'all'
+
+        graph = ColumnarGraph(generate_columnar(connections))
+
+        assert graph.to_dict() == connections
+        assert graph.group_count == 3
+        assert graph.edge_count == 7
+        assert graph.security_group_ids() == ['sg-11111111', 'sg-22222222', 'sg-33333333']
+
+    def test_columns(self, connections):
+        """Test the edge columns hold the edges in group and rule order"""
+        graph = ColumnarGraph(generate_columnar(connections))
+
+        edges = list(graph.iter_edges())
+
+        assert len(graph.column('edge_kind')) == 7
+        assert list(graph.column('group_edge_start')) == [0, 3, 5, 7]
+        assert edges[0] == ('sg-11111111', 'inbound', 'security_group', 'sg-22222222', 'tcp', 80, 80)
+        assert edges[-1][1:] == ('outbound', 'cidr', '0.0.0.0/0', '-1', -1, -1)
+        assert graph.string(graph.column('group_name')[2]) == 'Database'
+
+    def test_open_columnar(self, connections, tmp_path):
+        """Test a file is memory-mapped, read and closed"""
+        path = tmp_path / 'sgmap.bin'
+        with open(path, 'wb') as f:
+            write_columnar(connections, f)
+
+        with open_columnar(str(path)) as graph:
+            kinds = graph.column('edge_kind')
+            assert sum(1 for kind in kinds if kind & 1 == 0) == 4
+            assert graph.to_dict() == connections
+
+    def test_invalid_file(self):
+        """Test other files are rejected"""
+        with pytest.raises(ValueError, match='Not an sgmap columnar file'):
+            ColumnarGraph(b'{"vpc": {}}')
+
+
+class TestColumnarOption:
+    """Tests for the --columnar option"""
+
+    def test_from_file(self, tmp_path, sample_security_groups_response, connections):
+        """Test the analyzed VPC is written to the output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        output = tmp_path / 'sgmap.bin'
+
+        result = CliRunner().invoke(main, ['--from-file', str(path), '--columnar', '--output', str(output)])
+
+        assert result.exit_code == 0
+        with open_columnar(str(output)) as graph:
+            assert graph.to_dict()['security_groups'] == connections['security_groups']
+
+    def test_requires_output(self):
+        """Test binary output is not written to stdout"""
+        result = CliRunner().invoke(main, ['-v', 'vpc-1', '--columnar'])
+
+        assert result.exit_code == 2
+        assert "'--columnar' requires '--output'" in result.output
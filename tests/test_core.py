@@ -2,7 +2,9 @@
 Tests for sgmap.core module
 """
 
+import io
 import json
+from typing import Iterator
 from unittest.mock import patch, MagicMock
 
 import pytest
@@ -10,9 +12,16 @@ import pytest
 from sgmap.core import (
     get_name_from_tags,
     get_security_groups,
+    get_security_group_neighborhood,
+    select_neighborhood,
     analyze_security_group_connections,
     generate_mermaid_diagram,
-    generate_json_output
+    generate_json_output,
+    iter_json_lines,
+    iter_mermaid_lines,
+    write_json_lines,
+    write_json_output,
+    write_mermaid_diagram
 )
 
 
@@ -48,7 +57,8 @@ class TestGetSecurityGroups:
         """Test get_security_groups with VPC ID only"""
         # Setup mock responses
         mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
-        mock_boto3_client.describe_security_groups.return_value = sample_security_groups_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.return_value = [sample_security_groups_response]
 
         # Call the function
         result = get_security_groups('vpc-12345678')
@@ -59,7 +69,8 @@ class TestGetSecurityGroups:
 
         # Verify the API calls
         mock_boto3_client.describe_vpcs.assert_called_once_with(VpcIds=['vpc-12345678'])
-        mock_boto3_client.describe_security_groups.assert_called_once_with(
+        mock_boto3_client.get_paginator.assert_called_once_with('describe_security_groups')
+        mock_paginator.paginate.assert_called_once_with(
             Filters=[{'Name': 'vpc-id', 'Values': ['vpc-12345678']}]
         )
 
@@ -67,7 +78,8 @@ class TestGetSecurityGroups:
         """Test get_security_groups with VPC ID and security group ID"""
         # Setup mock responses
         mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
-        mock_boto3_client.describe_security_groups.return_value = sample_security_groups_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.return_value = [sample_security_groups_response]
 
         # Call the function
         result = get_security_groups('vpc-12345678', 'sg-11111111')
@@ -78,13 +90,43 @@ class TestGetSecurityGroups:
 
         # Verify the API calls
         mock_boto3_client.describe_vpcs.assert_called_once_with(VpcIds=['vpc-12345678'])
-        mock_boto3_client.describe_security_groups.assert_called_once_with(
+        mock_paginator.paginate.assert_called_once_with(
             Filters=[
                 {'Name': 'vpc-id', 'Values': ['vpc-12345678']},
                 {'Name': 'group-id', 'Values': ['sg-11111111']}
             ]
         )
 
+    def test_get_security_groups_multiple_pages(self, mock_boto3_client, sample_vpc_response, sample_security_groups_response):
+        """Test get_security_groups collects every page and passes the page size"""
+        groups = sample_security_groups_response['SecurityGroups']
+        mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.return_value = [
+            {'SecurityGroups': groups[:2], 'NextToken': 'token'},
+            {'SecurityGroups': groups[2:]}
+        ]
+
+        result = get_security_groups('vpc-12345678', page_size=5)
+
+        assert result['security_groups'] == groups
+        mock_paginator.paginate.assert_called_once_with(
+            Filters=[{'Name': 'vpc-id', 'Values': ['vpc-12345678']}],
+            PaginationConfig={'PageSize': 5}
+        )
+
+    def test_get_security_groups_stream(self, mock_boto3_client, sample_vpc_response, sample_security_groups_response):
+        """Test get_security_groups returns a lazy generator when stream=True"""
+        mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.return_value = [sample_security_groups_response]
+
+        result = get_security_groups('vpc-12345678', stream=True)
+
+        assert isinstance(result['security_groups'], Iterator)
+        mock_paginator.paginate.assert_not_called()
+        assert list(result['security_groups']) == sample_security_groups_response['SecurityGroups']
+
     def test_get_security_groups_vpc_not_found(self, mock_boto3_client):
         """Test get_security_groups when VPC is not found"""
         # Setup mock responses
@@ -97,6 +139,94 @@ class TestGetSecurityGroups:
         assert result['vpc'] is None
 
 
+def _chain_groups():
+    """Build sg-a -> sg-b -> sg-c -> sg-d where each group only has an egress rule to the next"""
+    ids = ['sg-a', 'sg-b', 'sg-c', 'sg-d']
+    groups = []
+    for sg_id, next_id in zip(ids, ids[1:] + [None]):
+        egress = [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                   'UserIdGroupPairs': [{'GroupId': next_id}]}] if next_id else []
+        groups.append({'GroupId': sg_id, 'GroupName': sg_id, 'VpcId': 'vpc-12345678',
+                       'IpPermissions': [], 'IpPermissionsEgress': egress})
+    return groups
+
+
+def _filtering_paginate(groups):
+    """Emulate describe_security_groups filtering for a mock paginator"""
+    def paginate(Filters, **kwargs):
+        matches = groups
+        for f in Filters:
+            if f['Name'] == 'group-id':
+                matches = [sg for sg in matches if sg['GroupId'] in f['Values']]
+            elif f['Name'] in ('ip-permission.group-id', 'egress.ip-permission.group-id'):
+                key = 'IpPermissions' if f['Name'] == 'ip-permission.group-id' else 'IpPermissionsEgress'
+                matches = [
+                    sg for sg in matches
+                    if any(pair['GroupId'] in f['Values'] for rule in sg[key] for pair in rule['UserIdGroupPairs'])
+                ]
+        return [{'SecurityGroups': matches}]
+    return paginate
+
+
+class TestGetSecurityGroupNeighborhood:
+    """Tests for get_security_group_neighborhood and select_neighborhood functions"""
+
+    @pytest.mark.parametrize('depth, expected', [
+        (0, ['sg-c']),
+        (1, ['sg-c', 'sg-b', 'sg-d']),
+        (2, ['sg-c', 'sg-b', 'sg-d', 'sg-a']),
+        (5, ['sg-c', 'sg-b', 'sg-d', 'sg-a'])
+    ])
+    def test_neighborhood_by_depth(self, mock_boto3_client, sample_vpc_response, depth, expected):
+        """Test referencing and referenced groups are fetched hop by hop"""
+        mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.side_effect = _filtering_paginate(_chain_groups())
+
+        result = get_security_group_neighborhood('vpc-12345678', 'sg-c', depth)
+
+        assert [sg['GroupId'] for sg in result['security_groups']] == expected
+        assert result['vpc'] == sample_vpc_response['Vpcs'][0]
+        assert [sg['GroupId'] for sg in select_neighborhood(_chain_groups(), 'sg-c', depth)] == expected
+
+    def test_neighborhood_filters(self, mock_boto3_client, sample_vpc_response):
+        """Test each hop uses group-id and rule reference filters instead of listing the VPC"""
+        mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.side_effect = _filtering_paginate(_chain_groups())
+
+        get_security_group_neighborhood('vpc-12345678', 'sg-c', 1)
+
+        filters = [call.kwargs['Filters'][1] for call in mock_paginator.paginate.call_args_list]
+        assert filters == [
+            {'Name': 'group-id', 'Values': ['sg-c']},
+            {'Name': 'ip-permission.group-id', 'Values': ['sg-c']},
+            {'Name': 'egress.ip-permission.group-id', 'Values': ['sg-c']},
+            {'Name': 'group-id', 'Values': ['sg-d']}
+        ]
+        for call in mock_paginator.paginate.call_args_list:
+            assert call.kwargs['Filters'][0] == {'Name': 'vpc-id', 'Values': ['vpc-12345678']}
+
+    def test_neighborhood_batches_filter_values(self, mock_boto3_client, sample_vpc_response):
+        """Test large frontiers are split into batches of filter values"""
+        hub = {'GroupId': 'sg-hub', 'GroupName': 'hub', 'IpPermissionsEgress': [], 'IpPermissions': [{
+            'IpProtocol': '-1',
+            'UserIdGroupPairs': [{'GroupId': f'sg-{i}'} for i in range(450)]
+        }]}
+        mock_boto3_client.describe_vpcs.return_value = sample_vpc_response
+        mock_paginator = mock_boto3_client.get_paginator.return_value
+        mock_paginator.paginate.side_effect = _filtering_paginate([hub])
+
+        get_security_group_neighborhood('vpc-12345678', 'sg-hub', 1)
+
+        sizes = [len(call.kwargs['Filters'][1]['Values']) for call in mock_paginator.paginate.call_args_list]
+        assert sizes == [1, 1, 1, 200, 200, 50]
+
+    def test_select_neighborhood_missing_group(self):
+        """Test an unknown center group selects nothing"""
+        assert select_neighborhood(_chain_groups(), 'sg-x', 1) == []
+
+
 class TestAnalyzeSecurityGroupConnections:
     """Tests for analyze_security_group_connections function"""
 
@@ -137,6 +267,49 @@ class TestAnalyzeSecurityGroupConnections:
         assert len(database['inbound']) == 1  # From WebServer
         assert len(database['outbound']) == 1  # To 0.0.0.0/0
 
+    def test_analyze_security_group_connections_from_generator(self, sample_vpc_and_sgs):
+        """Test analysis of a single-pass generator matches analysis of a list"""
+        expected = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        streamed = analyze_security_group_connections({
+            'vpc': sample_vpc_and_sgs['vpc'],
+            'security_groups': (sg for sg in sample_vpc_and_sgs['security_groups'])
+        })
+
+        assert streamed == expected
+        # Names of groups that appear later in the stream are still resolved
+        web_server = streamed['security_groups']['sg-11111111']
+        assert web_server['outbound'][0]['name'] == 'Database'
+
+    def test_prefix_lists_are_resolved_in_one_batch(self, sample_vpc_and_sgs):
+        """Test a resolver is asked once for every prefix list referenced by a list of groups"""
+        class Resolver:
+            def __init__(self):
+                self.batches = []
+
+            def resolve(self, ids):
+                self.batches.append(list(ids))
+                return {pl_id: ['10.1.0.0/16'] for pl_id in ids}
+
+        security_groups = sample_vpc_and_sgs['security_groups'] + [{
+            'GroupId': 'sg-44444444',
+            'GroupName': 'Endpoints',
+            'IpPermissions': [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                               'PrefixListIds': [{'PrefixListId': 'pl-1'}, {'PrefixListId': 'pl-2'}]}],
+            'IpPermissionsEgress': [{'IpProtocol': '-1', 'PrefixListIds': [{'PrefixListId': 'pl-1'}]}]
+        }]
+        resolver = Resolver()
+
+        result = analyze_security_group_connections({
+            'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': security_groups, 'prefix_lists': resolver
+        })
+
+        assert resolver.batches == [['pl-1', 'pl-2']]
+        endpoints = result['security_groups']['sg-44444444']
+        assert [(conn['id'], conn['name']) for conn in endpoints['inbound']] == [
+            ('10.1.0.0/16', 'pl-1'), ('10.1.0.0/16', 'pl-2')
+        ]
+
 
 class TestGenerateMermaidDiagram:
     """Tests for generate_mermaid_diagram function"""
@@ -189,6 +362,86 @@ class TestGenerateMermaidDiagram:
         assert 'SG_sg_22222222' in diagram
         assert 'SG_sg_33333333' in diagram
 
+    def test_link_styles(self, sample_vpc_and_sgs):
+        """Test linkStyle lines list the inbound and outbound link indices"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        lines = list(iter_mermaid_lines(connections))
+
+        # Links: WebServer in x2, out; LoadBalancer in, out; Database in, out
+        assert '    linkStyle 0,1,3,5 stroke:#cccccc,stroke-width:2' in lines
+        assert '    linkStyle 2,4,6 stroke:#555555,stroke-width:2' in lines
+
+    @pytest.mark.parametrize('include_vpc', [False, True])
+    def test_write_mermaid_diagram(self, sample_vpc_and_sgs, include_vpc):
+        """Test the streaming writer produces the same diagram"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+        fp = io.StringIO()
+
+        write_mermaid_diagram(connections, fp, include_vpc)
+
+        assert fp.getvalue() == generate_mermaid_diagram(connections, include_vpc) + "\n"
+
+
+    def test_ipv6_and_unresolved_prefix_list_node_ids(self, sample_vpc_and_sgs):
+        """Test IPv6 CIDRs and prefix list IDs become valid mermaid node IDs"""
+        sg = sample_vpc_and_sgs['security_groups'][0]
+        sg['IpPermissions'][0]['Ipv6Ranges'] = [{'CidrIpv6': '::/0'}]
+        sg['IpPermissions'][0]['PrefixListIds'] = [{'PrefixListId': 'pl-6da54004'}]
+
+        diagram = generate_mermaid_diagram(analyze_security_group_connections(sample_vpc_and_sgs))
+
+        assert 'CIDR____0["🔌 ::/0"]' in diagram
+        assert 'CIDR_pl_6da54004["🔌 pl-6da54004"]' in diagram
+
+
+class TestCompactMermaidDiagram:
+    """Tests for the compact mermaid rendering mode"""
+
+    def test_cidr_nodes_declared_once(self, sample_vpc_and_sgs):
+        """Test a CIDR referenced by several rules is declared once"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        diagram = generate_mermaid_diagram(connections, compact=True)
+
+        assert generate_mermaid_diagram(connections).count('CIDR_0_0_0_0_0["') == 3
+        assert diagram.count('CIDR_0_0_0_0_0["') == 1
+        assert diagram.startswith('```mermaid\nflowchart LR')
+        assert diagram.endswith('```')
+
+    def test_parallel_edges_merged(self):
+        """Test parallel edges are merged with collapsed port ranges"""
+        def conn(protocol, from_port, to_port):
+            return {'type': 'security_group', 'id': 'sg-2', 'name': 'b', 'protocol': protocol,
+                    'from_port': from_port, 'to_port': to_port, 'description': ''}
+        connections = {
+            'vpc': {'id': 'vpc-1', 'cidr': '', 'name': '', 'tags': []},
+            'security_groups': {
+                'sg-1': {'name': 'a', 'description': '', 'tags': [], 'inbound': [
+                    conn('tcp', 80, 80), conn('tcp', 81, 81), conn('6', 443, 443),
+                    conn('tcp', 8000, 8100), conn('tcp', 8050, 8200), conn('udp', 53, 53), conn('icmp', 8, -1)
+                ], 'outbound': [conn('-1', 'all', 'all')]}
+            }
+        }
+
+        lines = list(iter_mermaid_lines(connections, compact=True))
+
+        assert '    SG_sg_2 -->|inbound: tcp/80-81,443,8000-8200<br>udp/53<br>icmp/8--1| SG_sg_1' in lines
+        assert '    SG_sg_1 -->|outbound: -1/all| SG_sg_2' in lines
+        assert '    linkStyle 0 stroke:#cccccc,stroke-width:2' in lines
+        assert '    linkStyle 1 stroke:#555555,stroke-width:2' in lines
+
+    def test_compact_with_vpc_link_indices(self, sample_vpc_and_sgs):
+        """Test edge link indices start after the VPC links"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        lines = list(iter_mermaid_lines(connections, include_vpc=True, compact=True))
+
+        assert lines.count('    VPC_vpc_12345678 -->|belongs to| SG_sg_11111111') == 1
+        link_styles = [line for line in lines if 'linkStyle' in line]
+        indices = sorted(int(i) for line in link_styles for i in line.split()[1].split(','))
+        assert indices == list(range(3, 10))
+
 
 class TestGenerateJsonOutput:
     """Tests for generate_json_output function"""
@@ -214,4 +467,63 @@ class TestGenerateJsonOutput:
         # Verify security groups
         assert 'sg-11111111' in parsed_json['security_groups']
         assert 'sg-22222222' in parsed_json['security_groups']
-        assert 'sg-33333333' in parsed_json['security_groups']
\ No newline at end of file
+        assert 'sg-33333333' in parsed_json['security_groups']
+
+    def test_write_json_output(self, sample_vpc_and_sgs):
+        """Test the streaming writer produces the same JSON"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+        fp = io.StringIO()
+
+        write_json_output(connections, fp)
+
+        assert fp.getvalue() == generate_json_output(connections) + "\n"
+
+
+class TestJsonLines:
+    """Tests for iter_json_lines and write_json_lines functions"""
+
+    def test_group_records(self, sample_vpc_and_sgs):
+        """Test one record per group matches the connection map once every peer is known"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+        names = {sg_id: sg['name'] for sg_id, sg in connections['security_groups'].items()}
+
+        records = list(iter_json_lines(sample_vpc_and_sgs, known_names=names))
+
+        assert records[0] == {'record': 'vpc', **connections['vpc']}
+        assert [record['id'] for record in records[1:]] == list(connections['security_groups'])
+        for record in records[1:]:
+            entry = {key: value for key, value in record.items() if key not in ('record', 'vpc_id', 'id')}
+            assert entry == connections['security_groups'][record['id']]
+
+    def test_streamed_groups(self, sample_vpc_and_sgs):
+        """Test records are produced before the input is exhausted and later peers are named by ID"""
+        consumed = []
+
+        def stream():
+            for sg in sample_vpc_and_sgs['security_groups']:
+                consumed.append(sg['GroupId'])
+                yield sg
+
+        records = iter_json_lines({'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': stream()})
+        next(records)
+        web = next(records)
+
+        assert consumed == ['sg-11111111']
+        assert web['inbound'][0]['name'] == 'sg-22222222'
+        assert next(records)['outbound'][0]['name'] == 'WebServer'
+
+    def test_write_connection_records(self, sample_vpc_and_sgs):
+        """Test one compact line per connection"""
+        fp = io.StringIO()
+
+        write_json_lines(sample_vpc_and_sgs, fp, per_connection=True)
+
+        lines = fp.getvalue().splitlines()
+        assert len(lines) == 1 + 7
+        record = json.loads(lines[1])
+        assert record == {
+            'record': 'connection', 'vpc_id': 'vpc-12345678', 'security_group': 'sg-11111111',
+            'direction': 'inbound', 'type': 'security_group', 'id': 'sg-22222222', 'name': 'sg-22222222',
+            'protocol': 'tcp', 'from_port': 80, 'to_port': 80, 'description': record['description']
+        }
+        assert ', ' not in lines[1]
@@ -0,0 +1,157 @@
+"""
+Tests for sgmap.diff module
+"""
+
+import copy
+import json
+from unittest.mock import patch
+
+import pytest
+
+from sgmap.diff import diff_snapshots, generate_diff_mermaid, group_fingerprint, has_changes, load_snapshot
+from sgmap.graph import iter_rule_edges
+
+
+@pytest.fixture
+def changed_vpc_and_sgs(sample_vpc_and_sgs):
+    """
+    Fixture for the sample VPC after some drift:
+    WebServer opens 22 from a CIDR and changes a description, Database is removed,
+    and a Bastion group is added
+    """
+    groups = copy.deepcopy(sample_vpc_and_sgs['security_groups'])
+    web = groups[0]
+    web['IpPermissions'].append({
+        'IpProtocol': 'tcp',
+        'FromPort': 22,
+        'ToPort': 22,
+        'UserIdGroupPairs': [],
+        'IpRanges': [{'CidrIp': '10.0.0.0/8'}]
+    })
+    web['IpPermissions'][0]['IpRanges'][0]['Description'] = 'Allow HTTP from the internet'
+    del groups[2]
+    groups.append({
+        'GroupId': 'sg-44444444',
+        'GroupName': 'Bastion',
+        'VpcId': 'vpc-12345678',
+        'IpPermissions': [],
+        'IpPermissionsEgress': [{
+            'IpProtocol': 'tcp',
+            'FromPort': 22,
+            'ToPort': 22,
+            'UserIdGroupPairs': [{'GroupId': 'sg-11111111'}]
+        }]
+    })
+    return {'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': groups}
+
+
+class TestGroupFingerprint:
+    """Tests for group_fingerprint function"""
+
+    def test_independent_of_key_order(self):
+        """Test the fingerprint does not depend on dictionary key order"""
+        assert group_fingerprint({'GroupId': 'sg-1', 'GroupName': 'a'}) == \
+            group_fingerprint({'GroupName': 'a', 'GroupId': 'sg-1'})
+        assert group_fingerprint({'GroupId': 'sg-1', 'GroupName': 'a'}) != \
+            group_fingerprint({'GroupId': 'sg-1', 'GroupName': 'b'})
+
+
+class TestDiffSnapshots:
+    """Tests for diff_snapshots function"""
+
+    def test_identical(self, sample_vpc_and_sgs):
+        """Test identical snapshots have no differences"""
+        diff = diff_snapshots(sample_vpc_and_sgs, copy.deepcopy(sample_vpc_and_sgs))
+
+        assert not has_changes(diff)
+        assert diff['summary']['unchanged'] == 3
+        assert diff['vpc']['id'] == 'vpc-12345678'
+
+    def test_added_removed_changed(self, sample_vpc_and_sgs, changed_vpc_and_sgs):
+        """Test groups and edges are classified by status"""
+        diff = diff_snapshots(sample_vpc_and_sgs, changed_vpc_and_sgs)
+
+        assert diff['summary'] == {
+            'added': 1,
+            'removed': 1,
+            'changed': 1,
+            'unchanged': 1,
+            'edges': {'added': 2, 'removed': 2, 'changed': 1}
+        }
+        groups = diff['security_groups']
+        assert set(groups) == {'sg-11111111', 'sg-33333333', 'sg-44444444'}
+
+        web = groups['sg-11111111']
+        assert web['status'] == 'changed'
+        assert [(e['id'], e['from_port']) for e in web['edges']['added']] == [('10.0.0.0/8', 22)]
+        assert web['edges']['changed'][0]['old_description'] == 'Allow HTTP from anywhere'
+        assert web['edges']['changed'][0]['description'] == 'Allow HTTP from the internet'
+
+        assert groups['sg-33333333']['status'] == 'removed'
+        assert len(groups['sg-33333333']['edges']['removed']) == 2
+        bastion = groups['sg-44444444']
+        assert bastion['status'] == 'added'
+        assert bastion['edges']['added'][0]['name'] == 'WebServer'
+
+    def test_only_changed_groups_are_analyzed(self, sample_vpc_and_sgs, changed_vpc_and_sgs):
+        """Test unchanged groups are compared by fingerprint only"""
+        with patch('sgmap.diff.iter_rule_edges', wraps=iter_rule_edges) as mock_iter:
+            diff_snapshots(sample_vpc_and_sgs, changed_vpc_and_sgs)
+
+        analyzed = {call.args[0]['GroupId'] for call in mock_iter.call_args_list}
+        assert 'sg-22222222' not in analyzed
+
+
+class TestGenerateDiffMermaid:
+    """Tests for generate_diff_mermaid function"""
+
+    def test_changed_subgraph_only(self, sample_vpc_and_sgs, changed_vpc_and_sgs):
+        """Test only changed groups and their changed edges are drawn"""
+        mermaid = generate_diff_mermaid(diff_snapshots(sample_vpc_and_sgs, changed_vpc_and_sgs))
+
+        assert mermaid.startswith("```mermaid\nflowchart LR")
+        assert 'SG_sg_11111111["WebServer<br>(sg-11111111)"]:::changed' in mermaid
+        assert 'SG_sg_33333333["Database<br>(sg-33333333)"]:::removed' in mermaid
+        assert 'SG_sg_44444444["Bastion<br>(sg-44444444)"]:::added' in mermaid
+        assert 'CIDR_10_0_0_0_8 -->|+ inbound: tcp/22-22| SG_sg_11111111' in mermaid
+        assert 'SG_sg_44444444 -->|+ outbound: tcp/22-22| SG_sg_11111111' in mermaid
+        assert 'CIDR_0_0_0_0_0 -->|~ inbound: tcp/80-80| SG_sg_11111111' in mermaid
+        # LoadBalancer is unchanged and not a peer of any changed edge
+        assert 'sg_22222222' not in mermaid
+        assert 'linkStyle' in mermaid and 'classDef removed' in mermaid
+
+    def test_no_changes(self, sample_vpc_and_sgs):
+        """Test an empty diff renders an empty diagram"""
+        mermaid = generate_diff_mermaid(diff_snapshots(sample_vpc_and_sgs, sample_vpc_and_sgs))
+
+        assert 'SG_' not in mermaid
+        assert 'linkStyle' not in mermaid
+
+
+class TestLoadSnapshot:
+    """Tests for load_snapshot function"""
+
+    def test_describe_output(self, tmp_path, sample_security_groups_response):
+        """Test describe-security-groups output is loaded"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+
+        snapshot = load_snapshot(str(path))
+
+        assert snapshot['vpc'] == {'VpcId': 'vpc-12345678'}
+        assert len(snapshot['security_groups']) == 3
+
+    def test_cache_snapshot(self, tmp_path, sample_vpc_and_sgs):
+        """Test a --cache-dir snapshot is loaded"""
+        path = tmp_path / 'snapshot.json'
+        path.write_text(json.dumps({'created_at': 0, 'vpc_and_sgs': sample_vpc_and_sgs}))
+
+        assert load_snapshot(str(path)) == sample_vpc_and_sgs
+
+    def test_unrecognized(self, tmp_path):
+        """Test other JSON files are rejected"""
+        path = tmp_path / 'other.json'
+        path.write_text('{"Vpcs": []}')
+
+        with pytest.raises(ValueError):
+            load_snapshot(str(path))
@@ -0,0 +1,206 @@
+"""
+Tests for sgmap.graph module
+"""
+
+import pytest
+
+from sgmap.core import analyze_security_group_connections, build_connection_graph
+from sgmap.graph import (
+    ConnectionGraph, iter_rule_edges, prefix_list_ids, resolve_prefix_lists, INBOUND, OUTBOUND, SECURITY_GROUP, CIDR
+)
+
+
+@pytest.fixture
+def ipv6_and_prefix_list_sg():
+    """
+    Fixture for a security group with IPv6 and prefix list rules
+    """
+    return {
+        'GroupId': 'sg-1',
+        'GroupName': 'one',
+        'IpPermissions': [{
+            'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+            'IpRanges': [{'CidrIp': '10.0.0.0/8'}],
+            'Ipv6Ranges': [{'CidrIpv6': '2001:db8::/32', 'Description': 'Office'}],
+            'PrefixListIds': [{'PrefixListId': 'pl-s3', 'Description': 'S3'}]
+        }],
+        'IpPermissionsEgress': [{
+            'IpProtocol': '-1',
+            'PrefixListIds': [{'PrefixListId': 'pl-unknown'}, {'PrefixListId': 'pl-s3'}]
+        }]
+    }
+
+
+@pytest.fixture
+def graph(sample_vpc_and_sgs):
+    """
+    Fixture for the connection graph of the sample VPC
+    """
+    return build_connection_graph(sample_vpc_and_sgs)
+
+
+class TestIterRuleEdges:
+    """Tests for iter_rule_edges function"""
+
+    def test_iter_rule_edges_order(self, sample_vpc_and_sgs):
+        """Test inbound edges precede outbound ones and group peers precede CIDRs"""
+        web_server = sample_vpc_and_sgs['security_groups'][0]
+
+        edges = list(iter_rule_edges(web_server))
+
+        assert edges == [
+            (INBOUND, SECURITY_GROUP, 'sg-22222222', None, 'tcp', 80, 80, 'Allow from LoadBalancer'),
+            (INBOUND, CIDR, '0.0.0.0/0', 'Allow HTTP from anywhere', 'tcp', 80, 80, 'Allow HTTP from anywhere'),
+            (OUTBOUND, SECURITY_GROUP, 'sg-33333333', None, 'tcp', 3306, 3306, 'Allow to Database')
+        ]
+
+    def test_iter_rule_edges_defaults(self):
+        """Test missing fields fall back like analyze_security_group_connections"""
+        sg = {'IpPermissions': [{'IpRanges': [{'CidrIp': '10.0.0.0/8'}], 'UserIdGroupPairs': [{'UserId': '1'}]}]}
+
+        assert list(iter_rule_edges(sg)) == [
+            (INBOUND, CIDR, '10.0.0.0/8', '10.0.0.0/8', 'all', 'all', 'all', '')
+        ]
+
+    def test_iter_rule_edges_ipv6_and_prefix_lists(self, ipv6_and_prefix_list_sg):
+        """Test IPv6 ranges are CIDR peers and prefix lists expand to their entries"""
+        prefix_lists = {'pl-s3': ['52.216.0.0/15', '3.5.0.0/19'], 'pl-unknown': None}
+
+        edges = list(iter_rule_edges(ipv6_and_prefix_list_sg, prefix_lists))
+
+        assert edges == [
+            (INBOUND, CIDR, '10.0.0.0/8', '10.0.0.0/8', 'tcp', 443, 443, ''),
+            (INBOUND, CIDR, '2001:db8::/32', 'Office', 'tcp', 443, 443, 'Office'),
+            (INBOUND, CIDR, '52.216.0.0/15', 'pl-s3', 'tcp', 443, 443, 'S3'),
+            (INBOUND, CIDR, '3.5.0.0/19', 'pl-s3', 'tcp', 443, 443, 'S3'),
+            (OUTBOUND, CIDR, 'pl-unknown', 'pl-unknown', '-1', 'all', 'all', ''),
+            (OUTBOUND, CIDR, '52.216.0.0/15', 'pl-s3', '-1', 'all', 'all', ''),
+            (OUTBOUND, CIDR, '3.5.0.0/19', 'pl-s3', '-1', 'all', 'all', '')
+        ]
+
+    def test_unresolved_prefix_lists_keep_their_id(self, ipv6_and_prefix_list_sg):
+        """Test prefix lists are shown by ID without a resolver, and empty lists add no edge"""
+        assert [edge[2] for edge in iter_rule_edges(ipv6_and_prefix_list_sg)] == [
+            '10.0.0.0/8', '2001:db8::/32', 'pl-s3', 'pl-unknown', 'pl-s3'
+        ]
+        assert [edge[2] for edge in iter_rule_edges(ipv6_and_prefix_list_sg, {'pl-s3': []})] == [
+            '10.0.0.0/8', '2001:db8::/32', 'pl-unknown'
+        ]
+
+
+class TestPrefixListIds:
+    """Tests for prefix_list_ids and resolve_prefix_lists functions"""
+
+    def test_prefix_list_ids(self, ipv6_and_prefix_list_sg, sample_vpc_and_sgs):
+        """Test referenced prefix lists are listed once in first-seen order"""
+        groups = sample_vpc_and_sgs['security_groups'] + [ipv6_and_prefix_list_sg, ipv6_and_prefix_list_sg]
+
+        assert prefix_list_ids(groups) == ['pl-s3', 'pl-unknown']
+
+    def test_resolve_prefix_lists(self, ipv6_and_prefix_list_sg):
+        """Test mappings are looked up and resolvers are asked once for every ID"""
+        class Resolver:
+            def __init__(self):
+                self.batches = []
+
+            def resolve(self, ids):
+                self.batches.append(ids)
+                return {pl_id: [] for pl_id in ids}
+
+        resolver = Resolver()
+
+        assert resolve_prefix_lists({'pl-s3': ['1.2.3.0/24']}, [ipv6_and_prefix_list_sg]) == {
+            'pl-s3': ['1.2.3.0/24'], 'pl-unknown': None
+        }
+        assert resolve_prefix_lists(resolver, [ipv6_and_prefix_list_sg]) == {'pl-s3': [], 'pl-unknown': []}
+        assert resolver.batches == [['pl-s3', 'pl-unknown']]
+
+
+class TestConnectionGraph:
+    """Tests for ConnectionGraph class"""
+
+    def test_to_dict_matches_analysis(self, graph, sample_vpc_and_sgs):
+        """Test to_dict reproduces the connection map"""
+        connections = graph.to_dict()
+
+        assert connections == analyze_security_group_connections(sample_vpc_and_sgs)
+        assert connections['security_groups']['sg-11111111']['inbound'][0] == {
+            'type': 'security_group',
+            'id': 'sg-22222222',
+            'name': 'LoadBalancer',
+            'protocol': 'tcp',
+            'from_port': 80,
+            'to_port': 80,
+            'description': 'Allow from LoadBalancer'
+        }
+        assert connections['security_groups']['sg-33333333']['outbound'][0] == {
+            'type': 'cidr',
+            'id': '0.0.0.0/0',
+            'name': 'Allow all outbound traffic',
+            'protocol': '-1',
+            'from_port': -1,
+            'to_port': -1,
+            'description': 'Allow all outbound traffic'
+        }
+
+    def test_counts_and_ids(self, graph):
+        """Test node and edge counts"""
+        assert graph.security_group_ids() == ['sg-11111111', 'sg-22222222', 'sg-33333333']
+        assert graph.node_count == 3
+        assert graph.edge_count == 7
+
+    def test_adjacency_indexes(self, graph):
+        """Test edges can be looked up by owner and by peer in both directions"""
+        inbound = graph.edges_of('sg-11111111', 'inbound')
+        outbound = graph.edges_of('sg-11111111', 'outbound')
+        assert [graph.edge_peer(edge) for edge in inbound] == [
+            ('security_group', 'sg-22222222'), ('cidr', '0.0.0.0/0')
+        ]
+        assert [graph.edge_peer(edge) for edge in outbound] == [('security_group', 'sg-33333333')]
+
+        referencing = graph.edges_referencing('sg-11111111')
+        assert [(graph.edge_owner(edge), graph.edge_direction(edge)) for edge in referencing] == [
+            ('sg-22222222', 'outbound'), ('sg-33333333', 'inbound')
+        ]
+        assert graph.edges_referencing('sg-11111111', 'inbound') == [referencing[1]]
+        assert graph.edge_rule(referencing[1]) == ('tcp', 3306, 3306)
+
+    def test_unknown_peer_keeps_id_as_name(self):
+        """Test groups referenced but not analyzed are named by their ID"""
+        graph = ConnectionGraph({'id': 'vpc-1', 'cidr': '', 'name': '', 'tags': []})
+        graph.add_security_group({
+            'GroupId': 'sg-1',
+            'GroupName': 'one',
+            'IpPermissions': [{'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22,
+                               'UserIdGroupPairs': [{'GroupId': 'sg-peer'}]}]
+        })
+
+        assert graph.has_security_group('sg-1')
+        assert not graph.has_security_group('sg-peer')
+        assert graph.edges_of('sg-peer') == []
+        assert graph.to_dict()['security_groups']['sg-1']['inbound'][0]['name'] == 'sg-peer'
+
+    def test_ipv6_and_prefix_lists_match_iter_rule_edges(self, ipv6_and_prefix_list_sg):
+        """Test the inlined rule loop expands IPv6 ranges and prefix lists like iter_rule_edges"""
+        prefix_lists = {'pl-s3': ['52.216.0.0/15', '3.5.0.0/19']}
+        graph = ConnectionGraph({'id': 'vpc-1', 'cidr': '', 'name': '', 'tags': []}, prefix_lists)
+        graph.add_security_group(ipv6_and_prefix_list_sg)
+
+        entry = graph.to_dict()['security_groups']['sg-1']
+        edges = [
+            (direction, conn['id'], conn['name'], conn['description'])
+            for direction, key in ((INBOUND, 'inbound'), (OUTBOUND, 'outbound'))
+            for conn in entry[key]
+        ]
+        assert edges == [
+            (direction, peer_id, name, description)
+            for direction, _, peer_id, name, _, _, _, description in iter_rule_edges(ipv6_and_prefix_list_sg, prefix_lists)
+        ]
+        assert graph.edge_count == 7
+
+    def test_values_are_interned(self, graph):
+        """Test repeated rule values are stored once"""
+        web_inbound = graph.edges_of('sg-11111111', 'inbound')
+
+        # Both edges of the same rule share one (protocol, from_port, to_port) entry
+        assert graph._edge_rule[web_inbound[0]] == graph._edge_rule[web_inbound[1]]
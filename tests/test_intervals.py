@@ -0,0 +1,132 @@
+"""
+Tests for sgmap.intervals module
+"""
+
+import pytest
+
+from sgmap.intervals import (
+    PortIntervalIndex,
+    canonical_protocol,
+    merge_ranges,
+    parse_port_spec,
+    port_range
+)
+
+
+class TestCanonicalProtocol:
+    """Tests for canonical_protocol function"""
+
+    @pytest.mark.parametrize('protocol, expected', [
+        ('tcp', 'tcp'), ('TCP', 'tcp'), ('6', 'tcp'), (6, 'tcp'),
+        ('17', 'udp'), ('1', 'icmp'), ('58', 'icmpv6'),
+        ('-1', '-1'), (-1, '-1'), ('all', '-1'), ('50', '50')
+    ])
+    def test_canonical_protocol(self, protocol, expected):
+        """Test protocol names and numbers are canonicalized"""
+        assert canonical_protocol(protocol) == expected
+
+
+class TestPortRange:
+    """Tests for port_range function"""
+
+    def test_port_range(self):
+        """Test ranges for specific, missing and wildcard ports"""
+        assert port_range('tcp', 80, 443) == (80, 443)
+        assert port_range('-1', -1, -1) == (0, 65535)
+        assert port_range('tcp', 'all', 'all') == (0, 65535)
+        assert port_range('icmp', -1, -1) == (0, 65535)
+
+    def test_icmp_type_and_code(self):
+        """Test ICMP rules cover their type only, whatever the code"""
+        assert port_range('icmp', 8, -1) == (8, 8)
+        assert port_range('1', 3, 4) == (3, 3)
+        assert port_range('icmpv6', 128, -1) == (128, 128)
+
+
+class TestParsePortSpec:
+    """Tests for parse_port_spec function"""
+
+    @pytest.mark.parametrize('spec, expected', [
+        ('5432/tcp', ('tcp', 5432)), ('53/udp', ('udp', 53)), ('443', ('tcp', 443)),
+        ('all', ('-1', None)), ('icmp', ('icmp', None)), ('all/udp', ('udp', None))
+    ])
+    def test_parse_port_spec(self, spec, expected):
+        """Test valid specifications"""
+        assert parse_port_spec(spec) == expected
+
+    def test_parse_port_spec_invalid(self):
+        """Test invalid ports are rejected"""
+        with pytest.raises(ValueError):
+            parse_port_spec('70000/tcp')
+        with pytest.raises(ValueError):
+            parse_port_spec('http/tcp')
+
+
+class TestMergeRanges:
+    """Tests for merge_ranges function"""
+
+    def test_merge_ranges(self):
+        """Test overlapping and adjacent ranges are merged"""
+        assert merge_ranges([(80, 80), (8000, 8100), (81, 90), (85, 100), (8101, 8200)]) == [
+            (80, 100), (8000, 8200)
+        ]
+        assert merge_ranges([]) == []
+
+
+class TestPortIntervalIndex:
+    """Tests for PortIntervalIndex class"""
+
+    def test_allows(self):
+        """Test membership per protocol"""
+        index = PortIntervalIndex()
+        index.add('tcp', 80, 80)
+        index.add('6', 8000, 8100)
+        index.add('udp', 53, 53)
+
+        assert index.allows('tcp', 80)
+        assert index.allows('tcp', 8050)
+        assert not index.allows('tcp', 81)
+        assert not index.allows('tcp', 53)
+        assert index.allows('udp', 53)
+        assert index.allows('tcp')
+        assert not index.allows('icmp')
+        assert index.ranges() == {'tcp': [(80, 80), (8000, 8100)], 'udp': [(53, 53)]}
+
+    def test_all_protocols(self):
+        """Test a -1 rule allows everything"""
+        index = PortIntervalIndex()
+        index.add('-1', -1, -1)
+
+        assert index.allows('tcp', 22)
+        assert index.allows('icmp')
+
+    def test_intersects(self):
+        """Test two indexes intersect when they share a protocol and port"""
+        def index(*rules):
+            result = PortIntervalIndex()
+            for rule in rules:
+                result.add(*rule)
+            return result
+
+        web = index(('tcp', 80, 80), ('tcp', 443, 443))
+        assert web.intersects(index(('6', 400, 500)))
+        assert not web.intersects(index(('tcp', 81, 442), ('udp', 80, 80)))
+        assert web.intersects(index(('-1', -1, -1)))
+        assert index(('-1', -1, -1)).intersects(web)
+        assert not index(('-1', -1, -1)).intersects(PortIntervalIndex())
+
+        # Restricted to one protocol
+        assert web.intersects(index(('tcp', 440, 450), ('udp', 80, 80)), 'tcp')
+        assert not web.intersects(index(('tcp', 440, 450), ('udp', 80, 80)), 'udp')
+        assert web.intersects(index(('-1', -1, -1)), 'tcp')
+        assert not web.intersects(index(('-1', -1, -1)), '-1')
+        assert not index(('icmp', 8, -1)).intersects(index(('icmp', 0, -1)), 'icmp')
+
+    def test_add_after_query(self):
+        """Test ranges added after a lookup are merged in"""
+        index = PortIntervalIndex()
+        index.add('tcp', 22, 22)
+        assert not index.allows('tcp', 23)
+        index.add('tcp', 23, 23)
+        assert index.allows('tcp', 23)
+        assert index.ranges() == {'tcp': [(22, 23)]}
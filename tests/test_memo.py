@@ -0,0 +1,113 @@
+"""
+Tests for sgmap.memo module
+"""
+
+import copy
+from unittest.mock import patch
+
+import pytest
+
+from sgmap.core import analyze_security_group_connections, generate_json_output, generate_mermaid_diagram
+from sgmap.memo import CacheInfo, RenderCache, cached_mermaid_diagram, content_key, default_render_cache
+
+
+@pytest.fixture
+def connections(sample_vpc_and_sgs):
+    """
+    Fixture for the analyzed sample VPC
+    """
+    return analyze_security_group_connections(sample_vpc_and_sgs)
+
+
+class TestContentKey:
+    """Tests for content_key function"""
+
+    def test_equal_maps(self, sample_vpc_and_sgs, connections):
+        """Test maps analyzed from equal data get the same key"""
+        other = analyze_security_group_connections(copy.deepcopy(sample_vpc_and_sgs))
+
+        assert content_key(other) == content_key(connections)
+
+    def test_changed_map(self, connections):
+        """Test any change to the data changes the key"""
+        changed = copy.deepcopy(connections)
+        changed['security_groups']['sg-11111111']['inbound'][0]['port_range'] = '81'
+
+        assert content_key(changed) != content_key(connections)
+
+
+class TestRenderCache:
+    """Tests for RenderCache class"""
+
+    def test_hit_returns_same_document(self, connections):
+        """Test a repeated render is served from the cache and matches the uncached render"""
+        cache = RenderCache()
+
+        first = cache.mermaid(connections, include_vpc=True)
+        with patch('sgmap.memo.generate_mermaid_diagram') as mock_render:
+            second = cache.mermaid(connections, include_vpc=True)
+
+        mock_render.assert_not_called()
+        assert second is first
+        assert first == generate_mermaid_diagram(connections, include_vpc=True)
+        assert cache.cache_info() == CacheInfo(hits=1, misses=1, maxsize=32, currsize=1)
+
+    def test_key_covers_format_and_options(self, connections):
+        """Test each format and option combination is cached separately"""
+        cache = RenderCache()
+
+        documents = [
+            cache.mermaid(connections),
+            cache.mermaid(connections, include_vpc=True),
+            cache.mermaid(connections, compact=True),
+            cache.json(connections)
+        ]
+
+        assert cache.cache_info().misses == 4
+        assert documents[3] == generate_json_output(connections)
+        assert len(set(documents)) == 4
+
+    def test_changed_data_misses(self, connections):
+        """Test a mutated map is rendered again"""
+        cache = RenderCache()
+        cache.json(connections)
+
+        connections['vpc']['name'] = 'Renamed'
+
+        assert '"Renamed"' in cache.json(connections)
+        assert cache.cache_info().hits == 0
+
+    def test_lru_eviction(self, connections):
+        """Test the least recently used document is evicted beyond maxsize"""
+        cache = RenderCache(maxsize=2)
+        cache.mermaid(connections)
+        cache.json(connections)
+        cache.mermaid(connections)
+        cache.mermaid(connections, compact=True)
+
+        cache.mermaid(connections)
+        cache.json(connections)
+
+        assert cache.cache_info() == CacheInfo(hits=2, misses=4, maxsize=2, currsize=2)
+
+    def test_caller_key(self, connections):
+        """Test a caller-supplied key skips hashing"""
+        cache = RenderCache()
+        cache.json(connections, key='v1')
+
+        with patch('sgmap.memo.content_key') as mock_key:
+            cache.json(connections, key='v1')
+
+        mock_key.assert_not_called()
+        assert cache.cache_info().hits == 1
+
+    def test_cache_clear(self, connections):
+        """Test clearing removes documents and resets counters"""
+        cache_info = default_render_cache.cache_info()
+        cached_mermaid_diagram(connections)
+        cached_mermaid_diagram(connections)
+        assert default_render_cache.cache_info().hits == cache_info.hits + 1
+
+        default_render_cache.cache_clear()
+
+        assert default_render_cache.cache_info() == CacheInfo(0, 0, 32, 0)
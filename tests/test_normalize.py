@@ -0,0 +1,102 @@
+"""
+Tests for sgmap.normalize module
+"""
+
+import copy
+
+from sgmap.normalize import normalize_connections, normalize_entries
+
+
+def _conn(peer, protocol, from_port, to_port, name=None, description=''):
+    return {'type': 'cidr', 'id': peer, 'name': name or peer, 'protocol': protocol,
+            'from_port': from_port, 'to_port': to_port, 'description': description}
+
+
+def _ports(entries):
+    return [(conn['id'], conn['protocol'], conn['from_port'], conn['to_port']) for conn in entries]
+
+
+class TestNormalizeEntries:
+    """Tests for normalize_entries function"""
+
+    def test_merges_overlapping_and_adjacent_ranges(self):
+        """Test TCP ranges spelled differently are merged when they overlap or touch"""
+        entries = normalize_entries([
+            _conn('10.0.0.0/8', 'tcp', 80, 80, description='http'),
+            _conn('10.0.0.0/8', '6', 81, 90),
+            _conn('10.0.0.0/8', 'tcp', 85, 100),
+            _conn('10.0.0.0/8', 'tcp', 443, 443, description='https'),
+            _conn('10.0.0.0/8', 'udp', 53, 53)
+        ])
+
+        assert _ports(entries) == [
+            ('10.0.0.0/8', 'tcp', 80, 100),
+            ('10.0.0.0/8', 'tcp', 443, 443),
+            ('10.0.0.0/8', 'udp', 53, 53)
+        ]
+        # A merged entry keeps the name and description of its first rule
+        assert [conn['description'] for conn in entries] == ['http', 'https', '']
+
+    def test_all_protocols_subsume_other_rules(self):
+        """Test a rule for all protocols makes the other rules to the same peer redundant"""
+        entries = normalize_entries([
+            _conn('10.0.0.0/8', 'tcp', 22, 22),
+            _conn('192.168.0.0/16', 'tcp', 22, 22),
+            _conn('10.0.0.0/8', 'all', 'all', 'all'),
+            _conn('10.0.0.0/8', 'icmp', 8, -1)
+        ])
+
+        assert _ports(entries) == [
+            ('10.0.0.0/8', '-1', 'all', 'all'),
+            ('192.168.0.0/16', 'tcp', 22, 22)
+        ]
+
+    def test_dedupes_icmp_types(self):
+        """Test ICMP types are deduplicated and all types subsume the others"""
+        assert _ports(normalize_entries([
+            _conn('10.0.0.0/8', 'icmp', 8, -1),
+            _conn('10.0.0.0/8', '1', 8, -1),
+            _conn('10.0.0.0/8', 'icmp', 0, -1)
+        ])) == [('10.0.0.0/8', 'icmp', 8, -1), ('10.0.0.0/8', 'icmp', 0, -1)]
+        assert _ports(normalize_entries([
+            _conn('10.0.0.0/8', 'icmp', 8, -1),
+            _conn('10.0.0.0/8', 'icmp', -1, -1)
+        ])) == [('10.0.0.0/8', 'icmp', -1, -1)]
+
+    def test_peers_are_kept_apart(self):
+        """Test rules to different peers or peer types are never merged"""
+        conns = [
+            _conn('10.0.0.0/8', 'tcp', 80, 80),
+            _conn('10.0.0.0/16', 'tcp', 81, 81),
+            {'type': 'security_group', 'id': '10.0.0.0/8', 'name': 'odd', 'protocol': 'tcp',
+             'from_port': 81, 'to_port': 81, 'description': ''}
+        ]
+
+        assert len(normalize_entries(conns)) == 3
+
+
+class TestNormalizeConnections:
+    """Tests for normalize_connections function"""
+
+    def test_counts_collapsed_edges_and_keeps_input(self):
+        """Test the number of collapsed edges is returned and the input is not modified"""
+        connections = {
+            'vpc': {'id': 'vpc-1', 'cidr': '10.0.0.0/16', 'name': '', 'tags': []},
+            'security_groups': {
+                'sg-1': {'name': 'web', 'description': '', 'tags': [], 'inbound': [
+                    _conn('0.0.0.0/0', 'tcp', 80, 80), _conn('0.0.0.0/0', 'tcp', 443, 443),
+                    _conn('0.0.0.0/0', 'tcp', 81, 442)
+                ], 'outbound': [_conn('0.0.0.0/0', '-1', 'all', 'all'), _conn('0.0.0.0/0', 'udp', 53, 53)]},
+                'sg-2': {'name': 'db', 'description': '', 'tags': [], 'inbound': [], 'outbound': []}
+            }
+        }
+        original = copy.deepcopy(connections)
+
+        normalized, collapsed = normalize_connections(connections)
+
+        assert collapsed == 3
+        assert connections == original
+        assert normalized['vpc'] == connections['vpc']
+        assert _ports(normalized['security_groups']['sg-1']['inbound']) == [('0.0.0.0/0', 'tcp', 80, 443)]
+        assert _ports(normalized['security_groups']['sg-1']['outbound']) == [('0.0.0.0/0', '-1', 'all', 'all')]
+        assert normalized['security_groups']['sg-2']['name'] == 'db'
@@ -0,0 +1,97 @@
+"""
+Tests for sgmap.offline module
+"""
+
+import io
+import json
+
+import pytest
+
+from sgmap.core import analyze_security_group_connections
+from sgmap.offline import iter_json_array_items, load_vpc_and_sgs_from_files
+
+
+@pytest.fixture
+def dump_files(tmp_path, sample_vpc_response, sample_security_groups_response):
+    """
+    Fixture writing describe-vpcs and describe-security-groups output files
+    """
+    vpcs_path = tmp_path / 'vpcs.json'
+    sgs_path = tmp_path / 'sgs.json'
+    vpcs_path.write_text(json.dumps(sample_vpc_response, indent=4))
+    sgs_path.write_text(json.dumps(sample_security_groups_response, indent=4))
+    return str(vpcs_path), str(sgs_path)
+
+
+class TestIterJsonArrayItems:
+    """Tests for iter_json_array_items function"""
+
+    def test_streams_selected_arrays(self):
+        """Test only elements of the selected top-level arrays are yielded"""
+        document = {
+            'Skipped': [{'a': 1}, [2, 3]],
+            'SecurityGroups': [{'GroupId': 'sg-1', 'Nested': {'x': [1, 2]}}, {'GroupId': 'sg-2'}],
+            'NextToken': 'token',
+            'Count': 12345
+        }
+        fp = io.StringIO(json.dumps(document))
+
+        items = list(iter_json_array_items(fp, ['SecurityGroups'], chunk_size=7))
+
+        assert items == [
+            ('SecurityGroups', {'GroupId': 'sg-1', 'Nested': {'x': [1, 2]}}),
+            ('SecurityGroups', {'GroupId': 'sg-2'})
+        ]
+
+    def test_small_chunks_match_json_load(self, sample_security_groups_response):
+        """Test chunk boundaries anywhere in the text do not change the result"""
+        text = json.dumps(sample_security_groups_response, indent=2)
+
+        for chunk_size in (1, 3, 16, 1024):
+            items = [item for _, item in iter_json_array_items(io.StringIO(text), ['SecurityGroups'], chunk_size)]
+            assert items == sample_security_groups_response['SecurityGroups']
+
+    def test_empty_object_and_array(self):
+        """Test empty containers"""
+        assert list(iter_json_array_items(io.StringIO('{}'), ['SecurityGroups'])) == []
+        assert list(iter_json_array_items(io.StringIO('{"SecurityGroups": []}'), ['SecurityGroups'])) == []
+
+    def test_invalid_json(self):
+        """Test truncated input raises an error"""
+        with pytest.raises(ValueError):
+            list(iter_json_array_items(io.StringIO('{"SecurityGroups": [{"GroupId": "sg-1"}'), ['SecurityGroups']))
+
+
+class TestLoadVpcAndSgsFromFiles:
+    """Tests for load_vpc_and_sgs_from_files function"""
+
+    def test_load_matches_live_analysis(self, dump_files, sample_vpc_and_sgs):
+        """Test files produce the same connection map as the API responses"""
+        vpc_and_sgs = load_vpc_and_sgs_from_files(dump_files)
+
+        assert vpc_and_sgs['vpc'] == sample_vpc_and_sgs['vpc']
+        assert analyze_security_group_connections(vpc_and_sgs) == \
+            analyze_security_group_connections(sample_vpc_and_sgs)
+
+    def test_load_without_vpcs_file(self, dump_files):
+        """Test the VPC is taken from the security groups when no describe-vpcs file is given"""
+        vpc_and_sgs = load_vpc_and_sgs_from_files([dump_files[1]])
+
+        assert vpc_and_sgs['vpc'] == {'VpcId': 'vpc-12345678'}
+        assert len(list(vpc_and_sgs['security_groups'])) == 3
+
+    def test_load_filters_by_vpc_and_group(self, dump_files):
+        """Test VPC and security group filters"""
+        vpc_and_sgs = load_vpc_and_sgs_from_files(dump_files, 'vpc-12345678', 'sg-22222222')
+        assert [sg['GroupId'] for sg in vpc_and_sgs['security_groups']] == ['sg-22222222']
+
+        missing = load_vpc_and_sgs_from_files(dump_files, 'vpc-nonexistent')
+        assert missing['vpc'] is None
+
+    def test_load_multiple_vpcs_requires_vpc_id(self, tmp_path, dump_files):
+        """Test an ambiguous describe-vpcs file requires a VPC ID"""
+        vpcs_path = tmp_path / 'many_vpcs.json'
+        vpcs_path.write_text(json.dumps({'Vpcs': [{'VpcId': 'vpc-1'}, {'VpcId': 'vpc-2'}]}))
+
+        with pytest.raises(ValueError):
+            load_vpc_and_sgs_from_files([str(vpcs_path), dump_files[1]])
@@ -0,0 +1,115 @@
+"""
+Tests for sgmap.parallel module
+"""
+
+import copy
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from sgmap.cli import main
+from sgmap.core import analyze_security_group_connections, generate_json_output
+from sgmap.parallel import analyze_security_group_connections_parallel
+
+
+@pytest.fixture
+def many_vpc_and_sgs(sample_vpc_and_sgs):
+    """
+    Fixture for the sample groups copied ten times under new IDs, each copy
+    referencing the groups of the previous copy
+    """
+    groups = []
+    for copy_index in range(10):
+        for sg in sample_vpc_and_sgs['security_groups']:
+            sg = copy.deepcopy(sg)
+            sg['GroupId'] = f"{sg['GroupId']}-{copy_index}"
+            sg['GroupName'] = f"{sg['GroupName']}{copy_index}"
+            for rule in sg['IpPermissions'] + sg['IpPermissionsEgress']:
+                for pair in rule['UserIdGroupPairs']:
+                    pair['GroupId'] = f"{pair['GroupId']}-{max(copy_index - 1, 0)}"
+            groups.append(sg)
+    return {'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': groups}
+
+
+class TestAnalyzeSecurityGroupConnectionsParallel:
+    """Tests for analyze_security_group_connections_parallel function"""
+
+    def test_identical_to_serial(self, many_vpc_and_sgs):
+        """Test peers in other shards are named and the output is byte-identical"""
+        serial = analyze_security_group_connections(many_vpc_and_sgs)
+
+        parallel = analyze_security_group_connections_parallel(many_vpc_and_sgs, workers=3, shard_size=4)
+
+        assert generate_json_output(parallel) == generate_json_output(serial)
+        peers = {conn['id']: conn['name'] for conn in parallel['security_groups']['sg-11111111-5']['inbound']}
+        assert peers['sg-22222222-4'] == 'LoadBalancer4'
+
+    def test_duplicate_group_ids(self, sample_vpc_and_sgs):
+        """Test a group repeated in another shard is merged like the serial analysis"""
+        groups = copy.deepcopy(sample_vpc_and_sgs['security_groups'])
+        renamed = copy.deepcopy(groups[1])
+        renamed['GroupName'] = 'Renamed'
+        vpc_and_sgs = {'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': groups + [renamed]}
+
+        parallel = analyze_security_group_connections_parallel(vpc_and_sgs, workers=2, shard_size=2)
+
+        assert parallel == analyze_security_group_connections(vpc_and_sgs)
+        assert list(parallel['security_groups']) == ['sg-11111111', 'sg-22222222', 'sg-33333333']
+
+    def test_prefix_lists(self, many_vpc_and_sgs):
+        """Test prefix lists are resolved once in the parent and expanded by every worker"""
+        class Resolver:
+            def __init__(self):
+                self.batches = []
+
+            def resolve(self, ids):
+                self.batches.append(ids)
+                return {pl_id: ['52.216.0.0/15', '3.5.0.0/19'] for pl_id in ids}
+
+        for sg in many_vpc_and_sgs['security_groups']:
+            sg['IpPermissionsEgress'][0]['PrefixListIds'] = [{'PrefixListId': 'pl-s3'}]
+        resolver = Resolver()
+        vpc_and_sgs = {**many_vpc_and_sgs, 'prefix_lists': resolver}
+
+        parallel = analyze_security_group_connections_parallel(vpc_and_sgs, workers=3, shard_size=4)
+
+        assert resolver.batches == [['pl-s3']]
+        assert parallel == analyze_security_group_connections(
+            {**many_vpc_and_sgs, 'prefix_lists': {'pl-s3': ['52.216.0.0/15', '3.5.0.0/19']}}
+        )
+        assert [conn['id'] for conn in parallel['security_groups']['sg-11111111-9']['outbound']][-2:] == [
+            '52.216.0.0/15', '3.5.0.0/19'
+        ]
+
+    def test_single_shard_runs_serially(self, sample_vpc_and_sgs):
+        """Test small inputs are analyzed in-process"""
+        parallel = analyze_security_group_connections_parallel(iter_groups(sample_vpc_and_sgs), workers=4)
+
+        assert parallel == analyze_security_group_connections(sample_vpc_and_sgs)
+
+
+def iter_groups(vpc_and_sgs):
+    """Return vpc_and_sgs with the security groups as a generator"""
+    return {'vpc': vpc_and_sgs['vpc'], 'security_groups': (sg for sg in vpc_and_sgs['security_groups'])}
+
+
+class TestAnalysisWorkersOption:
+    """Tests for the --analysis-workers option"""
+
+    def test_from_file(self, tmp_path, sample_security_groups_response):
+        """Test the parallel analysis is used for a single VPC"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+
+        result = CliRunner().invoke(main, ['--from-file', str(path), '--json', '--analysis-workers', '2'])
+
+        assert result.exit_code == 0
+        assert set(json.loads(result.output)['security_groups']) == {'sg-11111111', 'sg-22222222', 'sg-33333333'}
+
+    def test_several_vpcs(self):
+        """Test the option is rejected in multi-VPC mode"""
+        result = CliRunner().invoke(main, ['--all-vpcs', '--analysis-workers', '2'])
+
+        assert result.exit_code == 2
+        assert "'--analysis-workers' cannot be used with several VPCs" in result.output
@@ -0,0 +1,152 @@
+"""
+Tests for sgmap.prefix_lists module
+"""
+
+import threading
+
+import pytest
+from botocore.stub import Stubber
+
+from sgmap.aws import ec2_client
+from sgmap.cache import SnapshotCache
+from sgmap.core import analyze_security_group_connections
+from sgmap.prefix_lists import PrefixListResolver
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    """
+    Fixture for dummy AWS credentials so that real clients can be created offline
+    """
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+
+class FakeEc2:
+    """EC2 client serving get_managed_prefix_list_entries from a dict, one page per list"""
+
+    def __init__(self, prefix_lists):
+        self.prefix_lists = prefix_lists
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def get_paginator(self, operation):
+        assert operation == 'get_managed_prefix_list_entries'
+        return self
+
+    def paginate(self, PrefixListId):
+        with self._lock:
+            self.requested.append(PrefixListId)
+        yield {'Entries': [{'Cidr': cidr} for cidr in self.prefix_lists[PrefixListId]]}
+
+
+class TestPrefixListResolver:
+    """Tests for PrefixListResolver class"""
+
+    def test_paginates_and_unreadable_lists_resolve_to_none(self, aws_credentials):
+        """Test every page is read and API errors resolve to None"""
+        ec2 = ec2_client('us-east-1')
+        resolver = PrefixListResolver(ec2)
+        with Stubber(ec2) as stubber:
+            stubber.add_response('get_managed_prefix_list_entries', {
+                'Entries': [{'Cidr': '52.216.0.0/15'}], 'NextToken': 'token'
+            }, {'PrefixListId': 'pl-s3'})
+            stubber.add_response('get_managed_prefix_list_entries', {
+                'Entries': [{'Cidr': '3.5.0.0/19'}]
+            }, {'PrefixListId': 'pl-s3', 'NextToken': 'token'})
+            stubber.add_client_error('get_managed_prefix_list_entries', 'InvalidPrefixListID.NotFound')
+
+            assert resolver.get('pl-s3') == ['52.216.0.0/15', '3.5.0.0/19']
+            assert resolver.get('pl-missing') is None
+            assert resolver.get('pl-s3') == ['52.216.0.0/15', '3.5.0.0/19']
+            stubber.assert_no_pending_responses()
+
+        assert resolver.calls == 2
+
+    def test_resolve_fetches_each_list_once(self):
+        """Test a batch fetches the unknown lists concurrently and only once"""
+        ec2 = FakeEc2({'pl-a': ['10.0.0.0/8'], 'pl-b': ['192.168.0.0/16'], 'pl-c': []})
+        resolver = PrefixListResolver(ec2, max_workers=4)
+
+        assert resolver.resolve(['pl-a', 'pl-b', 'pl-a']) == {'pl-a': ['10.0.0.0/8'], 'pl-b': ['192.168.0.0/16']}
+        assert resolver.resolve(['pl-b', 'pl-c']) == {'pl-b': ['192.168.0.0/16'], 'pl-c': []}
+
+        assert sorted(ec2.requested) == ['pl-a', 'pl-b', 'pl-c']
+
+    def test_concurrent_callers_share_one_fetch(self):
+        """Test threads asking for the same list at once wait for a single fetch"""
+        release = threading.Event()
+
+        class SlowEc2(FakeEc2):
+            def paginate(self, PrefixListId):
+                release.wait(5)
+                return super().paginate(PrefixListId)
+
+        ec2 = SlowEc2({'pl-a': ['10.0.0.0/8']})
+        resolver = PrefixListResolver(ec2)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(resolver.get('pl-a'))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == [['10.0.0.0/8']] * 4
+        assert ec2.requested == ['pl-a']
+
+    def test_ttl(self, monkeypatch):
+        """Test lists are fetched again once the in-memory TTL has passed"""
+        now = [100.0]
+        monkeypatch.setattr('sgmap.prefix_lists.time.monotonic', lambda: now[0])
+        ec2 = FakeEc2({'pl-a': ['10.0.0.0/8']})
+        resolver = PrefixListResolver(ec2, ttl=60)
+
+        resolver.get('pl-a')
+        now[0] += 60
+        resolver.get('pl-a')
+        now[0] += 1
+        resolver.get('pl-a')
+
+        assert ec2.requested == ['pl-a', 'pl-a']
+
+    def test_persistent_cache(self, aws_credentials, tmp_path):
+        """Test a resolver backed by the snapshot cache does not fetch lists another run stored"""
+        cache = SnapshotCache(str(tmp_path))
+        first = FakeEc2({'pl-a': ['10.0.0.0/8']})
+        PrefixListResolver(first, region='us-east-1', cache=cache).get('pl-a')
+
+        second = FakeEc2({'pl-a': ['10.0.0.0/8']})
+        resolver = PrefixListResolver(second, region='us-east-1', cache=cache)
+
+        assert resolver.get('pl-a') == ['10.0.0.0/8']
+        assert first.requested == ['pl-a']
+        assert second.requested == []
+        assert resolver.calls == 0
+
+    def test_analysis_resolves_each_list_once(self, sample_vpc_and_sgs):
+        """Test prefix lists referenced by many groups are fetched once per analysis"""
+        groups = []
+        for i in range(5):
+            groups.append({
+                'GroupId': f"sg-{i}",
+                'GroupName': f"group{i}",
+                'IpPermissions': [],
+                'IpPermissionsEgress': [{
+                    'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                    'PrefixListIds': [{'PrefixListId': 'pl-s3'}, {'PrefixListId': f"pl-{i % 2}"}]
+                }]
+            })
+        ec2 = FakeEc2({'pl-s3': ['52.216.0.0/15'], 'pl-0': [], 'pl-1': ['10.1.0.0/16']})
+        resolver = PrefixListResolver(ec2)
+
+        for security_groups in (groups, iter(groups)):
+            connections = analyze_security_group_connections({
+                'vpc': sample_vpc_and_sgs['vpc'], 'security_groups': security_groups, 'prefix_lists': resolver
+            })
+            assert [conn['id'] for conn in connections['security_groups']['sg-1']['outbound']] == [
+                '52.216.0.0/15', '10.1.0.0/16'
+            ]
+
+        assert sorted(ec2.requested) == ['pl-0', 'pl-1', 'pl-s3']
@@ -0,0 +1,142 @@
+"""
+Tests for sgmap.query module
+"""
+
+import pytest
+
+from sgmap.core import analyze_security_group_connections, build_connection_graph
+from sgmap.query import ReachabilityIndex
+
+
+@pytest.fixture
+def index(sample_vpc_and_sgs):
+    """
+    Fixture for the reachability index of the sample VPC
+    """
+    return ReachabilityIndex.from_graph(build_connection_graph(sample_vpc_and_sgs))
+
+
+def _default_egress_sgs(egress_cidr='0.0.0.0/0'):
+    """sg-a with allow-all egress to a CIDR, sg-b allowing tcp/5432 from sg-a, sg-c allowing nothing"""
+    def sg(group_id, ingress, egress):
+        return {'GroupId': group_id, 'GroupName': group_id, 'VpcId': 'vpc-12345678',
+                'IpPermissions': ingress, 'IpPermissionsEgress': egress}
+
+    return {
+        'vpc': {'VpcId': 'vpc-12345678', 'CidrBlock': '10.0.0.0/16', 'Tags': []},
+        'security_groups': [
+            sg('sg-a', [], [{'IpProtocol': '-1', 'IpRanges': [{'CidrIp': egress_cidr}]}]),
+            sg('sg-b', [{'IpProtocol': 'tcp', 'FromPort': 5432, 'ToPort': 5432,
+                         'UserIdGroupPairs': [{'GroupId': 'sg-a'}]}], []),
+            sg('sg-c', [], [])
+        ]
+    }
+
+
+def _chain_index():
+    """Build a -> b -> c where each hop is allowed on tcp/5432 only"""
+    index = ReachabilityIndex()
+    for source, target in (('sg-a', 'sg-b'), ('sg-b', 'sg-c')):
+        index.add_rule(source, 'outbound', target, 'tcp', 5432, 5432)
+        index.add_rule(target, 'inbound', source, '6', 5000, 6000)
+    return index
+
+
+class TestReachabilityIndex:
+    """Tests for ReachabilityIndex class"""
+
+    def test_direct_requires_egress_and_ingress(self, index):
+        """Test a direct connection needs both the source egress and destination ingress"""
+        # WebServer egress 3306 -> Database, Database ingress 3306 <- WebServer
+        assert index.allows('sg-11111111', 'sg-33333333', 'tcp', 3306)
+        assert not index.allows('sg-11111111', 'sg-33333333', 'tcp', 3307)
+        assert not index.allows('sg-11111111', 'sg-33333333', 'udp', 3306)
+        # LoadBalancer egress 80 -> WebServer, WebServer ingress 80 <- LoadBalancer
+        assert index.allows('sg-22222222', 'sg-11111111', 'tcp', 80)
+        # Database has no egress rule referencing WebServer
+        assert not index.allows('sg-33333333', 'sg-11111111', 'tcp', 3306)
+
+    def test_from_connections_matches_from_graph(self, sample_vpc_and_sgs, index):
+        """Test both constructors build the same index"""
+        from_dict = ReachabilityIndex.from_connections(analyze_security_group_connections(sample_vpc_and_sgs))
+
+        for source in ('sg-11111111', 'sg-22222222', 'sg-33333333'):
+            for target in ('sg-11111111', 'sg-22222222', 'sg-33333333'):
+                for port in (80, 443, 3306):
+                    assert from_dict.allows(source, target, 'tcp', port) == index.allows(source, target, 'tcp', port)
+
+    def test_chained_query(self):
+        """Test reachability through chained security group references"""
+        index = _chain_index()
+
+        result = index.query('sg-a', 'sg-c', 'tcp', 5432)
+        assert result['allowed']
+        assert not result['direct']
+        assert result['path'] == ['sg-a', 'sg-b', 'sg-c']
+
+        assert not index.query('sg-a', 'sg-c', 'tcp', 5432, max_hops=1)['allowed']
+        assert not index.query('sg-a', 'sg-c', 'tcp', 5433)['allowed']
+        assert not index.query('sg-c', 'sg-a', 'tcp', 5432)['allowed']
+
+    def test_query_any_port(self):
+        """Test a query without port matches any port of the protocol"""
+        index = _chain_index()
+
+        assert index.query('sg-a', 'sg-b', 'tcp')['allowed']
+        assert not index.query('sg-a', 'sg-b', 'udp')['allowed']
+
+    def test_query_any_port_requires_overlap(self):
+        """Test a query without port needs a port open on both sides of a hop"""
+        index = ReachabilityIndex()
+        index.add_rule('sg-a', 'outbound', 'sg-b', 'tcp', 22, 22)
+        index.add_rule('sg-b', 'inbound', 'sg-a', 'tcp', 443, 443)
+        index.add_rule('sg-a', 'outbound', 'sg-b', 'icmp', 8, -1)
+        index.add_rule('sg-b', 'inbound', 'sg-a', 'icmp', 0, -1)
+
+        assert not index.allows('sg-a', 'sg-b', 'tcp')
+        # Echo request (type 8) out, echo reply (type 0) in
+        assert not index.allows('sg-a', 'sg-b', 'icmp')
+        assert not index.allows('sg-a', 'sg-b', 'icmp', 9)
+        assert not index.allows('sg-a', 'sg-b', None)
+
+    def test_query_any_protocol(self):
+        """Test protocol=None allows each hop on any protocol and port open on both sides"""
+        index = _chain_index()
+        index.add_rule('sg-c', 'outbound', 'sg-d', 'udp', 53, 53)
+        index.add_rule('sg-d', 'inbound', 'sg-c', 'tcp', 53, 53)
+
+        result = index.query('sg-a', 'sg-c', None)
+        assert result['allowed']
+        assert result['protocol'] is None
+        assert result['path'] == ['sg-a', 'sg-b', 'sg-c']
+        # Egress allows udp/53 but ingress only tcp/53
+        assert not index.query('sg-c', 'sg-d', None)['allowed']
+
+    def test_egress_to_cidr_covering_the_vpc(self):
+        """Test the default allow-all egress to 0.0.0.0/0 reaches groups that admit the source"""
+        vpc_and_sgs = _default_egress_sgs()
+        index = ReachabilityIndex.from_graph(build_connection_graph(vpc_and_sgs))
+
+        assert index.query('sg-a', 'sg-b', 'tcp', 5432)['allowed']
+        assert not index.allows('sg-a', 'sg-b', 'tcp', 5433)
+        assert index.allows('sg-a', 'sg-b', None)
+        assert not index.allows('sg-a', 'sg-c', None)
+        assert not index.allows('sg-b', 'sg-a', None)
+        assert index.successors('sg-a') == ['sg-b']
+
+        from_dict = ReachabilityIndex.from_connections(analyze_security_group_connections(vpc_and_sgs))
+        assert from_dict.allows('sg-a', 'sg-b', 'tcp', 5432)
+
+    @pytest.mark.parametrize('cidr, allowed', [
+        ('::/0', True), ('10.0.0.0/8', True), ('10.0.0.0/16', True),
+        ('10.0.1.0/24', False), ('192.168.0.0/16', False), ('pl-12345678', False)
+    ])
+    def test_egress_cidr_must_contain_the_vpc(self, cidr, allowed):
+        """Test only egress CIDRs containing the whole VPC CIDR count as egress to every group"""
+        index = ReachabilityIndex.from_graph(build_connection_graph(_default_egress_sgs(cidr)))
+
+        assert index.allows('sg-a', 'sg-b', 'tcp', 5432) is allowed
+
+    def test_security_groups(self):
+        """Test every referenced group is listed"""
+        assert _chain_index().security_groups() == {'sg-a', 'sg-b', 'sg-c'}
@@ -0,0 +1,140 @@
+"""
+Tests for sgmap.scan module
+"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from sgmap.aws import ec2_client
+from sgmap.scan import _scan_vpc, scan_vpcs, flatten_scan
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    """
+    Fixture for dummy AWS credentials so that real clients can be created offline
+    """
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+
+def _make_ec2(region, vpcs, security_groups):
+    """Build a fake EC2 client serving the given VPCs and security groups"""
+    ec2 = MagicMock()
+    ec2.meta.region_name = region
+
+    def describe_vpcs(VpcIds):
+        found = [vpc for vpc in vpcs if vpc['VpcId'] in VpcIds]
+        if len(found) < len(VpcIds):
+            # Like EC2, an unknown VPC ID is an error rather than an empty list
+            error = {'Error': {'Code': 'InvalidVpcID.NotFound', 'Message': 'The vpc ID does not exist'}}
+            raise ClientError(error, 'DescribeVpcs')
+        return {'Vpcs': found}
+
+    def get_paginator(operation):
+        paginator = MagicMock()
+        if operation == 'describe_vpcs':
+            paginator.paginate.return_value = [{'Vpcs': vpcs}]
+        else:
+            def paginate(Filters, **kwargs):
+                vpc_id = Filters[0]['Values'][0]
+                return [{'SecurityGroups': [sg for sg in security_groups if sg['VpcId'] == vpc_id]}]
+            paginator.paginate.side_effect = paginate
+        return paginator
+
+    ec2.describe_vpcs.side_effect = describe_vpcs
+    ec2.get_paginator.side_effect = get_paginator
+    return ec2
+
+
+@pytest.fixture
+def regional_clients(sample_vpc_and_sgs):
+    """
+    Fixture patching boto3.client with one fake EC2 client per region
+    """
+    other_vpc = {'VpcId': 'vpc-87654321', 'CidrBlock': '10.1.0.0/16', 'Tags': []}
+    other_sg = {
+        'GroupId': 'sg-44444444',
+        'GroupName': 'Other',
+        'VpcId': 'vpc-87654321',
+        'IpPermissions': [],
+        'IpPermissionsEgress': []
+    }
+    clients = {
+        'us-east-1': _make_ec2('us-east-1', [sample_vpc_and_sgs['vpc']], sample_vpc_and_sgs['security_groups']),
+        'eu-west-1': _make_ec2('eu-west-1', [other_vpc], [other_sg])
+    }
+    with patch('boto3.client', side_effect=lambda service, region_name=None: clients[region_name]) as mock_client:
+        yield mock_client, clients
+
+
+class TestScanVpcs:
+    """Tests for scan_vpcs function"""
+
+    def test_scan_vpcs_keyed_by_region_and_vpc(self, regional_clients):
+        """Test VPC IDs are looked up in every region and missing ones are skipped"""
+        mock_client, clients = regional_clients
+
+        result = scan_vpcs(vpc_ids=['vpc-12345678', 'vpc-87654321'], regions=['us-east-1', 'eu-west-1'])
+
+        assert list(result['regions']) == ['us-east-1', 'eu-west-1']
+        assert list(result['regions']['us-east-1']) == ['vpc-12345678']
+        assert list(result['regions']['eu-west-1']) == ['vpc-87654321']
+        assert set(result['regions']['us-east-1']['vpc-12345678']['security_groups']) == {
+            'sg-11111111', 'sg-22222222', 'sg-33333333'
+        }
+
+        # One client per region, reused for every VPC in it
+        assert mock_client.call_count == 2
+
+    def test_scan_vpcs_all_vpcs(self, regional_clients):
+        """Test all_vpcs lists the VPCs of every region"""
+        result = scan_vpcs(regions=['us-east-1', 'eu-west-1'], all_vpcs=True)
+
+        assert flatten_scan(result)[0][:2] == ('us-east-1', 'vpc-12345678')
+        assert flatten_scan(result)[1][:2] == ('eu-west-1', 'vpc-87654321')
+
+    def test_scan_vpcs_runs_concurrently(self, regional_clients):
+        """Test fetches for different VPCs overlap when several workers are available"""
+        _, clients = regional_clients
+        barrier = threading.Barrier(2, timeout=5)
+        for ec2 in clients.values():
+            describe_vpcs = ec2.describe_vpcs.side_effect
+
+            def waiting_describe_vpcs(VpcIds, _describe=describe_vpcs):
+                # Both regions must be in flight at the same time to pass the barrier
+                barrier.wait()
+                return _describe(VpcIds=VpcIds)
+
+            ec2.describe_vpcs.side_effect = waiting_describe_vpcs
+
+        result = scan_vpcs(vpc_ids=['vpc-12345678', 'vpc-87654321'], regions=['us-east-1', 'eu-west-1'], max_workers=4)
+
+        assert len(flatten_scan(result)) == 2
+
+
+class TestScanVpc:
+    """Tests for _scan_vpc function"""
+
+    def test_missing_vpc_is_skipped(self, aws_credentials):
+        """Test an InvalidVpcID.NotFound error from describe_vpcs yields None"""
+        ec2 = ec2_client('us-east-1')
+        with Stubber(ec2) as stubber:
+            stubber.add_client_error('describe_vpcs', 'InvalidVpcID.NotFound', expected_params={'VpcIds': ['vpc-missing']})
+
+            assert _scan_vpc(ec2, 'vpc-missing', None, None) is None
+            stubber.assert_no_pending_responses()
+
+    def test_other_errors_are_raised(self, aws_credentials):
+        """Test errors other than a missing VPC abort the scan"""
+        ec2 = ec2_client('us-east-1')
+        with Stubber(ec2) as stubber:
+            stubber.add_client_error('describe_vpcs', 'UnauthorizedOperation')
+
+            with pytest.raises(ClientError):
+                _scan_vpc(ec2, 'vpc-12345678', None, None)
@@ -0,0 +1,253 @@
+"""
+Tests for sgmap.server module
+"""
+
+import copy
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+from sgmap.cli import main
+from sgmap.core import analyze_security_group_connections, generate_mermaid_diagram
+from sgmap.server import GraphStore, SgmapServer
+
+
+class Loader:
+    """Loader returning a copy of the current VPC data, or raising `error` when set"""
+
+    def __init__(self, vpc_and_sgs):
+        self.vpc_and_sgs = vpc_and_sgs
+        self.error = None
+        self.calls = 0
+
+    def __call__(self, vpc_id):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return copy.deepcopy(self.vpc_and_sgs)
+
+
+@pytest.fixture
+def loader(sample_vpc_and_sgs):
+    """
+    Fixture for a loader serving the sample VPC
+    """
+    return Loader(sample_vpc_and_sgs)
+
+
+@pytest.fixture
+def server(loader):
+    """
+    Fixture for a running server with the sample VPC loaded; yields its base URL
+    """
+    store = GraphStore(loader, ['vpc-12345678'])
+    store.refresh_all()
+    httpd = SgmapServer(('127.0.0.1', 0), store, quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", store
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _get(url, headers=None, method='GET'):
+    """Request a URL and return (status, headers, body), including error responses"""
+    request = urllib.request.Request(url, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+class TestGraphStore:
+    """Tests for GraphStore class"""
+
+    def test_unchanged_refresh_keeps_snapshot(self, loader):
+        """Test cached renders survive a refresh that finds no change"""
+        store = GraphStore(loader, ['vpc-12345678'])
+        assert store.refresh('vpc-12345678')
+        snapshot = store.get('vpc-12345678')
+        rendered = snapshot.render('mermaid')
+
+        assert not store.refresh('vpc-12345678')
+        assert store.get('vpc-12345678') is snapshot
+        assert snapshot.render('mermaid') is rendered
+
+    def test_changed_refresh_replaces_snapshot(self, loader):
+        """Test a changed VPC gets a new snapshot"""
+        store = GraphStore(loader, ['vpc-12345678'])
+        store.refresh('vpc-12345678')
+        loader.vpc_and_sgs = copy.deepcopy(loader.vpc_and_sgs)
+        loader.vpc_and_sgs['security_groups'].pop()
+
+        assert store.refresh('vpc-12345678')
+        assert len(store.get('vpc-12345678').connections['security_groups']) == 2
+
+    def test_changed_prefix_list_replaces_snapshot(self, loader):
+        """Test a refresh picks up a prefix list whose entries changed"""
+        loader.vpc_and_sgs = copy.deepcopy(loader.vpc_and_sgs)
+        loader.vpc_and_sgs['security_groups'][0]['IpPermissionsEgress'][0]['PrefixListIds'] = [
+            {'PrefixListId': 'pl-s3'}
+        ]
+        loader.vpc_and_sgs['prefix_lists'] = {'pl-s3': ['52.216.0.0/15']}
+        store = GraphStore(loader, ['vpc-12345678'])
+        store.refresh('vpc-12345678')
+
+        assert not store.refresh('vpc-12345678')
+        loader.vpc_and_sgs['prefix_lists'] = {'pl-s3': ['52.216.0.0/15', '3.5.0.0/19']}
+        assert store.refresh('vpc-12345678')
+        outbound = store.get('vpc-12345678').connections['security_groups']['sg-11111111']['outbound']
+        assert [conn['id'] for conn in outbound][-2:] == ['52.216.0.0/15', '3.5.0.0/19']
+
+    def test_failed_refresh_keeps_serving(self, loader):
+        """Test a failing loader keeps the previous snapshot and reports the error"""
+        store = GraphStore(loader, ['vpc-12345678'])
+        store.refresh('vpc-12345678')
+        snapshot = store.get('vpc-12345678')
+        loader.error = RuntimeError('throttled')
+
+        assert not store.refresh('vpc-12345678')
+        assert store.get('vpc-12345678') is snapshot
+        status = store.status()[0]
+        assert status['error'] == 'throttled'
+        assert status['security_groups'] == 3
+
+    def test_background_refresh(self, loader):
+        """Test the background thread refreshes on the interval until stopped"""
+        store = GraphStore(loader, ['vpc-12345678'], interval=0.01)
+        store.start()
+        try:
+            for _ in range(500):
+                if loader.calls >= 2:
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            store.stop()
+
+        assert loader.calls >= 2
+        assert store.get('vpc-12345678') is not None
+
+
+class TestSgmapServer:
+    """Tests for the HTTP endpoints"""
+
+    def test_mermaid(self, server, sample_vpc_and_sgs):
+        """Test the mermaid document matches the CLI output and is revalidated by ETag"""
+        url, _ = server
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        status, headers, body = _get(f"{url}/vpcs/vpc-12345678/mermaid?compact=1")
+
+        assert status == 200
+        assert body.decode('utf-8') == generate_mermaid_diagram(connections, compact=True) + "\n"
+        status, _, body = _get(f"{url}/vpcs/vpc-12345678/mermaid?compact=1", {'If-None-Match': headers['ETag']})
+        assert status == 304 and body == b''
+        _, other, _ = _get(f"{url}/vpcs/vpc-12345678/mermaid")
+        assert other['ETag'] != headers['ETag']
+
+    def test_json_and_status(self, server):
+        """Test the JSON document and the VPC list"""
+        url, _ = server
+
+        _, headers, body = _get(f"{url}/vpcs/vpc-12345678/json")
+        assert headers['Content-Type'] == 'application/json'
+        assert set(json.loads(body)['security_groups']) == {'sg-11111111', 'sg-22222222', 'sg-33333333'}
+
+        _, _, body = _get(f"{url}/vpcs")
+        status = json.loads(body)[0]
+        assert status['id'] == 'vpc-12345678'
+        assert status['loaded'] and status['error'] is None
+        assert status['edges'] == 7
+
+    def test_query(self, server):
+        """Test reachability queries and parameter errors"""
+        url, _ = server
+
+        _, _, body = _get(f"{url}/vpcs/vpc-12345678/query?from=sg-22222222&to=sg-11111111&port=80/tcp")
+        assert json.loads(body)['allowed'] is True
+
+        _, _, body = _get(f"{url}/vpcs/vpc-12345678/query?from=sg-22222222&to=sg-11111111")
+        assert json.loads(body)['allowed'] is True
+
+        status, _, body = _get(f"{url}/vpcs/vpc-12345678/query?from=sg-22222222&to=sg-11111111&port=70000")
+        assert status == 400
+        assert 'Invalid port' in json.loads(body)['error']
+
+    def test_blast_radius(self, server):
+        """Test blast radius queries in both directions and parameter errors"""
+        url, _ = server
+
+        _, _, body = _get(f"{url}/vpcs/vpc-12345678/blast-radius?sg=sg-22222222")
+        result = json.loads(body)
+        assert result['count'] == 2
+        assert [group['id'] for group in result['security_groups']] == ['sg-11111111', 'sg-33333333']
+
+        _, _, body = _get(f"{url}/vpcs/vpc-12345678/blast-radius?sg=sg-33333333&reverse=1")
+        assert [group['name'] for group in json.loads(body)['security_groups']] == ['WebServer', 'LoadBalancer']
+
+        assert _get(f"{url}/vpcs/vpc-12345678/blast-radius")[0] == 400
+        assert _get(f"{url}/vpcs/vpc-12345678/blast-radius?sg=sg-unknown")[0] == 404
+
+    def test_refresh(self, server, loader):
+        """Test POST refresh reloads the VPC"""
+        url, _ = server
+        calls = loader.calls
+
+        status, _, body = _get(f"{url}/vpcs/vpc-12345678/refresh", method='POST')
+
+        assert status == 200
+        assert json.loads(body)['changed'] is False
+        assert loader.calls == calls + 1
+
+    def test_not_found(self, server):
+        """Test unknown VPCs and paths"""
+        url, _ = server
+
+        assert _get(f"{url}/vpcs/vpc-unknown/json")[0] == 404
+        assert _get(f"{url}/vpcs/vpc-12345678/svg")[0] == 404
+        assert _get(f"{url}/nothing")[0] == 404
+        assert _get(f"{url}/healthz")[2] == b'ok\n'
+
+    def test_not_loaded(self, loader):
+        """Test 503 is returned until the first successful load"""
+        loader.error = RuntimeError('no credentials')
+        store = GraphStore(loader, ['vpc-12345678'])
+        store.refresh_all()
+        httpd = SgmapServer(('127.0.0.1', 0), store, quiet=True)
+        threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+        try:
+            status, _, _ = _get(f"http://127.0.0.1:{httpd.server_address[1]}/vpcs/vpc-12345678/json")
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+        assert status == 503
+
+
+class TestServeCommand:
+    """Tests for the serve command"""
+
+    def test_serve_from_file(self, tmp_path, sample_security_groups_response):
+        """Test the VPC is loaded from files before serving"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+
+        with patch('sgmap.server.SgmapServer.serve_forever', side_effect=KeyboardInterrupt) as mock_serve:
+            result = CliRunner().invoke(main, ['serve', '--from-file', str(path), '--port', '0'])
+
+        assert result.exit_code == 0
+        assert 'Serving vpc-12345678 on http://127.0.0.1:' in result.output
+        mock_serve.assert_called_once()
+
+    def test_requires_source(self):
+        """Test a VPC ID or input file is required"""
+        result = CliRunner().invoke(main, ['serve'])
+
+        assert result.exit_code == 2
+        assert "Missing option '--vpc-id'" in result.output
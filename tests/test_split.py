@@ -0,0 +1,88 @@
+"""
+Tests for sgmap.split module
+"""
+
+import json
+import os
+
+from click.testing import CliRunner
+
+from sgmap.cli import main
+from sgmap.core import analyze_security_group_connections, generate_json_output, generate_mermaid_diagram
+from sgmap.split import split_connections, write_split_output
+
+
+class TestSplitConnections:
+    """Tests for split_connections function"""
+
+    def test_one_map_per_group(self, sample_vpc_and_sgs):
+        """Test each slice holds one group and shares the analyzed entry"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        slices = list(split_connections(connections))
+
+        assert [sg_id for sg_id, _ in slices] == ['sg-11111111', 'sg-22222222', 'sg-33333333']
+        sg_id, group_connections = slices[0]
+        assert group_connections['vpc'] is connections['vpc']
+        assert group_connections['security_groups'] == {sg_id: connections['security_groups'][sg_id]}
+        assert group_connections['security_groups'][sg_id] is connections['security_groups'][sg_id]
+
+
+class TestWriteSplitOutput:
+    """Tests for write_split_output function"""
+
+    def test_files_match_single_group_output(self, sample_vpc_and_sgs, tmp_path):
+        """Test every group gets a diagram and a JSON file rendered from its slice"""
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        sg_ids = write_split_output(connections, str(tmp_path / 'out'), include_vpc=True)
+
+        assert sorted(os.listdir(tmp_path / 'out')) == sorted(
+            f"{sg_id}.{ext}" for sg_id in sg_ids for ext in ('md', 'json')
+        )
+        for sg_id, group_connections in split_connections(connections):
+            mermaid = (tmp_path / 'out' / f"{sg_id}.md").read_text(encoding='utf-8')
+            assert mermaid == generate_mermaid_diagram(group_connections, include_vpc=True) + "\n"
+            assert (tmp_path / 'out' / f"{sg_id}.json").read_text() == generate_json_output(group_connections) + "\n"
+
+    def test_worker_processes(self, sample_vpc_and_sgs, tmp_path, monkeypatch):
+        """Test the process pool writes the same files as the in-process path"""
+        monkeypatch.setattr('sgmap.split.MIN_GROUPS_PER_WORKER', 1)
+        connections = analyze_security_group_connections(sample_vpc_and_sgs)
+
+        write_split_output(connections, str(tmp_path / 'serial'), compact=True, workers=1)
+        write_split_output(connections, str(tmp_path / 'parallel'), compact=True, workers=2)
+
+        for name in os.listdir(tmp_path / 'serial'):
+            assert (tmp_path / 'parallel' / name).read_text() == (tmp_path / 'serial' / name).read_text()
+        assert len(os.listdir(tmp_path / 'parallel')) == 6
+
+
+class TestSplitOutputOption:
+    """Tests for the --split-output option"""
+
+    def test_from_file(self, tmp_path, sample_security_groups_response):
+        """Test peers are named from the whole VPC in the per-group files"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+
+        result = CliRunner().invoke(main, ['--from-file', str(path), '--split-output', str(tmp_path / 'docs')])
+
+        assert result.exit_code == 0
+        assert 'Wrote 3 security groups' in result.output
+        web = json.loads((tmp_path / 'docs' / 'sg-11111111.json').read_text())
+        assert list(web['security_groups']) == ['sg-11111111']
+        assert web['security_groups']['sg-11111111']['inbound'][0]['name'] == 'LoadBalancer'
+        assert (tmp_path / 'docs' / 'sg-33333333.md').read_text().startswith("```mermaid\n")
+
+    def test_conflicting_options(self, tmp_path):
+        """Test the option is rejected with --json and with several VPCs"""
+        runner = CliRunner()
+
+        result = runner.invoke(main, ['-v', 'vpc-1', '--json', '--split-output', str(tmp_path)])
+        assert result.exit_code == 2
+        assert "cannot be used with '--json' or '--output'" in result.output
+
+        result = runner.invoke(main, ['--all-vpcs', '--split-output', str(tmp_path)])
+        assert result.exit_code == 2
+        assert "'--split-output' cannot be used with several VPCs" in result.output
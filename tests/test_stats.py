@@ -0,0 +1,136 @@
+"""
+Tests for sgmap.stats module
+"""
+
+import json
+import time
+
+import pytest
+from botocore.stub import Stubber
+from click.testing import CliRunner
+
+from sgmap.aws import ec2_client
+from sgmap.cli import main
+from sgmap.core import analyze_security_group_connections, get_security_groups
+from sgmap.stats import PipelineStats
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    """
+    Fixture for dummy AWS credentials so that real clients can be created offline
+    """
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+
+
+class TestPipelineStats:
+    """Tests for PipelineStats class"""
+
+    def test_stages_accumulate_and_call_back(self):
+        """Test stage timings accumulate and are forwarded to callbacks"""
+        events = []
+        with PipelineStats(callbacks=[lambda *event: events.append(event)]) as stats:
+            with stats.stage('render'):
+                pass
+            with stats.stage('render'):
+                pass
+            stats.incr('pages', 2)
+
+        data = stats.to_dict()
+        assert list(data['stages']) == ['render']
+        assert data['counters'] == {'pages': 2}
+        assert data['total_seconds'] >= data['stages']['render']
+        assert [(kind, name) for kind, name, _ in events] == [
+            ('timing', 'render'), ('timing', 'render'), ('counter', 'pages'), ('timing', 'total')
+        ]
+
+    def test_lazy_pages_are_not_credited_to_the_consumer(self):
+        """Test time spent producing streamed items counts toward their own stage only"""
+        def slow_pages():
+            for page in range(3):
+                time.sleep(0.02)
+                yield page
+
+        stats = PipelineStats()
+        pages = stats.iter_stage('fetch', slow_pages())
+        with stats.stage('analyze'):
+            assert list(pages) == [0, 1, 2]
+
+        assert stats.stages['fetch'] >= 0.06
+        assert stats.stages['analyze'] < 0.02
+
+    def test_record_connections(self, sample_vpc_and_sgs):
+        """Test security groups, nodes and edges are counted"""
+        stats = PipelineStats()
+
+        stats.record_connections(analyze_security_group_connections(sample_vpc_and_sgs))
+
+        # 3 groups plus the 0.0.0.0/0 CIDR
+        assert stats.counters == {'security_groups': 3, 'nodes': 4, 'edges': 7}
+
+    def test_instruments_clients_created_while_active(self, aws_credentials, sample_vpc_response, sample_security_groups_response):
+        """Test API calls, pages and botocore retry attempts are counted"""
+        with PipelineStats() as stats:
+            ec2 = ec2_client('us-east-1')
+            with Stubber(ec2) as stubber:
+                stubber.add_response('describe_vpcs', sample_vpc_response)
+                groups = sample_security_groups_response['SecurityGroups']
+                stubber.add_response('describe_security_groups', {
+                    'SecurityGroups': groups[:2], 'NextToken': 'token',
+                    'ResponseMetadata': {'RetryAttempts': 2}
+                })
+                stubber.add_response('describe_security_groups', {'SecurityGroups': groups[2:]})
+
+                get_security_groups('vpc-12345678', ec2=ec2)
+
+        counters = stats.counters
+        assert counters['api_calls'] == 3
+        assert counters['api_calls.DescribeVpcs'] == 1
+        assert counters['api_calls.DescribeSecurityGroups'] == 2
+        assert counters['pages'] == 2
+        assert counters['retries'] == 2
+        assert 'DescribeSecurityGroups:' in stats.format_report()
+
+    def test_clients_created_after_exit_are_not_instrumented(self, aws_credentials):
+        """Test the client hook is removed when the collector exits"""
+        with PipelineStats() as stats:
+            pass
+        ec2 = ec2_client('us-east-1')
+        with Stubber(ec2) as stubber:
+            stubber.add_response('describe_vpcs', {'Vpcs': []})
+            ec2.describe_vpcs()
+
+        assert stats.counters == {}
+
+
+class TestStatsOption:
+    """Tests for the --stats and --stats-file options"""
+
+    @pytest.fixture
+    def sgs_file(self, tmp_path, sample_security_groups_response):
+        """Fixture writing a describe-security-groups output file"""
+        path = tmp_path / 'sgs.json'
+        path.write_text(json.dumps(sample_security_groups_response))
+        return str(path)
+
+    def test_stats_report(self, sgs_file):
+        """Test --stats prints the report"""
+        result = CliRunner().invoke(main, ['--from-file', sgs_file, '--stats'])
+
+        assert result.exit_code == 0
+        assert 'sgmap stats:' in result.output
+        assert '3 security groups, 4 nodes, 7 edges' in result.output
+
+    def test_stats_file(self, sgs_file, tmp_path):
+        """Test --stats-file writes the measurements as JSON"""
+        stats_path = tmp_path / 'stats.json'
+
+        result = CliRunner().invoke(main, ['--from-file', sgs_file, '--json', '--stats-file', str(stats_path)])
+
+        assert result.exit_code == 0
+        data = json.loads(stats_path.read_text())
+        assert list(data['stages']) == ['fetch', 'analyze', 'render']
+        assert data['counters']['edges'] == 7
+        assert 'sgmap stats:' not in result.output
@@ -0,0 +1,119 @@
+"""
+Tests for sgmap.table module
+"""
+
+import pytest
+
+from sgmap.table import NOT_A_CIDR, RuleTable
+
+
+def _conn(peer_type, peer, protocol='tcp', from_port=443, to_port=443, name=None):
+    return {'type': peer_type, 'id': peer, 'name': name or peer, 'protocol': protocol,
+            'from_port': from_port, 'to_port': to_port, 'description': ''}
+
+
+@pytest.fixture(params=['array', 'numpy'])
+def backend(request):
+    """
+    Fixture for each table backend (numpy is skipped when NumPy is not installed)
+    """
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    return request.param
+
+
+@pytest.fixture
+def connections():
+    """
+    Fixture for a connection map with internal and external peers
+    """
+    return {
+        'vpc': {'id': 'vpc-1', 'cidr': '10.0.0.0/16', 'name': '', 'tags': []},
+        'security_groups': {
+            'sg-web': {'name': 'web', 'description': '', 'tags': [], 'inbound': [
+                _conn('cidr', '0.0.0.0/0', 'tcp', 22, 22),
+                _conn('cidr', '10.0.1.0/24', '6', 8000, 8080),
+                _conn('security_group', 'sg-db', 'tcp', 443, 443, name='db')
+            ], 'outbound': [
+                _conn('cidr', '0.0.0.0/0', '-1', 'all', 'all'),
+                _conn('security_group', 'sg-other-vpc', '-1', 'all', 'all')
+            ]},
+            'sg-db': {'name': 'db', 'description': '', 'tags': [], 'inbound': [
+                _conn('cidr', 'pl-12345678', 'icmp', 8, -1)
+            ], 'outbound': []}
+        }
+    }
+
+
+class TestRuleTable:
+    """Tests for RuleTable class"""
+
+    def test_columns(self, connections, backend):
+        """Test one row per rule with codes into the distinct values"""
+        table = RuleTable.from_connections(connections, backend)
+
+        assert len(table) == 6
+        assert table.backend == backend
+        assert [table.group_ids[code] for code in table.columns['owner']] == ['sg-web'] * 5 + ['sg-db']
+        assert [table.protocols[code] for code in table.columns['protocol']] == [
+            'tcp', 'tcp', 'tcp', '-1', '-1', 'icmp'
+        ]
+        assert [table.port_ranges[code] for code in table.columns['ports']] == [
+            (22, 22), (8000, 8080), (443, 443), (0, 65535), (0, 65535), (8, 8)
+        ]
+        assert list(table.columns['prefix_length']) == [0, 24, NOT_A_CIDR, 0, NOT_A_CIDR, NOT_A_CIDR]
+        # Groups of the table and CIDRs inside the VPC CIDR are internal
+        assert list(table.columns['internal']) == [0, 1, 1, 0, 0, 0]
+
+    def test_select_and_combine(self, connections, backend):
+        """Test masks built from predicates combine with &, | and invert"""
+        table = RuleTable.from_connections(connections, backend)
+
+        inbound = table.select('direction', 'inbound'.__eq__)
+        world = table.select('peer', {'0.0.0.0/0', '::/0'}.__contains__)
+        broad = table.select('prefix_length', lambda length: length <= 8)
+
+        assert table.rows(inbound) == [0, 1, 2, 5]
+        assert table.rows(inbound & world) == [0]
+        assert table.rows(world | table.invert(inbound)) == [0, 3, 4]
+        # Non-CIDR peers have no prefix length and never match
+        assert table.rows(broad) == [0, 3]
+        assert table.count(table.all()) == 6
+        assert table.count(table.none()) == 0
+
+    def test_select_within(self, connections, backend):
+        """Test selecting among few candidate rows gives the same rows as combining masks"""
+        table = RuleTable.from_connections(connections, backend)
+        covers_22 = table.select('ports', lambda ports: ports[0] <= 22 <= ports[1])
+
+        for candidates in (table.select('peer', '0.0.0.0/0'.__eq__), table.all(), table.none()):
+            within = table.select('ports', lambda ports: ports[0] <= 22 <= ports[1], within=candidates)
+            assert table.rows(within) == table.rows(covers_22 & candidates)
+
+    def test_rules(self, connections, backend):
+        """Test selected rows are materialized with their original values"""
+        table = RuleTable.from_connections(connections, backend)
+
+        rules = table.rules(table.select('protocol', 'icmp'.__eq__))
+
+        assert rules == [{
+            'security_group': 'sg-db',
+            'security_group_name': 'db',
+            'direction': 'inbound',
+            'type': 'cidr',
+            'id': 'pl-12345678',
+            'name': 'pl-12345678',
+            'protocol': 'icmp',
+            'from_port': 8,
+            'to_port': -1,
+            'description': ''
+        }]
+
+    def test_empty_and_unknown_backend(self, backend):
+        """Test an empty connection map and an unknown backend"""
+        table = RuleTable.from_connections({'vpc': {'id': 'vpc-1', 'cidr': ''}, 'security_groups': {}}, backend)
+
+        assert len(table) == 0
+        assert table.rules(table.select('direction', 'inbound'.__eq__)) == []
+        with pytest.raises(ValueError):
+            RuleTable.from_connections({'vpc': {}, 'security_groups': {}}, 'pandas')